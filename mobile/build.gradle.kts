@@ -55,6 +55,8 @@ android {
             proguardFiles(getDefaultProguardFile("proguard-android.txt"), "proguard-rules.pro")
         }
     }
+    // OuiDatabase maps the asset directly
+    androidResources.noCompress += "bin"
     packagingOptions.resources.excludes.addAll(listOf(
         "**/*.kotlin_*",
         "META-INF/versions/**",
@@ -89,6 +91,30 @@ android {
 }
 kotlin.compilerOptions.jvmTarget.set(JvmTarget.fromTarget(javaVersion.toString()))
 
+/**
+ * oui.bin is committed with oui.json, which pins its SHA-256 and the registry versions it was compiled from, so builds
+ * need neither the network nor Python. updateOuiDatabase refreshes both from the IEEE and is only run on purpose.
+ */
+val ouiDatabase = file("src/main/assets/oui.bin")
+val ouiManifest = file("oui.json")
+val verifyOuiDatabase by tasks.registering {
+    description = "Checks the committed OUI database against the SHA-256 pinned in oui.json."
+    inputs.files(ouiDatabase, ouiManifest)
+    doLast {
+        val expected = (groovy.json.JsonSlurper().parse(ouiManifest) as Map<*, *>)["sha256"]
+        val actual = java.security.MessageDigest.getInstance("SHA-256").digest(ouiDatabase.readBytes())
+            .joinToString("") { "%02x".format(it) }
+        if (actual != expected) throw GradleException("$ouiDatabase has SHA-256 $actual, oui.json pins $expected")
+    }
+}
+tasks.named("preBuild") { dependsOn(verifyOuiDatabase) }
+tasks.register<Exec>("updateOuiDatabase") {
+    description = "Downloads the IEEE registries and recompiles oui.bin and oui.json, to be reviewed and committed."
+    workingDir = rootProject.file("tests")
+    commandLine("python3", "-m", "common.oui_db", "--download", "--output", ouiDatabase.absolutePath,
+        "--manifest", ouiManifest.absolutePath)
+}
+
 dependencies {
     val lifecycleVersion = "2.8.7"
     val roomVersion = "2.6.1"
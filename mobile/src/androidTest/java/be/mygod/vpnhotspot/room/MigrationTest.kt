@@ -1,9 +1,13 @@
 package be.mygod.vpnhotspot.room
 
+import androidx.room.Room
 import androidx.room.testing.MigrationTestHelper
 import androidx.sqlite.db.framework.FrameworkSQLiteOpenHelperFactory
 import androidx.test.ext.junit.runners.AndroidJUnit4
 import androidx.test.platform.app.InstrumentationRegistry
+import be.mygod.vpnhotspot.net.MacAddressCompat
+import kotlinx.coroutines.runBlocking
+import org.junit.Assert.assertEquals
 import org.junit.Rule
 import org.junit.Test
 import org.junit.runner.RunWith
@@ -13,6 +17,11 @@ import java.io.IOException
 class MigrationTest {
     companion object {
         private const val TEST_DB = "migration-test"
+        private const val STATS = "SELECT MIN(TrafficRecord.timestamp), COUNT(TrafficRecord.id), " +
+                "SUM(TrafficRecord.sentPackets), SUM(TrafficRecord.sentBytes), SUM(TrafficRecord.receivedPackets), " +
+                "SUM(TrafficRecord.receivedBytes) FROM TrafficRecord " +
+                "LEFT JOIN TrafficRecord AS Next ON TrafficRecord.id = Next.previousId " +
+                "WHERE TrafficRecord.mac = ? AND Next.id IS NULL"
     }
 
     @get:Rule
@@ -26,4 +35,49 @@ class MigrationTest {
         db.close()
         privateDatabase.runMigrationsAndValidate(TEST_DB, 2, true, AppDatabase.Migration2)
     }
+
+    @Test
+    @Throws(IOException::class)
+    fun migrate2To3() {
+        // mac 1 has a chain of 3 records and a chain of 1, mac 2 has a chain of 2, mac 3 has no records
+        val chains = mapOf(1L to listOf(listOf(1L, 2L, 3L), listOf(4L)), 2L to listOf(listOf(5L, 6L)),
+                3L to emptyList())
+        val expected = privateDatabase.createDatabase(TEST_DB, 2).run {
+            for ((mac, macChains) in chains) for (chain in macChains) chain.forEachIndexed { index, id ->
+                execSQL("INSERT INTO TrafficRecord (id, timestamp, mac, ip, downstream, sentPackets, sentBytes, " +
+                        "receivedPackets, receivedBytes, previousId) " +
+                        "VALUES (?, ?, ?, X'C0A82B02', 'wlan0', ?, ?, ?, ?, ?)",
+                        arrayOf(id, 1000 * id, mac, id, 100 * id, 2 * id, 200 * id, chain.getOrNull(index - 1)))
+            }
+            val stats = chains.keys.associateWith { mac ->
+                query(STATS, arrayOf(mac)).use { cursor ->
+                    check(cursor.moveToFirst())
+                    ClientStats(cursor.getLong(0), cursor.getLong(1), cursor.getLong(2), cursor.getLong(3),
+                            cursor.getLong(4), cursor.getLong(5))
+                }
+            }
+            close()
+            stats
+        }
+        privateDatabase.runMigrationsAndValidate(TEST_DB, 3, true, AppDatabase.Migration3).apply {
+            for ((mac, macChains) in chains) query("SELECT id FROM TrafficChainHead WHERE mac = ? ORDER BY id",
+                    arrayOf(mac)).use { cursor ->
+                val heads = generateSequence { if (cursor.moveToNext()) cursor.getLong(0) else null }.toList()
+                assertEquals(macChains.map { it.last() }, heads)
+            }
+            query("SELECT COUNT(*) FROM TrafficChainHead").use {
+                check(it.moveToFirst())
+                assertEquals(chains.values.sumOf { it.size }.toLong(), it.getLong(0))
+            }
+            close()
+        }
+        val database = Room.databaseBuilder(InstrumentationRegistry.getInstrumentation().targetContext,
+                AppDatabase::class.java, TEST_DB).addMigrations(AppDatabase.Migration2, AppDatabase.Migration3).build()
+        privateDatabase.closeWhenFinished(database)
+        runBlocking {
+            for ((mac, stats) in expected) {
+                assertEquals(stats, database.trafficRecordDao.queryStats(MacAddressCompat(mac).toPlatform()))
+            }
+        }
+    }
 }
@@ -11,16 +11,24 @@ import be.mygod.vpnhotspot.net.wifi.WifiApManager
 import be.mygod.vpnhotspot.net.wifi.WifiApManager.wifiApState
 import be.mygod.vpnhotspot.util.Services
 import be.mygod.vpnhotspot.util.ApiKeyManager
+import be.mygod.vpnhotspot.util.HttpMessageReader
 import kotlinx.coroutines.*
 import okhttp3.*
 import okhttp3.MediaType.Companion.toMediaType
 import okhttp3.ResponseBody.Companion.toResponseBody
+import org.json.JSONException
+import org.json.JSONObject
 import timber.log.Timber
+import java.io.ByteArrayOutputStream
 import java.io.IOException
 import java.net.InetSocketAddress
 import java.net.ServerSocket
+import java.security.MessageDigest
 import java.util.concurrent.Executors
 import java.util.concurrent.TimeUnit
+import java.util.concurrent.atomic.AtomicLong
+import java.util.zip.DeflaterOutputStream
+import java.util.zip.GZIPOutputStream
 import kotlin.math.roundToInt
 
 /**
@@ -34,11 +42,32 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         private var cachedSystemStatus: SystemStatus? = null
         private var lastStatusUpdateTime: Long = 0
         private const val STATUS_CACHE_DURATION = 2000L // 2秒缓存
+        private const val KEEP_ALIVE_TIMEOUT = 5000 // keep-alive连接空闲5秒后关闭
+        private const val MAX_KEEP_ALIVE_REQUESTS = 100 // 单个连接最多处理100个请求
+        private const val STATUS_STREAM_MIN_INTERVAL = 500L // 状态推送的最小间隔
+        private const val STATUS_STREAM_MAX_INTERVAL = 60000L
+        private const val STATUS_STREAM_HEARTBEAT = 15000L // 无变化时15秒发送一次保活注释，及时发现已断开的客户端
+        private const val MAX_BATCH_REQUESTS = 16 // 单个批量请求最多包含的子请求数
         
         // CPU使用率计算相关变量
         private var lastCpuTotal = 0L
         private var lastCpuNonIdle = 0L
         
+        /**
+         * 绑定监听端口：只绑定一次并允许地址重用，快速重启时端口上残留的TIME_WAIT连接不会导致绑定失败
+         */
+        fun bind(port: Int): ServerSocket {
+            val socket = ServerSocket()
+            try {
+                socket.reuseAddress = true
+                socket.bind(InetSocketAddress(port))
+            } catch (e: IOException) {
+                socket.close()
+                throw e
+            }
+            return socket
+        }
+        
         fun getInstance(context: Context): OkHttpWebServer {
             if (instance == null) {
                 instance = OkHttpWebServer(context.applicationContext)
@@ -83,6 +112,12 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
     var isRunning = false
         private set
     private val executor = Executors.newCachedThreadPool()
+    // 正在等待下一个请求的keep-alive连接，停止服务器时直接关闭，不必等满空闲超时
+    private val idleConnections = java.util.concurrent.ConcurrentHashMap.newKeySet<java.net.Socket>()
+    // 正在推送状态的SSE连接，停止服务器时关闭
+    private val streamConnections = java.util.concurrent.ConcurrentHashMap.newKeySet<java.net.Socket>()
+    // 连接编号，用于在日志中把接受连接与处理该连接的工作线程对应起来（tests/common/request_timeline.py）
+    private val connectionIds = AtomicLong()
     private var scope = CoroutineScope(Dispatchers.IO + SupervisorJob())
     
     private val client = OkHttpClient.Builder()
@@ -94,9 +129,20 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
     private val jsonMediaType = "application/json; charset=utf-8".toMediaType()
     private val htmlMediaType = "text/html; charset=utf-8".toMediaType()
     private val textMediaType = "text/plain; charset=utf-8".toMediaType()
+    private val eventStreamMediaType = "text/event-stream; charset=utf-8".toMediaType()
     
-    fun start() {
-        if (isRunning) return
+    // 控制面板与API Key引导页的内容是固定的，第一次请求时构建并压缩，之后直接发送
+    private val mainPage by lazy { StaticPage(mainPageHtml()) }
+    private val apiKeyRequiredPage by lazy { StaticPage(apiKeyRequiredPageHtml()) }
+    
+    /**
+     * 启动服务器；[boundSocket] 为调用方已绑定到 [port] 的监听套接字（见 WebServerManager），之后由服务器负责关闭
+     */
+    fun start(boundSocket: ServerSocket? = null) {
+        if (isRunning) {
+            boundSocket?.close()
+            return
+        }
         
         try {
             // 如果协程作用域已被取消，重新创建
@@ -105,9 +151,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                 Timber.d("Recreated coroutine scope for WebServer restart")
             }
             
-            serverSocket = ServerSocket()
-            serverSocket?.reuseAddress = true
-            serverSocket?.bind(InetSocketAddress(port))
+            serverSocket = boundSocket ?: bind(port)
             isRunning = true
             
             scope.launch {
@@ -115,7 +159,9 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                     while (isRunning && !Thread.currentThread().isInterrupted) {
                         try {
                             val socket = serverSocket?.accept() ?: break
-                            handleConnection(socket)
+                            val id = connectionIds.incrementAndGet()
+                            Timber.d("Accepted connection #$id from ${socket.remoteSocketAddress}")
+                            handleConnection(socket, id)
                         } catch (e: IOException) {
                             if (isRunning) {
                                 Timber.e(e, "Error accepting connection")
@@ -135,6 +181,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         } catch (e: IOException) {
             Timber.e(e, "Failed to start OkHttpWebServer")
             isRunning = false
+            boundSocket?.close()
             throw e
         }
     }
@@ -163,6 +210,24 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                 }
             }
             
+            // 关闭空闲的keep-alive连接，正在处理的请求不受影响
+            idleConnections.forEach { connection ->
+                try {
+                    connection.close()
+                } catch (e: Exception) {
+                    Timber.w(e, "Error closing idle connection")
+                }
+            }
+            idleConnections.clear()
+            streamConnections.forEach { connection ->
+                try {
+                    connection.close()
+                } catch (e: Exception) {
+                    Timber.w(e, "Error closing status stream")
+                }
+            }
+            streamConnections.clear()
+            
             // 2. 取消协程作用域并等待完成
             try {
                 if (scope.isActive) {
@@ -311,12 +376,13 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         }
     }
     
-    private fun handleConnection(socket: java.net.Socket) {
+    private fun handleConnection(socket: java.net.Socket, id: Long) {
         executor.execute {
             var inputStream: java.io.InputStream? = null
             var outputStream: java.io.OutputStream? = null
-            var bufferedReader: java.io.BufferedReader? = null
             var bufferedWriter: java.io.BufferedWriter? = null
+            var handled = 0
+            Timber.d("Handling connection #$id")
             
             try {
                 // 设置套接字超时以避免长时间阻塞
@@ -324,15 +390,47 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                 
                 inputStream = socket.getInputStream()
                 outputStream = socket.getOutputStream()
+                // 读写器与连接同生命周期，在finally中关闭；每个响应只flush，不关闭套接字
+                // 请求按字节读取，请求体按Content-Length的字节数读完，下一个请求才不会错位
+                val input = HttpMessageReader(inputStream.buffered())
+                val output = outputStream.bufferedWriter().also { bufferedWriter = it }
                 
-                val request = parseRequest(socket)
-                val response = processRequest(request)
-                sendResponse(socket, response)
+                // HTTP/1.1持久连接：在同一连接上依次处理请求，直到客户端要求关闭、
+                // 达到单连接最大请求数、空闲超时或服务器停止
+                while (isRunning) {
+                    val request = parseRequest(socket, input, idle = handled > 0) ?: break
+                    handled++
+                    val keepAlive = isRunning && handled < MAX_KEEP_ALIVE_REQUESTS && isKeepAlive(request)
+                    val processStart = System.nanoTime()
+                    val response = processRequest(request)
+                    val sendStart = System.nanoTime()
+                    if (response.streamInterval != null) {
+                        // 状态流占用整个连接，结束后关闭
+                        try {
+                            streamStatus(socket, output, response.streamInterval)
+                        } finally {
+                            logResponse(request, response, processStart, sendStart)
+                        }
+                        break
+                    }
+                    sendResponse(output, response, keepAlive, outputStream)
+                    logResponse(request, response, processStart, sendStart)
+                    if (!keepAlive) break
+                }
                 
+            } catch (e: HttpMessageReader.HttpException) {
+                // 请求体没有恰好读完，连接上剩余的字节无法解析：应答错误并关闭连接
+                Timber.w("Rejected request: ${e.message}")
+                try {
+                    sendErrorResponse(bufferedWriter ?: socket.getOutputStream().bufferedWriter(), e.statusCode,
+                        e.message ?: getStatusText(e.statusCode))
+                } catch (ex: Exception) {
+                    Timber.e(ex, "Error sending rejection response")
+                }
             } catch (e: java.net.SocketTimeoutException) {
                 Timber.w("Socket timeout while handling connection")
                 try {
-                    sendErrorResponse(socket, 408, "Request Timeout")
+                    sendErrorResponse(bufferedWriter ?: socket.getOutputStream().bufferedWriter(), 408, "Request Timeout")
                 } catch (ex: Exception) {
                     Timber.e(ex, "Error sending timeout response")
                 }
@@ -342,7 +440,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
             } catch (e: Exception) {
                 Timber.e(e, "Error handling connection")
                 try {
-                    sendErrorResponse(socket, 500, "Internal Server Error")
+                    sendErrorResponse(bufferedWriter ?: socket.getOutputStream().bufferedWriter(), 500, "Internal Server Error")
                 } catch (ex: Exception) {
                     Timber.e(ex, "Error sending error response")
                 }
@@ -354,12 +452,6 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                     Timber.w(e, "Error closing buffered writer")
                 }
                 
-                try {
-                    bufferedReader?.close()
-                } catch (e: Exception) {
-                    Timber.w(e, "Error closing buffered reader")
-                }
-                
                 try {
                     outputStream?.close()
                 } catch (e: Exception) {
@@ -381,18 +473,46 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                 } catch (e: Exception) {
                     Timber.w(e, "Error closing socket")
                 }
+                Timber.d("Connection #$id closed after $handled requests")
             }
         }
     }
     
-    private fun parseRequest(socket: java.net.Socket): HttpRequest {
-        val input = socket.getInputStream().bufferedReader()
-        
+    // 请求时间线：与 HTTP request first line、Parsed HTTP request 两行一起还原每个请求各阶段的耗时
+    private fun logResponse(request: HttpRequest, response: HttpResponse, processStart: Long, sendStart: Long) {
+        val end = System.nanoTime()
+        Timber.d("Responded ${response.statusCode} to ${request.method} ${request.uri} " +
+            "(process ${(sendStart - processStart) / 1_000_000} ms, send ${(end - sendStart) / 1_000_000} ms)")
+    }
+    
+    /**
+     * 从连接上解析一个请求
+     * idle为true表示在keep-alive连接上等待后续请求：空闲超时或客户端关闭连接时返回null
+     */
+    private fun parseRequest(socket: java.net.Socket, input: HttpMessageReader, idle: Boolean = false): HttpRequest? {
         try {
             // 设置较短的读取超时，避免长时间阻塞
             socket.soTimeout = 5000 // 5秒超时
             
-            val firstLine = input.readLine()
+            val firstLine = if (idle) {
+                // 等待下一个请求时使用空闲超时，请求行到达后恢复为较短的读取超时
+                socket.soTimeout = KEEP_ALIVE_TIMEOUT
+                idleConnections.add(socket)
+                val line = try {
+                    input.readLine()
+                } catch (e: IOException) {
+                    Timber.v("Keep-alive connection closed: ${e.message}")
+                    null
+                } finally {
+                    idleConnections.remove(socket)
+                }
+                if (line.isNullOrBlank()) return null
+                socket.soTimeout = 5000
+                line
+            } else {
+                input.readLine()
+            }
+            
             if (firstLine == null || firstLine.trim().isEmpty()) {
                 throw IOException("Empty request")
             }
@@ -435,30 +555,12 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                 }
             }
             
-            // 读取请求体（如果有）
-            var body: String? = null
-            val contentLength = headers["content-length"]?.toIntOrNull()
-            if (contentLength != null && contentLength > 0) {
-                if (contentLength > 1024 * 1024) { // 限制最大1MB
-                    throw IOException("Request body too large: $contentLength bytes")
-                }
-                
-                val bodyChars = CharArray(contentLength)
-                var totalRead = 0
-                while (totalRead < contentLength) {
-                    val bytesRead = input.read(bodyChars, totalRead, contentLength - totalRead)
-                    if (bytesRead == -1) break
-                    totalRead += bytesRead
-                }
-                
-                if (totalRead > 0) {
-                    body = String(bodyChars, 0, totalRead)
-                    Timber.v("HTTP body: $body")
-                }
-            }
+            // 读取请求体（如果有）：Content-Length或chunked，最大1MB，无法恰好读完时抛出HttpException
+            val body = input.readBody(headers)?.toString(Charsets.UTF_8)
+            if (body != null) Timber.v("HTTP body: $body")
             
             Timber.d("Parsed HTTP request: $method $uri (${headers.size} headers)")
-            return HttpRequest(method, uri, headers, body)
+            return HttpRequest(method, uri, headers, body, httpVersion)
             
         } catch (e: java.net.SocketTimeoutException) {
             throw IOException("Request timeout while reading", e)
@@ -485,7 +587,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         // 如果没有启用API Key认证，直接处理请求
         if (!apiKeyAuthEnabled) {
             return when {
-                uri == "/" || uri.isEmpty() -> serveMainPage()
+                uri == "/" || uri.isEmpty() -> serveMainPage(request)
                 uri.startsWith("/api/") -> handleApiRequest(uri, method, request)
                 else -> serve404()
             }
@@ -504,7 +606,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                 // API Key有效，移除API Key部分并处理剩余路径
                 val remainingPath = uri.substringAfter("/$apiKey")
                 return when {
-                    remainingPath.isEmpty() || remainingPath == "/" -> serveMainPage()
+                    remainingPath.isEmpty() || remainingPath == "/" -> serveMainPage(request)
                     remainingPath.startsWith("/api/") -> handleApiRequest(remainingPath, method, request)
                     else -> serve404()
                 }
@@ -516,7 +618,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         }
         
         // 如果启用了API Key认证但没有提供API Key，返回引导页面
-        return serveApiKeyRequiredPage()
+        return serveApiKeyRequiredPage(request)
     }
     
     // 统一API Key提取方法
@@ -579,6 +681,8 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
     private fun handleApiRequestInternal(uri: String, method: String, request: HttpRequest): HttpResponse {
         return when {
             uri == "/api/status" -> serveApiStatus()
+            uri == "/api/status/stream" -> openStatusStream(method, request)
+            uri == "/api/batch" -> handleBatch(method, request)
             uri == "/api/wifi/start" -> handleApiWifiStart()
             uri == "/api/wifi/stop" -> handleApiWifiStop()
             uri == "/api/system/info" -> serveSystemInfo()
@@ -594,8 +698,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
     
 
     
-    private fun serveApiStatus(): HttpResponse {
-        val status = getSystemStatus()
+    private fun serveApiStatus(status: SystemStatus = getSystemStatus()): HttpResponse {
         val json = """
             {
                 "success": true,
@@ -613,8 +716,119 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         return HttpResponse(200, jsonMediaType, json)
     }
     
-    private fun serveSystemInfo(): HttpResponse {
-        val status = getSystemStatus()
+    /**
+     * 批量调用：请求体为 {"requests": [{"path": "/api/status"}, {"path": "/api/wifi/start"}, ...]}，
+     * 按顺序执行子请求并在一个响应中返回全部结果，远程控制刷新一次只需一个往返。
+     * 只读子请求共用同一个 getSystemStatus() 快照；批量请求不能嵌套，也不能包含状态流与开发者接口
+     */
+    private fun handleBatch(method: String, request: HttpRequest): HttpResponse {
+        if (method != "POST") {
+            return HttpResponse(405, jsonMediaType, """{"success": false, "error": "Method not allowed"}""")
+        }
+        val paths = try {
+            val requests = JSONObject(request.body ?: "").getJSONArray("requests")
+            List(requests.length()) { requests.getJSONObject(it).getString("path").substringBefore('?') }
+        } catch (e: JSONException) {
+            Timber.w(e, "Invalid batch request")
+            return HttpResponse(400, jsonMediaType, """{"success": false, "error": "Invalid batch request"}""")
+        }
+        if (paths.size > MAX_BATCH_REQUESTS) {
+            return HttpResponse(400, jsonMediaType,
+                """{"success": false, "error": "Too many requests in batch (max $MAX_BATCH_REQUESTS)"}""")
+        }
+        val snapshot by lazy { getSystemStatus() }
+        val results = paths.map { path ->
+            val response = when (path) {
+                "/api/status" -> serveApiStatus(snapshot)
+                "/api/system/info" -> serveSystemInfo(snapshot)
+                "/api/auth-status" -> handleAuthStatus()
+                "/api/debug/status" -> serveDebugStatus()
+                "/api/test" -> HttpResponse(200, jsonMediaType, """{"test": "ok"}""")
+                "/api/wifi/start" -> handleApiWifiStart()
+                "/api/wifi/stop" -> handleApiWifiStop()
+                else -> HttpResponse(400, jsonMediaType,
+                    """{"success": false, "error": "Endpoint not allowed in batch"}""")
+            }
+            // JSON响应原样嵌入，其他类型作为字符串
+            val body = if (response.contentType == jsonMediaType) response.body else JSONObject.quote(response.body)
+            """{"path": ${JSONObject.quote(path)}, "status": ${response.statusCode}, "body": $body}"""
+        }
+        val json = """{"success": true, "data": {"responses": [${results.joinToString(", ")}], """ +
+            """"timestamp": ${System.currentTimeMillis()}}}"""
+        return HttpResponse(200, jsonMediaType, json)
+    }
+    
+    /**
+     * 状态流：以Server-Sent Events推送状态，interval参数为两次检查之间的毫秒数
+     * （默认与状态缓存时长相同），代替客户端反复轮询 /api/status
+     */
+    private fun openStatusStream(method: String, request: HttpRequest): HttpResponse {
+        if (method != "GET") {
+            return HttpResponse(405, jsonMediaType, """{"success": false, "error": "Method not allowed"}""")
+        }
+        var interval = STATUS_CACHE_DURATION
+        request.uri.substringAfter('?', "").split('&').forEach {
+            val (k, v) = it.split('=', limit = 2).let { arr -> arr[0] to arr.getOrNull(1) }
+            if (k == "interval") v?.toLongOrNull()?.let { value -> interval = value }
+        }
+        return HttpResponse(200, eventStreamMediaType, "",
+            streamInterval = interval.coerceIn(STATUS_STREAM_MIN_INTERVAL, STATUS_STREAM_MAX_INTERVAL))
+    }
+    
+    /**
+     * 在连接上持续推送状态：第一个事件（status）包含全部字段，之后只在数值变化时发送变化的字段（delta），
+     * 直到客户端断开或服务器停止
+     */
+    private fun streamStatus(socket: java.net.Socket, output: java.io.BufferedWriter, interval: Long) {
+        output.write("HTTP/1.1 200 OK\r\n")
+        output.write("Content-Type: $eventStreamMediaType\r\n")
+        output.write("Cache-Control: no-cache\r\n")
+        output.write("Access-Control-Allow-Origin: *\r\n")
+        output.write("Connection: close\r\n")
+        output.write("\r\n")
+        output.write("retry: $interval\n\n")
+        output.flush()
+        streamConnections.add(socket)
+        try {
+            var previous: SystemStatus? = null
+            var lastWrite = System.currentTimeMillis()
+            var id = 0L
+            while (isRunning) {
+                val status = getSystemStatus()
+                val now = System.currentTimeMillis()
+                val fields = statusDelta(previous, status)
+                if (fields.isNotEmpty()) {
+                    val event = if (previous == null) "status" else "delta"
+                    output.write("id: ${++id}\nevent: $event\n")
+                    output.write("data: {${fields.joinToString(", ")}, \"timestamp\": $now}\n\n")
+                    output.flush()
+                    lastWrite = now
+                } else if (now - lastWrite >= STATUS_STREAM_HEARTBEAT) {
+                    output.write(": keep-alive\n\n")
+                    output.flush()
+                    lastWrite = now
+                }
+                previous = status
+                Thread.sleep(interval)
+            }
+        } catch (e: InterruptedException) {
+            Thread.currentThread().interrupt()
+        } finally {
+            streamConnections.remove(socket)
+        }
+    }
+    
+    private fun statusDelta(previous: SystemStatus?, status: SystemStatus) = buildList {
+        if (previous?.battery != status.battery) add("\"battery\": ${status.battery}")
+        if (previous?.batteryTemperature != status.batteryTemperature) {
+            add("\"batteryTemperature\": ${status.batteryTemperature}")
+        }
+        if (previous?.cpuTemperature != status.cpuTemperature) add("\"cpuTemperature\": ${status.cpuTemperature}")
+        if (previous?.cpu != status.cpu) add("\"cpu\": ${status.cpu}")
+        if (previous?.wifiStatus != status.wifiStatus) add("\"wifiStatus\": \"${status.wifiStatus}\"")
+    }
+    
+    private fun serveSystemInfo(status: SystemStatus = getSystemStatus()): HttpResponse {
         val json = """
             {
                 "success": true,
@@ -710,7 +924,40 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         }
     }
     
-    private fun serveMainPage(): HttpResponse {
+    private fun serveMainPage(request: HttpRequest) = serveStaticPage(mainPage, request)
+    
+    private fun serveApiKeyRequiredPage(request: HttpRequest) = serveStaticPage(apiKeyRequiredPage, request)
+    
+    /**
+     * 发送预先构建的页面：按 Accept-Encoding 选择gzip、deflate或原文，If-None-Match 与该页面任一编码的ETag一致时
+     * 返回304，不发送内容。no-cache 让浏览器每次都用ETag验证，应用更新后立即生效
+     */
+    private fun serveStaticPage(page: StaticPage, request: HttpRequest): HttpResponse {
+        val acceptEncoding = request.headers["accept-encoding"] ?: ""
+        val encoding = when {
+            acceptsEncoding(acceptEncoding, "gzip") -> "gzip"
+            acceptsEncoding(acceptEncoding, "deflate") -> "deflate"
+            else -> null
+        }
+        val headers = mapOf("ETag" to page.etag(encoding), "Cache-Control" to "no-cache", "Vary" to "Accept-Encoding")
+        val ifNoneMatch = request.headers["if-none-match"]
+        if (ifNoneMatch != null && page.matches(ifNoneMatch, encoding)) {
+            return HttpResponse(304, htmlMediaType, "", headers = headers)
+        }
+        return when (encoding) {
+            null -> HttpResponse(200, htmlMediaType, "", page.identity, headers)
+            else -> HttpResponse(200, htmlMediaType, "", page.body(encoding),
+                headers + ("Content-Encoding" to encoding))
+        }
+    }
+    
+    // Accept-Encoding 中列出了该编码且q不为0
+    private fun acceptsEncoding(acceptEncoding: String, encoding: String) = acceptEncoding.split(',').any {
+        val parts = it.split(';').map { part -> part.trim().lowercase() }
+        parts[0] == encoding && parts.drop(1).none { param -> param.removePrefix("q=").toDoubleOrNull() == 0.0 }
+    }
+    
+    private fun mainPageHtml(): String {
         val html = """
             <!DOCTYPE html>
             <html>
@@ -780,6 +1027,44 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                         return url;
                     }
                     
+                    // 显示状态；状态流的增量事件只包含变化的字段，未包含的字段保持不变
+                    function renderStatus(status) {
+                        if ('battery' in status) {
+                            document.getElementById('battery').textContent = status.battery + '%';
+                        }
+                        
+                        // 电池温度
+                        if ('batteryTemperature' in status) {
+                            if (status.batteryTemperature === -1 || status.batteryTemperature === "-1") {
+                                document.getElementById('battery-temperature').textContent = '无法获取';
+                            } else {
+                                document.getElementById('battery-temperature').textContent = status.batteryTemperature + '°C';
+                            }
+                        }
+                        
+                        // CPU温度
+                        if ('cpuTemperature' in status) {
+                            if (status.cpuTemperature === -1 || status.cpuTemperature === "-1") {
+                                document.getElementById('cpu-temperature').textContent = '无法获取';
+                            } else {
+                                document.getElementById('cpu-temperature').textContent = status.cpuTemperature + '°C';
+                            }
+                        }
+                        
+                        // CPU使用率
+                        if ('cpu' in status) {
+                            if (status.cpu === -1 || status.cpu === "-1") {
+                                document.getElementById('cpu').textContent = '需要root权限';
+                            } else {
+                                document.getElementById('cpu').textContent = status.cpu + '%';
+                            }
+                        }
+                        
+                        if ('wifiStatus' in status) {
+                            document.getElementById('wifi-status').textContent = status.wifiStatus;
+                        }
+                    }
+                    
                     function refreshStatus() {
                         try {
                             const apiUrl = getApiUrl('/api/status');
@@ -810,30 +1095,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                             .then(data => {
                                 console.log('Response data:', data);
                                 if (data.success) {
-                                    document.getElementById('battery').textContent = data.data.battery + '%';
-                                    
-                                    // 电池温度
-                                    if (data.data.batteryTemperature === -1 || data.data.batteryTemperature === "-1") {
-                                        document.getElementById('battery-temperature').textContent = '无法获取';
-                                    } else {
-                                        document.getElementById('battery-temperature').textContent = data.data.batteryTemperature + '°C';
-                                    }
-                                    
-                                    // CPU温度
-                                    if (data.data.cpuTemperature === -1 || data.data.cpuTemperature === "-1") {
-                                        document.getElementById('cpu-temperature').textContent = '无法获取';
-                                    } else {
-                                        document.getElementById('cpu-temperature').textContent = data.data.cpuTemperature + '°C';
-                                    }
-                                    
-                                    // CPU使用率
-                                    if (data.data.cpu === -1 || data.data.cpu === "-1") {
-                                        document.getElementById('cpu').textContent = '需要root权限';
-                                    } else {
-                                        document.getElementById('cpu').textContent = data.data.cpu + '%';
-                                    }
-                                    
-                                    document.getElementById('wifi-status').textContent = data.data.wifiStatus;
+                                    renderStatus(data.data);
                                 } else {
                                     throw new Error(data.error || '获取状态失败');
                                 }
@@ -950,17 +1212,41 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
                     console.log('Page loaded, current URL:', window.location.href);
                     console.log('Current pathname:', window.location.pathname);
                     
-                    // 页面加载时刷新状态
-                    refreshStatus();
+                    // 订阅状态流，服务器只在数值变化时推送；浏览器不支持或连接被拒绝时退回每30秒轮询
+                    let pollTimer = null;
+                    function startPolling() {
+                        if (pollTimer === null) {
+                            refreshStatus();
+                            pollTimer = setInterval(refreshStatus, 30000);
+                        }
+                    }
+                    
+                    function subscribeStatus() {
+                        if (!window.EventSource) {
+                            startPolling();
+                            return;
+                        }
+                        const source = new EventSource(getApiUrl('/api/status/stream'));
+                        const onStatus = event => renderStatus(JSON.parse(event.data));
+                        source.addEventListener('status', onStatus);
+                        source.addEventListener('delta', onStatus);
+                        source.onerror = () => {
+                            // 断线时EventSource会自动重连；CLOSED表示服务器拒绝了请求（如401），不再重试
+                            if (source.readyState === EventSource.CLOSED) {
+                                console.warn('Status stream unavailable, falling back to polling');
+                                startPolling();
+                            }
+                        };
+                    }
                     
-                    // 每30秒自动刷新状态
-                    setInterval(refreshStatus, 30000);
+                    // 页面加载时刷新状态并订阅后续变化
+                    subscribeStatus();
                 </script>
             </body>
             </html>
         """.trimIndent()
         
-        return HttpResponse(200, htmlMediaType, html)
+        return html
     }
     
     private fun serveFavicon(): HttpResponse {
@@ -983,7 +1269,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         return HttpResponse(404, textMediaType, "404 Not Found")
     }
     
-    private fun serveApiKeyRequiredPage(): HttpResponse {
+    private fun apiKeyRequiredPageHtml(): String {
         val html = """
             <!DOCTYPE html>
             <html>
@@ -1115,7 +1401,7 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
             </html>
         """.trimIndent()
         
-        return HttpResponse(200, htmlMediaType, html)
+        return html
     }
     
     private fun serveDebugStatus(): HttpResponse {
@@ -1184,15 +1470,25 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
             return cachedSystemStatus!!
         }
         
-        // 更新缓存 - 获取实时状态
+        // 更新缓存 - 获取实时状态，逐项计时（CPU温度与使用率可能需要 su -c cat）
+        val times = LongArray(6)
+        times[0] = System.nanoTime()
         val battery = getBatteryLevel()
+        times[1] = System.nanoTime()
         val batteryTemperature = getBatteryTemperature()
+        times[2] = System.nanoTime()
         val cpuTemperature = getCpuTemperature()
+        times[3] = System.nanoTime()
         val cpu = getCpuUsage()
+        times[4] = System.nanoTime()
         val wifiStatus = getWifiStatus()
+        times[5] = System.nanoTime()
         
         cachedSystemStatus = SystemStatus(battery, batteryTemperature, cpuTemperature, cpu, wifiStatus)
         lastStatusUpdateTime = currentTime
+        val ms = LongArray(5) { (times[it + 1] - times[it]) / 1_000_000 }
+        Timber.d("System status refreshed in ${(times[5] - times[0]) / 1_000_000} ms (battery ${ms[0]} ms, " +
+            "batteryTemperature ${ms[1]} ms, cpuTemperature ${ms[2]} ms, cpu ${ms[3]} ms, wifi ${ms[4]} ms)")
         
         return cachedSystemStatus!!
     }
@@ -1362,34 +1658,68 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         }
     }
     
-    private fun sendResponse(socket: java.net.Socket, response: HttpResponse) {
-        socket.getOutputStream().bufferedWriter().use { output ->
-            val bodyBytes = response.body.toByteArray(response.contentType.charset() ?: Charsets.UTF_8)
-            output.write("HTTP/1.1 ${response.statusCode} ${getStatusText(response.statusCode)}\r\n")
-            output.write("Content-Type: ${response.contentType}\r\n")
-            output.write("Content-Length: ${bodyBytes.size}\r\n")
-            output.write("Access-Control-Allow-Origin: *\r\n")
-            output.write("Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n")
-            output.write("Access-Control-Allow-Headers: Content-Type, Accept, Authorization, X-API-Key\r\n")
+    /**
+     * 客户端是否希望保持连接：HTTP/1.1默认保持，HTTP/1.0需显式请求keep-alive；
+     * HEAD响应仍会带body，为避免客户端读错下一个响应，发送后关闭连接
+     */
+    private fun isKeepAlive(request: HttpRequest): Boolean {
+        if (request.method == "HEAD") return false
+        val connection = request.headers["connection"]?.lowercase() ?: ""
+        return when {
+            connection.contains("close") -> false
+            request.version == "HTTP/1.1" -> true
+            else -> connection.contains("keep-alive")
+        }
+    }
+    
+    /**
+     * 发送响应；带有bytes的响应（预先压缩的页面）在写完头部后直接写入stream
+     */
+    private fun sendResponse(output: java.io.BufferedWriter, response: HttpResponse, keepAlive: Boolean = false,
+                             stream: java.io.OutputStream? = null) {
+        val bodyBytes = response.bytes ?: response.body.toByteArray(response.contentType.charset() ?: Charsets.UTF_8)
+        output.write("HTTP/1.1 ${response.statusCode} ${getStatusText(response.statusCode)}\r\n")
+        output.write("Content-Type: ${response.contentType}\r\n")
+        // 304响应没有body
+        if (response.statusCode != 304) output.write("Content-Length: ${bodyBytes.size}\r\n")
+        response.headers.forEach { (name, value) -> output.write("$name: $value\r\n") }
+        output.write("Access-Control-Allow-Origin: *\r\n")
+        output.write("Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n")
+        output.write("Access-Control-Allow-Headers: Content-Type, Accept, Authorization, X-API-Key\r\n")
+        if (keepAlive) {
+            output.write("Connection: keep-alive\r\n")
+            output.write("Keep-Alive: timeout=${KEEP_ALIVE_TIMEOUT / 1000}, max=$MAX_KEEP_ALIVE_REQUESTS\r\n")
+        } else {
             output.write("Connection: close\r\n")
-            output.write("\r\n")
+        }
+        output.write("\r\n")
+        if (response.bytes != null) {
+            output.flush()
+            checkNotNull(stream) { "Binary response requires the socket stream" }.write(response.bytes)
+            stream.flush()
+        } else {
             output.write(response.body)
             output.flush()
         }
     }
     
-    private fun sendErrorResponse(socket: java.net.Socket, statusCode: Int, message: String) {
+    private fun sendErrorResponse(output: java.io.BufferedWriter, statusCode: Int, message: String) {
         val response = HttpResponse(statusCode, textMediaType, message)
-        sendResponse(socket, response)
+        sendResponse(output, response)
     }
     
     private fun getStatusText(statusCode: Int): String {
         return when (statusCode) {
             200 -> "OK"
+            304 -> "Not Modified"
+            400 -> "Bad Request"
             401 -> "Unauthorized"
             404 -> "Not Found"
             405 -> "Method Not Allowed"
+            408 -> "Request Timeout"
+            413 -> "Content Too Large"
             500 -> "Internal Server Error"
+            501 -> "Not Implemented"
             else -> "Unknown"
         }
     }
@@ -1398,15 +1728,56 @@ class OkHttpWebServer(private val context: Context, val port: Int = 9999) {
         val method: String,
         val uri: String,
         val headers: Map<String, String>,
-        val body: String? = null
+        val body: String? = null,
+        val version: String = "HTTP/1.1"
     )
     
     data class HttpResponse(
         val statusCode: Int,
         val contentType: MediaType,
-        val body: String
+        val body: String,
+        val bytes: ByteArray? = null, // 非null时代替body原样发送（如预先压缩的页面）
+        val headers: Map<String, String> = emptyMap(),
+        val streamInterval: Long? = null // 非null时不发送body，改为按此间隔（毫秒）推送状态流
     )
     
+    /**
+     * 预先构建的静态页面：UTF-8原文及其gzip、deflate（zlib格式）压缩版本
+     *
+     * 三种编码的字节不同，各自使用强ETag（RFC 9110 8.8.3）：原文为原文SHA-256的前16个十六进制字符，
+     * 压缩版本再加上 "-gzip"、"-deflate" 后缀，缓存不会把一种编码的字节当作另一种的验证结果
+     */
+    class StaticPage(html: String) {
+        val identity = html.toByteArray(Charsets.UTF_8)
+        val gzip = compress(identity) { GZIPOutputStream(it) }
+        val deflate = compress(identity) { DeflaterOutputStream(it) }
+        private val hash = MessageDigest.getInstance("SHA-256").digest(identity).take(8)
+            .joinToString("") { "%02x".format(it) }
+        
+        fun etag(encoding: String? = null) = if (encoding == null) "\"$hash\"" else "\"$hash-$encoding\""
+        
+        fun body(encoding: String) = when (encoding) {
+            "gzip" -> gzip
+            "deflate" -> deflate
+            else -> throw IllegalArgumentException("Unsupported encoding: $encoding")
+        }
+        
+        /**
+         * If-None-Match 使用弱比较（RFC 9110 13.1.2）：忽略 W/ 前缀，只有所选编码 [encoding] 的ETag或 * 才算命中，
+         * 否则客户端会把缓存的另一种编码的内容当作这种编码使用
+         */
+        fun matches(ifNoneMatch: String, encoding: String? = null): Boolean {
+            val etag = etag(encoding)
+            return ifNoneMatch.split(',').any {
+                val tag = it.trim()
+                tag == "*" || tag.removePrefix("W/") == etag
+            }
+        }
+        
+        private fun compress(data: ByteArray, wrap: (java.io.OutputStream) -> java.io.OutputStream) =
+            ByteArrayOutputStream().also { out -> wrap(out).use { it.write(data) } }.toByteArray()
+    }
+    
     data class SystemStatus(
         val battery: Int,
         val batteryTemperature: Float,
@@ -24,7 +24,7 @@ import java.util.Scanner
 import java.util.regex.Pattern
 
 /**
- * This class generates a default nickname for new clients.
+ * This class generates a default nickname for new clients, from [OuiDatabase] if it is bundled or macaddress.io.
  */
 object MacLookup {
     class UnexpectedError(val mac: MacAddress, val error: String) : JSONException("") {
@@ -53,12 +53,28 @@ object MacLookup {
     @MainThread
     fun abort(mac: MacAddress) = macLookupBusy.remove(mac)?.cancel()
 
+    private fun formatNickname(company: String, country: String?) = if (country != null) {
+        String(country.flatMap { listOf('\uD83C', it + 0xDDA5) }.toCharArray()) + ' ' + company
+    } else company
+
     @MainThread
     fun perform(mac: MacAddress, explicit: Boolean = false) {
         abort(mac)
         macLookupBusy[mac] = GlobalScope.launch(Dispatchers.Unconfined, CoroutineStart.UNDISPATCHED) {
             var response: String? = null
             try {
+                val database = OuiDatabase.instance
+                val offline = database?.lookup(mac)
+                // a miss offline is a private or unassigned block, unless the bundled registry is out of date
+                if (offline != null || database != null && !explicit) {
+                    val result = offline?.run { formatNickname(name, country) }
+                    Timber.d("$mac -> $result (offline)")
+                    AppDatabase.instance.clientRecordDao.upsert(mac) {
+                        if (result != null) nickname = result
+                        macLookupPending = false
+                    }
+                    return@launch
+                }
                 response = connectCancellable("https://macaddress.io/macaddress/$mac") { conn ->
                     val responseCode = conn.responseCode
                     when (responseCode) {
@@ -78,11 +94,7 @@ object MacLookup {
                 val result = if (obj.getJSONObject("blockDetails").getBoolean("blockFound")) {
                     val vendor = obj.getJSONObject("vendorDetails")
                     val company = vendor.getString("companyName")
-                    val match = extractCountry(mac, response, vendor, obj)
-                    if (match != null) {
-                        String(match.groupValues[1].flatMap { listOf('\uD83C', it + 0xDDA5) }.toCharArray()) + ' ' +
-                                company
-                    } else company
+                    formatNickname(company, extractCountry(mac, response, vendor, obj)?.groupValues?.get(1))
                 } else null
                 Timber.d("$mac -> $result")
                 AppDatabase.instance.clientRecordDao.upsert(mac) {
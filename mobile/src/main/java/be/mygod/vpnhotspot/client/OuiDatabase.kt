@@ -0,0 +1,110 @@
+package be.mygod.vpnhotspot.client
+
+import android.net.MacAddress
+import be.mygod.vpnhotspot.App.Companion.app
+import timber.log.Timber
+import java.io.FileInputStream
+import java.io.IOException
+import java.nio.ByteBuffer
+import java.nio.channels.FileChannel
+
+/**
+ * Offline IEEE MA-L/MA-M/MA-S registry compiled by `tests/common/oui_db.py` into the uncompressed asset [ASSET],
+ * which is committed with its checksum and source versions in `mobile/oui.json` (refreshed by `updateOuiDatabase`).
+ *
+ * Layout (big-endian): a [HEADER_SIZE] byte header with the magic, version, the entry count of each table and the size
+ * of the string pool, then the 36, 28 and 24-bit tables sorted by prefix, each entry being the prefix in 5, 4 or 3
+ * bytes followed by a 3-byte offset into the string pool, then the pool with each vendor stored once as its country
+ * code in 2 bytes (zeros if unknown), the length of its name in 2 bytes and the UTF-8 name.
+ * The file is memory-mapped and a lookup is at most three binary searches, so nothing but the matched name is read.
+ */
+class OuiDatabase(private val buffer: ByteBuffer) {
+    companion object {
+        const val ASSET = "oui.bin"
+        private const val MAGIC = 0x56484F55    // VHOU
+        private const val VERSION = 1
+        private const val HEADER_SIZE = 24
+        private const val OFFSET_SIZE = 3
+
+        /**
+         * Null if the asset cannot be opened, in which case [MacLookup] falls back to the network.
+         */
+        val instance by lazy {
+            try {
+                app.assets.openFd(ASSET).use { fd ->
+                    FileInputStream(fd.fileDescriptor).channel.use {
+                        OuiDatabase(it.map(FileChannel.MapMode.READ_ONLY, fd.startOffset, fd.length))
+                    }
+                }
+            } catch (e: IOException) {
+                Timber.d(e)
+                null
+            }
+        }
+    }
+
+    data class Vendor(val name: String, val country: String?)
+
+    private class Table(val bits: Int, val start: Int, val count: Int) {
+        val prefixSize = (bits + 7) / 8
+        val stride = prefixSize + OFFSET_SIZE
+    }
+
+    private val tables: List<Table>
+    /**
+     * Entry count of the 36, 28 and 24-bit tables.
+     */
+    internal val counts get() = tables.map { it.count }
+    private val strings: Int
+
+    init {
+        if (buffer.getInt(0) != MAGIC || buffer.getShort(4).toInt() != VERSION) {
+            throw IOException("Unrecognized OUI database")
+        }
+        var start = HEADER_SIZE
+        tables = listOf(36, 28, 24).mapIndexed { index, bits ->
+            Table(bits, start, buffer.getInt(8 + index * 4)).also { start += it.count * it.stride }
+        }
+        strings = start
+        if (strings + buffer.getInt(20) != buffer.limit()) throw IOException("Truncated OUI database")
+    }
+
+    private fun read(offset: Int, size: Int): Long {
+        var value = 0L
+        for (i in offset until offset + size) value = value shl 8 or (buffer.get(i).toLong() and 0xFF)
+        return value
+    }
+
+    private fun Table.find(mac: Long): Int? {
+        val prefix = mac ushr (48 - bits)
+        var low = 0
+        var high = count - 1
+        while (low <= high) {
+            val middle = (low + high) ushr 1
+            val entry = start + middle * stride
+            val value = read(entry, prefixSize)
+            when {
+                value < prefix -> low = middle + 1
+                value > prefix -> high = middle - 1
+                else -> return read(entry + prefixSize, OFFSET_SIZE).toInt()
+            }
+        }
+        return null
+    }
+
+    /**
+     * The vendor of the most specific assignment containing [mac].
+     */
+    fun lookup(mac: MacAddress) =
+        lookup(mac.toByteArray().fold(0L) { acc, byte -> acc shl 8 or (byte.toLong() and 0xFF) })
+    internal fun lookup(mac: Long): Vendor? {
+        val offset = tables.firstNotNullOfOrNull { it.find(mac) } ?: return null
+        val entry = strings + offset
+        val country = if (buffer.get(entry).toInt() == 0) null else {
+            String(charArrayOf(buffer.get(entry).toInt().toChar(), buffer.get(entry + 1).toInt().toChar()))
+        }
+        val name = ByteArray(buffer.getShort(entry + 2).toInt() and 0xFFFF)
+        buffer.duplicate().apply { position(entry + 4) }.get(name)
+        return Vendor(String(name, Charsets.UTF_8), country)
+    }
+}
@@ -0,0 +1,109 @@
+package be.mygod.vpnhotspot.net
+
+import be.mygod.vpnhotspot.App.Companion.app
+import be.mygod.vpnhotspot.net.Routing.Companion.IPTABLES
+import be.mygod.vpnhotspot.root.RoutingCommands.ProcessResult
+import be.mygod.vpnhotspot.util.RootSession
+import timber.log.Timber
+import java.util.concurrent.atomic.AtomicInteger
+
+/**
+ * Lets the IPv4 clients of a downstream through vpnhotspot_acl.
+ *
+ * [Rules] inserts one ACCEPT rule per client and direction, so the chain every forwarded packet walks grows with the
+ * clients and every neighbour change rewrites the filter table. [IpSet] instead appends two rules per downstream that
+ * match a hash set of client addresses per direction, and clients are added and removed with `ipset restore` without
+ * touching iptables. Both keep per-client counters for [be.mygod.vpnhotspot.net.monitor.TrafficRecorder]: rule
+ * counters for the former and set member counters for the latter, hence one set per direction.
+ */
+sealed class ClientAcl(protected val downstream: String) {
+    companion object {
+        private const val KEY_IPSET = "service.ipsetAcl"
+        const val IPSET = "ipset"
+        const val SET_PREFIX = "vpnhotspot_"
+        const val SENT_PREFIX = "${SET_PREFIX}src_"
+        const val RECEIVED_PREFIX = "${SET_PREFIX}dst_"
+        /**
+         * Prints every set member with its counters, e.g. `add vpnhotspot_src_wlan1 192.168.43.100 packets 3 bytes 180`.
+         */
+        const val SAVE_COMMAND = "$IPSET save"
+        /**
+         * What `iptables -C` prints when it could parse the rule, set match included, but the rule does not exist.
+         */
+        private const val RULE_MISSING = "does a matching rule exist in that chain?"
+
+        private val activeSets = AtomicInteger()
+        val ipsetInUse get() = activeSets.get() > 0
+
+        /**
+         * Picks the backend for [downstream]. The rules matching the sets are added to [rules] so that they are
+         * applied and reverted with the rest of the transaction, while the sets live until [close].
+         */
+        fun setup(transaction: RootSession.Transaction, rules: IptablesBatch, downstream: String): ClientAcl {
+            if (app.pref.getBoolean(KEY_IPSET, true)) {
+                val acl = IpSet(downstream)
+                if (acl.setup(transaction, rules)) return acl
+            }
+            return Rules(downstream)
+        }
+
+        /**
+         * Whether the set match works according to `iptables -C` on a rule that uses it. -C exits with 1 and
+         * [RULE_MISSING] when it does. Otherwise ipset or the set match is unavailable: a missing set or userspace
+         * extension exits with 2, while a kernel without xt_set also exits with 1, but with
+         * "No chain/target/match by that name."
+         */
+        internal fun setMatchWorks(probe: ProcessResult) = probe.exit == 1 && RULE_MISSING in probe.err
+    }
+
+    abstract fun allow(transaction: RootSession.Transaction, address: String)
+    open fun close() { }
+
+    class Rules(downstream: String) : ClientAcl(downstream) {
+        override fun allow(transaction: RootSession.Transaction, address: String) {
+            IptablesBatch().apply {
+                insert("vpnhotspot_acl -i $downstream -s $address -j ACCEPT")
+                insert("vpnhotspot_acl -o $downstream -d $address -j ACCEPT")
+            }.applyTo(transaction)
+        }
+    }
+
+    class IpSet(downstream: String) : ClientAcl(downstream) {
+        private val sent = "$SENT_PREFIX$downstream"
+        private val received = "$RECEIVED_PREFIX$downstream"
+        private val destroy = "$IPSET destroy $sent 2>/dev/null\n$IPSET destroy $received 2>/dev/null"
+        /**
+         * Creates (or empties) both sets and checks whether a rule matching them can be parsed, see [setMatchWorks].
+         */
+        internal val probe = listOf(sent, received).joinToString("\n") {
+            "$IPSET -exist create $it hash:ip family inet counters\n$IPSET flush $it"
+        } + "\n$IPTABLES -C FORWARD -m set --match-set $sent src -j ACCEPT"
+
+        fun setup(transaction: RootSession.Transaction, rules: IptablesBatch): Boolean {
+            val result = transaction.execQuiet(probe)
+            if (!setMatchWorks(result)) {
+                Timber.i(result.message(listOf(probe), err = true))
+                transaction.execQuiet(destroy)
+                return false
+            }
+            rules.add("vpnhotspot_acl -i $downstream -m set --match-set $sent src -j ACCEPT")
+            rules.add("vpnhotspot_acl -o $downstream -m set --match-set $received dst -j ACCEPT")
+            activeSets.incrementAndGet()
+            return true
+        }
+
+        internal fun restore(operation: String, address: String) =
+            "printf '%s\\n' '$operation $sent $address' '$operation $received $address' | $IPSET -exist restore"
+        override fun allow(transaction: RootSession.Transaction, address: String) {
+            transaction.exec(restore("add", address), restore("del", address))
+        }
+
+        /**
+         * Called after the transaction holding the matching rules and every client have been reverted.
+         */
+        override fun close() {
+            activeSets.decrementAndGet()
+            RootSession.use { it.submit(destroy) }
+        }
+    }
+}
@@ -0,0 +1,93 @@
+package be.mygod.vpnhotspot.net
+
+import be.mygod.vpnhotspot.App.Companion.app
+import be.mygod.vpnhotspot.net.Routing.Companion.IP6TABLES
+import be.mygod.vpnhotspot.net.Routing.Companion.IPTABLES
+import be.mygod.vpnhotspot.util.RootSession
+import timber.log.Timber
+
+/**
+ * Collects the iptables rules of a [RootSession.Transaction] and applies them in a single root shell invocation:
+ * one `iptables-restore --noflush` payload per table, with the matching revert payload registered as one revert
+ * command. Each table is committed atomically by iptables-restore, so if a payload is rejected (e.g. a missing chain
+ * or an old iptables-restore without `-w`), none of its rules were applied and the same rules are applied one by one
+ * instead, which is exactly what happens when batching is disabled. The fallback is per table: tables whose payload
+ * was committed are not applied again.
+ *
+ * Like the commands registered when batching is disabled, the revert payload is built from the requested rules, not
+ * from the ones that were actually applied. If some of them never made it in, deleting them makes the revert payload
+ * fail as a whole and its fallback deletes the rules one by one, which only removes the ones that exist.
+ *
+ * Chains are created with `iptables -N` instead of declaring them in the payload since iptables-restore --noflush
+ * flushes existing user-defined chains that are declared, which are shared between downstreams.
+ */
+class IptablesBatch(private val batched: Boolean = enabled) {
+    companion object {
+        private const val KEY_ENABLED = "service.iptablesRestore"
+        val enabled get() = app.pref.getBoolean(KEY_ENABLED, true)
+
+        private val restoreCommands = mapOf(
+            IPTABLES to "iptables-restore -w --noflush",
+            IP6TABLES to "ip6tables-restore -w --noflush",
+        )
+
+        private fun quote(line: String) = "'" + line.replace("'", "'\\''") + "'"
+        private fun restore(binary: String, table: String, lines: List<String>, fallback: List<String>) =
+            "printf '%s\\n' ${(listOf("*$table") + lines + "COMMIT").joinToString(" ") { quote(it) }} | " +
+                    "${restoreCommands.getValue(binary)} || { ${fallback.joinToString("; ")}; }"
+
+        private fun RootSession.Transaction.iptables(command: String, revert: String?) {
+            val result = execQuiet(command, revert)
+            val message = result.message(listOf(command), err = false)
+            if (result.err.isNotEmpty()) Timber.i(message)  // busy wait message
+        }
+    }
+
+    private class Rule(val binary: String, val table: String, val operation: String, val content: String) {
+        val line get() = "$operation $content"
+        val command get() = "$binary -t $table $operation $content"
+        val revertLine get() = "-D $content"
+        val revertCommand get() = "$binary -t $table -D $content"
+    }
+
+    private val chains = mutableListOf<String>()
+    private val rules = mutableListOf<Rule>()
+
+    fun newChain(chain: String, table: String = "filter", binary: String = IPTABLES) {
+        chains += "$binary -t $table -N $chain"
+    }
+    fun add(content: String, table: String = "filter", binary: String = IPTABLES) {
+        rules += Rule(binary, table, "-A", content)
+    }
+    fun insert(content: String, table: String = "filter", binary: String = IPTABLES) {
+        rules += Rule(binary, table, "-I", content)
+    }
+
+    /**
+     * The commands to run, each with the revert command to register, in order. Clears the batch.
+     */
+    internal fun compile(): List<Pair<String, String?>> {
+        val commands = if (!batched) {
+            chains.map { it to null } + rules.map { it.command to it.revertCommand }
+        } else if (chains.isNotEmpty() || rules.isNotEmpty()) {
+            val groups = rules.groupBy { it.binary to it.table }
+            val command = chains.map { "$it 2>/dev/null" } + groups.map { (key, group) ->
+                restore(key.first, key.second, group.map { it.line }, group.map { it.command })
+            }
+            val revert = groups.entries.reversed().map { (key, group) ->
+                val reversed = group.asReversed()
+                restore(key.first, key.second, reversed.map { it.revertLine }, reversed.map { it.revertCommand })
+            }
+            listOf(command.joinToString("\n") to revert.joinToString("\n").ifEmpty { null })
+        } else emptyList()
+        chains.clear()
+        rules.clear()
+        return commands
+    }
+
+    fun applyTo(transaction: RootSession.Transaction) {
+        for ((command, revert) in compile()) {
+            if (revert == null) transaction.execQuiet(command) else transaction.iptables(command, revert)
+        }
+    }
+}
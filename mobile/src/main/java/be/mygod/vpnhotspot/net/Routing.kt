@@ -66,6 +66,8 @@ class Routing(private val caller: Any, private val downstream: String) : IpNeigh
             commands.appendLine("while $IP6TABLES -D OUTPUT -j vpnhotspot_filter; do done")
             commands.appendLine("$IP6TABLES -F vpnhotspot_filter")
             commands.appendLine("$IP6TABLES -X vpnhotspot_filter")
+            commands.appendLine("for set in \$(${ClientAcl.IPSET} list -n 2>/dev/null); do " +
+                    "case \$set in ${ClientAcl.SET_PREFIX}*) ${ClientAcl.IPSET} destroy \$set;; esac; done")
             commands.appendLine("while $IP rule del priority $RULE_PRIORITY_UPSTREAM; do done")
             commands.appendLine("while $IP rule del priority $RULE_PRIORITY_UPSTREAM_FALLBACK; do done")
             commands.appendLine("while $IP rule del priority $RULE_PRIORITY_UPSTREAM_DISABLE_SYSTEM; do done")
@@ -76,17 +78,8 @@ class Routing(private val caller: Any, private val downstream: String) : IpNeigh
             RootManager.use { it.execute(RoutingCommands.Clean()) }
         }
 
-        private fun RootSession.Transaction.iptables(command: String, revert: String) {
-            val result = execQuiet(command, revert)
-            val message = result.message(listOf(command), err = false)
-            if (result.err.isNotEmpty()) Timber.i(message)  // busy wait message
-        }
-        private fun RootSession.Transaction.iptablesAdd(content: String, table: String = "filter") =
-                iptables("$IPTABLES -t $table -A $content", "$IPTABLES -t $table -D $content")
-        private fun RootSession.Transaction.iptablesInsert(content: String, table: String = "filter") =
-                iptables("$IPTABLES -t $table -I $content", "$IPTABLES -t $table -D $content")
-        private fun RootSession.Transaction.ip6tablesInsert(content: String) =
-                iptables("$IP6TABLES -I $content", "$IP6TABLES -D $content")
+        private fun RootSession.Transaction.iptables(build: IptablesBatch.() -> Unit) =
+                IptablesBatch().apply(build).applyTo(this)
 
         private fun RootSession.Transaction.ndc(name: String, command: String, revert: String? = null) {
             val result = execQuiet(command, revert)
@@ -140,6 +133,11 @@ class Routing(private val caller: Any, private val downstream: String) : IpNeigh
     }
     private val hostSubnet = "${hostAddress.address.hostAddress}/${hostAddress.networkPrefixLength}"
     lateinit var transaction: RootSession.Transaction
+    /**
+     * Rules of [transaction], applied together in [commit].
+     */
+    private val rules = IptablesBatch()
+    private var acl: ClientAcl = ClientAcl.Rules(downstream)
 
     @Volatile
     private var stopped = false
@@ -157,8 +155,9 @@ class Routing(private val caller: Any, private val downstream: String) : IpNeigh
                 when (masqueradeMode) {
                     MasqueradeMode.None -> { }  // nothing to be done here
                     // note: specifying -i wouldn't work for POSTROUTING
-                    MasqueradeMode.Simple -> iptablesAdd(
-                        "vpnhotspot_masquerade -s $hostSubnet -o $upstream -j MASQUERADE", "nat")
+                    MasqueradeMode.Simple -> iptables {
+                        add("vpnhotspot_masquerade -s $hostSubnet -o $upstream -j MASQUERADE", "nat")
+                    }
                     /**
                      * 0 means that there are no interface addresses coming after, which is unused anyway.
                      *
@@ -195,11 +194,7 @@ class Routing(private val caller: Any, private val downstream: String) : IpNeigh
     private val emptyCallback = object : UpstreamMonitor.Callback { }
 
     private inner class Client(private val ip: Inet4Address, mac: MacAddress) : AutoCloseable {
-        private val transaction = RootSession.beginTransaction().safeguard {
-            val address = ip.hostAddress
-            iptablesInsert("vpnhotspot_acl -i $downstream -s $address -j ACCEPT")
-            iptablesInsert("vpnhotspot_acl -o $downstream -d $address -j ACCEPT")
-        }
+        private val transaction = RootSession.beginTransaction().safeguard { acl.allow(this, ip.hostAddress) }
 
         init {
             try {
@@ -257,30 +252,31 @@ class Routing(private val caller: Any, private val downstream: String) : IpNeigh
         transaction.exec("echo 1 >/proc/sys/net/ipv4/ip_forward")
     }
 
-    fun disableIpv6() {
-        transaction.execQuiet("$IP6TABLES -N vpnhotspot_filter")
-        transaction.ip6tablesInsert("INPUT -j vpnhotspot_filter")
-        transaction.ip6tablesInsert("FORWARD -j vpnhotspot_filter")
-        transaction.ip6tablesInsert("OUTPUT -j vpnhotspot_filter")
-        transaction.ip6tablesInsert("vpnhotspot_filter -i $downstream -j REJECT")
-        transaction.ip6tablesInsert("vpnhotspot_filter -o $downstream -j REJECT")
+    fun disableIpv6() = with(rules) {
+        newChain("vpnhotspot_filter", binary = IP6TABLES)
+        insert("INPUT -j vpnhotspot_filter", binary = IP6TABLES)
+        insert("FORWARD -j vpnhotspot_filter", binary = IP6TABLES)
+        insert("OUTPUT -j vpnhotspot_filter", binary = IP6TABLES)
+        insert("vpnhotspot_filter -i $downstream -j REJECT", binary = IP6TABLES)
+        insert("vpnhotspot_filter -o $downstream -j REJECT", binary = IP6TABLES)
     }
 
-    fun forward() {
-        transaction.execQuiet("$IPTABLES -N vpnhotspot_fwd")
-        transaction.execQuiet("$IPTABLES -N vpnhotspot_acl")
-        transaction.iptablesInsert("FORWARD -j vpnhotspot_fwd")
-        transaction.iptablesInsert("vpnhotspot_fwd -i $downstream -j vpnhotspot_acl")
-        transaction.iptablesInsert("vpnhotspot_fwd -o $downstream -m state --state ESTABLISHED,RELATED -j vpnhotspot_acl")
-        transaction.iptablesAdd("vpnhotspot_fwd -i $downstream ! -o $downstream -j REJECT") // ensure blocking works
+    fun forward() = with(rules) {
+        newChain("vpnhotspot_fwd")
+        newChain("vpnhotspot_acl")
+        insert("FORWARD -j vpnhotspot_fwd")
+        insert("vpnhotspot_fwd -i $downstream -j vpnhotspot_acl")
+        insert("vpnhotspot_fwd -o $downstream -m state --state ESTABLISHED,RELATED -j vpnhotspot_acl")
+        add("vpnhotspot_fwd -i $downstream ! -o $downstream -j REJECT") // ensure blocking works
+        acl = ClientAcl.setup(transaction, this, downstream)
         // the real forwarding filters will be added in Subrouting when clients are connected
     }
 
     fun masquerade(mode: MasqueradeMode) {
         masqueradeMode = mode
-        if (mode == MasqueradeMode.Simple) {
-            transaction.execQuiet("$IPTABLES -t nat -N vpnhotspot_masquerade")
-            transaction.iptablesInsert("POSTROUTING -j vpnhotspot_masquerade", "nat")
+        if (mode == MasqueradeMode.Simple) with(rules) {
+            newChain("vpnhotspot_masquerade", "nat")
+            insert("POSTROUTING -j vpnhotspot_masquerade", "nat")
             // further rules are added when upstreams are found
         }
     }
@@ -320,8 +316,9 @@ class Routing(private val caller: Any, private val downstream: String) : IpNeigh
             "127.0.0.1"
         } else hostAddress
         VpnFirewallManager.setup(transaction)
-        transaction.iptablesInsert("PREROUTING -i $downstream -p tcp -d $hostAddress --dport 53 -j DNAT --to-destination $forwarderIp:${forwarder.tcpPort}", "nat")
-        transaction.iptablesInsert("PREROUTING -i $downstream -p udp -d $hostAddress --dport 53 -j DNAT --to-destination $forwarderIp:${forwarder.udpPort}", "nat")
+        rules.insert("PREROUTING -i $downstream -p tcp -d $hostAddress --dport 53 -j DNAT --to-destination $forwarderIp:${forwarder.tcpPort}", "nat")
+        rules.insert("PREROUTING -i $downstream -p udp -d $hostAddress --dport 53 -j DNAT --to-destination $forwarderIp:${forwarder.udpPort}", "nat")
+        rules.applyTo(transaction)
         transaction.commit()
         Timber.i("Started routing for $downstream by $caller")
         FallbackUpstreamMonitor.registerCallback(fallbackUpstream)
@@ -336,5 +333,6 @@ class Routing(private val caller: Any, private val downstream: String) : IpNeigh
         synchronized(this) { clients.values.forEach { it.close() } }
         fallbackUpstream.subrouting.values.forEach { it.transaction.revert() }
         upstream.subrouting.values.forEach { it.transaction.revert() }
+        acl.close()
     }
 }
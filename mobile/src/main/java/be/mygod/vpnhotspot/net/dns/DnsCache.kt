@@ -0,0 +1,244 @@
+package be.mygod.vpnhotspot.net.dns
+
+import android.net.Network
+import android.os.SystemClock
+import kotlinx.coroutines.CancellationException
+import kotlinx.coroutines.CompletableDeferred
+import kotlinx.coroutines.currentCoroutineContext
+import kotlinx.coroutines.ensureActive
+import java.util.concurrent.atomic.AtomicLong
+
+/**
+ * Answer cache for [DnsForwarder], keyed on the question (case-insensitive name, type and class) plus the CD and DO
+ * bits and whether the query carries EDNS: a response must only include an OPT record if the query did (RFC 6891
+ * section 7), so queries with and without EDNS never share an answer. Answers are kept for the smallest TTL in the
+ * answer section, or for negative answers (NXDOMAIN or no data) the SOA minimum from the authority section (RFC 2308),
+ * evicting the least recently used entries beyond [MAX_ENTRIES] or [MAX_BYTES]. Concurrent misses for the same key
+ * share a single upstream query.
+ *
+ * A cached answer is served as is after patching the ID, RD bit and question name (clients may randomize its case)
+ * from the query and counting down the TTLs, so the wire format is only walked once when the answer is stored.
+ */
+class DnsCache(private val clock: () -> Long = SystemClock::elapsedRealtime) {
+    companion object {
+        private const val MAX_ENTRIES = 1024
+        private const val MAX_BYTES = 1 shl 20
+        private const val MAX_TTL = 86400L
+        private const val MAX_NEGATIVE_TTL = 900L
+        private const val HEADER_SIZE = 12
+        private const val TYPE_SOA = 6
+        private const val TYPE_OPT = 41
+        private const val RCODE_NOERROR = 0
+        private const val RCODE_NXDOMAIN = 3
+        /**
+         * Largest UDP response a client accepts without EDNS.
+         */
+        private const val UDP_SIZE = 512
+        const val TCP_SIZE = 65535
+
+        private fun u16(wire: ByteArray, offset: Int) =
+            (wire[offset].toInt() and 0xFF shl 8) or (wire[offset + 1].toInt() and 0xFF)
+        private fun u32(wire: ByteArray, offset: Int) =
+            u16(wire, offset).toLong() shl 16 or u16(wire, offset + 2).toLong()
+        private fun skipName(wire: ByteArray, offset: Int): Int {
+            var i = offset
+            while (true) {
+                val length = wire[i].toInt() and 0xFF
+                when {
+                    length == 0 -> return i + 1
+                    length and 0xC0 == 0xC0 -> return i + 2
+                    length and 0xC0 != 0 -> throw IndexOutOfBoundsException("Unknown label type $length")
+                    else -> i += length + 1
+                }
+            }
+        }
+    }
+
+    private data class Key(val name: String, val type: Int, val dclass: Int, val flags: Int, val edns: Boolean)
+
+    /**
+     * A cacheable standard query with a single question.
+     */
+    private class Query(val key: Key, val questionEnd: Int, val maxSize: Int)
+
+    private fun parseQuery(query: ByteArray, tcp: Boolean): Query? = try {
+        val flags = u16(query, 2)
+        // QR = 0, opcode QUERY, one question
+        if (flags and 0xF800 != 0 || u16(query, 4) != 1) null else {
+            val name = StringBuilder()
+            var i = HEADER_SIZE
+            while (true) {
+                val length = query[i].toInt() and 0xFF
+                if (length == 0) break
+                if (length and 0xC0 != 0) throw IndexOutOfBoundsException("Compressed question")
+                for (j in i + 1..i + length) name.append(query[j].toInt().toChar().lowercaseChar())
+                name.append('.')
+                i += length + 1
+            }
+            val questionEnd = i + 5
+            val type = u16(query, i + 1)
+            val dclass = u16(query, i + 3)
+            var maxSize = UDP_SIZE
+            var dnssecOk = 0
+            var edns = false
+            i = questionEnd
+            repeat(u16(query, 6) + u16(query, 8) + u16(query, 10)) {
+                i = skipName(query, i)
+                if (u16(query, i) == TYPE_OPT) {
+                    edns = true
+                    maxSize = maxOf(UDP_SIZE, u16(query, i + 2))
+                    dnssecOk = (u16(query, i + 6) shr 15) and 1
+                }
+                i += 10 + u16(query, i + 8)
+            }
+            if (questionEnd > query.size) null else Query(Key(name.toString(), type, dclass,
+                (flags and 0x0010) or dnssecOk, edns), questionEnd, if (tcp) TCP_SIZE else maxSize)
+        }
+    } catch (_: IndexOutOfBoundsException) {
+        null
+    }
+
+    /**
+     * An upstream response with the offsets of its TTL fields. [ttl] is how long it may be cached, 0 if not at all.
+     */
+    private class Answer(val wire: ByteArray, val stored: Long) {
+        val ttlOffsets: IntArray
+        val ttls: LongArray
+        val ttl: Long
+
+        init {
+            val offsets = mutableListOf<Int>()
+            var positive = Long.MAX_VALUE
+            var negative = Long.MAX_VALUE
+            val flags = u16(wire, 2)
+            var i = HEADER_SIZE
+            repeat(u16(wire, 4)) { i = skipName(wire, i) + 4 }
+            val answers = u16(wire, 6)
+            val authorities = u16(wire, 8)
+            for (index in 0 until answers + authorities + u16(wire, 10)) {
+                i = skipName(wire, i)
+                val type = u16(wire, i)
+                val ttl = u32(wire, i + 4)
+                val end = i + 10 + u16(wire, i + 8)
+                if (type != TYPE_OPT) offsets.add(i + 4)
+                if (index < answers) positive = minOf(positive, ttl) else if (index < answers + authorities &&
+                        type == TYPE_SOA) negative = minOf(negative, ttl, u32(wire, end - 4))
+                i = end
+            }
+            if (i > wire.size) throw IndexOutOfBoundsException("Truncated response")
+            ttlOffsets = offsets.toIntArray()
+            ttls = LongArray(ttlOffsets.size) { u32(wire, ttlOffsets[it]) }
+            ttl = when {
+                flags and 0x0200 != 0 -> 0L     // truncated
+                flags and 0xF == RCODE_NOERROR && answers > 0 -> minOf(positive, MAX_TTL)
+                flags and 0xF == RCODE_NXDOMAIN || flags and 0xF == RCODE_NOERROR ->
+                    if (negative == Long.MAX_VALUE) 0L else minOf(negative, MAX_NEGATIVE_TTL)
+                else -> 0L
+            }
+        }
+
+        val expires get() = stored + ttl * 1000
+
+        /**
+         * This answer as a response to [query], or null if it is too large for the client.
+         */
+        fun respond(query: ByteArray, parsed: Query, now: Long): ByteArray? {
+            if (wire.size > parsed.maxSize) return null
+            val response = wire.copyOf()
+            response[0] = query[0]
+            response[1] = query[1]
+            response[2] = (response[2].toInt() and 0xFE or (query[2].toInt() and 0x01)).toByte()
+            query.copyInto(response, HEADER_SIZE, HEADER_SIZE, parsed.questionEnd)
+            val elapsed = (now - stored) / 1000
+            for (index in ttlOffsets.indices) {
+                val ttl = maxOf(0, ttls[index] - elapsed)
+                val offset = ttlOffsets[index]
+                response[offset] = (ttl shr 24).toByte()
+                response[offset + 1] = (ttl shr 16).toByte()
+                response[offset + 2] = (ttl shr 8).toByte()
+                response[offset + 3] = ttl.toByte()
+            }
+            return response
+        }
+    }
+
+    private val entries = LinkedHashMap<Key, Answer>(16, .75f, true)
+    private val inFlight = mutableMapOf<Key, CompletableDeferred<Answer?>>()
+    private var network: Any? = null
+    private var bytes = 0
+    private val hits = AtomicLong()
+    private val misses = AtomicLong()
+    private val coalesced = AtomicLong()
+
+    /**
+     * Answers [query] from the cache or through [upstream], which is called at most once per key at a time.
+     * [network] (a [Network]) is only compared with the previous one: the cache starts over when it changes.
+     */
+    suspend fun resolve(network: Any, query: ByteArray, tcp: Boolean,
+                        upstream: suspend (ByteArray) -> ByteArray): ByteArray {
+        val parsed = parseQuery(query, tcp) ?: return upstream(query)
+        val pending: CompletableDeferred<Answer?>
+        val owner: Boolean
+        synchronized(entries) {
+            if (this.network != network) {
+                entries.clear()
+                bytes = 0
+                this.network = network
+            }
+            val now = clock()
+            val cached = entries[parsed.key]
+            if (cached != null && now >= cached.expires) {
+                entries.remove(parsed.key)
+                bytes -= cached.wire.size
+            } else cached?.respond(query, parsed, now)?.let {
+                hits.incrementAndGet()
+                return it
+            }
+            val existing = inFlight[parsed.key]
+            owner = existing == null
+            pending = existing ?: CompletableDeferred<Answer?>().also { inFlight[parsed.key] = it }
+        }
+        if (!owner) {
+            coalesced.incrementAndGet()
+            val answer = try {
+                pending.await()
+            } catch (e: CancellationException) {
+                currentCoroutineContext().ensureActive()
+                null    // the query joined was cancelled, try on our own
+            }
+            return answer?.respond(query, parsed, clock()) ?: upstream(query)
+        }
+        misses.incrementAndGet()
+        try {
+            val response = upstream(query)
+            val answer = try {
+                Answer(response, clock())
+            } catch (_: IndexOutOfBoundsException) {
+                null
+            }
+            synchronized(entries) {
+                inFlight.remove(parsed.key)
+                if (answer != null && answer.ttl > 0 && this.network == network) {
+                    entries.put(parsed.key, answer)?.let { bytes -= it.wire.size }
+                    bytes += answer.wire.size
+                    val iterator = entries.values.iterator()
+                    while (entries.size > MAX_ENTRIES || bytes > MAX_BYTES) {
+                        bytes -= iterator.next().wire.size
+                        iterator.remove()
+                    }
+                }
+            }
+            pending.complete(answer)
+            return response
+        } catch (e: Exception) {
+            synchronized(entries) { inFlight.remove(parsed.key) }
+            pending.completeExceptionally(e)
+            throw e
+        }
+    }
+
+    override fun toString() = synchronized(entries) {
+        "DnsCache(${entries.size} entries, $bytes bytes, ${hits.get()} hits, ${misses.get()} misses, " +
+                "${coalesced.get()} coalesced)"
+    }
+}
@@ -73,6 +73,7 @@ class DnsForwarder : CoroutineScope {
             CoroutineExceptionHandler { _, t -> Timber.w(t) }
     private var tcp: ServerSocket? = null
     private var udp: BoundDatagramSocket? = null
+    private val cache = DnsCache()
     val tcpPort get() = tcp!!.localAddress.toJavaAddress().port
     val udpPort get() = udp!!.localAddress.toJavaAddress().port
 
@@ -109,6 +110,7 @@ class DnsForwarder : CoroutineScope {
         cancel("All clients are gone")
         tcp?.close()
         udp?.close()
+        Timber.d(cache.toString())
     }
 
     private fun handleAsync(socket: Socket) = launch connection@ {
@@ -123,7 +125,7 @@ class DnsForwarder : CoroutineScope {
                         val query = ByteArray(reader.readShort().toUShort().toInt())
                         reader.readFully(query, 0, query.size)
                         launch {
-                            val response = resolve(query) {
+                            val response = resolve(query, true) {
                                 "Packet from tcp:${socket.remoteAddress.toJavaAddress()}"
                             } ?: return@launch
                             writerMutex.withLock {
@@ -153,16 +155,17 @@ class DnsForwarder : CoroutineScope {
 //        Timber.d("Incoming udp:${datagram.address.toJavaAddress()}")
         try {
             val query = datagram.packet.readByteArray()
-            val response = resolve(query) { "Packet from udp:${datagram.address.toJavaAddress()}" } ?: return@launch
+            val response = resolve(query, false) { "Packet from udp:${datagram.address.toJavaAddress()}" } ?: return@launch
             udp!!.send(Datagram(ByteReadPacket(response), datagram.address))
         } catch (e: IOException) {
             Timber.d(e, "Failed to handle connection from udp:${datagram.address.toJavaAddress()}")
         }
     }
 
-    private suspend fun resolve(query: ByteArray, source: () -> String) = try {
-        DnsResolverCompat.resolveRaw(UpstreamMonitor.currentNetwork ?: FallbackUpstreamMonitor.currentNetwork ?:
-            throw IOException("no upstream available"), query)
+    private suspend fun resolve(query: ByteArray, tcp: Boolean, source: () -> String) = try {
+        val network = UpstreamMonitor.currentNetwork ?: FallbackUpstreamMonitor.currentNetwork ?:
+            throw IOException("no upstream available")
+        cache.resolve(network, query, tcp) { DnsResolverCompat.resolveRaw(network, it) }
     } catch (e: Exception) {
         when (e) {
             is CancellationException -> { }
@@ -3,6 +3,7 @@ package be.mygod.vpnhotspot.net.monitor
 import android.net.MacAddress
 import androidx.collection.LongSparseArray
 import androidx.collection.set
+import be.mygod.vpnhotspot.net.ClientAcl
 import be.mygod.vpnhotspot.net.IpDev
 import be.mygod.vpnhotspot.net.Routing.Companion.IPTABLES
 import be.mygod.vpnhotspot.room.AppDatabase
@@ -24,6 +25,15 @@ import java.util.concurrent.TimeUnit
 object TrafficRecorder {
     private const val ANYWHERE = "0.0.0.0/0"
     private const val FOREGROUND_POLL_MS = 1015L
+    /**
+     * Same characters as `\s` in java.util.regex.
+     */
+    private const val SEPARATORS = " \t\n\u000B\u000C\r"
+    private const val COLUMNS = 9
+    /**
+     * `add <set> <ip> packets <packets> bytes <bytes>` in the output of [ClientAcl.SAVE_COMMAND].
+     */
+    private const val SET_COLUMNS = 7
 
     private var lastUpdate = 0L
     private val records = mutableMapOf<IpDev, TrafficRecord>()
@@ -68,55 +78,81 @@ object TrafficRecorder {
         scheduleUpdateLocked()
     }
 
+    /**
+     * Splits [line] into at most [columns].size whitespace-separated columns without regex or intermediate lists,
+     * ignoring the rest of the line. Returns the number of columns found.
+     */
+    private fun scanColumns(line: String, columns: Array<String>): Int {
+        var count = 0
+        var i = 0
+        while (count < columns.size) {
+            while (i < line.length && line[i] in SEPARATORS) ++i
+            if (i >= line.length) break
+            val start = i
+            while (i < line.length && line[i] !in SEPARATORS) ++i
+            columns[count++] = line.substring(start, i)
+        }
+        return count
+    }
+
     private fun doUpdate(timestamp: Long) {
         val oldRecords = LongSparseArray<TrafficRecord>()
-        loop@ for (line in RootSession.use {
+        fun updateRecord(ip: InetAddress, downstream: String, isReceive: Boolean, packets: Long, bytes: Long) {
+            val key = IpDev(ip, downstream)
+            val oldRecord = records[key] ?: return  // assuming they're legacy old rules
+            val record = if (oldRecord.id == null) oldRecord else TrafficRecord(
+                    timestamp = timestamp,
+                    mac = oldRecord.mac,
+                    ip = ip,
+                    downstream = downstream,
+                    sentPackets = -1,
+                    sentBytes = -1,
+                    receivedPackets = -1,
+                    receivedBytes = -1,
+                    previousId = oldRecord.id)
+            if (isReceive) {
+                if (record.receivedPackets == -1L && record.receivedBytes == -1L) {
+                    record.receivedPackets = packets
+                    record.receivedBytes = bytes
+                }
+            } else {
+                if (record.sentPackets == -1L && record.sentBytes == -1L) {
+                    record.sentPackets = packets
+                    record.sentBytes = bytes
+                }
+            }
+            oldRecord.id?.let { oldId ->
+                check(records.put(key, record) == oldRecord)
+                oldRecords[oldId] = oldRecord
+            }
+        }
+        val columns = Array(COLUMNS) { "" }
+        val (rules, sets) = RootSession.use {
             val command = "$IPTABLES -nvx -L vpnhotspot_acl"
             val result = it.execQuiet(command)
             val message = result.message(listOf(command))
             if (result.err.isNotEmpty()) Timber.i(message)
-            result.out.lineSequence().drop(2)
-        }) {
+            // clients of downstreams using ClientAcl.IpSet are counted by their set members instead
+            result.out.lineSequence().drop(2) to if (ClientAcl.ipsetInUse) {
+                val save = it.execQuiet(ClientAcl.SAVE_COMMAND)
+                if (save.err.isNotEmpty()) Timber.i(save.message(listOf(ClientAcl.SAVE_COMMAND)))
+                save.out.lineSequence()
+            } else emptySequence()
+        }
+        for (line in rules) {
             if (line.isBlank()) continue
-            val columns = line.split("\\s+".toRegex()).filter { it.isNotEmpty() }
             try {
-                check(columns.size >= 9)
+                check(scanColumns(line, columns) == COLUMNS)
                 when (columns[2]) {
                     "DROP" -> { }
                     "ACCEPT" -> {
                         val isReceive = columns[7] == ANYWHERE
                         val isSend = columns[8] == ANYWHERE
+                        if (isReceive && isSend && line.contains(" match-set ")) continue
                         // this check might fail when the user performed an upgrade from 1.x
                         check(isReceive != isSend) { "Failed to set up blocking rules, please clean routing rules" }
-                        val ip = parseNumericAddress(columns[if (isReceive) 8 else 7])
-                        val downstream = columns[if (isReceive) 6 else 5]
-                        val key = IpDev(ip, downstream)
-                        val oldRecord = records[key] ?: continue@loop   // assuming they're legacy old rules
-                        val record = if (oldRecord.id == null) oldRecord else TrafficRecord(
-                                timestamp = timestamp,
-                                mac = oldRecord.mac,
-                                ip = ip,
-                                downstream = downstream,
-                                sentPackets = -1,
-                                sentBytes = -1,
-                                receivedPackets = -1,
-                                receivedBytes = -1,
-                                previousId = oldRecord.id)
-                        if (isReceive) {
-                            if (record.receivedPackets == -1L && record.receivedBytes == -1L) {
-                                record.receivedPackets = columns[0].toLong()
-                                record.receivedBytes = columns[1].toLong()
-                            }
-                        } else {
-                            if (record.sentPackets == -1L && record.sentBytes == -1L) {
-                                record.sentPackets = columns[0].toLong()
-                                record.sentBytes = columns[1].toLong()
-                            }
-                        }
-                        oldRecord.id?.let { oldId ->
-                            check(records.put(key, record) == oldRecord)
-                            oldRecords[oldId] = oldRecord
-                        }
+                        updateRecord(parseNumericAddress(columns[if (isReceive) 8 else 7]),
+                                columns[if (isReceive) 6 else 5], isReceive, columns[0].toLong(), columns[1].toLong())
                     }
                     else -> check(false)
                 }
@@ -125,6 +161,20 @@ object TrafficRecorder {
                 Timber.w(e)
             }
         }
+        for (line in sets) {
+            if (!line.startsWith("add ${ClientAcl.SET_PREFIX}")) continue
+            try {
+                check(scanColumns(line, columns) >= SET_COLUMNS && columns[3] == "packets" && columns[5] == "bytes")
+                val isReceive = columns[1].startsWith(ClientAcl.RECEIVED_PREFIX)
+                val prefix = if (isReceive) ClientAcl.RECEIVED_PREFIX else ClientAcl.SENT_PREFIX
+                if (!columns[1].startsWith(prefix)) continue
+                updateRecord(parseNumericAddress(columns[2]), columns[1].substring(prefix.length), isReceive,
+                        columns[4].toLong(), columns[6].toLong())
+            } catch (e: Exception) {
+                Timber.w(line)
+                Timber.w(e)
+            }
+        }
         for ((_, record) in records) if (record.id == null) {
             check(record.sentPackets >= 0)
             check(record.sentBytes >= 0)
@@ -10,7 +10,7 @@ import be.mygod.vpnhotspot.App.Companion.app
 import kotlinx.coroutines.GlobalScope
 import kotlinx.coroutines.launch
 
-@Database(entities = [ClientRecord::class, TrafficRecord::class], version = 2)
+@Database(entities = [ClientRecord::class, TrafficRecord::class, TrafficChainHead::class], version = 3)
 @TypeConverters(Converters::class)
 abstract class AppDatabase : RoomDatabase() {
     companion object {
@@ -19,7 +19,8 @@ abstract class AppDatabase : RoomDatabase() {
         val instance by lazy {
             Room.databaseBuilder(app.deviceStorage, AppDatabase::class.java, DB_NAME).apply {
                 addMigrations(
-                        Migration2
+                        Migration2,
+                        Migration3
                 )
                 setQueryExecutor { GlobalScope.launch { it.run() } }
             }.build()
@@ -33,4 +34,16 @@ abstract class AppDatabase : RoomDatabase() {
         override fun migrate(database: SupportSQLiteDatabase) =
             database.execSQL("ALTER TABLE `ClientRecord` ADD COLUMN `macLookupPending` INTEGER NOT NULL DEFAULT 1")
     }
+
+    object Migration3 : Migration(2, 3) {
+        override fun migrate(database: SupportSQLiteDatabase) {
+            database.execSQL("CREATE TABLE IF NOT EXISTS `TrafficChainHead` (`id` INTEGER NOT NULL, " +
+                    "`mac` INTEGER NOT NULL, PRIMARY KEY(`id`), FOREIGN KEY(`id`) REFERENCES `TrafficRecord`(`id`) " +
+                    "ON UPDATE RESTRICT ON DELETE CASCADE )")
+            database.execSQL("CREATE INDEX IF NOT EXISTS `index_TrafficChainHead_mac` ON `TrafficChainHead` (`mac`)")
+            database.execSQL("INSERT INTO `TrafficChainHead` (`id`, `mac`) " +
+                    "SELECT TrafficRecord.id, TrafficRecord.mac FROM TrafficRecord " +
+                    "LEFT JOIN TrafficRecord AS Next ON TrafficRecord.id = Next.previousId WHERE Next.id IS NULL")
+        }
+    }
 }
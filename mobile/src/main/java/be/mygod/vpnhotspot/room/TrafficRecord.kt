@@ -43,9 +43,17 @@ data class TrafficRecord(
     abstract class Dao {
         @Insert
         protected abstract fun insertInternal(value: TrafficRecord): Long
-        fun insert(value: TrafficRecord) {
+        @Insert
+        protected abstract fun insertHead(value: TrafficChainHead)
+        @Query("DELETE FROM TrafficChainHead WHERE id = :id")
+        protected abstract fun deleteHead(id: Long)
+        @Transaction
+        open fun insert(value: TrafficRecord) {
             check(value.id == null)
-            value.id = insertInternal(value)
+            val id = insertInternal(value)
+            value.id = id
+            value.previousId?.let { deleteHead(it) }
+            insertHead(TrafficChainHead(id, value.mac))
         }
 
         @Query("""
@@ -55,14 +63,27 @@ data class TrafficRecord(
                     SUM(TrafficRecord.sentBytes) AS sentBytes,
                     SUM(TrafficRecord.receivedPackets) AS receivedPackets,
                     SUM(TrafficRecord.receivedBytes) AS receivedBytes
-                FROM TrafficRecord LEFT JOIN TrafficRecord AS Next ON TrafficRecord.id = Next.previousId
+                FROM TrafficChainHead JOIN TrafficRecord ON TrafficRecord.id = TrafficChainHead.id
                 /* We only want to find the last record for each chain so that we don't double count */
-                WHERE TrafficRecord.mac = :mac AND Next.id IS NULL
+                WHERE TrafficChainHead.mac = :mac
                 """)
         abstract suspend fun queryStats(mac: MacAddress): ClientStats
     }
 }
 
+/**
+ * The last record of each chain, i.e. the one that no other record points to with previousId.
+ * Kept up to date by [TrafficRecord.Dao.insert] so that stats for a client can be looked up by its chains instead of
+ * scanning the whole history for records without a successor.
+ */
+@Entity(foreignKeys = [ForeignKey(entity = TrafficRecord::class, parentColumns = ["id"], childColumns = ["id"],
+            onDelete = ForeignKey.CASCADE, onUpdate = ForeignKey.RESTRICT)],
+        indices = [Index(value = ["mac"])])
+data class TrafficChainHead(
+        @PrimaryKey
+        val id: Long,
+        val mac: MacAddress)
+
 @Parcelize
 data class ClientStats(
         val timestamp: Long = 0,
@@ -0,0 +1,91 @@
+package be.mygod.vpnhotspot.util
+
+import java.io.ByteArrayOutputStream
+import java.io.IOException
+import java.io.InputStream
+
+/**
+ * 从连接的原始字节流读取HTTP/1.1请求的行与请求体
+ *
+ * 行与请求体从同一个字节流读取，keep-alive连接上的请求边界才不会错位：Content-Length按字节计数，
+ * chunked请求体连同trailer一起读完。无法恰好读完请求体时抛出 [HttpException]，此后连接必须关闭。
+ */
+class HttpMessageReader(private val input: InputStream, private val maxBodySize: Int = 1024 * 1024) {
+    companion object {
+        private const val MAX_LINE = 8192
+        private const val MAX_TRAILERS = 100
+    }
+
+    /**
+     * 请求无法读到结尾：应答 [statusCode] 后关闭连接
+     */
+    class HttpException(val statusCode: Int, message: String) : IOException(message)
+
+    /**
+     * 去掉CRLF（或单独的LF）的一行，流在读到任何字节之前结束时返回null
+     */
+    fun readLine(): String? {
+        val line = ByteArrayOutputStream()
+        while (true) {
+            val byte = input.read()
+            if (byte == -1) return if (line.size() == 0) null else line.toString(Charsets.UTF_8.name())
+            if (byte == '\n'.code) break
+            if (line.size() >= MAX_LINE) throw HttpException(400, "Line too long")
+            line.write(byte)
+        }
+        val bytes = line.toByteArray()
+        val length = if (bytes.isNotEmpty() && bytes.last() == '\r'.code.toByte()) bytes.size - 1 else bytes.size
+        return String(bytes, 0, length, Charsets.UTF_8)
+    }
+
+    /**
+     * 按小写的 [headers] 读取请求体，没有请求体时返回null
+     */
+    fun readBody(headers: Map<String, String>): ByteArray? {
+        val transferEncoding = headers["transfer-encoding"]
+        val contentLength = headers["content-length"]
+        if (transferEncoding != null) {
+            // RFC 9112 6.3：同时带有两者的请求可能是请求走私，直接拒绝
+            if (contentLength != null) throw HttpException(400, "Both Transfer-Encoding and Content-Length present")
+            if (!transferEncoding.equals("chunked", true)) {
+                throw HttpException(501, "Unsupported Transfer-Encoding: $transferEncoding")
+            }
+            return readChunked().takeIf { it.isNotEmpty() }
+        }
+        if (contentLength == null) return null
+        val length = contentLength.toLongOrNull()?.takeIf { it >= 0 }
+            ?: throw HttpException(400, "Invalid Content-Length: $contentLength")
+        if (length > maxBodySize) throw HttpException(413, "Request body too large: $length bytes")
+        return if (length == 0L) null else readExactly(length.toInt())
+    }
+
+    private fun readExactly(size: Int): ByteArray {
+        val body = ByteArray(size)
+        var read = 0
+        while (read < size) {
+            val count = input.read(body, read, size - read)
+            if (count == -1) throw HttpException(400, "Request body ended after $read of $size bytes")
+            read += count
+        }
+        return body
+    }
+
+    private fun readChunked(): ByteArray {
+        val body = ByteArrayOutputStream()
+        while (true) {
+            val line = readLine() ?: throw HttpException(400, "Chunked body ended before the last chunk")
+            val size = line.substringBefore(';').trim().toIntOrNull(16)?.takeIf { it >= 0 }
+                ?: throw HttpException(400, "Invalid chunk size: $line")
+            if (size == 0) break
+            if (body.size() + size > maxBodySize) throw HttpException(413, "Request body too large")
+            body.write(readExactly(size))
+            if (readLine() != "") throw HttpException(400, "Chunk not terminated by CRLF")
+        }
+        // 不使用trailer字段，跳过直到空行
+        repeat(MAX_TRAILERS) {
+            val trailer = readLine() ?: throw HttpException(400, "Chunked body ended in the trailers")
+            if (trailer.isEmpty()) return body.toByteArray()
+        }
+        throw HttpException(400, "Too many trailers")
+    }
+}
@@ -6,7 +6,6 @@ import be.mygod.vpnhotspot.OkHttpWebServer
 import timber.log.Timber
 import java.io.IOException
 import java.net.BindException
-import java.net.ServerSocket
 import java.util.concurrent.TimeUnit
 
 /**
@@ -85,14 +84,15 @@ object WebServerManager {
             try {
                 Timber.d("Attempting to start WebServer on port $port")
                 
-                // 检查端口是否可用
-                if (!isPortAvailable(port)) {
-                    Timber.w("Port $port is already in use, trying next port")
-                    continue
+                // 只绑定一次并把绑定好的套接字交给服务器，不再先用临时套接字探测端口：
+                // 探测与真正绑定之间端口可能被别的进程占用，探测说可用的端口随后仍会绑定失败
+                val socket = OkHttpWebServer.bind(port)
+                currentServer = try {
+                    OkHttpWebServer(context.applicationContext, port).apply { start(socket) }
+                } catch (e: Exception) {
+                    socket.close()
+                    throw e
                 }
-                
-                currentServer = OkHttpWebServer(context.applicationContext, port)
-                currentServer!!.start()
                 lastUsedPort = port
                 
                 // 如果使用的端口不是首选端口，更新配置
@@ -126,19 +126,6 @@ object WebServerManager {
         throw IOException(errorMessage, lastException)
     }
     
-    /**
-     * 检查端口是否可用
-     */
-    private fun isPortAvailable(port: Int): Boolean {
-        return try {
-            ServerSocket(port).use { 
-                true 
-            }
-        } catch (e: IOException) {
-            false
-        }
-    }
-    
     /**
      * 停止WebServer，确保完整的资源清理
      */
@@ -148,12 +135,9 @@ object WebServerManager {
                 if (server.isRunning) {
                     Timber.i("Stopping WebServer on port ${server.port}")
                     
-                    // 调用服务器的停止方法
+                    // 调用服务器的停止方法，监听套接字在返回前已关闭
                     server.stop()
                     
-                    // 等待一小段时间确保资源被释放
-                    Thread.sleep(100)
-                    
                     Timber.i("WebServer stopped successfully")
                 } else {
                     Timber.d("WebServer was already stopped")
@@ -197,11 +181,8 @@ object WebServerManager {
     fun restart(context: Context) {
         try {
             Timber.i("Restarting WebServer")
+            // 监听套接字在 stop() 返回前已关闭，重新绑定时重用地址，不需要等待端口释放
             stop()
-            
-            // 短暂等待确保端口被释放
-            Thread.sleep(200)
-            
             start(context)
             Timber.i("WebServer restarted successfully")
         } catch (e: Exception) {
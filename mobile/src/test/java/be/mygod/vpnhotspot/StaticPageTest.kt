@@ -0,0 +1,48 @@
+package be.mygod.vpnhotspot
+
+import org.junit.Assert.assertArrayEquals
+import org.junit.Assert.assertEquals
+import org.junit.Assert.assertFalse
+import org.junit.Assert.assertNotEquals
+import org.junit.Assert.assertTrue
+import org.junit.Test
+import java.util.zip.GZIPInputStream
+import java.util.zip.InflaterInputStream
+
+class StaticPageTest {
+    private val page = OkHttpWebServer.StaticPage("<!DOCTYPE html><title>热点控制面板</title>".repeat(20))
+
+    @Test
+    fun encodingsDecodeToIdentity() {
+        assertArrayEquals(page.identity, GZIPInputStream(page.body("gzip").inputStream()).readBytes())
+        assertArrayEquals(page.identity, InflaterInputStream(page.body("deflate").inputStream()).readBytes())
+    }
+
+    @Test
+    fun eachEncodingHasItsOwnStrongEtag() {
+        val etags = listOf(page.etag(), page.etag("gzip"), page.etag("deflate"))
+        assertEquals(3, etags.toSet().size)
+        assertTrue(Regex("\"[0-9a-f]{16}\"").matches(page.etag()))
+        assertEquals(page.etag().dropLast(1) + "-gzip\"", page.etag("gzip"))
+        assertEquals(page.etag("gzip"), OkHttpWebServer.StaticPage(String(page.identity)).etag("gzip"))
+        assertNotEquals(page.etag(), OkHttpWebServer.StaticPage("other").etag())
+    }
+
+    @Test
+    fun ifNoneMatchComparesTheSelectedEncoding() {
+        for (tag in listOf(page.etag("gzip"), "W/${page.etag("gzip")}", "\"other\", ${page.etag("gzip")}", "*")) {
+            assertTrue(tag, page.matches(tag, "gzip"))
+        }
+        assertTrue(page.matches(page.etag()))
+        assertFalse(page.matches("\"other\"", "gzip"))
+        assertFalse(page.matches(OkHttpWebServer.StaticPage("other").etag("gzip"), "gzip"))
+    }
+
+    @Test
+    fun otherEncodingsDoNotMatch() {
+        // a client that cached the gzip body must not be told to reuse it as the identity or deflate body
+        assertFalse(page.matches(page.etag("gzip")))
+        assertFalse(page.matches(page.etag("gzip"), "deflate"))
+        assertFalse(page.matches("W/${page.etag()}", "gzip"))
+    }
+}
@@ -0,0 +1,99 @@
+package be.mygod.vpnhotspot.client
+
+import org.junit.Assert.assertEquals
+import org.junit.Assert.assertNull
+import org.junit.Assert.fail
+import org.junit.Test
+import java.io.ByteArrayOutputStream
+import java.io.DataOutputStream
+import java.io.IOException
+import java.nio.ByteBuffer
+
+class OuiDatabaseTest {
+    private class Record(val bits: Int, val prefix: Long, val name: String, val country: String?)
+
+    /**
+     * The same rows as SAMPLE in tests/unit/test_oui_db.py after parsing (registration authority and private rows are
+     * left out by the compiler), plus an MA-M and an MA-S assignment nested in an MA-L one to check the table order.
+     */
+    private val records = listOf(
+        Record(24, 0x3C22FB, "Apple Inc.", "US"),
+        Record(24, 0xA4C138, "Telink Semiconductor (Taipei) Co. Ltd.", "TW"),
+        Record(24, 0x001A11, "Google. Inc.", null),
+        Record(28, 0x0050C2A, "Société Générale", "FR"),
+        Record(36, 0x70B3D5F2C, "Ultra Electronics", null),
+        Record(24, 0x001122, "Large", null),
+        Record(28, 0x0011223, "Medium", null),
+        Record(36, 0x00112234A, "Small", "JP"),
+    )
+
+    /**
+     * Compiles [records] like compile_db in tests/common/oui_db.py.
+     */
+    private fun compile(records: List<Record>) = ByteArrayOutputStream().also { bytes ->
+        val pool = ByteArrayOutputStream()
+        val offsets = mutableMapOf<Pair<String, String?>, Int>()
+        val tables = ByteArrayOutputStream()
+        val counts = listOf(36, 28, 24).map { bits ->
+            val table = records.filter { it.bits == bits }.sortedBy { it.prefix }
+            for (record in table) {
+                val offset = offsets.getOrPut(record.name to record.country) {
+                    pool.size().also {
+                        val name = record.name.toByteArray()
+                        pool.write((record.country ?: "\u0000\u0000").toByteArray())
+                        pool.write(name.size shr 8)
+                        pool.write(name.size)
+                        pool.write(name)
+                    }
+                }
+                for (shift in ((bits + 7) / 8 - 1) * 8 downTo 0 step 8) tables.write((record.prefix shr shift).toInt())
+                for (shift in 16 downTo 0 step 8) tables.write(offset shr shift)
+            }
+            table.size
+        }
+        DataOutputStream(bytes).apply {
+            writeBytes("VHOU")
+            writeShort(1)
+            writeShort(0)
+            counts.forEach { writeInt(it) }
+            writeInt(pool.size())
+        }
+        tables.writeTo(bytes)
+        pool.writeTo(bytes)
+    }.toByteArray()
+
+    private val database = OuiDatabase(ByteBuffer.wrap(compile(records)))
+
+    @Test
+    fun mostSpecificAssignmentWins() {
+        assertEquals(OuiDatabase.Vendor("Small", "JP"), database.lookup(0x00112234A123))
+        assertEquals(OuiDatabase.Vendor("Medium", null), database.lookup(0x00112234B123))
+        assertEquals(OuiDatabase.Vendor("Medium", null), database.lookup(0x0011223FFFFF))
+        assertEquals(OuiDatabase.Vendor("Large", null), database.lookup(0x001122400000))
+        assertEquals(OuiDatabase.Vendor("Apple Inc.", "US"), database.lookup(0x3C22FB123456))
+        assertEquals(OuiDatabase.Vendor("Société Générale", "FR"), database.lookup(0x0050C2A12345))
+        assertEquals(OuiDatabase.Vendor("Ultra Electronics", null), database.lookup(0x70B3D5F2CFFF))
+        assertEquals(listOf(2, 2, 4), database.counts)
+    }
+
+    @Test
+    fun unassignedAddressesAreNotFound() {
+        // the rest of the registration authority blocks holding MA-M and MA-S assignments
+        assertNull(database.lookup(0x0050C2B12345))
+        assertNull(database.lookup(0x70B3D5F2D000))
+        // private and locally administered addresses
+        assertNull(database.lookup(0x080030000001))
+        assertNull(database.lookup(0x02C0FFEE0001))
+    }
+
+    @Test
+    fun brokenFilesAreRejected() {
+        val data = compile(records)
+        for (broken in listOf(data.copyOf(data.size - 1), "XXXX".toByteArray() + data.copyOfRange(4, data.size))) {
+            try {
+                OuiDatabase(ByteBuffer.wrap(broken))
+                fail("Expected IOException")
+            } catch (_: IOException) { }
+        }
+    }
+}
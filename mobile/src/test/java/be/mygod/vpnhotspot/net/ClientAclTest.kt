@@ -0,0 +1,45 @@
+package be.mygod.vpnhotspot.net
+
+import be.mygod.vpnhotspot.root.RoutingCommands.ProcessResult
+import org.junit.Assert.assertEquals
+import org.junit.Assert.assertFalse
+import org.junit.Assert.assertTrue
+import org.junit.Test
+
+class ClientAclTest {
+    private fun probe(exit: Int, err: String) = ProcessResult(exit, "", err)
+
+    @Test
+    fun missingRuleMeansTheSetMatchWorks() {
+        assertTrue(ClientAcl.setMatchWorks(probe(1,
+            "iptables: Bad rule (does a matching rule exist in that chain?).\n")))
+        // iptables-nft words it the same way
+        assertTrue(ClientAcl.setMatchWorks(probe(1,
+            "iptables v1.8.7 (nf_tables): Bad rule (does a matching rule exist in that chain?)\n")))
+    }
+
+    @Test
+    fun unavailableSetMatchFallsBack() {
+        // kernel without xt_set: same exit code as a missing rule
+        assertFalse(ClientAcl.setMatchWorks(probe(1, "iptables: No chain/target/match by that name.\n")))
+        assertFalse(ClientAcl.setMatchWorks(probe(2,
+            "iptables v1.8.7 (legacy): Couldn't load match `set':No such file or directory\n")))
+        assertFalse(ClientAcl.setMatchWorks(probe(2, "/system/bin/sh: ipset: inaccessible or not found\n" +
+            "iptables v1.8.7 (legacy): Set vpnhotspot_src_wlan1 doesn't exist.\n")))
+        assertFalse(ClientAcl.setMatchWorks(probe(0, "")))
+    }
+
+    @Test
+    fun ipSetCommands() {
+        val acl = ClientAcl.IpSet("wlan1")
+        assertEquals(listOf(
+            "ipset -exist create vpnhotspot_src_wlan1 hash:ip family inet counters",
+            "ipset flush vpnhotspot_src_wlan1",
+            "ipset -exist create vpnhotspot_dst_wlan1 hash:ip family inet counters",
+            "ipset flush vpnhotspot_dst_wlan1",
+            "iptables -w -C FORWARD -m set --match-set vpnhotspot_src_wlan1 src -j ACCEPT",
+        ), acl.probe.split('\n'))
+        assertEquals("printf '%s\\n' 'add vpnhotspot_src_wlan1 192.168.43.100' " +
+            "'add vpnhotspot_dst_wlan1 192.168.43.100' | ipset -exist restore", acl.restore("add", "192.168.43.100"))
+    }
+}
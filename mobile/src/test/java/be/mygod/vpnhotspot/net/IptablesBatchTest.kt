@@ -0,0 +1,65 @@
+package be.mygod.vpnhotspot.net
+
+import org.junit.Assert.assertEquals
+import org.junit.Assert.assertTrue
+import org.junit.Test
+
+class IptablesBatchTest {
+    private fun IptablesBatch.sample() = apply {
+        newChain("vpnhotspot_acl")
+        insert("FORWARD -j vpnhotspot_acl")
+        add("vpnhotspot_acl -i wlan0 -j ACCEPT")
+        add("POSTROUTING -o rmnet0 -j MASQUERADE", "nat")
+        add("vpnhotspot_acl -i wlan0 -j ACCEPT", binary = Routing.IP6TABLES)
+    }
+
+    @Test
+    fun oneRestorePayloadPerTable() {
+        val (command, revert) = IptablesBatch(true).sample().compile().single()
+        assertEquals(listOf(
+            "iptables -w -t filter -N vpnhotspot_acl 2>/dev/null",
+            "printf '%s\\n' '*filter' '-I FORWARD -j vpnhotspot_acl' '-A vpnhotspot_acl -i wlan0 -j ACCEPT' " +
+                "'COMMIT' | iptables-restore -w --noflush || { iptables -w -t filter -I FORWARD -j vpnhotspot_acl; " +
+                "iptables -w -t filter -A vpnhotspot_acl -i wlan0 -j ACCEPT; }",
+            "printf '%s\\n' '*nat' '-A POSTROUTING -o rmnet0 -j MASQUERADE' 'COMMIT' | " +
+                "iptables-restore -w --noflush || { iptables -w -t nat -A POSTROUTING -o rmnet0 -j MASQUERADE; }",
+            "printf '%s\\n' '*filter' '-A vpnhotspot_acl -i wlan0 -j ACCEPT' 'COMMIT' | " +
+                "ip6tables-restore -w --noflush || { ip6tables -w -t filter -A vpnhotspot_acl -i wlan0 -j ACCEPT; }",
+        ), command.split('\n'))
+        // tables are reverted in reverse order, rules within a table too
+        assertEquals(listOf(
+            "printf '%s\\n' '*filter' '-D vpnhotspot_acl -i wlan0 -j ACCEPT' 'COMMIT' | " +
+                "ip6tables-restore -w --noflush || { ip6tables -w -t filter -D vpnhotspot_acl -i wlan0 -j ACCEPT; }",
+            "printf '%s\\n' '*nat' '-D POSTROUTING -o rmnet0 -j MASQUERADE' 'COMMIT' | " +
+                "iptables-restore -w --noflush || { iptables -w -t nat -D POSTROUTING -o rmnet0 -j MASQUERADE; }",
+            "printf '%s\\n' '*filter' '-D vpnhotspot_acl -i wlan0 -j ACCEPT' '-D FORWARD -j vpnhotspot_acl' " +
+                "'COMMIT' | iptables-restore -w --noflush || { " +
+                "iptables -w -t filter -D vpnhotspot_acl -i wlan0 -j ACCEPT; " +
+                "iptables -w -t filter -D FORWARD -j vpnhotspot_acl; }",
+        ), revert!!.split('\n'))
+    }
+
+    @Test
+    fun unbatchedRunsEachCommand() {
+        assertEquals(listOf(
+            "iptables -w -t filter -N vpnhotspot_acl" to null,
+            "iptables -w -t filter -I FORWARD -j vpnhotspot_acl" to
+                "iptables -w -t filter -D FORWARD -j vpnhotspot_acl",
+            "iptables -w -t filter -A vpnhotspot_acl -i wlan0 -j ACCEPT" to
+                "iptables -w -t filter -D vpnhotspot_acl -i wlan0 -j ACCEPT",
+            "iptables -w -t nat -A POSTROUTING -o rmnet0 -j MASQUERADE" to
+                "iptables -w -t nat -D POSTROUTING -o rmnet0 -j MASQUERADE",
+            "ip6tables -w -t filter -A vpnhotspot_acl -i wlan0 -j ACCEPT" to
+                "ip6tables -w -t filter -D vpnhotspot_acl -i wlan0 -j ACCEPT",
+        ), IptablesBatch(false).sample().compile())
+    }
+
+    @Test
+    fun compileClearsTheBatch() {
+        val batch = IptablesBatch(true).sample()
+        batch.compile()
+        assertTrue(batch.compile().isEmpty())
+        batch.newChain("vpnhotspot_acl")
+        assertEquals(listOf("iptables -w -t filter -N vpnhotspot_acl 2>/dev/null" to null), batch.compile())
+    }
+}
@@ -0,0 +1,154 @@
+package be.mygod.vpnhotspot.net.dns
+
+import kotlinx.coroutines.runBlocking
+import org.junit.Assert.assertArrayEquals
+import org.junit.Assert.assertEquals
+import org.junit.Test
+import java.io.ByteArrayOutputStream
+
+class DnsCacheTest {
+    private companion object {
+        const val TYPE_A = 1
+        const val TYPE_SOA = 6
+        const val TYPE_OPT = 41
+        const val NETWORK = "rmnet_data0"
+        /**
+         * End of the question in messages about example.com, where the first record starts.
+         */
+        const val QUESTION_END = 12 + 13 + 4
+
+        fun ByteArrayOutputStream.u16(value: Int) = apply {
+            write(value shr 8)
+            write(value)
+        }
+        fun ByteArrayOutputStream.u32(value: Long) = u16((value shr 16).toInt()).u16(value.toInt() and 0xFFFF)
+        fun ByteArrayOutputStream.opt() = apply {
+            write(0)
+            u16(TYPE_OPT).u16(1232).u32(0).u16(0)
+        }
+        fun ByteArrayOutputStream.name(name: String) = apply {
+            for (label in name.split('.').filter { it.isNotEmpty() }) {
+                write(label.length)
+                write(label.toByteArray())
+            }
+            write(0)
+        }
+
+        fun u16(wire: ByteArray, offset: Int) =
+            (wire[offset].toInt() and 0xFF shl 8) or (wire[offset + 1].toInt() and 0xFF)
+        fun u32(wire: ByteArray, offset: Int) = u16(wire, offset).toLong() shl 16 or u16(wire, offset + 2).toLong()
+
+        fun query(id: Int, name: String, edns: Boolean = false, type: Int = TYPE_A) = ByteArrayOutputStream().run {
+            u16(id).u16(0x0100).u16(1).u16(0).u16(0).u16(if (edns) 1 else 0)
+            name(name).u16(type).u16(1)
+            if (edns) opt()
+            toByteArray()
+        }
+    }
+
+    /**
+     * Stands in for the upstream resolver: answers every query with [respond] and records the queries it got.
+     */
+    private class Upstream(val respond: ByteArrayOutputStream.() -> Triple<Int, Int, Int>) {
+        val queries = mutableListOf<ByteArray>()
+
+        suspend operator fun invoke(query: ByteArray): ByteArray {
+            queries += query
+            var questionEnd = 12
+            while (query[questionEnd].toInt() != 0) questionEnd += query[questionEnd] + 1
+            questionEnd += 5
+            val records = ByteArrayOutputStream()
+            val (rcode, answers, authorities) = records.respond()
+            val edns = u16(query, 10) > 0
+            return ByteArrayOutputStream().apply {
+                write(query, 0, 2)
+                u16(0x8180 or rcode).u16(1).u16(answers).u16(authorities).u16(if (edns) 1 else 0)
+                write(query, 12, questionEnd - 12)
+                write(records.toByteArray())
+                // like a real resolver, only answer with an OPT record when the query had one (RFC 6891 7)
+                if (edns) opt()
+            }.toByteArray()
+        }
+    }
+
+    private var now = 1_000_000L
+    private val cache = DnsCache { now }
+
+    private fun ByteArrayOutputStream.a(ttl: Long) = u16(0xC00C).u16(TYPE_A).u16(1).u32(ttl).u16(4).apply {
+        write(byteArrayOf(93, 184, 216.toByte(), 34))
+    }
+    private fun ByteArrayOutputStream.soa(ttl: Long, minimum: Long) = apply {
+        write(0)
+        u16(TYPE_SOA).u16(1).u32(ttl).u16(22)
+        write(0)    // MNAME and RNAME at the root
+        write(0)
+        u32(2024010101).u32(7200).u32(3600).u32(1209600).u32(minimum)
+    }
+
+    private fun resolve(query: ByteArray, upstream: Upstream) = runBlocking {
+        cache.resolve(NETWORK, query, false) { upstream(it) }
+    }
+
+    /**
+     * TTL of the [index]th A record in a response about example.com.
+     */
+    private fun answerTtl(response: ByteArray, index: Int = 0) = u32(response, QUESTION_END + index * 16 + 6)
+
+    @Test
+    fun ttlsCountDownUntilExpiry() {
+        val upstream = Upstream { a(300).a(600).let { Triple(0, 2, 0) } }
+        assertEquals(300, answerTtl(resolve(query(1, "example.com"), upstream)))
+        now += 100_000
+        val cached = resolve(query(2, "example.com"), upstream)
+        assertEquals(1, upstream.queries.size)
+        assertEquals(200, answerTtl(cached))
+        assertEquals(500, answerTtl(cached, 1))
+        now += 200_000
+        resolve(query(3, "example.com"), upstream)
+        assertEquals(2, upstream.queries.size)
+    }
+
+    @Test
+    fun negativeAnswersUseTheSoaMinimum() {
+        val upstream = Upstream { soa(3600, 60).let { Triple(3, 0, 1) } }
+        resolve(query(1, "nx.example.com"), upstream)
+        now += 59_000
+        val cached = resolve(query(2, "nx.example.com"), upstream)
+        assertEquals(1, upstream.queries.size)
+        assertEquals(3, u16(cached, 2) and 0xF)
+        now += 2_000
+        resolve(query(3, "nx.example.com"), upstream)
+        assertEquals(2, upstream.queries.size)
+        // no data without an SOA record cannot be cached
+        val noSoa = Upstream { Triple(0, 0, 0) }
+        resolve(query(4, "nodata.example.com"), noSoa)
+        resolve(query(5, "nodata.example.com"), noSoa)
+        assertEquals(2, noSoa.queries.size)
+    }
+
+    @Test
+    fun cachedAnswersTakeTheIdAndQuestionOfTheQuery() {
+        val upstream = Upstream { a(300).let { Triple(0, 1, 0) } }
+        val first = resolve(query(0x1234, "example.com"), upstream)
+        val query = query(0xBEEF, "ExAmPlE.cOm")
+        val cached = resolve(query, upstream)
+        assertEquals(1, upstream.queries.size)
+        assertEquals(0xBEEF, u16(cached, 0))
+        assertArrayEquals(query.copyOfRange(12, QUESTION_END), cached.copyOfRange(12, QUESTION_END))
+        assertArrayEquals(first.copyOfRange(2, 12), cached.copyOfRange(2, 12))
+        assertArrayEquals(first.copyOfRange(QUESTION_END, first.size), cached.copyOfRange(QUESTION_END, cached.size))
+    }
+
+    @Test
+    fun queriesWithAndWithoutEdnsAreCachedSeparately() {
+        val upstream = Upstream { a(300).let { Triple(0, 1, 0) } }
+        val edns = resolve(query(1, "example.com", edns = true), upstream)
+        assertEquals(1, u16(edns, 10))
+        val plain = resolve(query(2, "example.com"), upstream)
+        assertEquals(2, upstream.queries.size)
+        assertEquals(0, u16(plain, 10))
+        assertEquals(0, u16(resolve(query(3, "example.com"), upstream), 10))
+        assertEquals(1, u16(resolve(query(4, "example.com", edns = true), upstream), 10))
+        assertEquals(2, upstream.queries.size)
+    }
+}
@@ -0,0 +1,71 @@
+package be.mygod.vpnhotspot.util
+
+import org.junit.Assert.assertArrayEquals
+import org.junit.Assert.assertEquals
+import org.junit.Assert.assertNull
+import org.junit.Assert.fail
+import org.junit.Test
+
+class HttpMessageReaderTest {
+    private fun reader(vararg parts: String) =
+        HttpMessageReader(parts.joinToString("").toByteArray(Charsets.UTF_8).inputStream(), maxBodySize = 64)
+
+    private fun HttpMessageReader.headers(): Map<String, String> = generateSequence { readLine() }
+        .takeWhile { it.isNotEmpty() }
+        .associate { it.substringBefore(':').trim().lowercase() to it.substringAfter(':').trim() }
+
+    private fun assertRejected(statusCode: Int, vararg parts: String) {
+        val reader = reader(*parts)
+        reader.readLine()
+        try {
+            reader.readBody(reader.headers())
+            fail("Expected $statusCode")
+        } catch (e: HttpMessageReader.HttpException) {
+            assertEquals(statusCode, e.statusCode)
+        }
+    }
+
+    @Test
+    fun contentLengthCountsBytes() {
+        val body = "{\"name\":\"热点\"}"
+        val length = body.toByteArray(Charsets.UTF_8).size
+        val reader = reader("POST /api/wifi/start HTTP/1.1\r\nContent-Length: $length\r\n\r\n", body,
+            "GET /api/status HTTP/1.1\r\n\r\n")
+        assertEquals("POST /api/wifi/start HTTP/1.1", reader.readLine())
+        assertArrayEquals(body.toByteArray(Charsets.UTF_8), reader.readBody(reader.headers()))
+        // the next request on the keep-alive connection starts right after the body
+        assertEquals("GET /api/status HTTP/1.1", reader.readLine())
+        assertNull(reader.readBody(reader.headers()))
+        assertNull(reader.readLine())
+    }
+
+    @Test
+    fun chunkedBodyIsDecoded() {
+        val reader = reader("POST /api/batch HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n",
+            "4;ext=1\r\nWiki\r\n4\r\n 热\r\n0\r\nX-Trailer: 1\r\n\r\n", "GET / HTTP/1.1\r\n\r\n")
+        reader.readLine()
+        assertEquals("Wiki 热", reader.readBody(reader.headers())!!.toString(Charsets.UTF_8))
+        assertEquals("GET / HTTP/1.1", reader.readLine())
+    }
+
+    @Test
+    fun unreadableBodiesAreRejected() {
+        assertRejected(501, "POST / HTTP/1.1\r\nTransfer-Encoding: gzip, chunked\r\n\r\n")
+        assertRejected(400, "POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\nContent-Length: 3\r\n\r\nabc")
+        assertRejected(400, "POST / HTTP/1.1\r\nContent-Length: -1\r\n\r\n")
+        assertRejected(413, "POST / HTTP/1.1\r\nContent-Length: 65\r\n\r\n")
+        assertRejected(413, "POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n41\r\n")
+        assertRejected(400, "POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\nshort")
+        assertRejected(400, "POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabcd\r\n0\r\n\r\n")
+        assertRejected(400, "POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nzz\r\n")
+    }
+
+    @Test
+    fun linesEndWithCrlfOrLf() {
+        val reader = reader("a\r\nb\nc")
+        assertEquals("a", reader.readLine())
+        assertEquals("b", reader.readLine())
+        assertEquals("c", reader.readLine())
+        assertNull(reader.readLine())
+    }
+}
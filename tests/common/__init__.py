@@ -0,0 +1,8 @@
+"""
+VPNHotspot测试套件的共享工具模块
+
+unit/、integration/、device/ 下的脚本通过把 tests/ 加入 sys.path 来引用本包：
+
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from common.adb import run_adb_command
+"""
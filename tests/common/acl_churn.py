@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+客户端ACL的上下线回放基准
+
+Routing 原先为每个客户端在 vpnhotspot_acl 中插入两条ACCEPT规则（-i -s 与 -o -d），链随客户端数线性增长，
+每个转发的包都要逐条匹配，每次邻居变化都要取出并写回整张filter表。ClientAcl.IpSet 改为每个下游两条规则
+匹配两个 hash:ip 集合（按方向各一个，成员计数器供 TrafficRecorder 使用），客户端上下线只执行 `ipset restore`；
+没有 ipset 或内核不支持 set 匹配时（iptables -C 探测没有报告规则不存在）回退到逐条规则。
+
+这里提供：
+- LiveTransaction / Routing：RootSession.Transaction 与 Routing 中 forward()、ClientAcl、onIpNeighbourAvailable、
+  revert() 的移植，命令直接在 routing_trace.FakeRootShell 上执行（探测结果决定使用哪种后端）
+- replay()：把 `ip neigh monitor` 输出按 IpNeighbourMonitor 的语义逐行更新邻居表并回调，统计两种后端的
+  root shell往返次数、进程数、xtables锁的获取次数与持有时间、vpnhotspot_acl 链长，以及每个包平均匹配的规则数；
+  定期检查两种后端放行的客户端与 Routing 的客户端列表一致，结束时检查 `ipset save` 的计数器行与关闭后复原
+- parse_save()：TrafficRecorder 解析 `ipset save` 的移植
+
+语料默认用 ip_neigh.synthetic() 生成单个下游上频繁上下线的输出，也可以读取采集的 `ip neigh monitor` 输出。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.acl_churn --clients 150 --lines 5000
+    python3 -m common.acl_churn --file data/ip_neigh/monitor.txt --downstream wlan1
+    ip neigh monitor | python3 -m common.acl_churn --file - --json acl_churn.json
+"""
+
+import argparse
+import ipaddress
+import json
+import re
+import sys
+
+from common.histogram import LatencyHistogram
+from common.ip_neigh import parse, synthetic
+from common.results import record_metric
+from common.routing_trace import IPTABLES, CostModel, FakeRootShell, IptablesBatch
+
+IPSET = 'ipset'
+RULE_MISSING = 'does a matching rule exist in that chain?'
+SET_PREFIX = 'vpnhotspot_'
+SENT_PREFIX = f'{SET_PREFIX}src_'
+RECEIVED_PREFIX = f'{SET_PREFIX}dst_'
+SAVE_COMMAND = f'{IPSET} save'
+BACKENDS = ('rules', 'ipset')
+
+
+class LiveTransaction:
+    """RootSession.Transaction：命令立即执行，撤销命令逆序登记"""
+
+    def __init__(self, shell):
+        self.shell = shell
+        self.reverts = []
+
+    def exec(self, command, revert=None):
+        if revert is not None:
+            self.reverts.insert(0, revert)
+        return self.shell.exec(command)
+
+    def revert(self):
+        for command in self.reverts:
+            self.shell.exec(command)
+        self.reverts = []
+
+
+# ClientAcl
+
+class RulesAcl:
+    """ClientAcl.Rules"""
+
+    name = 'rules'
+
+    def __init__(self, downstream, batched=True):
+        self.downstream = downstream
+        self.batched = batched
+
+    def allow(self, transaction, address):
+        batch = IptablesBatch(self.batched)
+        batch.insert(f'vpnhotspot_acl -i {self.downstream} -s {address} -j ACCEPT')
+        batch.insert(f'vpnhotspot_acl -o {self.downstream} -d {address} -j ACCEPT')
+        batch.apply_to(transaction)
+
+    def close(self, shell):
+        pass
+
+
+def set_match_works(exit_code, err):
+    """
+    ClientAcl.setMatchWorks：-C 返回1且提示不存在匹配的规则时set匹配可用；缺少集合或用户态扩展时返回2，
+    内核没有 xt_set 时同样返回1，但提示 No chain/target/match by that name
+    """
+    return exit_code == 1 and RULE_MISSING in err
+
+
+class IpSetAcl:
+    """ClientAcl.IpSet"""
+
+    name = 'ipset'
+
+    def __init__(self, downstream):
+        self.downstream = downstream
+        self.sent = f'{SENT_PREFIX}{downstream}'
+        self.received = f'{RECEIVED_PREFIX}{downstream}'
+        self.destroy = f'{IPSET} destroy {self.sent} 2>/dev/null\n{IPSET} destroy {self.received} 2>/dev/null'
+
+        self.probe = '\n'.join(f'{IPSET} -exist create {name} hash:ip family inet counters\n{IPSET} flush {name}'
+                               for name in (self.sent, self.received))
+        self.probe += f'\n{IPTABLES} -C FORWARD -m set --match-set {self.sent} src -j ACCEPT'
+
+    def setup(self, transaction, rules):
+        exit_code, _, err = transaction.exec(self.probe)
+        if not set_match_works(exit_code, err):
+            transaction.exec(self.destroy)
+            return False
+        rules.add(f'vpnhotspot_acl -i {self.downstream} -m set --match-set {self.sent} src -j ACCEPT')
+        rules.add(f'vpnhotspot_acl -o {self.downstream} -m set --match-set {self.received} dst -j ACCEPT')
+        return True
+
+    def restore(self, operation, address):
+        return (f"printf '%s\\n' '{operation} {self.sent} {address}' '{operation} {self.received} {address}' | "
+                f"{IPSET} -exist restore")
+
+    def allow(self, transaction, address):
+        transaction.exec(self.restore('add', address), self.restore('del', address))
+
+    def close(self, shell):
+        shell.exec(self.destroy)
+
+
+def client_acl(transaction, rules, downstream, backend='ipset', batched=True):
+    """ClientAcl.setup：backend为 'rules' 时相当于关闭了设置"""
+    if backend == 'ipset':
+        acl = IpSetAcl(downstream)
+        if acl.setup(transaction, rules):
+            return acl
+    return RulesAcl(downstream, batched)
+
+
+class Routing:
+    """Routing 中与客户端ACL有关的部分：forward()、Client 与 onIpNeighbourAvailable"""
+
+    def __init__(self, shell, downstream='wlan1', backend='ipset', batched=True):
+        self.shell = shell
+        self.downstream = downstream
+        self.transaction = LiveTransaction(shell)
+        rules = IptablesBatch(batched)
+        rules.new_chain('vpnhotspot_fwd')
+        rules.new_chain('vpnhotspot_acl')
+        rules.insert('FORWARD -j vpnhotspot_fwd')
+        rules.insert(f'vpnhotspot_fwd -i {downstream} -j vpnhotspot_acl')
+        rules.insert(f'vpnhotspot_fwd -o {downstream} -m state --state ESTABLISHED,RELATED -j vpnhotspot_acl')
+        rules.add(f'vpnhotspot_fwd -i {downstream} ! -o {downstream} -j REJECT')
+        self.acl = client_acl(self.transaction, rules, downstream, backend, batched)
+        rules.apply_to(self.transaction)
+        self.clients = {}
+
+    def on_neighbours(self, neighbours):
+        """onIpNeighbourAvailable，返回 (上线数, 下线数)"""
+        wanted = {neighbour.ip for neighbour in neighbours
+                  if neighbour.dev == self.downstream and ipaddress.ip_address(neighbour.ip).version == 4}
+        added = removed = 0
+        for ip in sorted(wanted - self.clients.keys()):
+            client = LiveTransaction(self.shell)
+            self.acl.allow(client, ip)
+            self.clients[ip] = client
+            added += 1
+        for ip in sorted(self.clients.keys() - wanted):
+            self.clients.pop(ip).revert()
+            removed += 1
+        return added, removed
+
+    def revert(self):
+        self.transaction.revert()
+        for client in self.clients.values():
+            client.revert()
+        self.clients = {}
+        self.acl.close(self.shell)
+
+
+# 包的匹配
+
+_SET_MATCH = re.compile(r'^(-i|-o) (\S+) -m set --match-set (\S+) (src|dst) -j ACCEPT$')
+_ADDRESS_MATCH = re.compile(r'^(-i|-o) (\S+) (-s|-d) (\S+) -j ACCEPT$')
+
+
+class AclIndex:
+    """
+    vpnhotspot_acl 当前规则的索引：客户端 address 发出（'-i'）或收到（'-o'）的包
+    在匹配到ACCEPT前检查的规则数，与逐条匹配的结果相同
+    """
+
+    def __init__(self, shell, downstream):
+        self.rules = shell.table(IPTABLES, 'filter').chains.get('vpnhotspot_acl', [])
+        self.first = {}
+        self.sets = []
+        for index, rule in enumerate(self.rules, 1):
+            match = _SET_MATCH.match(rule)
+            if match and match.group(2) == downstream:
+                self.sets.append((index, match.group(1), shell.sets.get(match.group(3), ())))
+                continue
+            match = _ADDRESS_MATCH.match(rule)
+            if match and match.group(2) == downstream:
+                self.first.setdefault((match.group(1), match.group(4)), index)
+
+    def evaluations(self, address, direction):
+        """未放行时为None"""
+        found = self.first.get((direction, address))
+        for index, set_direction, members in self.sets:
+            if found is not None and index > found:
+                break
+            if set_direction == direction and address in members:
+                return index
+        return found
+
+
+def parse_save(text):
+    """TrafficRecorder 解析 `ipset save`：{(ip, 下游接口): [sentPackets, sentBytes, receivedPackets, receivedBytes]}"""
+    counters = {}
+    for line in text.split('\n'):
+        if not line.startswith(f'add {SET_PREFIX}'):
+            continue
+        columns = line.split()
+        if len(columns) < 7 or columns[3] != 'packets' or columns[5] != 'bytes':
+            continue
+        is_receive = columns[1].startswith(RECEIVED_PREFIX)
+        prefix = RECEIVED_PREFIX if is_receive else SENT_PREFIX
+        if not columns[1].startswith(prefix):
+            continue
+        record = counters.setdefault((columns[2], columns[1][len(prefix):]), [-1, -1, -1, -1])
+        offset = 2 if is_receive else 0
+        if record[offset] == -1 and record[offset + 1] == -1:
+            record[offset:offset + 2] = int(columns[4]), int(columns[6])
+    return counters
+
+
+# 回放
+
+def replay(lines, backend='ipset', downstream='wlan1', costs=None, system_rules=100, ipset=True, check_every=100,
+           xt_set=True):
+    """按 IpNeighbourMonitor.processLine 的语义逐行更新邻居表，每次变化都回调 Routing"""
+    shell = FakeRootShell(costs, system_rules, ipset=ipset, xt_set=xt_set)
+    baseline = shell.snapshot()
+    routing = Routing(shell, downstream, backend)
+    neighbours = {}
+    seen = set()
+    callbacks = joins = leaves = mismatches = 0
+    chain = LatencyHistogram()
+    per_packet = LatencyHistogram()
+    change = LatencyHistogram()
+    counters = (shell.now, shell.round_trips, shell.processes, len(shell.holds))
+    for line in lines:
+        old = dict(neighbours)
+        for neighbour in parse(line):
+            key = neighbour.ip, neighbour.dev
+            if neighbour.state == 'DELETING':
+                neighbours.pop(key, None)
+            else:
+                neighbours[key] = neighbour
+        if neighbours == old:
+            continue
+        callbacks += 1
+        start = shell.now
+        added, removed = routing.on_neighbours(list(neighbours.values()))
+        if added or removed:
+            change.record((shell.now - start) * 1000)
+        joins += added
+        leaves += removed
+        seen.update(routing.clients)
+        index = AclIndex(shell, downstream)
+        chain.record(len(index.rules))
+        for ip in routing.clients:
+            for direction in ('-i', '-o'):
+                per_packet.record(index.evaluations(ip, direction) or len(index.rules))
+        if callbacks % check_every == 0:
+            mismatches += _mismatches(shell, routing, seen)
+    mismatches += _mismatches(shell, routing, seen)
+    duration = shell.now - counters[0]
+    round_trips, processes = shell.round_trips - counters[1], shell.processes - counters[2]
+    holds = shell.holds[counters[3]:]
+    saved = parse_save(shell.exec(SAVE_COMMAND)[1]) if routing.acl.name == 'ipset' else None
+    counted = sorted(ip for ip, dev in saved) if saved is not None else None
+    active = sorted(routing.clients)
+    routing.revert()
+    return {
+        'backend': routing.acl.name,
+        'requested': backend,
+        'callbacks': callbacks,
+        'joins': joins,
+        'leaves': leaves,
+        'ms': round(duration, 2),
+        'round_trips': round_trips,
+        'processes': processes,
+        'lock_acquisitions': len(holds),
+        'lock_held_ms': round(sum(hold for _, hold in holds), 2),
+        'change_us': change.summary(),
+        'chain_length': chain.summary(),
+        'rules_per_packet': per_packet.summary(),
+        'mismatches': mismatches,
+        'counted_clients': counted == active if counted is not None else None,
+        'restored': shell.snapshot() == baseline,
+        '_change': change,
+    }
+
+
+def _mismatches(shell, routing, seen):
+    """放行的客户端（两个方向都能匹配ACCEPT）与 Routing 的客户端列表不同的地址数"""
+    index = AclIndex(shell, routing.downstream)
+    allowed = {ip for ip in seen
+               if index.evaluations(ip, '-i') is not None and index.evaluations(ip, '-o') is not None}
+    return len(allowed ^ set(routing.clients))
+
+
+def compare(lines, downstream='wlan1', costs=None, system_rules=100, ipset=True, check_every=100, xt_set=True):
+    report = {'lines': len(lines), 'downstream': downstream, 'costs': (costs or CostModel()).to_dict(),
+              'system_rules': system_rules, 'backends': {}, 'problems': []}
+    for backend in BACKENDS:
+        result = replay(lines, backend, downstream, costs, system_rules, ipset, check_every, xt_set)
+        report['backends'][backend] = result
+        if result['mismatches']:
+            report['problems'].append(f"{backend}: {result['mismatches']} 个地址的放行状态与客户端列表不一致")
+        if result['counted_clients'] is False:
+            report['problems'].append(f'{backend}: ipset save 的计数器与客户端列表不一致')
+        if not result['restored']:
+            report['problems'].append(f'{backend}: 关闭后没有恢复到开启前的状态')
+    rules, sets = report['backends']['rules'], report['backends']['ipset']
+    if (rules['joins'], rules['leaves']) != (sets['joins'], sets['leaves']):
+        report['problems'].append('两种后端的上下线次数不同')
+    report['speedup'] = round(rules['ms'] / max(sets['ms'], 1e-9), 2)
+    return report
+
+
+def print_report(report):
+    print(f"👥 {report['lines']} 行邻居变化，下游 {report['downstream']}，已有规则 {report['system_rules']} 条")
+    for backend, result in report['backends'].items():
+        label = backend if result['backend'] == backend else f"{backend}（回退到 {result['backend']}）"
+        print(f"   {label}: 上线 {result['joins']} 次 / 下线 {result['leaves']} 次，共 {result['ms']}ms，"
+              f"往返 {result['round_trips']} 次，进程 {result['processes']} 个，"
+              f"持锁 {result['lock_acquisitions']} 次共 {result['lock_held_ms']}ms")
+        print(f"      每次变化 p50={result['change_us']['p50'] / 1000:.2f}ms p99={result['change_us']['p99'] / 1000:.2f}ms  "
+              f"链长 平均 {result['chain_length']['mean']:.1f} 最大 {result['chain_length']['max']}  "
+              f"每个包匹配规则 平均 {result['rules_per_packet']['mean']:.1f} 最大 {result['rules_per_packet']['max']}")
+    print(f"📈 ipset 快 {report['speedup']}x")
+    for problem in report['problems']:
+        print(f"❌ {problem}")
+    if not report['problems']:
+        print("✅ 两种后端放行的客户端一致，关闭后恢复原状")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='客户端ACL的上下线回放基准')
+    parser.add_argument('--file', default=None, help="`ip neigh monitor` 输出（'-' 为标准输入），默认生成")
+    parser.add_argument('--clients', type=int, default=150, help='生成语料的客户端数')
+    parser.add_argument('--lines', type=int, default=5000, help='生成语料的行数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--downstream', default='wlan1')
+    parser.add_argument('--system-rules', type=int, default=100, help='已有规则数（影响每次取出整张表的开销）')
+    parser.add_argument('--no-ipset', action='store_true', help='模拟没有 ipset 的设备（应回退到逐条规则）')
+    parser.add_argument('--no-xt-set', action='store_true', help='模拟有 ipset 但内核没有 xt_set 的设备（应回退到逐条规则）')
+    parser.add_argument('--check-every', type=int, default=100, help='每隔多少次回调检查一次放行状态')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    if args.file == '-':
+        lines = sys.stdin.read().splitlines()
+    elif args.file:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            lines = [line.rstrip('\n') for line in f if not line.startswith('#')]
+    else:
+        lines = synthetic(args.lines, args.clients, args.seed, ifaces=(args.downstream,))
+    report = compare(lines, args.downstream, system_rules=args.system_rules, ipset=not args.no_ipset,
+                     check_every=args.check_every, xt_set=not args.no_xt_set)
+    print_report(report)
+    for backend, result in report['backends'].items():
+        record_metric(f'acl churn {backend} change', histogram=result['_change'].values(), unit='us')
+        record_metric(f'acl churn {backend} rules per packet', value=result['rules_per_packet']['mean'],
+                      unit='count')
+    if args.json:
+        output = dict(report, backends={backend: {key: value for key, value in result.items()
+                                                  if not key.startswith('_')}
+                                        for backend, result in report['backends'].items()})
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 0 if not report['problems'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
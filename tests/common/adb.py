@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+共享ADB会话层
+
+直接通过adb server的套接字协议（默认 127.0.0.1:5037）与设备通信，
+避免每条命令都fork一个新的 `adb` 进程并重新握手：
+
+- AdbClient: 单次的host服务（host:devices 等）与单次shell服务
+- ShellSession: 长连接的 `shell:sh` 会话，支持流水线批量执行
+- run_adb_command: 与各测试脚本原有的同名函数签名兼容，
+  无法连接adb server时回退到 subprocess 调用 `adb`
+"""
+
+import os
+import shlex
+import socket
+import subprocess
+import threading
+import uuid
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5037
+DEFAULT_TIMEOUT = 30
+
+# 命令结束标记前缀，使用ASCII记录分隔符避免与普通输出冲突
+_MARKER_PREFIX = '\x1e'
+
+
+class AdbError(Exception):
+    """ADB协议或会话错误"""
+
+
+class CommandInterrupted(AdbError):
+    """命令已写入会话后会话出错：命令可能已经在设备上执行，不能重试"""
+
+
+def server_address():
+    """按adb自身的环境变量约定解析server地址"""
+    socket_spec = os.environ.get('ADB_SERVER_SOCKET', '')
+    if socket_spec.startswith('tcp:'):
+        host, _, port = socket_spec[4:].rpartition(':')
+        return host or DEFAULT_HOST, int(port)
+    host = os.environ.get('ANDROID_ADB_SERVER_ADDRESS', DEFAULT_HOST)
+    port = int(os.environ.get('ANDROID_ADB_SERVER_PORT', DEFAULT_PORT))
+    return host, port
+
+
+def _encode_request(payload):
+    data = payload.encode('utf-8')
+    return b'%04x' % len(data) + data
+
+
+def _recv_exact(sock, size):
+    buf = b''
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise AdbError('adb server closed connection')
+        buf += chunk
+    return buf
+
+
+def _read_status(sock):
+    """读取 OKAY/FAIL 状态，FAIL时抛出带错误信息的AdbError"""
+    status = _recv_exact(sock, 4)
+    if status == b'OKAY':
+        return
+    if status == b'FAIL':
+        length = int(_recv_exact(sock, 4), 16)
+        raise AdbError(_recv_exact(sock, length).decode('utf-8', 'replace'))
+    raise AdbError(f'unexpected adb status: {status!r}')
+
+
+def _recv_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+class AdbClient:
+    """adb server客户端，每个服务请求使用一条独立的套接字"""
+
+    def __init__(self, serial=None, host=None, port=None, timeout=DEFAULT_TIMEOUT):
+        default_host, default_port = server_address()
+        self.serial = serial if serial is not None else os.environ.get('ANDROID_SERIAL')
+        self.host = host or default_host
+        self.port = port or default_port
+        self.timeout = timeout
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def host_command(self, request):
+        """执行带长度前缀响应的host服务，例如 host:version、host:devices"""
+        with self._connect() as sock:
+            sock.sendall(_encode_request(request))
+            _read_status(sock)
+            length = int(_recv_exact(sock, 4), 16)
+            return _recv_exact(sock, length).decode('utf-8', 'replace')
+
+    def version(self):
+        return int(self.host_command('host:version'), 16)
+
+    def devices(self):
+        """返回 [(serial, state), ...]"""
+        result = []
+        for line in self.host_command('host:devices').splitlines():
+            serial, _, state = line.partition('\t')
+            if serial:
+                result.append((serial, state.strip()))
+        return result
+
+    def open_service(self, service):
+        """切换到目标设备并打开设备端服务，返回已就绪的套接字"""
+        sock = self._connect()
+        try:
+            transport = f'host:transport:{self.serial}' if self.serial else 'host:transport-any'
+            sock.sendall(_encode_request(transport))
+            _read_status(sock)
+            sock.sendall(_encode_request(service))
+            _read_status(sock)
+            return sock
+        except BaseException:
+            sock.close()
+            raise
+
+    def shell(self, command):
+        """单次shell服务（不fork本地进程），返回合并后的输出"""
+        with self.open_service(f'shell:{command}') as sock:
+            return _recv_all(sock).decode('utf-8', 'replace')
+
+    def exec_out(self, command):
+        """与 `adb exec-out` 相同：不分配pty的原始输出，适合传输二进制文件"""
+        with self.open_service(f'exec:{command}') as sock:
+            return _recv_all(sock)
+
+
+class ShellSession:
+    """
+    长连接shell会话
+
+    所有命令写入同一个 `sh` 进程的标准输入，每条命令后追加唯一结束标记和退出码。
+    命令的stdin重定向到 /dev/null，stderr合并到输出中。
+    """
+
+    def __init__(self, client=None, shell='sh'):
+        self.client = client or AdbClient()
+        self._shell = shell
+        self._sock = None
+        self._buffer = b''
+        self._token = uuid.uuid4().hex
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._sock is not None
+
+    def open(self):
+        if self._sock is None:
+            self._sock = self.client.open_service(f'shell:{self._shell}')
+            self._buffer = b''
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._buffer = b''
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _frame(self, command):
+        self._seq += 1
+        marker = f'{_MARKER_PREFIX}{self._token}:{self._seq}:'
+        script = f"{{ {command}\n}} </dev/null 2>&1; printf '{marker}%d\\n' $?\n"
+        return script.encode('utf-8'), marker.encode('utf-8')
+
+    def _read_result(self, marker, timeout):
+        self._sock.settimeout(timeout)
+        while True:
+            index = self._buffer.find(marker)
+            if index >= 0:
+                end = self._buffer.find(b'\n', index + len(marker))
+                if end >= 0:
+                    output = self._buffer[:index]
+                    code = int(self._buffer[index + len(marker):end])
+                    self._buffer = self._buffer[end + 1:]
+                    return code, output.decode('utf-8', 'replace')
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise AdbError('shell session closed by device')
+            self._buffer += chunk
+
+    def run_many(self, commands, timeout=DEFAULT_TIMEOUT):
+        """
+        流水线执行：一次写入全部命令后按顺序读取结果，
+        返回 [(exit_code, output), ...]
+        """
+        with self._lock:
+            self.open()
+            frames = [self._frame(command) for command in commands]
+            try:
+                self._sock.settimeout(timeout)
+                self._sock.sendall(b''.join(script for script, _ in frames))
+                return [self._read_result(marker, timeout) for _, marker in frames]
+            except socket.timeout:
+                self.close()
+                raise
+            except (OSError, AdbError) as e:
+                # 会话状态已不可知（残留输出会错位），丢弃后由下次调用重建
+                self.close()
+                raise CommandInterrupted(f'shell session failed after sending the command: {e}') from e
+
+    def run(self, command, timeout=DEFAULT_TIMEOUT):
+        """执行单条命令，返回 (exit_code, output)"""
+        return self.run_many([command], timeout)[0]
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(serial=None):
+    """获取（必要时创建）指定设备的共享会话"""
+    client = AdbClient(serial)
+    key = (client.host, client.port, client.serial)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = ShellSession(client)
+        return session
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _run_subprocess(command, timeout, serial):
+    """回退路径：调用本地adb可执行文件"""
+    args = ['adb'] + (['-s', serial] if serial else []) + list(command)
+    try:
+        result = subprocess.run(args, capture_output=True, text=True, timeout=timeout)
+        return result.returncode == 0, result.stdout, result.stderr
+    except subprocess.TimeoutExpired:
+        return False, "", "Command timeout"
+    except Exception as e:
+        return False, "", str(e)
+
+
+def _to_shell_command(command):
+    """
+    把 `adb <args>` 形式的参数列表转换为会话中执行的shell命令，无法转换时返回None
+
+    与adb客户端行为保持一致：`shell` 的参数按空格直接拼接（保留管道等元字符），
+    `logcat` 的参数会逐个转义。持续输出的logcat不适合会话模式。
+    """
+    if not command:
+        return None
+    name, args = command[0], list(command[1:])
+    if name == 'shell' and args:
+        return ' '.join(args)
+    if name == 'logcat' and any(flag in args for flag in ('-d', '-c', '-g')):
+        return ' '.join(['logcat'] + [shlex.quote(arg) for arg in args])
+    return None
+
+
+def run_adb_command(command, timeout=DEFAULT_TIMEOUT, serial=None):
+    """
+    执行ADB命令，返回 (success, stdout, stderr)
+
+    shell与一次性logcat命令经由共享会话执行（stderr合并在stdout中，失败时同时放入stderr），
+    `devices` 直接查询adb server，其余命令以及server不可达时回退到subprocess。
+    命令写入会话后才出错时直接返回失败而不回退，避免非幂等的命令（如 `svc wifi disable`）执行两次。
+    """
+    command = list(command)
+    try:
+        if command == ['devices']:
+            lines = ['List of devices attached']
+            lines += [f'{s}\t{state}' for s, state in AdbClient(serial).devices()]
+            return True, '\n'.join(lines) + '\n\n', ''
+        shell_command = _to_shell_command(command)
+        if shell_command is not None:
+            code, output = get_session(serial).run(shell_command, timeout)
+            return code == 0, output, '' if code == 0 else output
+    except socket.timeout:
+        return False, "", "Command timeout"
+    except CommandInterrupted as e:
+        return False, "", str(e)
+    except (OSError, AdbError):
+        pass
+    return _run_subprocess(command, timeout, serial)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+/api/batch 批量调用
+
+远程控制流程依次请求 /api/status、/api/system/info、/api/wifi/start 与 /api/auth-status，
+在较慢的共享网络上每个请求都要付出一次完整的往返。OkHttpWebServer 的 /api/batch 接收
+{"requests": [{"path": ...}, ...]}，按顺序执行后在一个响应中返回
+{"success": true, "data": {"responses": [{"path", "status", "body"}, ...], "timestamp"}}；
+只读子请求共用同一个 getSystemStatus() 快照，单个批量最多16个子请求。
+
+BatchClient.call() 发送一个批量请求；服务器不支持（旧版本应用返回404）时自动退回逐个请求，
+两种情况下返回相同形式的结果。bench() 在同一服务器上比较每轮逐个请求（每请求新连接/持久连接）
+与批量请求的耗时和服务器处理的请求数。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.batch --profile slow-tether --rounds 20           # 本地替身
+    python3 -m common.batch --host 192.168.1.133 --api-key KEY --json batch.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import namedtuple
+
+from common.fake_webserver import FakeWebServer, Profile
+from common.fleet import DEFAULT_PORT, Device
+from common.histogram import LatencyHistogram
+from common.http_client import HttpSession
+from common.loadgen import DEFAULT_API_KEY
+from common.results import record_metric
+
+MAX_BATCH_REQUESTS = 16
+WORKFLOW = ('/api/status', '/api/system/info', '/api/wifi/start', '/api/auth-status')
+ACTIONS = ('/api/wifi/start', '/api/wifi/stop')
+
+SubResponse = namedtuple('SubResponse', 'path status body')
+
+
+class BatchError(Exception):
+    pass
+
+
+def _decode(data, content_type=''):
+    text = data.decode('utf-8', 'replace') if isinstance(data, bytes) else data
+    if content_type and 'json' not in content_type:
+        return text
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+class BatchClient:
+    """在 HttpSession 上发送批量请求；supported 为None表示还未探测服务器是否支持"""
+
+    def __init__(self, session, supported=None):
+        self.session = session
+        self.supported = supported
+        self.round_trips = 0
+
+    def call(self, paths, timeout=None):
+        """执行 paths 中的全部子请求，返回 [SubResponse]；失败时抛出 BatchError"""
+        paths = list(paths)
+        if self.supported is not False:
+            if len(paths) > MAX_BATCH_REQUESTS:
+                return [result for start in range(0, len(paths), MAX_BATCH_REQUESTS)
+                        for result in self.call(paths[start:start + MAX_BATCH_REQUESTS], timeout)]
+            body = json.dumps({'requests': [{'path': path} for path in paths]})
+            response = self.session.post('/api/batch', body, timeout=timeout,
+                                         headers={'Content-Type': 'application/json'})
+            self.round_trips += 1
+            if response.status == 404 and self.supported is None:
+                self.supported = False
+            elif response.status != 200:
+                raise BatchError(f'HTTP {response.status}: {response.text[:200]}')
+            else:
+                self.supported = True
+                try:
+                    return [SubResponse(item['path'], item['status'], item['body'])
+                            for item in response.json()['data']['responses']]
+                except (ValueError, KeyError, TypeError) as e:
+                    raise BatchError(f'Invalid batch response: {e}') from e
+        return self.sequential(paths, timeout)
+
+    def sequential(self, paths, timeout=None):
+        """逐个请求，wifi 控制用POST，其余用GET"""
+        results = []
+        for path in paths:
+            if path in ACTIONS:
+                response = self.session.post(path, timeout=timeout)
+            else:
+                response = self.session.get(path, timeout=timeout)
+            self.round_trips += 1
+            results.append(SubResponse(path, response.status,
+                                       _decode(response.body, response.headers.get('Content-Type', ''))))
+        return results
+
+
+def snapshot_consistent(results):
+    """/api/status 与 /api/system/info 是否来自同一个状态快照"""
+    fields = ('battery', 'batteryTemperature', 'cpuTemperature', 'cpu', 'wifiStatus')
+    data = [result.body['data'] for result in results
+            if result.path in ('/api/status', '/api/system/info') and result.status == 200]
+    return all(tuple(item[field] for field in fields) == tuple(data[0][field] for field in fields) for item in data)
+
+
+def run_mode(device, mode, paths, rounds, timeout=10.0):
+    """mode: 'close'（逐个请求、每请求新连接）、'keep-alive'（逐个请求、持久连接）或 'batch'"""
+    histogram = LatencyHistogram()
+    failures = 0
+    with HttpSession(device.ip, device.port, headers=device.headers(), keep_alive=mode != 'close',
+                     timeout=timeout) as session:
+        client = BatchClient(session, supported=None if mode == 'batch' else False)
+        for _ in range(rounds):
+            start = time.monotonic()
+            try:
+                results = client.call(paths)
+                failures += sum(result.status != 200 for result in results)
+            except (OSError, BatchError) as e:
+                failures += len(paths)
+                print(f"   ⚠️  {mode}: {e}")
+                continue
+            histogram.record((time.monotonic() - start) * 1e6)
+        return {
+            'mode': mode,
+            'rounds': rounds,
+            'round_trips': client.round_trips,
+            'connections': session.connections_opened,
+            'failures': failures,
+            'batch_supported': client.supported,
+            'round_us': histogram.summary() if histogram.total else None,
+            '_histogram': histogram,
+        }
+
+
+def bench(host=None, port=DEFAULT_PORT, api_key=DEFAULT_API_KEY, paths=WORKFLOW, rounds=20, profile='slow-tether'):
+    """依次运行三种方式；host为None时每种方式使用一个新的本地替身，额外统计服务器请求数与状态刷新次数"""
+    report = {'paths': list(paths), 'rounds': rounds, 'modes': {}}
+    for mode in ('close', 'keep-alive', 'batch'):
+        if host is None:
+            with FakeWebServer(profile=Profile.preset(profile, seed=1)) as server:
+                result = run_mode(Device('127.0.0.1', server.port, name='fake'), mode, paths, rounds)
+            result['server_requests'] = sum(server.responses.values())
+            result['status_refreshes'] = server.status_refreshes
+        else:
+            result = run_mode(Device(host, port, api_key), mode, paths, rounds)
+        report['modes'][mode] = result
+    baseline, batch = report['modes']['close']['round_us'], report['modes']['batch']['round_us']
+    if baseline and batch:
+        report['speedup'] = round(baseline['p50'] / max(1, batch['p50']), 2)
+    return report
+
+
+def print_report(report):
+    names = {'close': '逐个请求（每请求新连接）', 'keep-alive': '逐个请求（持久连接）', 'batch': '批量请求'}
+    print(f"📦 每轮 {len(report['paths'])} 个调用: {', '.join(report['paths'])}")
+    for mode, result in report['modes'].items():
+        latency = result['round_us'] or {}
+        server = f"，服务器处理 {result['server_requests']} 个请求" if 'server_requests' in result else ''
+        print(f"   {names[mode]}: 每轮 p50={latency.get('p50', 0) / 1000:.1f}ms "
+              f"p99={latency.get('p99', 0) / 1000:.1f}ms，往返 {result['round_trips']} 次，"
+              f"连接 {result['connections']} 个{server}，失败 {result['failures']} 个")
+    if report['modes']['batch']['batch_supported'] is False:
+        print("   ⚠️  服务器不支持 /api/batch，批量请求已退回逐个请求")
+    if 'speedup' in report:
+        print(f"📈 批量请求比每请求新连接快 {report['speedup']}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='/api/batch 批量调用对比')
+    parser.add_argument('--host', default=None, help='设备地址（默认使用本地替身）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--api-key', default=DEFAULT_API_KEY)
+    parser.add_argument('--paths', default=','.join(WORKFLOW), help='每轮调用的接口，逗号分隔')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--profile', choices=sorted(Profile.PRESETS), default='slow-tether',
+                        help='本地替身的延迟配置')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+    report = bench(args.host, args.port, args.api_key, paths, args.rounds, args.profile)
+    print_report(report)
+    for mode, result in report['modes'].items():
+        if result['_histogram'].total:
+            record_metric(f'api round {mode}', histogram=result['_histogram'].values(), unit='us')
+    if args.json:
+        output = dict(report, modes={mode: {key: value for key, value in result.items() if not key.startswith('_')}
+                                     for mode, result in report['modes'].items()})
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 0 if all(not result['failures'] for result in report['modes'].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
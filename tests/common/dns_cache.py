@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+"""
+DnsForwarder 应答缓存的负载基准
+
+DnsForwarder.resolve 原先把每个客户端的UDP报文与TCP查询都转发给上游（DnsResolverCompat.resolveRaw），
+几十个客户端反复查询相同的主机名时每次都要付出完整的上游延迟，而上游常常是很慢的VPN。DnsCache 按问题
+（名字不区分大小写、类型、类别）加 CD/DO 位与是否带EDNS缓存应答：正常应答保留应答段中最小的TTL，否定应答（NXDOMAIN
+或没有数据）保留权威段SOA的最小TTL（RFC 2308），超出条数或字节上限时淘汰最久未用的条目；同一个键并发的
+未命中只向上游查询一次，其余等待同一个结果；上游网络变化时清空。
+
+这里提供：
+- DnsCache：DnsCache.kt 的移植（命中的应答改写ID、RD位与问题中的名字，并按经过的时间递减TTL）
+- StandInUpstream：本地的替身上游（UDP与TCP），按名字给出A记录或NXDOMAIN，可设置延迟与TTL，统计收到的查询数
+- Forwarder：DnsForwarder 的替身，监听UDP与TCP，每个查询用单独的UDP套接字问上游，可以关闭缓存
+- generate()：负载生成器，concurrency 个客户端（按 tcp_ratio 分为TCP与UDP）按Zipf分布选名字并随机化名字的
+  大小写，检查每个应答的ID、问题、rcode、地址与TTL，统计延迟分布与每秒查询数
+- compare()：同样的负载分别在关闭与开启缓存时运行，报告命中率、上游查询数、p50/p99延迟与QPS
+
+用法（在 tests/ 目录下）：
+    python3 -m common.dns_cache --queries 20000 --concurrency 32 --latency-ms 30
+    python3 -m common.dns_cache --names 5000 --zipf 0.9 --tcp-ratio 0.5 --json dns_cache.json
+"""
+
+import argparse
+import asyncio
+import bisect
+import collections
+import itertools
+import json
+import random
+import struct
+import sys
+import time
+
+from common.histogram import LatencyHistogram
+from common.results import record_metric
+
+MAX_ENTRIES = 1024
+MAX_BYTES = 1 << 20
+MAX_TTL = 86400
+MAX_NEGATIVE_TTL = 900
+HEADER_SIZE = 12
+TYPE_A = 1
+TYPE_SOA = 6
+TYPE_OPT = 41
+CLASS_IN = 1
+RCODE_NOERROR = 0
+RCODE_SERVFAIL = 2
+RCODE_NXDOMAIN = 3
+UDP_SIZE = 512
+TCP_SIZE = 65535
+
+
+def _u16(wire, offset):
+    return wire[offset] << 8 | wire[offset + 1]
+
+
+def _u32(wire, offset):
+    return _u16(wire, offset) << 16 | _u16(wire, offset + 2)
+
+
+def _skip_name(wire, offset):
+    i = offset
+    while True:
+        length = wire[i]
+        if length == 0:
+            return i + 1
+        if length & 0xC0 == 0xC0:
+            return i + 2
+        if length & 0xC0:
+            raise IndexError(f'Unknown label type {length}')
+        i += length + 1
+
+
+Query = collections.namedtuple('Query', 'key question_end max_size')
+
+
+def parse_query(query, tcp):
+    """可缓存的查询（标准查询、一个问题），否则返回 None"""
+    try:
+        flags = _u16(query, 2)
+        if flags & 0xF800 or _u16(query, 4) != 1:
+            return None
+        labels = []
+        i = HEADER_SIZE
+        while True:
+            length = query[i]
+            if length == 0:
+                break
+            if length & 0xC0:
+                raise IndexError('Compressed question')
+            if i + length >= len(query):
+                raise IndexError('Truncated label')
+            labels.append(bytes(query[i + 1:i + 1 + length]).decode('latin-1').lower() + '.')
+            i += length + 1
+        question_end = i + 5
+        qtype, qclass = _u16(query, i + 1), _u16(query, i + 3)
+        max_size, dnssec_ok, edns = UDP_SIZE, 0, False
+        i = question_end
+        for _ in range(_u16(query, 6) + _u16(query, 8) + _u16(query, 10)):
+            i = _skip_name(query, i)
+            if _u16(query, i) == TYPE_OPT:
+                max_size = max(UDP_SIZE, _u16(query, i + 2))
+                dnssec_ok = _u16(query, i + 6) >> 15 & 1
+                edns = True
+            i += 10 + _u16(query, i + 8)
+        if question_end > len(query):
+            return None
+        key = (''.join(labels), qtype, qclass, flags & 0x0010 | dnssec_ok, edns)
+        return Query(key, question_end, TCP_SIZE if tcp else max_size)
+    except IndexError:
+        return None
+
+
+class Answer:
+    """上游的应答与其中各TTL字段的位置；ttl 为可以缓存的秒数，0 表示不缓存。格式错误时抛出 IndexError"""
+
+    def __init__(self, wire, stored):
+        self.wire = bytes(wire)
+        self.stored = stored
+        offsets = []
+        positive = negative = None
+        flags = _u16(wire, 2)
+        i = HEADER_SIZE
+        for _ in range(_u16(wire, 4)):
+            i = _skip_name(wire, i) + 4
+        answers, authorities = _u16(wire, 6), _u16(wire, 8)
+        for index in range(answers + authorities + _u16(wire, 10)):
+            i = _skip_name(wire, i)
+            rtype, ttl = _u16(wire, i), _u32(wire, i + 4)
+            end = i + 10 + _u16(wire, i + 8)
+            if rtype != TYPE_OPT:
+                offsets.append(i + 4)
+            if index < answers:
+                positive = ttl if positive is None else min(positive, ttl)
+            elif index < answers + authorities and rtype == TYPE_SOA:
+                minimum = min(ttl, _u32(wire, end - 4))
+                negative = minimum if negative is None else min(negative, minimum)
+            i = end
+        if i > len(wire):
+            raise IndexError('Truncated response')
+        self.ttl_offsets = offsets
+        self.ttls = [_u32(wire, offset) for offset in offsets]
+        rcode = flags & 0xF
+        if flags & 0x0200:      # 截断
+            self.ttl = 0
+        elif rcode == RCODE_NOERROR and answers:
+            self.ttl = min(positive, MAX_TTL)
+        elif rcode in (RCODE_NXDOMAIN, RCODE_NOERROR):
+            self.ttl = 0 if negative is None else min(negative, MAX_NEGATIVE_TTL)
+        else:
+            self.ttl = 0
+
+    @property
+    def expires(self):
+        return self.stored + self.ttl
+
+    def respond(self, query, parsed, now):
+        """作为 query 的应答，对客户端太大时返回 None"""
+        if len(self.wire) > parsed.max_size:
+            return None
+        response = bytearray(self.wire)
+        response[0:2] = query[0:2]
+        response[2] = response[2] & 0xFE | query[2] & 0x01
+        response[HEADER_SIZE:parsed.question_end] = query[HEADER_SIZE:parsed.question_end]
+        elapsed = int(now - self.stored)
+        for offset, ttl in zip(self.ttl_offsets, self.ttls):
+            struct.pack_into('>I', response, offset, max(0, ttl - elapsed))
+        return bytes(response)
+
+
+class DnsCache:
+    """DnsCache.kt 的移植，clock 返回秒"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.entries = collections.OrderedDict()
+        self.in_flight = {}
+        self.network = None
+        self.bytes = 0
+        self.hits = self.misses = self.coalesced = 0
+
+    async def resolve(self, network, query, tcp, upstream):
+        """从缓存或经 upstream 应答 query，同一个键同一时间最多调用一次 upstream"""
+        parsed = parse_query(query, tcp)
+        if parsed is None:
+            return await upstream(query)
+        if self.network != network:
+            self.entries.clear()
+            self.bytes = 0
+            self.network = network
+        now = self.clock()
+        cached = self.entries.get(parsed.key)
+        if cached is not None:
+            self.entries.move_to_end(parsed.key)
+            if now >= cached.expires:
+                del self.entries[parsed.key]
+                self.bytes -= len(cached.wire)
+            else:
+                response = cached.respond(query, parsed, now)
+                if response is not None:
+                    self.hits += 1
+                    return response
+        pending = self.in_flight.get(parsed.key)
+        if pending is not None:
+            self.coalesced += 1
+            # 等待者自己被取消时不取消共享的查询
+            answer = await asyncio.shield(pending)
+            response = answer and answer.respond(query, parsed, self.clock())
+            return response or await upstream(query)
+        pending = asyncio.get_running_loop().create_future()
+        pending.add_done_callback(lambda future: future.cancelled() or future.exception())
+        self.in_flight[parsed.key] = pending
+        self.misses += 1
+        try:
+            response = await upstream(query)
+        except asyncio.CancelledError:
+            del self.in_flight[parsed.key]
+            pending.set_result(None)    # 等待者自己再查询
+            raise
+        except Exception as e:
+            del self.in_flight[parsed.key]
+            pending.set_exception(e)
+            raise
+        try:
+            answer = Answer(response, self.clock())
+        except IndexError:
+            answer = None
+        del self.in_flight[parsed.key]
+        if answer is not None and answer.ttl > 0 and self.network == network:
+            previous = self.entries.pop(parsed.key, None)
+            if previous is not None:
+                self.bytes -= len(previous.wire)
+            self.entries[parsed.key] = answer
+            self.bytes += len(answer.wire)
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self.bytes -= len(self.entries.popitem(last=False)[1].wire)
+        pending.set_result(answer)
+        return response
+
+    def stats(self):
+        return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'misses': self.misses,
+                'coalesced': self.coalesced}
+
+
+def encode_name(name):
+    wire = bytearray()
+    for label in name.rstrip('.').split('.'):
+        if label:
+            encoded = label.encode('ascii')
+            wire += bytes([len(encoded)]) + encoded
+    return bytes(wire + b'\x00')
+
+
+def build_query(name, qtype=TYPE_A, qid=0, edns_size=None, dnssec_ok=False, recursion=True):
+    header = struct.pack('>HHHHHH', qid, 0x0100 if recursion else 0, 1, 0, 0, 1 if edns_size else 0)
+    wire = header + encode_name(name) + struct.pack('>HH', qtype, CLASS_IN)
+    if edns_size:
+        wire += b'\x00' + struct.pack('>HHIH', TYPE_OPT, edns_size, 0x8000 if dnssec_ok else 0, 0)
+    return wire
+
+
+def servfail(query):
+    """上游失败时给客户端的应答（只含问题），无法解析时返回 None"""
+    parsed = parse_query(query, True)
+    if parsed is None:
+        return None
+    header = struct.pack('>HHHHHH', _u16(query, 0), 0x8080 | query[2] << 8 & 0x0100 | RCODE_SERVFAIL, 1, 0, 0, 0)
+    return header + bytes(query[HEADER_SIZE:parsed.question_end])
+
+
+def expected(name):
+    """替身上游对名字的应答：(rcode, 地址, TTL)；hostN 为A记录（N % 7 == 3 时TTL很短），missingN 不存在"""
+    label = name.split('.', 1)[0].lower()
+    if label.startswith('missing'):
+        return RCODE_NXDOMAIN, None, StandInUpstream.NEGATIVE_TTL
+    index = int(label[4:])
+    address = bytes([10, index >> 16 & 0xFF, index >> 8 & 0xFF, index & 0xFF])
+    return RCODE_NOERROR, address, StandInUpstream.SHORT_TTL if index % 7 == 3 else StandInUpstream.TTL
+
+
+def zipf_names(count):
+    """按流行度排序的名字，每十个中有一个不存在"""
+    return [f'missing{index}.example.' if index % 10 == 9 else f'host{index}.example.' for index in range(count)]
+
+
+class _DatagramServer(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.server.spawn(self._reply(data, addr))
+
+    async def _reply(self, data, addr):
+        response = await self.server.handle(data, False)
+        if response is not None and not self.transport.is_closing():
+            self.transport.sendto(response, addr)
+
+
+class DnsServer:
+    """监听UDP与TCP（两字节长度前缀，同一连接上的查询并发处理），子类实现 handle()"""
+
+    def __init__(self, host='127.0.0.1'):
+        self.host = host
+        self.udp = self.tcp = None
+        self.tasks = set()
+
+    def spawn(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def handle(self, query, tcp):
+        raise NotImplementedError
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.udp, _ = await loop.create_datagram_endpoint(lambda: _DatagramServer(self), local_addr=(self.host, 0))
+        self.tcp = await asyncio.start_server(self._connection, self.host, 0)
+        return self
+
+    @property
+    def udp_port(self):
+        return self.udp.get_extra_info('sockname')[1]
+
+    @property
+    def tcp_port(self):
+        return self.tcp.sockets[0].getsockname()[1]
+
+    async def _connection(self, reader, writer):
+        lock = asyncio.Lock()
+
+        async def reply(query):
+            response = await self.handle(query, True)
+            if response is None:
+                return
+            async with lock:
+                writer.write(struct.pack('>H', len(response)) + response)
+                await writer.drain()
+        try:
+            while True:
+                length = _u16(await reader.readexactly(2), 0)
+                self.spawn(reply(await reader.readexactly(length)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        self.udp.close()
+        self.tcp.close()
+        await self.tcp.wait_closed()
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+class StandInUpstream(DnsServer):
+    """替身上游：每个查询延迟 latency 秒后应答，NXDOMAIN 带SOA，查询带EDNS时应答也带"""
+    TTL = 300
+    SHORT_TTL = 1
+    NEGATIVE_TTL = 60
+
+    def __init__(self, latency=0.03, host='127.0.0.1'):
+        super().__init__(host)
+        self.latency = latency
+        self.queries = 0
+        self.by_name = collections.Counter()
+
+    async def handle(self, query, tcp):
+        parsed = parse_query(query, tcp)
+        if parsed is None:
+            return None
+        self.queries += 1
+        name = parsed.key[0]
+        self.by_name[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        rcode, address, ttl = expected(name)
+        answers = authorities = b''
+        if rcode == RCODE_NOERROR and parsed.key[1] == TYPE_A:
+            answers = struct.pack('>HHHIH', 0xC00C, TYPE_A, CLASS_IN, ttl, 4) + address
+        elif rcode == RCODE_NXDOMAIN or parsed.key[1] != TYPE_A:
+            soa = b'\x00\x00' + struct.pack('>IIIII', 1, 3600, 600, 86400, self.NEGATIVE_TTL)
+            authorities = b'\x00' + struct.pack('>HHIH', TYPE_SOA, CLASS_IN, self.NEGATIVE_TTL, len(soa)) + soa
+        additional = b'\x00' + struct.pack('>HHIH', TYPE_OPT, 1232, 0, 0) if _u16(query, 10) else b''
+        header = struct.pack('>HHHHHH', _u16(query, 0), 0x8080 | query[2] << 8 & 0x0100 | rcode, 1,
+                             1 if answers else 0, 1 if authorities else 0, 1 if additional else 0)
+        return header + bytes(query[HEADER_SIZE:parsed.question_end]) + answers + authorities + additional
+
+
+class _UpstreamQuery(asyncio.DatagramProtocol):
+    def __init__(self, future):
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(data)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+class Forwarder(DnsServer):
+    """DnsForwarder 的替身：network 代表当前的上游网络，cache 为 False 时直接转发"""
+
+    def __init__(self, upstream, cache=True, timeout=2.0, host='127.0.0.1'):
+        super().__init__(host)
+        self.upstream = upstream
+        self.timeout = timeout
+        self.network = 'rmnet_data0'
+        self.cache = DnsCache() if cache else None
+        self.failures = 0
+
+    async def resolve_raw(self, query):
+        """DnsResolverCompat.resolveRaw：每个查询一个UDP套接字"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        transport, _ = await loop.create_datagram_endpoint(lambda: _UpstreamQuery(future), remote_addr=self.upstream)
+        try:
+            transport.sendto(query)
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            transport.close()
+
+    async def handle(self, query, tcp):
+        try:
+            if self.cache is None:
+                return await self.resolve_raw(query)
+            return await self.cache.resolve(self.network, query, tcp, self.resolve_raw)
+        except (OSError, asyncio.TimeoutError):
+            self.failures += 1
+            return servfail(query)
+
+
+def check_response(query, response, name):
+    """应答与查询的ID、问题逐字节一致，rcode、地址符合替身上游，TTL不超过原值；返回问题描述或 None"""
+    if len(response) < HEADER_SIZE or response[:2] != query[:2]:
+        return 'ID不匹配'
+    parsed = parse_query(query, True)
+    if not response[2] & 0x80 or response[HEADER_SIZE:parsed.question_end] != query[HEADER_SIZE:parsed.question_end]:
+        return '问题不匹配'
+    rcode, address, ttl = expected(name)
+    if response[3] & 0xF != rcode:
+        return f'rcode {response[3] & 0xF}'
+    if address is not None:
+        if _u16(response, 6) != 1:
+            return '没有应答'
+        i = _skip_name(response, parsed.question_end)
+        if response[i + 10:i + 14] != address:
+            return '地址错误'
+        if _u32(response, i + 4) > ttl:
+            return 'TTL超过原值'
+    return None
+
+
+def _randomize_case(name, rng):
+    return ''.join(c.upper() if rng.random() < .5 else c for c in name)
+
+
+class _ClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.future = None
+        self.expect = None
+
+    def datagram_received(self, data, addr):
+        if self.future is not None and not self.future.done() and data[:2] == self.expect:
+            self.future.set_result(data)
+
+
+async def generate(host, udp_port, tcp_port, names, queries=5000, concurrency=32, tcp_ratio=0.2, zipf=1.1, seed=0,
+                   timeout=2.0, randomize_case=True):
+    """closed 模式的负载：每个客户端收到应答后立即发下一个查询，名字按 1/rank^zipf 的权重选取"""
+    cumulative = list(itertools.accumulate(1 / (rank + 1) ** zipf for rank in range(len(names))))
+    remaining = itertools.count()
+    latency = {'udp': LatencyHistogram(), 'tcp': LatencyHistogram()}
+    errors = collections.Counter()
+    tcp_clients = round(concurrency * tcp_ratio)
+
+    async def client(index):
+        rng = random.Random(seed * 1000003 + index)
+        protocol = 'tcp' if index < tcp_clients else 'udp'
+        loop = asyncio.get_running_loop()
+        if protocol == 'tcp':
+            reader, writer = await asyncio.open_connection(host, tcp_port)
+        else:
+            transport, endpoint = await loop.create_datagram_endpoint(_ClientProtocol, remote_addr=(host, udp_port))
+        try:
+            while next(remaining) < queries:
+                name = names[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+                query = build_query(_randomize_case(name, rng) if randomize_case else name, qid=rng.getrandbits(16),
+                                    edns_size=1232 if rng.random() < .5 else None)
+                start = time.perf_counter()
+                try:
+                    if protocol == 'tcp':
+                        writer.write(struct.pack('>H', len(query)) + query)
+                        length = _u16(await asyncio.wait_for(reader.readexactly(2), timeout), 0)
+                        response = await asyncio.wait_for(reader.readexactly(length), timeout)
+                    else:
+                        endpoint.future, endpoint.expect = loop.create_future(), query[:2]
+                        transport.sendto(query)
+                        response = await asyncio.wait_for(endpoint.future, timeout)
+                except asyncio.TimeoutError:
+                    errors['超时'] += 1
+                    if protocol == 'tcp':
+                        break   # 连接上的后续应答无法对应
+                    continue
+                latency[protocol].record(int((time.perf_counter() - start) * 1e6))
+                problem = check_response(query, response, name)
+                if problem:
+                    errors[problem] += 1
+        finally:
+            if protocol == 'tcp':
+                writer.close()
+            else:
+                transport.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(concurrency)))
+    duration = time.perf_counter() - start
+    total = LatencyHistogram().merge(latency['udp']).merge(latency['tcp'])
+    return {
+        'queries': total.total,
+        'seconds': round(duration, 3),
+        'qps': round(total.total / duration, 1) if duration else 0.0,
+        'latency_us': total.summary(),
+        'protocols': {protocol: histogram.summary() for protocol, histogram in latency.items()},
+        'errors': dict(errors),
+        '_latency': total,
+    }
+
+
+async def bench(cache=True, queries=5000, names=1000, concurrency=32, tcp_ratio=0.2, zipf=1.1, latency=0.03,
+                seed=0):
+    """启动替身上游与转发器，运行一次负载"""
+    upstream = await StandInUpstream(latency).start()
+    forwarder = await Forwarder(('127.0.0.1', upstream.udp_port), cache).start()
+    try:
+        result = await generate('127.0.0.1', forwarder.udp_port, forwarder.tcp_port, zipf_names(names), queries,
+                                concurrency, tcp_ratio, zipf, seed)
+    finally:
+        await forwarder.stop()
+        await upstream.stop()
+    stats = forwarder.cache.stats() if forwarder.cache else {'hits': 0, 'coalesced': 0}
+    result.update(
+        cache=cache,
+        upstream_queries=upstream.queries,
+        distinct_names=len(upstream.by_name),
+        hit_ratio=round(stats['hits'] / result['queries'], 4) if result['queries'] else 0.0,
+        coalesced=stats['coalesced'],
+        upstream_failures=forwarder.failures,
+    )
+    return result
+
+
+def compare(queries=5000, names=1000, concurrency=32, tcp_ratio=0.2, zipf=1.1, latency=0.03, seed=0):
+    settings = {'queries': queries, 'names': names, 'concurrency': concurrency, 'tcp_ratio': tcp_ratio,
+                'zipf': zipf, 'latency_ms': latency * 1000, 'seed': seed}
+    report = {'settings': settings, 'modes': {}, 'problems': []}
+    for mode, cache in (('direct', False), ('cached', True)):
+        result = asyncio.run(bench(cache, queries, names, concurrency, tcp_ratio, zipf, latency, seed))
+        report['modes'][mode] = result
+        if result['errors']:
+            report['problems'].append(f'{mode}: 应答错误 {result["errors"]}')
+        if result['queries'] != queries:
+            report['problems'].append(f'{mode}: 只完成了 {result["queries"]}/{queries} 个查询')
+    direct, cached = report['modes']['direct'], report['modes']['cached']
+    if direct['upstream_queries'] != direct['queries']:
+        report['problems'].append('关闭缓存时上游查询数与查询数不同')
+    if cached['upstream_queries'] >= direct['upstream_queries']:
+        report['problems'].append('缓存没有减少上游查询')
+    report['upstream_saved'] = direct['upstream_queries'] - cached['upstream_queries']
+    report['qps_speedup'] = round(cached['qps'] / max(direct['qps'], 1e-9), 2)
+    return report
+
+
+def print_report(report):
+    settings = report['settings']
+    print(f"🌐 {settings['queries']} 个查询，{settings['names']} 个名字（Zipf s={settings['zipf']}），"
+          f"{settings['concurrency']} 个客户端（TCP占 {settings['tcp_ratio']:.0%}），上游延迟 {settings['latency_ms']:g}ms")
+    for mode, result in report['modes'].items():
+        latency = result['latency_us']
+        print(f"   {mode}: {result['qps']} 查询/秒，p50={latency['p50'] / 1000:.2f}ms p99={latency['p99'] / 1000:.2f}ms，"
+              f"上游查询 {result['upstream_queries']} 次（{result['distinct_names']} 个名字），"
+              f"命中率 {result['hit_ratio']:.1%}，合并 {result['coalesced']} 次")
+    print(f"📈 上游查询减少 {report['upstream_saved']} 次，吞吐提高 {report['qps_speedup']}x")
+    for problem in report['problems']:
+        print(f"❌ {problem}")
+    if not report['problems']:
+        print("✅ 所有应答的ID、问题、地址与TTL正确")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DnsForwarder 应答缓存的负载基准')
+    parser.add_argument('--queries', type=int, default=20000)
+    parser.add_argument('--names', type=int, default=2000, help='名字总数（每十个中有一个不存在）')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--tcp-ratio', type=float, default=0.2, help='使用TCP的客户端比例')
+    parser.add_argument('--zipf', type=float, default=1.1, help='Zipf分布的指数')
+    parser.add_argument('--latency-ms', type=float, default=30.0, help='替身上游每个查询的延迟')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    report = compare(args.queries, args.names, args.concurrency, args.tcp_ratio, args.zipf, args.latency_ms / 1000,
+                     args.seed)
+    print_report(report)
+    for mode, result in report['modes'].items():
+        record_metric(f'dns forwarder {mode} latency', histogram=result['_latency'].values(), unit='us')
+        record_metric(f'dns forwarder {mode} qps', value=result['qps'], unit='qps')
+    if args.json:
+        output = dict(report, modes={mode: {key: value for key, value in result.items() if not key.startswith('_')}
+                                     for mode, result in report['modes'].items()})
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 0 if not report['problems'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+本地adb server替身，用于离线测试
+
+实现adb智能套接字协议中测试需要的子集：
+host:version、host:devices、host:transport[-any]、shell:<command>、exec:<command>。
+shell服务在本机用 `sh` 执行，因此会话层的帧格式、流水线和错误处理都能被真实验证。
+"""
+
+import socket
+import socketserver
+import subprocess
+import threading
+
+ADB_SERVER_VERSION = 41
+
+
+def _read_request(rfile):
+    header = rfile.read(4)
+    if len(header) < 4:
+        return None
+    return rfile.read(int(header, 16)).decode('utf-8')
+
+
+def _okay_with_payload(payload):
+    data = payload.encode('utf-8')
+    return b'OKAY' + b'%04x' % len(data) + data
+
+
+def _fail(message):
+    data = message.encode('utf-8')
+    return b'FAIL' + b'%04x' % len(data) + data
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def setup(self):
+        super().setup()
+        # 本机sh的小块输出不应被Nagle算法与延迟ACK拖慢
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def handle(self):
+        server = self.server
+        transport = None
+        while True:
+            request = _read_request(self.rfile)
+            if request is None:
+                return
+            server.record(request)
+            if request == 'host:version':
+                self.wfile.write(_okay_with_payload('%04x' % ADB_SERVER_VERSION))
+                return
+            if request == 'host:devices':
+                payload = ''.join(f'{serial}\tdevice\n' for serial in server.serials)
+                self.wfile.write(_okay_with_payload(payload))
+                return
+            if request.startswith('host:transport'):
+                serial = request.partition(':transport:')[2]
+                if request == 'host:transport-any' and len(server.serials) == 1:
+                    transport = server.serials[0]
+                elif serial in server.serials:
+                    transport = serial
+                else:
+                    self.wfile.write(_fail(f"device '{serial}' not found"))
+                    return
+                self.wfile.write(b'OKAY')
+                continue
+            if request.startswith(('shell:', 'exec:')) and transport is not None:
+                self.wfile.write(b'OKAY')
+                self.wfile.flush()
+                self._run_shell(request.partition(':')[2])
+                return
+            self.wfile.write(_fail(f'unsupported request: {request}'))
+            return
+
+    def _run_shell(self, command):
+        fd = self.connection.fileno()
+        handler = self.server.shell_handler
+        if handler is not None and handler(command, self.connection):
+            return
+        if command in ('', 'sh'):
+            args, stdin = ['sh'], fd
+        else:
+            args, stdin = ['sh', '-c', command], subprocess.DEVNULL
+        process = subprocess.Popen(args, stdin=stdin, stdout=fd, stderr=subprocess.STDOUT)
+        process.wait()
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """
+    在随机端口上监听的adb server替身
+
+    shell_handler(command, conn) 返回True表示已自行处理该shell请求，
+    用于模拟logcat等本机不存在的命令。
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, serials=('emulator-5554',), shell_handler=None):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.serials = list(serials)
+        self.shell_handler = shell_handler
+        self.requests = []
+        self._requests_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def record(self, request):
+        with self._requests_lock:
+            self.requests.append(request)
+
+    def count(self, prefix):
+        with self._requests_lock:
+            return sum(1 for request in self.requests if request.startswith(prefix))
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
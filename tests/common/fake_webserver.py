@@ -0,0 +1,886 @@
+#!/usr/bin/env python3
+"""
+OkHttpWebServer 的本地替身
+
+按 OkHttpWebServer.kt 逐条复刻协议行为，使HTTP层的测试无需真机即可运行：
+- parseRequest：请求行/方法校验、header小写化、最多100个header、1MB请求体上限，
+  解析失败统一返回 500 Internal Server Error（原实现把超时等异常包装为IOException）
+- processRequest / handleApiRequest：favicon、API Key路径前缀、Bearer/X-API-Key/api_key参数、
+  noAuthEndpoints、developerEndpoints 以及各类404
+- sendResponse：相同的响应头，未知状态码的原因短语为 "Unknown"
+- handleConnection：HTTP/1.1持久连接（空闲5秒、单连接最多100个请求后关闭，HEAD与HTTP/1.0默认关闭），
+  keep_alive=False 时退回每个请求一个连接的 `Connection: close` 行为
+- getSystemStatus：2秒 STATUS_CACHE_DURATION 缓存（与原实现一样不加锁）
+- handleBatch：/api/batch 在一个响应中返回多个子请求的结果，只读子请求共用一个状态快照
+- streamStatus：/api/status/stream 的Server-Sent Events状态流，只推送变化的字段
+- 控制面板与API Key引导页直接从Kotlin源码中提取，保持与应用一致；与 StaticPage 一样预先压缩，
+  每种编码带各自的ETag与 Cache-Control: no-cache，If-None-Match 命中任一编码时返回304
+
+另外支持注入延迟与故障（Profile），用于在无设备噪声的环境下比较客户端性能。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.fake_webserver --port 9999 --auth --profile device
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+import zlib
+
+DEFAULT_API_KEY = 'default_api_key_for_debug_2024'
+STATUS_CACHE_DURATION = 2.0
+MAX_HEADERS = 100
+MAX_BODY = 1024 * 1024
+KEEP_ALIVE_TIMEOUT = 5.0
+MAX_KEEP_ALIVE_REQUESTS = 100
+STATUS_STREAM_MIN_INTERVAL = 0.5
+STATUS_STREAM_MAX_INTERVAL = 60.0
+STATUS_STREAM_HEARTBEAT = 15.0
+MAX_BATCH_REQUESTS = 16
+BATCH_ENDPOINTS = ('/api/status', '/api/system/info', '/api/auth-status', '/api/debug/status', '/api/test',
+                   '/api/wifi/start', '/api/wifi/stop')
+SUPPORTED_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'OPTIONS')
+DEVELOPER_ENDPOINTS = ('/api/generate-key', '/api/toggle-auth')
+NO_AUTH_ENDPOINTS = ('/api/auth-status',)
+
+JSON_TYPE = 'application/json; charset=utf-8'
+HTML_TYPE = 'text/html; charset=utf-8'
+TEXT_TYPE = 'text/plain; charset=utf-8'
+ICON_TYPE = 'image/x-icon'
+EVENT_STREAM_TYPE = 'text/event-stream; charset=utf-8'
+
+STATUS_TEXT = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    408: 'Request Timeout',
+    413: 'Content Too Large',
+    500: 'Internal Server Error',
+    501: 'Not Implemented',
+}
+
+KOTLIN_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'mobile', 'src', 'main',
+                             'java', 'be', 'mygod', 'vpnhotspot', 'OkHttpWebServer.kt')
+
+FAVICON = bytes([
+    0x89, 0x50, 0x4E, 0x47, 0x0D, 0x0A, 0x1A, 0x0A, 0x00, 0x00, 0x00, 0x0D, 0x49, 0x48, 0x44, 0x52,
+    0x00, 0x00, 0x00, 0x01, 0x00, 0x00, 0x00, 0x01, 0x08, 0x06, 0x00, 0x00, 0x00, 0x1F, 0x15, 0xC4,
+    0x89, 0x00, 0x00, 0x00, 0x0A, 0x49, 0x44, 0x41, 0x54, 0x78, 0x9C, 0x63, 0x00, 0x01, 0x00, 0x00,
+    0x05, 0x00, 0x01, 0x0D, 0x0A, 0x2D, 0xB4, 0x00, 0x00, 0x00, 0x00, 0x49, 0x45, 0x4E, 0x44, 0xAE,
+    0x42, 0x60, 0x82,
+])
+
+logger = logging.getLogger('OkHttpWebServer')
+
+
+def trim_indent(text):
+    """Kotlin String.trimIndent()"""
+    lines = text.split('\n')
+    indents = [len(line) - len(line.lstrip()) for line in lines if line.strip()]
+    indent = min(indents) if indents else 0
+    result = []
+    for index, line in enumerate(lines):
+        if index in (0, len(lines) - 1) and not line.strip():
+            continue
+        result.append(line[indent:])
+    return '\n'.join(result)
+
+
+def load_page(function, fallback):
+    """从OkHttpWebServer.kt中提取指定函数里的HTML字面量"""
+    try:
+        with open(KOTLIN_SOURCE, 'r', encoding='utf-8') as f:
+            source = f.read()
+    except OSError:
+        return fallback
+    match = re.search(r'fun %s\(\)[^{]*\{\s*val html = """(.*?)"""\.trimIndent\(\)' % function, source, re.DOTALL)
+    return trim_indent(match.group(1)) if match else fallback
+
+
+MAIN_PAGE = load_page('mainPageHtml', '<!DOCTYPE html><html><body><h1>热点控制面板</h1></body></html>')
+API_KEY_REQUIRED_PAGE = load_page('apiKeyRequiredPageHtml',
+                                  '<!DOCTYPE html><html><body><h1>需要API Key访问</h1></body></html>')
+
+
+def kotlin_float(value):
+    """Kotlin Float.toString() 对常见数值的格式（总带小数点）"""
+    text = repr(float(value))
+    return text if ('.' in text or 'e' in text or 'n' in text) else text + '.0'
+
+
+class StaticPage:
+    """
+    OkHttpWebServer.StaticPage：原文与gzip、deflate（zlib格式，java.util.zip默认压缩级别）版本，
+    每种编码各有强ETag（压缩版本加 -gzip / -deflate 后缀）
+    """
+
+    def __init__(self, html):
+        self.identity = html.encode('utf-8')
+        self.gzip = gzip.compress(self.identity, compresslevel=6, mtime=0)
+        self.deflate = zlib.compress(self.identity)
+        self._hash = hashlib.sha256(self.identity).hexdigest()[:16]
+
+    def etag(self, encoding=None):
+        return f'"{self._hash}"' if encoding is None else f'"{self._hash}-{encoding}"'
+
+    def matches(self, if_none_match, encoding=None):
+        """弱比较：忽略 W/ 前缀，只有所选编码的ETag或 * 才算命中"""
+        etag = self.etag(encoding)
+        return any(tag.strip() == '*' or tag.strip().removeprefix('W/') == etag for tag in if_none_match.split(','))
+
+
+def accepts_encoding(accept_encoding, encoding):
+    """Accept-Encoding 中列出了该编码且q不为0"""
+    for item in accept_encoding.split(','):
+        parts = [part.strip().lower() for part in item.split(';')]
+        if parts[0] != encoding:
+            continue
+        zero = False
+        for param in parts[1:]:
+            try:
+                zero = zero or float(param[2:] if param.startswith('q=') else param) == 0.0
+            except ValueError:
+                pass
+        if not zero:
+            return True
+    return False
+
+
+class Response:
+
+    def __init__(self, status, content_type, body, stream_interval=None, data=None, headers=None):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        # data非None时代替body原样发送（预先压缩的页面），headers为额外的响应头
+        self.data = data
+        self.headers = headers or {}
+        # 非None时不发送body，改为按此间隔（秒）推送状态流
+        self.stream_interval = stream_interval
+
+    def encode(self, keep_alive=False):
+        # 原实现通过Writer以UTF-8写出字符串body（favicon先按ISO-8859-1转成字符串，因此同样被UTF-8编码）
+        body = self.data if self.data is not None else self.body.encode('utf-8')
+        if keep_alive:
+            connection = (f'Connection: keep-alive\r\n'
+                          f'Keep-Alive: timeout={int(KEEP_ALIVE_TIMEOUT)}, max={MAX_KEEP_ALIVE_REQUESTS}\r\n')
+        else:
+            connection = 'Connection: close\r\n'
+        head = (
+            f'HTTP/1.1 {self.status} {STATUS_TEXT.get(self.status, "Unknown")}\r\n'
+            f'Content-Type: {self.content_type}\r\n'
+            + ('' if self.status == 304 else f'Content-Length: {len(body)}\r\n')
+            + ''.join(f'{name}: {value}\r\n' for name, value in self.headers.items())
+            + 'Access-Control-Allow-Origin: *\r\n'
+            'Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n'
+            'Access-Control-Allow-Headers: Content-Type, Accept, Authorization, X-API-Key\r\n'
+            f'{connection}'
+            '\r\n'
+        )
+        return head.encode('utf-8') + body
+
+
+class Request:
+
+    def __init__(self, method, uri, headers, body=None, version='HTTP/1.1'):
+        self.method = method
+        self.uri = uri
+        self.headers = headers
+        self.body = body
+        self.version = version
+
+    def keep_alive(self):
+        """isKeepAlive：HTTP/1.1默认保持连接，HTTP/1.0需显式请求；HEAD响应带body，发送后关闭"""
+        if self.method == 'HEAD':
+            return False
+        connection = self.headers.get('connection', '').lower()
+        if 'close' in connection:
+            return False
+        return self.version == 'HTTP/1.1' or 'keep-alive' in connection
+
+
+class BadRequest(IOError):
+    """对应原实现parseRequest抛出的IOException"""
+
+
+class HttpError(BadRequest):
+    """对应 HttpMessageReader.HttpException：请求体无法恰好读完，应答 status 后关闭连接"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Profile:
+    """
+    延迟与故障注入
+
+    latency: 每个请求的基础处理延迟（秒），jitter: 额外均匀随机延迟上限
+    status_cost: getSystemStatus缓存失效时刷新一次的耗时（模拟 su -c cat 调用）
+    failure_rate: 请求失败概率，failure: 'reset'（RST断开）、'error'（500）或 'hang'（挂起hang秒后断开）
+    """
+
+    PRESETS = {
+        'ideal': {},
+        'device': {'latency': 0.004, 'jitter': 0.004, 'status_cost': 0.15},
+        'slow-tether': {'latency': 0.08, 'jitter': 0.04, 'status_cost': 0.15},
+        'flaky': {'latency': 0.004, 'jitter': 0.004, 'status_cost': 0.15, 'failure_rate': 0.05},
+    }
+
+    def __init__(self, latency=0.0, jitter=0.0, status_cost=0.0, failure_rate=0.0, failure='reset',
+                 hang=5.0, paths=None, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.status_cost = status_cost
+        self.failure_rate = failure_rate
+        self.failure = failure
+        self.hang = hang
+        # paths为None时对所有路径生效，否则只对以其中任一前缀开头的路径生效
+        self.paths = paths
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def preset(cls, name, **overrides):
+        return cls(**dict(cls.PRESETS[name], **overrides))
+
+    def _applies(self, uri):
+        return self.paths is None or any(uri.startswith(prefix) for prefix in self.paths)
+
+    def delay(self, uri):
+        if not self._applies(uri):
+            return 0.0
+        with self._lock:
+            return self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+
+    def pick_failure(self, uri):
+        if not self.failure_rate or not self._applies(uri):
+            return None
+        with self._lock:
+            return self.failure if self._random.random() < self.failure_rate else None
+
+
+def default_sampler():
+    """生成缓慢变化的合成系统状态"""
+    state = {'calls': 0}
+
+    def sample(server):
+        state['calls'] += 1
+        n = state['calls']
+        return {
+            'battery': max(1, 100 - n // 30),
+            'batteryTemperature': round(30.0 + (n % 50) / 10, 1),
+            'cpuTemperature': round(40.0 + (n % 80) / 10, 1),
+            'cpu': round((n * 7.3) % 100, 1),
+            'wifiStatus': '运行中 (接口: wlan1)' if server.wifi_enabled else '已停止',
+        }
+    return sample
+
+
+def _read_exactly(reader, size):
+    data = reader.read(size)
+    if len(data) != size:
+        raise HttpError(400, f'Request body ended after {len(data)} of {size} bytes')
+    return data
+
+
+def read_body(reader, headers):
+    """HttpMessageReader.readBody：按Content-Length的字节数或chunked读完请求体，没有时返回None"""
+    transfer_encoding = headers.get('transfer-encoding')
+    content_length = headers.get('content-length')
+    if transfer_encoding is not None:
+        if content_length is not None:
+            raise HttpError(400, 'Both Transfer-Encoding and Content-Length present')
+        if transfer_encoding.lower() != 'chunked':
+            raise HttpError(501, f'Unsupported Transfer-Encoding: {transfer_encoding}')
+        body = b''
+        while True:
+            line = reader.readline()
+            try:
+                size = int(line.split(b';')[0].strip(), 16)
+            except ValueError:
+                raise HttpError(400, f'Invalid chunk size: {line!r}') from None
+            if size < 0:
+                raise HttpError(400, f'Invalid chunk size: {line!r}')
+            if size == 0:
+                break
+            if len(body) + size > MAX_BODY:
+                raise HttpError(413, 'Request body too large')
+            body += _read_exactly(reader, size)
+            if reader.readline().rstrip(b'\n').rstrip(b'\r'):
+                raise HttpError(400, 'Chunk not terminated by CRLF')
+        for _ in range(MAX_HEADERS):
+            line = reader.readline()
+            if not line:
+                raise HttpError(400, 'Chunked body ended in the trailers')
+            if not line.rstrip(b'\r\n'):
+                return body or None
+        raise HttpError(400, 'Too many trailers')
+    if content_length is None:
+        return None
+    try:
+        length = int(content_length)
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise HttpError(400, f'Invalid Content-Length: {content_length}')
+    if length > MAX_BODY:
+        raise HttpError(413, f'Request body too large: {length} bytes')
+    return _read_exactly(reader, length) if length else None
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        server = self.server
+        sock = self.request
+        reader = sock.makefile('rb')
+        server.count_connection()
+        connection_id = server.connection_id(sock)
+        logger.debug('Handling connection #%d', connection_id)
+        handled = 0
+        try:
+            while True:
+                first_line = None
+                if handled:
+                    first_line = server.wait_next_request(sock, reader)
+                    if first_line is None:
+                        return
+                keep_alive = False
+                try:
+                    sock.settimeout(5.0)
+                    request = server.parse_request(reader, first_line)
+                    handled += 1
+                    keep_alive = (server.keep_alive and handled < server.max_keep_alive_requests
+                                  and request.keep_alive())
+                    process_start = time.monotonic()
+                    response = server.route(request)
+                except HttpError as e:
+                    logger.warning('Rejected request: %s', e)
+                    response = Response(e.status, TEXT_TYPE, str(e))
+                    request = None
+                    keep_alive = False
+                except Exception as e:
+                    logger.error('Error handling connection: %s', e)
+                    response = Response(500, TEXT_TYPE, 'Internal Server Error')
+                    request = None
+                uri = request.uri if request else ''
+                send_start = time.monotonic()
+                failure = server.profile.pick_failure(uri)
+                delay = server.profile.delay(uri)
+                if delay:
+                    time.sleep(delay)
+                if failure == 'reset':
+                    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                    return
+                if failure == 'hang':
+                    time.sleep(server.profile.hang)
+                    return
+                if failure == 'error':
+                    response = Response(500, TEXT_TYPE, 'Internal Server Error')
+                    keep_alive = False
+                server.count(response.status)
+                if response.stream_interval is not None:
+                    try:
+                        server.stream_status(sock, response.stream_interval)
+                    finally:
+                        server.log_response(request, response, process_start, send_start)
+                    return
+                sock.sendall(response.encode(keep_alive))
+                if request is not None:
+                    server.log_response(request, response, process_start, send_start)
+                if not keep_alive:
+                    return
+        except OSError as e:
+            logger.debug('Client disconnected: %s', e)
+        finally:
+            reader.close()
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            logger.debug('Connection #%d closed after %d requests', connection_id, handled)
+
+
+class FakeWebServer(socketserver.ThreadingTCPServer):
+    """
+    OkHttpWebServer替身，每个连接一个线程（对应原实现的 newCachedThreadPool）
+
+    port为0时随机分配端口；status_sampler(server) 返回系统状态字典。
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+    # 与 java.net.ServerSocket 默认backlog一致；socketserver默认的5在并发时会导致SYN重传
+    request_queue_size = 50
+
+    def __init__(self, port=0, host='127.0.0.1', api_key=DEFAULT_API_KEY, auth_enabled=False,
+                 developer_mode=False, profile=None, status_sampler=None, clock=time.monotonic,
+                 keep_alive=True, keep_alive_timeout=KEEP_ALIVE_TIMEOUT,
+                 max_keep_alive_requests=MAX_KEEP_ALIVE_REQUESTS):
+        super().__init__((host, port), _Handler)
+        self.keep_alive = keep_alive
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_keep_alive_requests = max_keep_alive_requests
+        self.connections = 0
+        self._connection_ids = {}
+        self._accepted = 0
+        self._idle = set()
+        self._streams = set()
+        self._stopping = threading.Event()
+        self.stream_events = 0
+        self.api_key = api_key
+        self.auth_enabled = auth_enabled
+        self.developer_mode = developer_mode
+        self.profile = profile or Profile()
+        self.wifi_enabled = False
+        self._sampler = status_sampler or default_sampler()
+        self._clock = clock
+        self._cached_status = None
+        self._last_status_update = 0.0
+        self._last_status_wall = 0
+        self.status_refreshes = 0
+        self.status_cache_hits = 0
+        self.responses = {}
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self.pages = {'main': StaticPage(MAIN_PAGE), 'api_key_required': StaticPage(API_KEY_REQUIRED_PAGE)}
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def base_url(self):
+        return f'http://{self.server_address[0]}:{self.port}'
+
+    def count(self, status):
+        with self._stats_lock:
+            self.responses[status] = self.responses.get(status, 0) + 1
+
+    def count_connection(self):
+        with self._stats_lock:
+            self.connections += 1
+
+    def process_request(self, request, client_address):
+        # 与 start() 中的接受循环相同，在分派给工作线程之前记录连接编号
+        with self._stats_lock:
+            self._accepted += 1
+            self._connection_ids[request] = self._accepted
+        logger.debug('Accepted connection #%d from /%s:%d', self._accepted, *client_address)
+        super().process_request(request, client_address)
+
+    def connection_id(self, sock):
+        with self._stats_lock:
+            return self._connection_ids.pop(sock, 0)
+
+    @staticmethod
+    def log_response(request, response, process_start, send_start):
+        end = time.monotonic()
+        logger.debug('Responded %d to %s %s (process %d ms, send %d ms)', response.status, request.method,
+                     request.uri, (send_start - process_start) * 1000, (end - send_start) * 1000)
+
+    def wait_next_request(self, sock, reader):
+        """在keep-alive连接上等待下一个请求行；空闲超时或客户端关闭时返回None"""
+        sock.settimeout(self.keep_alive_timeout)
+        with self._stats_lock:
+            self._idle.add(sock)
+        try:
+            line = reader.readline()
+        except OSError as e:
+            logger.debug('Keep-alive connection closed: %s', e)
+            return None
+        finally:
+            with self._stats_lock:
+                self._idle.discard(sock)
+        return line if line.strip() else None
+
+    def close_idle_connections(self):
+        """停止时关闭空闲的keep-alive连接，正在处理的请求不受影响"""
+        with self._stats_lock:
+            idle, self._idle = self._idle, set()
+        for sock in idle:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stopping.set()
+        self.shutdown()
+        self.server_close()
+        self.close_idle_connections()
+        self.close_streams()
+
+    def close_streams(self):
+        with self._stats_lock:
+            streams, self._streams = self._streams, set()
+        for sock in streams:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    # ApiKeyManager
+
+    def verify_api_key(self, api_key):
+        if not self.auth_enabled:
+            return True
+        return api_key == self.api_key
+
+    # parseRequest
+
+    def parse_request(self, reader, first_line=None):
+        first_line = (reader.readline() if first_line is None else first_line).decode('utf-8', 'replace')
+        if not first_line.strip():
+            raise BadRequest('Empty request')
+        first_line = first_line.rstrip('\r\n')
+        logger.debug('HTTP request first line: %s', first_line)
+        parts = first_line.strip().split(' ')
+        if len(parts) != 3:
+            raise BadRequest(f'Invalid request line: {first_line}')
+        method, uri, version = parts[0].upper(), parts[1], parts[2]
+        if method not in SUPPORTED_METHODS:
+            raise BadRequest(f'Unsupported HTTP method: {method}')
+        headers = {}
+        header_count = 0
+        while True:
+            line = reader.readline()
+            if not line:
+                break
+            line = line.decode('utf-8', 'replace').rstrip('\r\n')
+            if not line:
+                break
+            header_count += 1
+            if header_count > MAX_HEADERS:
+                raise BadRequest('Too many headers')
+            colon = line.find(':')
+            if colon > 0:
+                headers[line[:colon].strip().lower()] = line[colon + 1:].strip()
+        data = read_body(reader, headers)
+        body = data.decode('utf-8', 'replace') if data else None
+        logger.debug('Parsed HTTP request: %s %s (%d headers)', method, uri, len(headers))
+        return Request(method, uri, headers, body, version)
+
+    # processRequest
+
+    def route(self, request):
+        uri = request.uri
+        if uri == '/favicon.ico':
+            return Response(200, ICON_TYPE, FAVICON.decode('latin-1'))
+        if not self.auth_enabled:
+            if uri in ('/', ''):
+                return self.serve_main_page(request)
+            if uri.startswith('/api/'):
+                return self.handle_api_request(uri, request)
+            return Response(404, TEXT_TYPE, '404 Not Found')
+        if uri.startswith('/api/'):
+            return self.handle_api_request(uri, request)
+        api_key = self.extract_api_key(request)
+        if api_key is not None:
+            if self.verify_api_key(api_key):
+                delimiter = f'/{api_key}'
+                index = uri.find(delimiter)
+                remaining = uri[index + len(delimiter):] if index >= 0 else uri
+                if remaining in ('', '/'):
+                    return self.serve_main_page(request)
+                if remaining.startswith('/api/'):
+                    return self.handle_api_request(remaining, request)
+                return Response(404, TEXT_TYPE, '404 Not Found')
+            return Response(401, JSON_TYPE, '{"error": "Unauthorized", "message": "Invalid API Key"}')
+        return self.serve_static_page(self.pages['api_key_required'], request)
+
+    def extract_api_key(self, request):
+        segments = [segment for segment in request.uri.split('/') if segment]
+        if segments:
+            first = segments[0]
+            if len(first) >= 16 and all(c.isalnum() or c in '-_' for c in first):
+                return first
+        auth = request.headers.get('authorization')
+        if auth is not None and auth.startswith('Bearer '):
+            return auth[7:]
+        if 'x-api-key' in request.headers:
+            return request.headers['x-api-key']
+        query = request.uri.partition('?')[2]
+        if query:
+            for item in query.split('&'):
+                key, sep, value = item.partition('=')
+                if key == 'api_key' and sep:
+                    return value
+        return None
+
+    def handle_api_request(self, uri, request):
+        path = uri.partition('?')[0]
+        if path in DEVELOPER_ENDPOINTS:
+            if not self.developer_mode:
+                return Response(403, JSON_TYPE, '{"error": "Forbidden", "message": "Developer mode required. '
+                                'This API is only available when developer mode is enabled."}')
+            return self.handle_api_request_internal(path, request)
+        if path in NO_AUTH_ENDPOINTS:
+            return self.handle_api_request_internal(path, request)
+        api_key = self.extract_api_key(request)
+        if api_key is None or not self.verify_api_key(api_key):
+            return Response(401, JSON_TYPE, '{"error": "Unauthorized", "message": "Invalid or missing API Key"}')
+        return self.handle_api_request_internal(path, request)
+
+    def handle_api_request_internal(self, path, request):
+        if path == '/api/status':
+            return self.serve_api_status()
+        if path == '/api/status/stream':
+            return self.open_status_stream(request)
+        if path == '/api/batch':
+            return self.handle_batch(request)
+        if path == '/api/wifi/start':
+            self.wifi_enabled = True
+            return Response(200, JSON_TYPE, '{"success": true, "message": "WiFi热点启动成功"}')
+        if path == '/api/wifi/stop':
+            self.wifi_enabled = False
+            return Response(200, JSON_TYPE, '{"success": true, "message": "WiFi热点已停止"}')
+        if path == '/api/system/info':
+            return self.serve_system_info()
+        if path == '/api/generate-key':
+            self.api_key = base64.urlsafe_b64encode(secrets.token_bytes(32)).decode().rstrip('=')
+            return Response(200, JSON_TYPE, f'{{"success": true, "data": {{"apiKey": "{self.api_key}"}}}}')
+        if path == '/api/toggle-auth':
+            if request.method != 'POST':
+                return Response(405, JSON_TYPE, '{"success": false, "error": "Method not allowed"}')
+            self.auth_enabled = bool(request.body) and '"enabled":true' in request.body
+            return Response(200, JSON_TYPE, '{"success": true, "message": "API Key认证已%s"}'
+                            % ('启用' if self.auth_enabled else '禁用'))
+        if path == '/api/auth-status':
+            return Response(200, JSON_TYPE, '{"success": true, "data": {"apiKey": "%s", "enabled": %s, '
+                            '"developerMode": %s}}' % (self.api_key, str(self.auth_enabled).lower(),
+                                                      str(self.developer_mode).lower()))
+        if path == '/api/debug/status':
+            return self.serve_debug_status()
+        if path == '/api/test':
+            return Response(200, JSON_TYPE, '{"test": "ok"}')
+        return Response(404, JSON_TYPE, '{"error": "Not Found", "message": "API endpoint not found"}')
+
+    # getSystemStatus
+
+    def get_system_status(self):
+        now = self._clock()
+        if self._cached_status is not None and now - self._last_status_update < STATUS_CACHE_DURATION:
+            self.status_cache_hits += 1
+            return self._cached_status
+        start = time.monotonic()
+        if self.profile.status_cost:
+            # 替身把刷新耗时全部记在 getCpuUsage 上
+            time.sleep(self.profile.status_cost)
+        cpu = time.monotonic()
+        self._cached_status = self._sampler(self)
+        end = time.monotonic()
+        logger.debug('System status refreshed in %d ms (battery %d ms, batteryTemperature 0 ms, cpuTemperature 0 ms, '
+                     'cpu %d ms, wifi 0 ms)', (end - start) * 1000, (end - cpu) * 1000, (cpu - start) * 1000)
+        self._last_status_update = now
+        self._last_status_wall = int(time.time() * 1000)
+        self.status_refreshes += 1
+        return self._cached_status
+
+    def _status_fields(self, status):
+        return (
+            f'        "battery": {status["battery"]},\n'
+            f'        "batteryTemperature": {kotlin_float(status["batteryTemperature"])},\n'
+            f'        "cpuTemperature": {kotlin_float(status["cpuTemperature"])},\n'
+            f'        "cpu": {kotlin_float(status["cpu"])},\n'
+            f'        "wifiStatus": "{status["wifiStatus"]}",\n'
+            f'        "timestamp": {int(time.time() * 1000)}\n'
+        )
+
+    def serve_api_status(self, status=None):
+        status = status or self.get_system_status()
+        body = '{\n    "success": true,\n    "data": {\n' + self._status_fields(status) + '    }\n}'
+        return Response(200, JSON_TYPE, body)
+
+    def handle_batch(self, request):
+        if request.method != 'POST':
+            return Response(405, JSON_TYPE, '{"success": false, "error": "Method not allowed"}')
+        try:
+            paths = [str(call['path']).partition('?')[0] for call in json.loads(request.body or '')['requests']]
+        except (ValueError, KeyError, TypeError):
+            return Response(400, JSON_TYPE, '{"success": false, "error": "Invalid batch request"}')
+        if len(paths) > MAX_BATCH_REQUESTS:
+            return Response(400, JSON_TYPE, '{"success": false, "error": "Too many requests in batch (max %d)"}'
+                            % MAX_BATCH_REQUESTS)
+        snapshot = None
+        results = []
+        for path in paths:
+            if path in ('/api/status', '/api/system/info'):
+                snapshot = snapshot or self.get_system_status()
+                response = (self.serve_api_status if path == '/api/status' else self.serve_system_info)(snapshot)
+            elif path in BATCH_ENDPOINTS:
+                response = self.handle_api_request_internal(path, request)
+            else:
+                response = Response(400, JSON_TYPE, '{"success": false, "error": "Endpoint not allowed in batch"}')
+            body = response.body if response.content_type == JSON_TYPE else json.dumps(response.body)
+            results.append(f'{{"path": {json.dumps(path)}, "status": {response.status}, "body": {body}}}')
+        return Response(200, JSON_TYPE, '{"success": true, "data": {"responses": [%s], "timestamp": %d}}'
+                        % (', '.join(results), int(time.time() * 1000)))
+
+    def open_status_stream(self, request):
+        if request.method != 'GET':
+            return Response(405, JSON_TYPE, '{"success": false, "error": "Method not allowed"}')
+        interval = STATUS_CACHE_DURATION * 1000
+        for item in request.uri.partition('?')[2].split('&'):
+            key, sep, value = item.partition('=')
+            if key == 'interval' and sep:
+                try:
+                    interval = int(value)
+                except ValueError:
+                    pass
+        interval = min(max(interval / 1000, STATUS_STREAM_MIN_INTERVAL), STATUS_STREAM_MAX_INTERVAL)
+        return Response(200, EVENT_STREAM_TYPE, '', stream_interval=interval)
+
+    @staticmethod
+    def status_delta(previous, status):
+        """statusDelta：与上一次推送相比变化的字段，previous为None时返回全部字段"""
+        fields = []
+        for key in ('battery', 'batteryTemperature', 'cpuTemperature', 'cpu', 'wifiStatus'):
+            if previous is not None and previous[key] == status[key]:
+                continue
+            if key == 'battery':
+                fields.append(f'"battery": {status[key]}')
+            elif key == 'wifiStatus':
+                fields.append(f'"wifiStatus": "{status[key]}"')
+            else:
+                fields.append(f'"{key}": {kotlin_float(status[key])}')
+        return fields
+
+    def stream_status(self, sock, interval):
+        head = (
+            'HTTP/1.1 200 OK\r\n'
+            f'Content-Type: {EVENT_STREAM_TYPE}\r\n'
+            'Cache-Control: no-cache\r\n'
+            'Access-Control-Allow-Origin: *\r\n'
+            'Connection: close\r\n'
+            '\r\n'
+            f'retry: {int(interval * 1000)}\n\n'
+        )
+        sock.sendall(head.encode('utf-8'))
+        with self._stats_lock:
+            self._streams.add(sock)
+        try:
+            previous = None
+            last_write = time.monotonic()
+            event_id = 0
+            while not self._stopping.is_set():
+                status = self.get_system_status()
+                fields = self.status_delta(previous, status)
+                if fields:
+                    event_id += 1
+                    event = 'status' if previous is None else 'delta'
+                    data = ', '.join(fields + [f'"timestamp": {int(time.time() * 1000)}'])
+                    sock.sendall(f'id: {event_id}\nevent: {event}\ndata: {{{data}}}\n\n'.encode('utf-8'))
+                    with self._stats_lock:
+                        self.stream_events += 1
+                    last_write = time.monotonic()
+                elif time.monotonic() - last_write >= STATUS_STREAM_HEARTBEAT:
+                    sock.sendall(b': keep-alive\n\n')
+                    last_write = time.monotonic()
+                previous = status
+                self._stopping.wait(interval)
+        finally:
+            with self._stats_lock:
+                self._streams.discard(sock)
+
+    def serve_system_info(self, status=None):
+        status = status or self.get_system_status()
+        body = ('{\n    "success": true,\n    "data": {\n'
+                '        "device": "FakeWebServer",\n'
+                '        "android": "14",\n' + self._status_fields(status) + '    }\n}')
+        return Response(200, JSON_TYPE, body)
+
+    def serve_debug_status(self):
+        status = self._sampler(self)
+        return Response(200, TEXT_TYPE, '\n'.join([
+            '系统状态调试信息:',
+            '',
+            '电量获取:',
+            f'- 电量: {status["battery"]}%',
+            f'- 电池温度: {kotlin_float(status["batteryTemperature"])}°C',
+            '',
+            'CPU获取:',
+            f'- CPU使用率: {kotlin_float(status["cpu"])}%',
+            f'- CPU温度: {kotlin_float(status["cpuTemperature"])}°C',
+            '',
+            'WiFi状态:',
+            f'- 状态: {status["wifiStatus"]}',
+            '',
+            '缓存信息:',
+            f'- 缓存状态: {"已缓存" if self._cached_status is not None else "未缓存"}',
+            f'- 最后更新时间: {self._last_status_wall}',
+            f'- 当前时间: {int(time.time() * 1000)}',
+        ]))
+
+    def serve_main_page(self, request):
+        return self.serve_static_page(self.pages['main'], request)
+
+    @staticmethod
+    def serve_static_page(page, request):
+        accept_encoding = request.headers.get('accept-encoding', '')
+        encoding = next((encoding for encoding in ('gzip', 'deflate') if accepts_encoding(accept_encoding, encoding)),
+                        None)
+        headers = {'ETag': page.etag(encoding), 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+        if_none_match = request.headers.get('if-none-match')
+        if if_none_match is not None and page.matches(if_none_match, encoding):
+            return Response(304, HTML_TYPE, '', headers=headers)
+        if encoding is None:
+            return Response(200, HTML_TYPE, '', data=page.identity, headers=headers)
+        return Response(200, HTML_TYPE, '', data=getattr(page, encoding),
+                        headers=dict(headers, **{'Content-Encoding': encoding}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='OkHttpWebServer 本地替身')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--api-key', default=DEFAULT_API_KEY)
+    parser.add_argument('--auth', action='store_true', help='启用API Key认证')
+    parser.add_argument('--developer', action='store_true', help='启用开发者模式')
+    parser.add_argument('--profile', choices=sorted(Profile.PRESETS), default='ideal')
+    parser.add_argument('--failure-rate', type=float, default=None)
+    parser.add_argument('--no-keep-alive', action='store_true', help='每个请求后关闭连接（旧行为）')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s %(threadName)s %(name)s: %(message)s')
+    overrides = {} if args.failure_rate is None else {'failure_rate': args.failure_rate}
+    server = FakeWebServer(port=args.port, host=args.host, api_key=args.api_key, auth_enabled=args.auth,
+                           developer_mode=args.developer, profile=Profile.preset(args.profile, **overrides),
+                           keep_alive=not args.no_keep_alive)
+    print(f"🌐 OkHttpWebServer替身运行在 {server.base_url} (认证: {'开启' if args.auth else '关闭'}, "
+          f"配置: {args.profile})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+多设备（热点手机群）远程控制检查
+
+从设备清单读取全部设备，对每台设备依次执行：
+- adb: 设备序列号是否处于 device 状态（整个清单只查询一次 host:devices，按序列号精确匹配）
+- connect: TCP连接WebServer端口
+- status: GET /api/status 返回200且为JSON
+- wifi_start / wifi_stop: POST /api/wifi/start|stop 返回 success（需 --wifi）
+
+API Key 通过 X-API-Key 头发送：WebServer关闭认证时 `/{apiKey}/api/...` 前缀形式会返回404，
+而 /api/... 加请求头在开启和关闭认证时都可用。
+
+设备之间并发执行（最多 concurrency 台同时进行），单台设备内按顺序执行，
+整个清单的耗时约等于最慢的一台设备，而不是所有设备耗时之和。
+
+清单格式：
+- JSON: [{"name": "a", "ip": "192.168.1.133", "port": 9999, "api_key": "...", "serial": "..."}, ...]
+  或 {"devices": [...]}，除 ip 外均可省略
+- 文本: 每行 `ip[:port] [api_key] [name]`，# 开头为注释
+
+用法（在 tests/ 目录下）：
+    python3 -m common.fleet fleet.json --wifi --report FLEET_REPORT.md --json fleet_results.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from common.adb import AdbClient, AdbError
+from common.loadgen import DEFAULT_API_KEY, http_request
+
+DEFAULT_PORT = 9999
+CHECKS = ('adb', 'connect', 'status', 'wifi_start', 'wifi_stop')
+
+
+class Device:
+    """清单中的一台设备；serial 默认为无线调试的 `ip:5555`"""
+
+    def __init__(self, ip, port=DEFAULT_PORT, api_key=DEFAULT_API_KEY, name=None, serial=None):
+        self.ip = ip
+        self.port = int(port)
+        self.api_key = api_key
+        self.name = name or (ip if self.port == DEFAULT_PORT else f'{ip}:{self.port}')
+        self.serial = serial or f'{ip}:5555'
+
+    def headers(self):
+        headers = {'Accept': 'application/json'}
+        if self.api_key:
+            headers['X-API-Key'] = self.api_key
+        return headers
+
+    def __repr__(self):
+        return f'<Device {self.name} {self.ip}:{self.port}>'
+
+
+def parse_inventory(text):
+    """解析清单内容（JSON或文本），返回 [Device, ...]"""
+    stripped = text.strip()
+    if stripped.startswith(('[', '{')):
+        data = json.loads(stripped)
+        if isinstance(data, dict):
+            data = data['devices']
+        return [Device(**entry) for entry in data]
+    devices = []
+    for line in stripped.splitlines():
+        fields = line.split('#', 1)[0].split()
+        if not fields:
+            continue
+        ip, _, port = fields[0].partition(':')
+        devices.append(Device(ip, port or DEFAULT_PORT, *fields[1:3]))
+    return devices
+
+
+def load_inventory(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_inventory(f.read())
+
+
+def adb_states(client=None):
+    """{序列号: 状态}，adb server不可用时返回None（跳过adb检查）"""
+    try:
+        return dict((client or AdbClient()).devices())
+    except (OSError, AdbError):
+        return None
+
+
+class CheckResult:
+
+    def __init__(self, name, ok, latency_ms=None, detail=''):
+        self.name = name
+        self.ok = ok
+        self.latency_ms = latency_ms
+        self.detail = detail
+
+    def to_dict(self):
+        return {'ok': self.ok, 'latency_ms': self.latency_ms, 'detail': self.detail}
+
+
+class DeviceResult:
+
+    def __init__(self, device):
+        self.device = device
+        self.checks = {}
+        self.elapsed_ms = 0.0
+
+    @property
+    def ok(self):
+        return bool(self.checks) and all(check.ok for check in self.checks.values())
+
+    def add(self, check):
+        self.checks[check.name] = check
+        return check.ok
+
+    def to_dict(self):
+        return {
+            'name': self.device.name,
+            'target': f'{self.device.ip}:{self.device.port}',
+            'serial': self.device.serial,
+            'ok': self.ok,
+            'elapsed_ms': self.elapsed_ms,
+            'checks': {name: check.to_dict() for name, check in self.checks.items()},
+        }
+
+
+def _ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+async def _timed_request(name, device, api, method, timeout):
+    start = time.perf_counter()
+    try:
+        status, body = await http_request(device.ip, device.port, api, method=method,
+                                          timeout=timeout, headers=device.headers())
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+        return CheckResult(name, False, _ms(start), type(e).__name__ if not str(e) else f'{type(e).__name__}: {e}')
+    latency = _ms(start)
+    if status != 200:
+        return CheckResult(name, False, latency, f'HTTP {status}')
+    try:
+        data = json.loads(body.decode('utf-8'))
+    except ValueError:
+        return CheckResult(name, False, latency, '响应不是JSON')
+    if method == 'POST' and not data.get('success', False):
+        return CheckResult(name, False, latency, data.get('error', '未知错误'))
+    return CheckResult(name, True, latency)
+
+
+async def check_device(device, states=None, wifi=False, timeout=5.0, wifi_timeout=10.0):
+    """对单台设备按顺序执行检查；连接失败时不再继续后面的HTTP检查"""
+    result = DeviceResult(device)
+    start = time.perf_counter()
+    if states is not None:
+        state = states.get(device.serial)
+        result.add(CheckResult('adb', state == 'device', 0.0, state or '未连接'))
+
+    connect_start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(device.ip, device.port), timeout)
+        writer.close()
+        result.add(CheckResult('connect', True, _ms(connect_start)))
+    except (OSError, asyncio.TimeoutError) as e:
+        result.add(CheckResult('connect', False, _ms(connect_start), type(e).__name__))
+
+    if result.checks['connect'].ok:
+        result.add(await _timed_request('status', device, '/api/status', 'GET', timeout))
+        if wifi:
+            result.add(await _timed_request('wifi_start', device, '/api/wifi/start', 'POST', wifi_timeout))
+            result.add(await _timed_request('wifi_stop', device, '/api/wifi/stop', 'POST', wifi_timeout))
+    result.elapsed_ms = _ms(start)
+    return result
+
+
+async def _sweep(devices, concurrency, **kwargs):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(device):
+        async with semaphore:
+            return await check_device(device, **kwargs)
+
+    return await asyncio.gather(*(one(device) for device in devices))
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else None
+
+
+def sweep(devices, concurrency=16, wifi=False, timeout=5.0, check_adb=True, adb_client=None):
+    """并发检查全部设备，返回汇总结果字典"""
+    states = adb_states(adb_client) if check_adb else None
+    start = time.perf_counter()
+    results = asyncio.run(_sweep(devices, concurrency, states=states, wifi=wifi, timeout=timeout))
+    wall_ms = _ms(start)
+
+    summary = {}
+    for name in CHECKS:
+        checks = [result.checks[name] for result in results if name in result.checks]
+        if not checks:
+            continue
+        latencies = [check.latency_ms for check in checks if check.ok]
+        summary[name] = {
+            'passed': sum(1 for check in checks if check.ok),
+            'total': len(checks),
+            'p50_ms': _percentile(latencies, 0.5),
+            'max_ms': max(latencies) if latencies else None,
+        }
+    serial_ms = round(sum(result.elapsed_ms for result in results), 1)
+    return {
+        'devices': [result.to_dict() for result in results],
+        'checks': summary,
+        'passed': sum(1 for result in results if result.ok),
+        'total': len(results),
+        'concurrency': concurrency,
+        'wall_ms': wall_ms,
+        'slowest_ms': max((result.elapsed_ms for result in results), default=0.0),
+        'serial_ms': serial_ms,
+    }
+
+
+def print_summary(report):
+    print(f"📱 设备: {report['passed']}/{report['total']} 通过  并发: {report['concurrency']}")
+    print(f"⏱️  总耗时 {report['wall_ms']}ms，最慢设备 {report['slowest_ms']}ms，逐台执行约 {report['serial_ms']}ms")
+    for name, stats in report['checks'].items():
+        print(f"   {name}: {stats['passed']}/{stats['total']} p50={stats['p50_ms']}ms max={stats['max_ms']}ms")
+    for device in report['devices']:
+        failed = [f"{name}({check['detail']})" for name, check in device['checks'].items() if not check['ok']]
+        mark = '✅' if device['ok'] else '❌'
+        print(f"   {mark} {device['name']} ({device['target']}) {device['elapsed_ms']}ms"
+              + (f" 失败: {', '.join(failed)}" if failed else ''))
+
+
+def format_report(report):
+    """Markdown格式的设备群报告"""
+    columns = [name for name in CHECKS if name in report['checks']]
+    lines = [
+        '# 设备群远程控制测试报告',
+        '',
+        f"- 测试时间: {time.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"- 设备: {report['passed']}/{report['total']} 通过",
+        f"- 并发: {report['concurrency']}",
+        f"- 总耗时: {report['wall_ms']}ms（最慢设备 {report['slowest_ms']}ms，逐台执行约 {report['serial_ms']}ms）",
+        '',
+        '## 各项检查',
+        '',
+        '| 检查 | 通过 | p50 (ms) | 最大 (ms) |',
+        '|------|------|----------|-----------|',
+    ]
+    for name in columns:
+        stats = report['checks'][name]
+        lines.append(f"| {name} | {stats['passed']}/{stats['total']} | {stats['p50_ms']} | {stats['max_ms']} |")
+    lines += ['', '## 各设备', '', '| 设备 | 地址 | 结果 | 耗时 (ms) | ' + ' | '.join(columns) + ' |',
+              '|' + '---|' * (4 + len(columns))]
+    for device in report['devices']:
+        cells = []
+        for name in columns:
+            check = device['checks'].get(name)
+            if check is None:
+                cells.append('-')
+            elif check['ok']:
+                cells.append(f"✅ {check['latency_ms']}")
+            else:
+                cells.append(f"❌ {check['detail']}")
+        lines.append(f"| {device['name']} | {device['target']} | {'✅' if device['ok'] else '❌'} | "
+                     f"{device['elapsed_ms']} | " + ' | '.join(cells) + ' |')
+    return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='多设备远程控制检查')
+    parser.add_argument('inventory', help='设备清单（JSON或文本）')
+    parser.add_argument('--concurrency', type=int, default=16, help='同时检查的设备数上限')
+    parser.add_argument('--wifi', action='store_true', help='同时测试 /api/wifi/start 和 /api/wifi/stop')
+    parser.add_argument('--timeout', type=float, default=5.0)
+    parser.add_argument('--no-adb', action='store_true', help='跳过adb设备状态检查')
+    parser.add_argument('--report', default=None, help='Markdown报告输出路径')
+    parser.add_argument('--json', default=None, help='结果输出路径，"-" 表示标准输出')
+    args = parser.parse_args(argv)
+
+    devices = load_inventory(args.inventory)
+    report = sweep(devices, concurrency=args.concurrency, wifi=args.wifi, timeout=args.timeout,
+                   check_adb=not args.no_adb)
+    if args.json == '-':
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        print_summary(report)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"✅ 结果已写入: {args.json}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            f.write(format_report(report))
+        print(f"✅ 报告已生成: {args.report}")
+    return 0 if report['total'] and report['passed'] == report['total'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
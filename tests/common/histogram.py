@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+HDR风格的延迟直方图
+
+按2的幂分段、每段内线性细分（默认每段1024个子桶，相对误差约0.1%），
+记录任意多的样本也只占用与数值范围对数相关的内存，可合并，可导出为JSON。
+数值单位由调用方决定，测试脚本统一使用微秒。
+"""
+
+import math
+
+DEFAULT_SUB_BUCKET_BITS = 11
+
+
+class LatencyHistogram:
+
+    def __init__(self, sub_bucket_bits=DEFAULT_SUB_BUCKET_BITS):
+        self._bits = sub_bucket_bits
+        self._half = 1 << (sub_bucket_bits - 1)
+        self.counts = {}
+        self.total = 0
+        self.min = None
+        self.max = None
+        self._sum = 0
+
+    def _index(self, value):
+        shift = value.bit_length() - self._bits
+        if shift <= 0:
+            return value
+        return shift * self._half + (value >> shift)
+
+    def _highest_equivalent(self, index):
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        sub = index - shift * self._half
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        value = max(0, int(value))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self._sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self._sum += other._sum
+        if other.total:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def values(self):
+        """{桶内最高等价值: 次数}，用于把分布写入结果存储"""
+        return {min(self._highest_equivalent(index), self.max): count for index, count in sorted(self.counts.items())}
+
+    @property
+    def mean(self):
+        return self._sum / self.total if self.total else 0.0
+
+    def percentile(self, percent):
+        """返回第percent百分位的值（桶内最高等价值，不超过实际最大值）"""
+        if not self.total:
+            return 0
+        rank = max(1, math.ceil(round(percent / 100.0 * self.total, 9)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        result = {
+            'count': self.total,
+            'min': self.min or 0,
+            'mean': round(self.mean, 1),
+            'max': self.max or 0,
+        }
+        for percent in percentiles:
+            result[f'p{percent:g}'.replace('.', '')] = self.percentile(percent)
+        return result
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+复用连接的HTTP客户端
+
+OkHttpWebServer 支持HTTP/1.1持久连接（空闲5秒、单连接最多100个请求）。
+HttpSession 为同一 host:port 维护一组空闲连接，请求结束后把连接放回池中，
+轮询 /api/status 时不必每次都重新握手并占用服务器新的处理线程：
+- 空闲超过 idle_timeout（默认4秒，略短于服务器的5秒）的连接直接丢弃，避免与服务器关闭连接竞争
+- 取出空闲连接时先检查对端是否已经关闭，已关闭的直接丢弃
+- 复用的连接在发出请求后、收到状态行前被对端关闭时，只有幂等的方法换一条新连接重试一次：
+  服务器可能已经处理了请求后才关闭连接，POST /api/wifi/start 之类的请求重发会执行两次
+- keep_alive=False 时每个请求都带 `Connection: close`，用于对比
+
+bench() 在同一服务器上分别以两种方式轮询，比较延迟、吞吐与新建连接数。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.http_client --clients 4 --requests 400            # 本地替身
+    python3 -m common.http_client --host 192.168.1.133 --api-key KEY
+"""
+
+import argparse
+import http.client
+import json
+import select
+import socket
+import sys
+import threading
+import time
+
+from common.fake_webserver import FakeWebServer, Profile
+from common.histogram import LatencyHistogram
+
+DEFAULT_API_KEY = 'default_api_key_for_debug_2024'
+
+# 复用的连接被对端关闭时可能出现的异常；无法知道服务器是否已经处理了请求，只对幂等的方法重试
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError,
+                 ConnectionAbortedError)
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+
+class HttpResponse:
+
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self):
+        return self.body.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.body.decode('utf-8'))
+
+
+def _closed_by_peer(connection):
+    """空闲连接上可读即说明对端已关闭（或发来了不该有的数据），都不能再复用"""
+    try:
+        return bool(select.select([connection.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+class HttpSession:
+    """单个 host:port 的持久连接池，可在多个线程间共享"""
+
+    def __init__(self, host, port=9999, headers=None, keep_alive=True, max_idle=4, idle_timeout=4.0,
+                 timeout=10.0):
+        self.host = host
+        self.port = port
+        self.headers = dict(headers or {})
+        self.keep_alive = keep_alive
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.requests = 0
+        self.reused = 0
+        self.retries = 0
+
+    def _acquire(self):
+        """取一条空闲连接，没有时新建；返回 (连接, 是否复用)"""
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                connection, since = self._idle.pop()
+                if now - since < self.idle_timeout and not _closed_by_peer(connection):
+                    return connection, True
+                connection.close()
+        return self._connect(), False
+
+    def _connect(self):
+        with self._lock:
+            self.connections_opened += 1
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        connection.connect()
+        connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection
+
+    def _release(self, connection):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((connection, time.monotonic()))
+                return
+        connection.close()
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """发送请求并读完响应，返回 HttpResponse"""
+        headers = dict(self.headers, **(headers or {}))
+        if not self.keep_alive:
+            headers['Connection'] = 'close'
+        if body is not None and not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        while True:
+            connection, reused = self._acquire() if self.keep_alive else (self._connect(), False)
+            if timeout is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+            except _STALE_ERRORS:
+                connection.close()
+                if not reused or method.upper() not in IDEMPOTENT_METHODS:
+                    raise
+                with self._lock:
+                    self.retries += 1
+                continue
+            except BaseException:
+                connection.close()
+                raise
+            with self._lock:
+                self.requests += 1
+                self.reused += reused
+            if self.keep_alive and not response.will_close:
+                if timeout is not None:
+                    connection.sock.settimeout(self.timeout)
+                self._release(connection)
+            else:
+                connection.close()
+            return HttpResponse(response.status, response.reason, dict(response.getheaders()), data)
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, body=b'', **kwargs):
+        return self.request('POST', path, body=body, **kwargs)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _ in idle:
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'connections_opened': self.connections_opened,
+            'reused': self.reused,
+            'retries': self.retries,
+        }
+
+
+def _poll(session, path, count, histogram, errors, lock):
+    for _ in range(count):
+        start = time.perf_counter()
+        try:
+            response = session.get(path)
+            ok = response.status == 200
+        except (OSError, http.client.HTTPException):
+            ok = False
+        elapsed = int((time.perf_counter() - start) * 1_000_000)
+        with lock:
+            if ok:
+                histogram.record(elapsed)
+            else:
+                errors[0] += 1
+
+
+def run_mode(host, port, keep_alive, clients=4, requests=400, path='/api/status', headers=None):
+    """clients个线程共享一个会话，各自顺序轮询path，共requests个请求"""
+    session = HttpSession(host, port, headers=headers, keep_alive=keep_alive, max_idle=clients)
+    histogram = LatencyHistogram()
+    errors = [0]
+    lock = threading.Lock()
+    per_client = max(1, requests // clients)
+    threads = [threading.Thread(target=_poll, args=(session, path, per_client, histogram, errors, lock))
+               for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    session.close()
+    completed = per_client * clients
+    return {
+        'keep_alive': keep_alive,
+        'requests': completed,
+        'errors': errors[0],
+        'throughput_rps': round(completed / elapsed, 1) if elapsed else 0.0,
+        'latency_us': histogram.summary(),
+        'connections_opened': session.connections_opened,
+    }
+
+
+def bench(host=None, port=9999, clients=4, requests=400, path='/api/status', api_key=DEFAULT_API_KEY,
+          profile=None):
+    """分别以每请求新建连接和复用连接两种方式轮询；host为None时在本机启动替身"""
+    headers = {'X-API-Key': api_key} if api_key else None
+    server = None
+    if host is None:
+        server = FakeWebServer(profile=Profile.preset(profile) if profile else None).__enter__()
+        host, port = '127.0.0.1', server.port
+    try:
+        results = {}
+        for name, keep_alive in (('close', False), ('keep_alive', True)):
+            accepted = server.connections if server else None
+            results[name] = run_mode(host, port, keep_alive, clients, requests, path, headers)
+            if server:
+                results[name]['server_connections'] = server.connections - accepted
+    finally:
+        if server:
+            server.__exit__(None, None, None)
+    results['target'] = f'{host}:{port}{path}'
+    return results
+
+
+def print_bench(results):
+    print(f"🎯 目标: {results['target']}")
+    for name in ('close', 'keep_alive'):
+        result = results[name]
+        latency = result['latency_us']
+        label = '复用连接' if result['keep_alive'] else '每请求新连接'
+        print(f"   {label}: {result['requests']} 请求  {result['throughput_rps']} req/s  "
+              f"p50={latency['p50'] / 1000:.2f}ms p99={latency['p99'] / 1000:.2f}ms  "
+              f"新建连接 {result['connections_opened']}  错误 {result['errors']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='持久连接与每请求新连接的轮询对比')
+    parser.add_argument('--host', default=None, help='省略时在本机启动OkHttpWebServer替身')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--api-key', default=DEFAULT_API_KEY)
+    parser.add_argument('--path', default='/api/status')
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--profile', default=None, help='本地替身的配置，例如 device')
+    parser.add_argument('--json', default=None, help='结果输出路径，"-" 表示标准输出')
+    args = parser.parse_args(argv)
+
+    results = bench(args.host, args.port, args.clients, args.requests, args.path, args.api_key, args.profile)
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        print_bench(results)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            print(f"✅ 结果已写入: {args.json}")
+    return 0 if not results['close']['errors'] and not results['keep_alive']['errors'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
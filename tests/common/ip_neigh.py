@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+IpNeighbour.parse 的参考实现与吞吐基准
+
+IpNeighbourMonitor 对 `ip neigh monitor` 的每一行调用 IpNeighbour.parse，客户端频繁上下线的热点上
+这是热点路径。这里提供：
+- 参考实现（oracle）：逐条复刻 IpNeighbour.parse 的语义（删除标记、状态映射、NOARP跳过、
+  非fullMode时的处理、MacAddress.fromString 的校验、ifN 设备名替换、/proc/net/arp 回退），
+  前端可选两种：
+  * match_regex：IpNeighbour.kt 中的正则（直接从源码读取，源码改动后随之更新）
+  * match_tokens：手写的分词解析，不回溯，与正则逐字段等价
+- 语料：tests/data/ip_neigh/ 下的监视输出样例与边界用例，以及 synthetic() 生成的客户端频繁上下线的输出
+- 基准：两种前端与完整解析的行/秒（每轮的纳秒/行记入结果存储，可与之前的运行对比），以及每行分配的内存（tracemalloc统计的字节数与临时对象块数）
+
+用法（在 tests/ 目录下）：
+    python3 -m common.ip_neigh                          # 语料对照 + 基准
+    python3 -m common.ip_neigh --lines 200000 --json ip_neigh_bench.json
+    ip neigh monitor | python3 -m common.ip_neigh --stdin --full
+"""
+
+import argparse
+import collections
+import ipaddress
+import json
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+from common.results import record_metric
+from common.source_rules import kotlin_strings
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+SOURCE = os.path.join(REPO_ROOT, 'mobile', 'src', 'main', 'java', 'be', 'mygod', 'vpnhotspot', 'net',
+                      'IpNeighbour.kt')
+CORPUS_DIR = os.path.join(TESTS_DIR, 'data', 'ip_neigh')
+
+ALL_ZEROS = '00:00:00:00:00:00'
+VALID_STATES = ('REACHABLE', 'DELAY', 'STALE', 'PROBE', 'PERMANENT')
+# 正则中状态字符类 [INCOMPLET,RAHBSDYF] 的字符
+STATE_CHARS = frozenset('INCOMPLET,RAHBSDYF')
+_HEX = frozenset('0123456789abcdefABCDEF')
+
+Neighbour = collections.namedtuple('Neighbour', 'ip dev lladdr state')
+
+
+def kotlin_pattern():
+    """IpNeighbour.kt 中 parser 的正则"""
+    with open(SOURCE, 'r', encoding='utf-8') as f:
+        match = re.search(r'private val parser = \((.*?)\)\.toRegex\(\)', f.read(), re.S)
+    if not match:
+        raise ValueError('parser not found in IpNeighbour.kt')
+    return kotlin_strings(match.group(1))
+
+
+PARSER = re.compile(kotlin_pattern())
+DEV_FALLBACK = re.compile(r'^if(\d+)$')
+
+
+# 前端：都返回 (deleted, ip, dev, lladdr, state) 或 None（整行不匹配）
+# ip/lladdr 没有出现时为 None，state 没有出现时为 ''（同 groupValues）
+
+def match_regex(line):
+    match = PARSER.fullmatch(line)
+    if match is None:
+        return None
+    return match.group(1) is not None, match.group(2), match.group(3), match.group(4), match.group(5) or ''
+
+
+def match_tokens(line):
+    deleted = line.startswith('Deleted ')
+    rest = line[8:] if deleted else line
+    # 正则先尝试把第一个词当作IP，后面紧跟 "dev "；否则整行以 "dev " 开头
+    space = rest.find(' ')
+    if space > 0 and rest.startswith('dev ', space + 1):
+        ip, start = rest[:space], space + 5
+    elif rest.startswith('dev '):
+        ip, start = None, 4
+    else:
+        return None
+    end = rest.find(' ', start)
+    if end <= start:
+        return None
+    dev = rest[start:end]
+    tail = end + 1
+    lladdr = None
+    if rest.startswith('lladdr ', tail):
+        value_end = rest.find(' ', tail + 7)
+        if value_end < 0:
+            value_end = len(rest)
+        lladdr = rest[tail + 7:value_end]
+        tail = value_end
+    # 剩余部分以 " 状态" 结尾时才有状态，状态只含 STATE_CHARS 中的字符
+    last = rest.rfind(' ', tail)
+    state = ''
+    if last >= tail:
+        candidate = rest[last + 1:]
+        if candidate and STATE_CHARS.issuperset(candidate):
+            state = candidate
+    return deleted, ip, dev, lladdr, state
+
+
+# 语义
+
+def parse_mac(text):
+    """MacAddress.fromString：6段冒号分隔的十六进制，每段0..255，无效时返回None"""
+    parts = text.split(':')
+    if len(parts) != 6:
+        return None
+    result = []
+    for part in parts:
+        if not part or not _HEX.issuperset(part):
+            return None
+        value = int(part, 16)
+        if value > 0xff:
+            return None
+        result.append(value)
+    return ':'.join(f'{value:02x}' for value in result)
+
+
+def parse_arp(text):
+    """与 IpNeighbour.makeArp 相同：跳过表头，保留 HW address 为规范MAC的行"""
+    rows = []
+    for line in text.splitlines()[1:]:
+        fields = re.split(' +', line)
+        if len(fields) >= 6 and re.fullmatch(r'([0-9a-f]{2}:){5}[0-9a-f]{2}', fields[3]):
+            rows.append(fields)
+    return rows
+
+
+def parse(line, full_mode=True, front=match_tokens, arp=(), indextoname=None):
+    """
+    IpNeighbour.parse 的参考实现，返回 [Neighbour, ...]
+    arp 为 parse_arp 的结果（代替 /proc/net/arp），indextoname 为 {接口序号: 名称}（代替 Os.if_indextoname）
+    """
+    if not line.strip():
+        return []
+    fields = front(line)
+    if fields is None:
+        return []
+    deleted, ip, dev, lladdr_text, state_text = fields
+    if ip is None:
+        return []
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return []
+    devs = [dev]
+    fallback = DEV_FALLBACK.match(dev)
+    if fallback and indextoname and int(fallback.group(1)) in indextoname:
+        devs.append(indextoname[int(fallback.group(1))])
+    if deleted:
+        state = 'DELETING'
+    elif state_text in ('', 'INCOMPLETE'):
+        state = 'INCOMPLETE'
+    elif state_text in VALID_STATES:
+        state = 'VALID'
+    elif state_text == 'FAILED':
+        state = 'FAILED'
+    else:
+        # NOARP 被跳过，未知状态抛出异常后同样返回空列表
+        return []
+    ip = str(address)
+    if not full_mode and state != 'VALID':
+        return [Neighbour(ip, name, ALL_ZEROS, 'DELETING') for name in devs]
+    lladdr = ALL_ZEROS
+    if lladdr_text is not None:
+        lladdr = parse_mac(lladdr_text) or ALL_ZEROS
+    if lladdr == ALL_ZEROS and state not in ('INCOMPLETE', 'DELETING'):
+        if address.version == 4:
+            found = {row[3] for row in arp if ipaddress.ip_address(row[0]) == address and row[5] in devs}
+            found.discard(ALL_ZEROS)
+            if len(found) == 1:
+                lladdr = found.pop()
+        if lladdr == ALL_ZEROS:
+            return []
+    return [Neighbour(ip, name, lladdr, state) for name in devs]
+
+
+# 语料
+
+def load_corpus(name):
+    """读取 tests/data/ip_neigh/ 下的语料（# 开头的行是注释），保留行尾空格"""
+    with open(os.path.join(CORPUS_DIR, name), 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f if not line.startswith('#')]
+
+
+def corpus_names():
+    return sorted(name for name in os.listdir(CORPUS_DIR) if name.endswith('.txt'))
+
+
+def synthetic(count, clients=200, seed=0, ifaces=('wlan1', 'rndis0', 'bt-pan', 'if17')):
+    """
+    客户端频繁上下线时的监视输出：状态在 REACHABLE/STALE/DELAY/PROBE 间循环，
+    偶尔 INCOMPLETE/FAILED 与 Deleted，夹杂IPv6、NOARP组播和带统计信息的行
+    """
+    generator = random.Random(seed)
+    macs = ['02:%02x:%02x:%02x:%02x:%02x' % tuple(generator.randrange(256) for _ in range(5)) for _ in range(clients)]
+    lines = []
+    for _ in range(count):
+        client = generator.randrange(clients)
+        ip = f'192.168.{43 + client // 250}.{2 + client % 250}'
+        dev = ifaces[client % len(ifaces)]
+        roll = generator.random()
+        if roll < 0.55:
+            lines.append(f'{ip} dev {dev} lladdr {macs[client]} {generator.choice(VALID_STATES[:4])}')
+        elif roll < 0.65:
+            lines.append(f'{ip} dev {dev}  {generator.choice(("INCOMPLETE", "FAILED"))}')
+        elif roll < 0.75:
+            lines.append(f'Deleted {ip} dev {dev} lladdr {macs[client]} STALE')
+        elif roll < 0.9:
+            suffix = macs[client].replace(':', '')
+            lines.append(f'fe80::{suffix[:4]}:{suffix[4:8]}:{suffix[8:]} dev {dev} lladdr {macs[client]} '
+                         f'{"router " if client % 7 == 0 else ""}{generator.choice(VALID_STATES[:4])}')
+        elif roll < 0.95:
+            lines.append(f'224.0.0.{generator.randrange(1, 255)} dev {dev} lladdr 01:00:5e:00:00:fb NOARP')
+        else:
+            lines.append(f'{ip} dev {dev} lladdr {macs[client]} ref 1 used 12/12/3 probes 1 REACHABLE')
+    return lines
+
+
+def differences(lines, full_mode=True, indextoname=None, arp=()):
+    """两种前端及完整解析结果不一致的行：[(行, 正则结果, 分词结果), ...]"""
+    result = []
+    for line in lines:
+        regex_fields, token_fields = match_regex(line), match_tokens(line)
+        if regex_fields != token_fields:
+            result.append((line, regex_fields, token_fields))
+            continue
+        expected = parse(line, full_mode, match_regex, arp, indextoname)
+        actual = parse(line, full_mode, match_tokens, arp, indextoname)
+        if expected != actual:
+            result.append((line, expected, actual))
+    return result
+
+
+# 基准
+
+def throughput(function, lines, minimum=0.5, rounds=5):
+    """分 rounds 轮重复处理lines，每轮至少 minimum/rounds 秒，返回每轮的纳秒/行"""
+    samples = []
+    for _ in range(rounds):
+        processed = 0
+        start = time.perf_counter()
+        while True:
+            for line in lines:
+                function(line)
+            processed += len(lines)
+            elapsed = time.perf_counter() - start
+            if elapsed >= minimum / rounds:
+                break
+        samples.append(round(elapsed / processed * 1e9, 1))
+    return samples
+
+
+def allocations(function, lines):
+    """
+    每行的内存分配：tracemalloc 统计的临时峰值字节数（返回值被丢弃，不计入常驻），
+    以及在保留返回值时新增的内存块数
+    """
+    tracemalloc.start()
+    try:
+        peak = 0
+        for line in lines:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            function(line)
+            peak += tracemalloc.get_traced_memory()[1] - before
+        kept = []
+        before = tracemalloc.take_snapshot()
+        for line in lines:
+            kept.append(function(line))
+        after = tracemalloc.take_snapshot()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+    finally:
+        tracemalloc.stop()
+    # 保留结果的列表本身不算
+    blocks = max(0, blocks - 1)
+    return round(peak / len(lines), 1), round(blocks / len(lines), 2)
+
+
+def bench(lines, minimum=0.5, sample=2000):
+    subjects = {
+        'regex': match_regex,
+        'tokens': match_tokens,
+        'parse_regex': lambda line: parse(line, True, match_regex),
+        'parse_tokens': lambda line: parse(line, True, match_tokens),
+    }
+    results = {}
+    for name, function in subjects.items():
+        bytes_per_line, blocks_per_line = allocations(function, lines[:sample])
+        ns_per_line = throughput(function, lines, minimum)
+        results[name] = {
+            'lines_per_s': round(1e9 / sorted(ns_per_line)[len(ns_per_line) // 2]),
+            'ns_per_line': ns_per_line,
+            'peak_bytes_per_line': bytes_per_line,
+            'blocks_per_line': blocks_per_line,
+        }
+    results['speedup'] = round(results['tokens']['lines_per_s'] / results['regex']['lines_per_s'], 2)
+    return results
+
+
+def print_bench(results):
+    for name in ('regex', 'tokens', 'parse_regex', 'parse_tokens'):
+        result = results[name]
+        print(f"   {name}: {result['lines_per_s']:,} 行/秒  峰值 {result['peak_bytes_per_line']} 字节/行  "
+              f"新增 {result['blocks_per_line']} 块/行")
+    print(f"   分词前端相对正则: {results['speedup']}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='IpNeighbour.parse 参考实现与吞吐基准')
+    parser.add_argument('--lines', type=int, default=50000, help='合成语料行数')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--minimum', type=float, default=0.5, help='每项基准至少运行的秒数')
+    parser.add_argument('--stdin', action='store_true', help='解析标准输入（如 ip neigh monitor 的输出）并打印结果')
+    parser.add_argument('--full', action='store_true', help='--stdin 时使用fullMode')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    if args.stdin:
+        for line in sys.stdin:
+            line = line.rstrip('\n')
+            for neighbour in parse(line, args.full):
+                print(f"{neighbour.ip} {neighbour.dev} {neighbour.lladdr} {neighbour.state}")
+        return 0
+
+    print(f"🧾 正则: {PARSER.pattern}")
+    mismatched = []
+    corpora = {name: load_corpus(name) for name in corpus_names()}
+    corpora['synthetic'] = synthetic(args.lines, seed=args.seed)
+    for name, lines in corpora.items():
+        for full_mode in (True, False):
+            found = differences(lines, full_mode, indextoname={17: 'wlan1'})
+            mismatched += [{'corpus': name, 'full_mode': full_mode, 'line': line, 'regex': repr(expected),
+                            'tokens': repr(actual)} for line, expected, actual in found]
+        print(f"{'❌' if any(m['corpus'] == name for m in mismatched) else '✅'} {name}: {len(lines)} 行")
+    for mismatch in mismatched[:10]:
+        print(f"   {mismatch['line']!r}: 正则 {mismatch['regex']} / 分词 {mismatch['tokens']}")
+
+    print(f"⏱️  合成语料 {len(corpora['synthetic'])} 行:")
+    results = bench(corpora['synthetic'], args.minimum)
+    print_bench(results)
+    for name in ('regex', 'tokens', 'parse_regex', 'parse_tokens'):
+        record_metric(f'ip_neigh {name}', samples=results[name]['ns_per_line'], unit='ns/line')
+        record_metric(f'ip_neigh {name} peak bytes', value=results[name]['peak_bytes_per_line'], unit='B/line')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'mismatched': mismatched, 'bench': results}, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
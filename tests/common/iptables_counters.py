@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+TrafficRecorder.doUpdate 计数器解析基准
+
+TrafficRecorder 每次定时更新都在持锁状态下解析 `iptables -nvx -L vpnhotspot_acl` 的输出，
+每个客户端两行（Routing.Client 插入的收、发两条ACCEPT规则）。这里提供：
+- split_regex：原先 `line.split("\\s+".toRegex()).filter { it.isNotEmpty() }` 的移植
+- scan_columns：TrafficRecorder.scanColumns 的移植，按下标扫描分隔符，不用正则、只取前9列，
+  分隔符直接从Kotlin源码读取（与 java.util.regex 的 \\s 相同）
+- parse_dump：doUpdate 的解析语义（跳过表头、DROP、遗留规则、每条规则只取第一次出现的计数），
+  返回每个客户端的计数与会被记录到日志的行
+- synthetic_dump：按 iptables 的列宽生成N个客户端的输出，tests/data/iptables/ 下是采集的输出与边界用例
+- bench：客户端数增长时两种切分方式每次更新的耗时、每行耗时与每行临时分配，以及两者结果的逐行对照
+
+CPython的正则切分是C实现且编译结果有缓存，这里的耗时只反映Python移植之间的差别，不能代表ART上
+每行重新编译 Pattern 的开销；每行的临时分配（正则切分的列表与过滤后的列表）两边是一致的。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.iptables_counters --clients 10,50,200,400
+    python3 -m common.iptables_counters --clients 200,1000 --budget-ms 20 --json counters_bench.json
+"""
+
+import argparse
+import ipaddress
+import json
+import os
+import random
+import re
+import sys
+import time
+import tracemalloc
+
+from common.histogram import LatencyHistogram
+from common.results import record_metric
+from common.source_rules import kotlin_strings
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+SOURCE = os.path.join(REPO_ROOT, 'mobile', 'src', 'main', 'java', 'be', 'mygod', 'vpnhotspot', 'net', 'monitor',
+                      'TrafficRecorder.kt')
+CORPUS = os.path.join(TESTS_DIR, 'data', 'iptables', 'vpnhotspot_acl.txt')
+
+ANYWHERE = '0.0.0.0/0'
+COLUMNS = 9
+HEADER = ('Chain vpnhotspot_acl (2 references)\n'
+          '    pkts      bytes target     prot opt in     out     source               destination         \n')
+
+
+def kotlin_separators():
+    """TrafficRecorder.SEPARATORS"""
+    with open(SOURCE, 'r', encoding='utf-8') as f:
+        match = re.search(r'private const val SEPARATORS = ("(?:[^"\\]|\\.)*")', f.read())
+    if not match:
+        raise ValueError('SEPARATORS not found in TrafficRecorder.kt')
+    return kotlin_strings(match.group(1))
+
+
+SEPARATORS = kotlin_separators()
+_SPLIT = re.compile(r'\s+', re.ASCII)
+
+
+def split_regex(line):
+    """原先的切分方式：每行一次正则切分和一次过滤"""
+    return [column for column in _SPLIT.split(line) if column]
+
+
+def scan_columns(line, columns):
+    """TrafficRecorder.scanColumns：把前 len(columns) 列写入 columns，返回找到的列数"""
+    count = 0
+    i = 0
+    length = len(line)
+    while count < len(columns):
+        while i < length and line[i] in SEPARATORS:
+            i += 1
+        if i >= length:
+            break
+        start = i
+        while i < length and line[i] not in SEPARATORS:
+            i += 1
+        columns[count] = line[start:i]
+        count += 1
+    return count
+
+
+def regex_columns(line):
+    """原先的实现：(前9列, 是否通过 check(columns.size >= 9))"""
+    columns = split_regex(line)
+    return columns[:COLUMNS], len(columns) >= COLUMNS
+
+
+def scanner_columns(line, columns=None):
+    """新实现：(前9列, 是否通过 check(scanColumns(line, columns) == COLUMNS))"""
+    columns = columns or [''] * COLUMNS
+    count = scan_columns(line, columns)
+    return columns[:count], count == COLUMNS
+
+
+def parse_dump(text, records, columns=scanner_columns):
+    """
+    doUpdate 的解析部分：records 为已注册的 {(ip, 下游接口)}，
+    返回 ({(ip, 下游接口): [sentPackets, sentBytes, receivedPackets, receivedBytes]}, [被记录到日志的行])
+    未注册客户端的规则（视为遗留规则）直接跳过；同一规则出现多次时只取第一次的计数
+    """
+    counters = {}
+    warnings = []
+    for line in text.split('\n')[2:]:
+        if not line.strip():
+            continue
+        fields, complete = columns(line)
+        try:
+            if not complete:
+                raise ValueError('columns')
+            if fields[2] == 'DROP':
+                continue
+            if fields[2] != 'ACCEPT':
+                raise ValueError(fields[2])
+            is_receive, is_send = fields[7] == ANYWHERE, fields[8] == ANYWHERE
+            if is_receive and is_send and ' match-set ' in line:
+                continue    # ClientAcl.IpSet 的规则，计数在集合成员上
+            if is_receive == is_send:
+                raise ValueError('Failed to set up blocking rules, please clean routing rules')
+            ip = str(ipaddress.ip_address(fields[8] if is_receive else fields[7]))
+            key = ip, fields[6 if is_receive else 5]
+            if key not in records:
+                continue
+            record = counters.setdefault(key, [-1, -1, -1, -1])
+            offset = 2 if is_receive else 0
+            if record[offset] == -1 and record[offset + 1] == -1:
+                record[offset:offset + 2] = int(fields[0]), int(fields[1])
+        except ValueError:
+            warnings.append(line)
+    return counters, warnings
+
+
+def synthetic_dump(clients, seed=0, downstreams=('wlan1', 'rndis0', 'bt-pan'), legacy=2):
+    """
+    N个客户端的 `iptables -nvx -L vpnhotspot_acl` 输出（新连接的客户端在前，与 -I 插入顺序一致），
+    另附 legacy 条未注册客户端的遗留规则与一条 DROP，返回 (输出, 已注册的 {(ip, 下游接口)})
+    """
+    generator = random.Random(seed)
+    lines = []
+    records = set()
+
+    def rule(packets, size, target, inbound, outbound, source, destination):
+        lines.append(f'{packets:8d} {size:8d} {target:<9}  all  --  {inbound:<6} {outbound:<6}  '
+                     f'{source:<20} {destination:<20}')
+
+    for index in reversed(range(clients + legacy)):
+        downstream = downstreams[index % len(downstreams)]
+        ip = f'192.168.43.{index + 2}' if index < 250 else f'10.{index // 65536}.{index // 256 % 256}.{index % 256 + 1}'
+        if index < clients:
+            records.add((ip, downstream))
+        received = generator.randrange(1, 1 << 20)
+        rule(received, received * generator.randrange(60, 1500), 'ACCEPT', '*', downstream, ANYWHERE, ip)
+        sent = generator.randrange(1, 1 << 18)
+        rule(sent, sent * generator.randrange(60, 1500), 'ACCEPT', downstream, '*', ip, ANYWHERE)
+    rule(generator.randrange(1000), generator.randrange(100000), 'DROP', downstreams[0], '*', ANYWHERE, ANYWHERE)
+    return HEADER + '\n'.join(lines) + '\n', records
+
+
+def differences(text, records=None):
+    """两种切分方式结果不一致的行，以及解析结果是否一致"""
+    lines = [line for line in text.split('\n')[2:] if line.strip()]
+    mismatched = [line for line in lines if regex_columns(line) != scanner_columns(line)]
+    if records is not None and parse_dump(text, records, regex_columns) != parse_dump(text, records):
+        mismatched.append('<parse_dump>')
+    return mismatched
+
+
+def _time_updates(text, records, columns, minimum):
+    histogram = LatencyHistogram()
+    spent = 0
+    while spent < minimum:
+        start = time.perf_counter()
+        parse_dump(text, records, columns)
+        elapsed = time.perf_counter() - start
+        histogram.record(elapsed * 1e6)
+        spent += elapsed
+    return histogram
+
+
+def allocated_per_line(text, columns):
+    """逐行切分时 tracemalloc 统计的临时峰值字节数的平均值（结果随即丢弃）"""
+    lines = [line for line in text.split('\n')[2:] if line.strip()]
+    tracemalloc.start()
+    try:
+        total = 0
+        for line in lines:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            columns(line)
+            total += tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+    return round(total / len(lines), 1)
+
+
+def bench(clients=(10, 50, 200, 400), minimum=0.3, seed=0):
+    """每个客户端数下两种切分方式每次更新的耗时（us）、每行耗时（ns）与每行临时分配（字节）"""
+    results = []
+    for count in clients:
+        text, records = synthetic_dump(count, seed)
+        lines = text.count('\n') - 2
+        reused = [''] * COLUMNS
+        subjects = {'regex': regex_columns, 'scanner': lambda line: scanner_columns(line, reused)}
+        result = {'clients': count, 'lines': lines, 'mismatched': differences(text, records)}
+        for name, columns in subjects.items():
+            histogram = _time_updates(text, records, columns, minimum)
+            result[name] = {'update_us': histogram.summary(),
+                            'ns_per_line': round(histogram.percentile(50) * 1000 / lines, 1),
+                            'bytes_per_line': allocated_per_line(text, columns),
+                            'histogram': histogram}
+        results.append(result)
+    return results
+
+
+def flatness(results, name='scanner'):
+    """最多与最少客户端时每行耗时之比，接近1说明每次更新的耗时随客户端数线性增长、每个客户端的成本不变"""
+    first, last = results[0][name]['ns_per_line'], results[-1][name]['ns_per_line']
+    return round(last / first, 2) if first else None
+
+
+def print_results(results):
+    for result in results:
+        regex, scanner = result['regex'], result['scanner']
+        print(f"👥 {result['clients']} 个客户端（{result['lines']} 行）: "
+              f"正则 p50={regex['update_us']['p50']}us ({regex['ns_per_line']}ns/行, {regex['bytes_per_line']}B/行)  "
+              f"扫描 p50={scanner['update_us']['p50']}us ({scanner['ns_per_line']}ns/行, "
+              f"{scanner['bytes_per_line']}B/行)")
+        if result['mismatched']:
+            print(f"   ❌ {len(result['mismatched'])} 行结果不一致")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='TrafficRecorder 计数器解析基准')
+    parser.add_argument('--clients', default='10,50,200,400', help='客户端数，逗号分隔')
+    parser.add_argument('--minimum', type=float, default=0.3, help='每项基准至少运行的秒数')
+    parser.add_argument('--budget-ms', type=float, default=50.0,
+                        help='200个以上客户端时每次更新允许的解析耗时p99（默认为1秒更新间隔的5%%）')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    with open(CORPUS, 'r', encoding='utf-8') as f:
+        corpus = f.read()
+    failed = False
+    mismatched = differences(corpus)
+    print(f"{'❌' if mismatched else '✅'} 采集语料: 两种切分方式逐行对照，{len(mismatched)} 行不一致")
+    failed |= bool(mismatched)
+
+    results = bench([int(value) for value in args.clients.split(',')], args.minimum)
+    print_results(results)
+    for result in results:
+        failed |= bool(result['mismatched'])
+        for name in ('regex', 'scanner'):
+            histogram = result[name].pop('histogram')
+            record_metric(f"iptables counters {name} clients={result['clients']}", histogram=histogram.values(),
+                          unit='us')
+        if result['clients'] >= 200 and result['scanner']['update_us']['p99'] > args.budget_ms * 1000:
+            print(f"   ❌ {result['clients']} 个客户端时 p99 超出 {args.budget_ms}ms")
+            failed = True
+    if len(results) > 1:
+        print(f"📈 每行耗时（扫描）: {results[-1]['clients']} 与 {results[0]['clients']} 个客户端之比 "
+              f"{flatness(results)}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
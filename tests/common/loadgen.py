@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+OkHttpWebServer 并发HTTP负载生成器
+
+基于asyncio，无第三方依赖：
+- closed 模式：concurrency 个worker各自收到响应后立即发下一个请求
+- open 模式：按固定速率（rate 请求/秒）发起请求，与响应快慢无关；
+  延迟从计划发送时刻算起，避免协调遗漏（coordinated omission）
+- 请求按权重混合，默认覆盖 /api/status、/api/system/info、/、/favicon.ico
+  以及带API Key前缀的 /{apiKey}/api/... 形式
+- 结果为可机读的JSON：总体与按路径的状态码、错误、吞吐和 p50/p90/p99/p999 延迟（微秒）
+
+用法（在 tests/ 目录下）：
+    python3 -m common.loadgen --host 192.168.1.133 --api-key KEY --concurrency 8 --duration 10
+    python3 -m common.loadgen --mode open --rate 200 --json results.json
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+
+from common.histogram import LatencyHistogram
+
+DEFAULT_API_KEY = 'default_api_key_for_debug_2024'
+
+
+def default_mix(api_key=None):
+    """默认请求组合：[(path, weight), ...]"""
+    mix = [
+        ('/api/status', 4),
+        ('/api/system/info', 2),
+        ('/', 1),
+        ('/favicon.ico', 1),
+    ]
+    if api_key:
+        mix += [
+            (f'/{api_key}/api/status', 4),
+            (f'/{api_key}/api/system/info', 2),
+            (f'/{api_key}', 1),
+        ]
+    return mix
+
+
+def parse_mix(spec, api_key=None):
+    """解析 "path=weight,path=weight" 形式的请求组合，路径中的 {apiKey} 会被替换"""
+    mix = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        path, _, weight = item.partition('=')
+        if api_key:
+            path = path.replace('{apiKey}', api_key)
+        mix.append((path, float(weight) if weight else 1.0))
+    if not mix:
+        raise ValueError(f'empty request mix: {spec!r}')
+    return mix
+
+
+class PathStats:
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.status_codes = {}
+        self.errors = {}
+        self.bytes = 0
+
+    @property
+    def requests(self):
+        return sum(self.status_codes.values()) + sum(self.errors.values())
+
+    def to_dict(self):
+        return {
+            'requests': self.requests,
+            'status_codes': {str(code): count for code, count in sorted(self.status_codes.items())},
+            'errors': dict(sorted(self.errors.items())),
+            'bytes': self.bytes,
+            'latency_us': self.histogram.summary(),
+        }
+
+
+async def http_request(host, port, path, method='GET', timeout=10.0, headers=None):
+    """发送一个 Connection: close 的HTTP/1.1请求，返回 (status_code, body_bytes)"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        if method == 'POST':
+            lines.append('Content-Length: 0')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8'))
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        parts = status_line.split()
+        if len(parts) < 2:
+            raise ConnectionError('empty response')
+        status = int(parts[1])
+        length = None
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value.strip())
+        if length is None:
+            body = await asyncio.wait_for(reader.read(), timeout)
+        else:
+            body = await asyncio.wait_for(reader.readexactly(length), timeout)
+        return status, body
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+
+def _error_name(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(error, ConnectionRefusedError):
+        return 'connection_refused'
+    if isinstance(error, ConnectionResetError):
+        return 'connection_reset'
+    if isinstance(error, asyncio.IncompleteReadError):
+        return 'incomplete_read'
+    return type(error).__name__
+
+
+class LoadGenerator:
+
+    def __init__(self, host='127.0.0.1', port=9999, mix=None, mode='closed', concurrency=4,
+                 duration=10.0, requests=None, rate=50.0, timeout=10.0, seed=None, request=http_request):
+        if mode not in ('closed', 'open'):
+            raise ValueError(f'unknown mode: {mode}')
+        self.host = host
+        self.port = port
+        self.mix = mix or default_mix()
+        self.mode = mode
+        self.concurrency = concurrency
+        self.duration = duration
+        self.max_requests = requests
+        self.rate = rate
+        self.timeout = timeout
+        self._request = request
+        self._random = random.Random(seed)
+        paths, weights = zip(*self.mix)
+        self._paths = list(paths)
+        self._cumulative = list(itertools.accumulate(weights))
+        self.stats = {path: PathStats() for path in self._paths}
+        self._issued = 0
+        self._elapsed = 0.0
+
+    def _next_path(self):
+        return self._random.choices(self._paths, cum_weights=self._cumulative)[0]
+
+    def _claim(self):
+        """占用一个请求名额，达到总请求数上限时返回False"""
+        if self.max_requests is not None and self._issued >= self.max_requests:
+            return False
+        self._issued += 1
+        return True
+
+    async def _one(self, path, scheduled):
+        stats = self.stats[path]
+        try:
+            status, body = await self._request(self.host, self.port, path, timeout=self.timeout)
+        except Exception as e:
+            stats.errors[_error_name(e)] = stats.errors.get(_error_name(e), 0) + 1
+            return
+        stats.histogram.record((time.perf_counter() - scheduled) * 1e6)
+        stats.status_codes[status] = stats.status_codes.get(status, 0) + 1
+        stats.bytes += len(body)
+
+    async def _closed_worker(self, deadline):
+        while time.perf_counter() < deadline and self._claim():
+            await self._one(self._next_path(), time.perf_counter())
+
+    async def _run_closed(self, deadline):
+        await asyncio.gather(*(self._closed_worker(deadline) for _ in range(self.concurrency)))
+
+    async def _run_open(self, deadline):
+        # concurrency 在开环模式下是在途请求上限，防止服务器卡死时无限堆积
+        limit = asyncio.Semaphore(self.concurrency)
+        interval = 1.0 / self.rate
+        start = time.perf_counter()
+        tasks = []
+
+        async def fire(path, scheduled):
+            async with limit:
+                await self._one(path, scheduled)
+
+        for n in itertools.count():
+            scheduled = start + n * interval
+            if scheduled >= deadline or not self._claim():
+                break
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(fire(self._next_path(), scheduled)))
+        await asyncio.gather(*tasks)
+
+    async def run(self):
+        start = time.perf_counter()
+        deadline = start + self.duration if self.duration else float('inf')
+        if self.mode == 'closed':
+            await self._run_closed(deadline)
+        else:
+            await self._run_open(deadline)
+        self._elapsed = time.perf_counter() - start
+        return self.results()
+
+    def results(self):
+        overall = PathStats()
+        for stats in self.stats.values():
+            overall.histogram.merge(stats.histogram)
+            overall.bytes += stats.bytes
+            for code, count in stats.status_codes.items():
+                overall.status_codes[code] = overall.status_codes.get(code, 0) + count
+            for name, count in stats.errors.items():
+                overall.errors[name] = overall.errors.get(name, 0) + count
+        summary = overall.to_dict()
+        summary['throughput_rps'] = round(summary['requests'] / self._elapsed, 2) if self._elapsed else 0.0
+        return {
+            'target': f'{self.host}:{self.port}',
+            'mode': self.mode,
+            'concurrency': self.concurrency,
+            'rate': self.rate if self.mode == 'open' else None,
+            'duration_s': round(self._elapsed, 3),
+            'mix': [{'path': path, 'weight': weight} for path, weight in self.mix],
+            'overall': summary,
+            'paths': {path: stats.to_dict() for path, stats in self.stats.items()},
+        }
+
+
+def run_load(**kwargs):
+    """同步入口，返回结果字典"""
+    return asyncio.run(LoadGenerator(**kwargs).run())
+
+
+def print_summary(results):
+    overall = results['overall']
+    latency = overall['latency_us']
+    print(f"🎯 目标: {results['target']} ({results['mode']}, 并发 {results['concurrency']})")
+    print(f"📊 请求: {overall['requests']}  吞吐: {overall['throughput_rps']} req/s  "
+          f"错误: {sum(overall['errors'].values())}")
+    print(f"⏱️  延迟(ms): p50={latency['p50'] / 1000:.2f} p99={latency['p99'] / 1000:.2f} "
+          f"p999={latency['p999'] / 1000:.2f} max={latency['max'] / 1000:.2f}")
+    for path, stats in results['paths'].items():
+        codes = ', '.join(f'{code}×{count}' for code, count in stats['status_codes'].items())
+        print(f"   {path}: {stats['requests']} 请求 [{codes}] p99={stats['latency_us']['p99'] / 1000:.2f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='OkHttpWebServer 并发负载生成器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--api-key', default=None, help=f'例如 {DEFAULT_API_KEY}')
+    parser.add_argument('--mode', choices=('closed', 'open'), default='closed')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='持续时间（秒）')
+    parser.add_argument('--requests', type=int, default=None, help='总请求数上限')
+    parser.add_argument('--rate', type=float, default=50.0, help='开环模式的请求速率（请求/秒）')
+    parser.add_argument('--timeout', type=float, default=10.0)
+    parser.add_argument('--mix', default=None, help='例如 "/api/status=5,/{apiKey}/api/status=5,/=1"')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--json', default=None, help='结果输出路径，"-" 表示标准输出')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix, args.api_key) if args.mix else default_mix(args.api_key)
+    results = run_load(host=args.host, port=args.port, mix=mix, mode=args.mode,
+                       concurrency=args.concurrency, duration=args.duration, requests=args.requests,
+                       rate=args.rate, timeout=args.timeout, seed=args.seed)
+    if args.json == '-':
+        json.dump(results, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        print_summary(results)
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+            print(f"✅ 结果已写入: {args.json}")
+    return 0 if results['overall']['requests'] and not results['overall']['errors'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+流式logcat读取与匹配
+
+- LogcatStream: 基于 `logcat -v threadtime` 的增量读取器，经由adb server套接字直连设备，
+  不可达时回退到 `adb logcat` 子进程；按行生成，内存占用与日志缓冲区大小无关
+- parse_line: 把threadtime格式的行解析为 LogRecord
+- PatternMatcher: 把多个关键词预编译为一个正则，单次扫描即可判断命中哪一个
+- watch_for_crash: 监控崩溃，出现 FATAL EXCEPTION 后立即返回而不是等满整个时间窗口
+"""
+
+import collections
+import os
+import re
+import selectors
+import shlex
+import socket
+import subprocess
+import time
+
+from common.adb import AdbClient, AdbError, get_session
+
+PACKAGE_NAME = 'be.mygod.vpnhotspot'
+
+# 与 test_crash_fix.check_for_crashes 原有的崩溃关键词保持一致
+CRASH_INDICATORS = [
+    'FATAL EXCEPTION',
+    'AndroidRuntime',
+    'java.lang.NullPointerException',
+    'APP CRASH',
+    f'Process: {PACKAGE_NAME}',
+]
+
+LogRecord = collections.namedtuple('LogRecord', 'date time pid tid level tag message raw')
+
+_THREADTIME = re.compile(
+    r'^(\d\d-\d\d) (\d\d:\d\d:\d\d\.\d+)\s+(\d+)\s+(\d+) ([VDIWEFS]) (.*?)\s*: ?(.*)$')
+
+
+def parse_line(line):
+    """解析一行threadtime格式日志，无法识别（如 `--------- beginning of main`）时返回None"""
+    match = _THREADTIME.match(line)
+    if match is None:
+        return None
+    date, time_, pid, tid, level, tag, message = match.groups()
+    return LogRecord(date, time_, int(pid), int(tid), level, tag, message, line)
+
+
+class PatternMatcher:
+    """预编译的多关键词匹配器"""
+
+    def __init__(self, patterns, ignore_case=False, regex=False):
+        self.patterns = list(patterns)
+        alternatives = []
+        for index, pattern in enumerate(self.patterns):
+            alternatives.append(f'(?P<p{index}>{pattern if regex else re.escape(pattern)})')
+        flags = re.IGNORECASE if ignore_case else 0
+        self._regex = re.compile('|'.join(alternatives) or r'(?!)', flags)
+
+    def search(self, text):
+        """返回第一个命中的关键词，未命中返回None"""
+        match = self._regex.search(text)
+        if match is None:
+            return None
+        return self.patterns[int(match.lastgroup[1:])]
+
+    def findall(self, text):
+        """返回文本中命中的全部关键词（去重，按首次出现顺序）"""
+        found = []
+        for match in self._regex.finditer(text):
+            pattern = self.patterns[int(match.lastgroup[1:])]
+            if pattern not in found:
+                found.append(pattern)
+        return found
+
+
+def device_time(seconds_ago=0, serial=None):
+    """
+    获取设备时间（可向前偏移seconds_ago秒），格式可直接用于 `logcat -T`
+    获取失败时返回None，此时调用方应从日志缓冲区开头读取
+    """
+    command = "date +'%m-%d %H:%M:%S.000'"
+    if seconds_ago:
+        command = f"date -d @$(($(date +%s) - {int(seconds_ago)})) +'%m-%d %H:%M:%S.000'"
+    try:
+        code, output = get_session(serial).run(command, timeout=5)
+    except (OSError, AdbError):
+        return None
+    return output.strip() if code == 0 else None
+
+
+class LogcatStream:
+    """
+    增量logcat读取器
+
+    args 为附加的logcat参数（例如 ['-d'] 或 ['-s', 'OkHttpWebServer:*']），
+    since 对应 `logcat -T`，只读取该时间之后的日志。
+    """
+
+    def __init__(self, args=(), since=None, serial=None, client=None):
+        self.args = ['-v', 'threadtime'] + (['-T', since] if since else []) + list(args)
+        self.client = client or AdbClient(serial)
+        self._sock = None
+        self._process = None
+        self._selector = None
+        # 已读取但未交给调用方的完整行和半行，跨多次 lines() 调用保留，便于分段轮询
+        self._lines = collections.deque()
+        self._pending = b''
+
+    def open(self):
+        if self._sock is not None or self._process is not None:
+            return self
+        command = ' '.join(['logcat'] + [shlex.quote(arg) for arg in self.args])
+        try:
+            self._sock = self.client.open_service(f'shell:{command}')
+        except (OSError, AdbError):
+            serial_args = ['-s', self.client.serial] if self.client.serial else []
+            self._process = subprocess.Popen(['adb'] + serial_args + ['logcat'] + self.args,
+                                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            self._selector = selectors.DefaultSelector()
+            self._selector.register(self._process.stdout, selectors.EVENT_READ)
+        return self
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._process is not None:
+            self._selector.close()
+            self._process.kill()
+            self._process.wait()
+            self._process.stdout.close()
+            self._process = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _read(self, timeout):
+        """读取一块数据；超时返回None，流结束返回b''"""
+        if self._sock is not None:
+            self._sock.settimeout(timeout)
+            try:
+                return self._sock.recv(65536)
+            except socket.timeout:
+                return None
+        if not self._selector.select(timeout):
+            return None
+        return os.read(self._process.stdout.fileno(), 65536)
+
+    def lines(self, timeout=None):
+        """按行生成日志，到达timeout（秒）或流结束时停止；可多次调用，从上次停下的位置继续"""
+        self.open()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            while self._lines:
+                yield self._lines.popleft().decode('utf-8', 'replace').rstrip('\r')
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+            chunk = self._read(remaining)
+            if chunk is None:
+                return
+            if not chunk:
+                if self._pending:
+                    pending, self._pending = self._pending, b''
+                    yield pending.decode('utf-8', 'replace').rstrip('\r')
+                return
+            *complete, self._pending = (self._pending + chunk).split(b'\n')
+            self._lines.extend(complete)
+
+    def records(self, timeout=None):
+        """按行生成已解析的 LogRecord，跳过无法解析的行"""
+        for line in self.lines(timeout):
+            record = parse_line(line)
+            if record is not None:
+                yield record
+
+
+def watch_for_crash(timeout, package=PACKAGE_NAME, stream=None, indicators=CRASH_INDICATORS):
+    """
+    监控应用崩溃，返回命中的崩溃记录列表（空列表表示时间窗口内无崩溃）
+
+    与原实现相同，只有同时包含关键词和包名的行才算命中；
+    `FATAL EXCEPTION` 所在行不含包名，因此记下其线程，
+    随后同一线程输出 `Process: <package>` 时立即返回。
+    """
+    matcher = PatternMatcher(indicators)
+    stream = stream or LogcatStream()
+    crashes = []
+    fatal_threads = {}
+    with stream:
+        for record in stream.records(timeout):
+            hits = matcher.findall(record.raw)
+            if not hits:
+                continue
+            key = (record.pid, record.tid)
+            if 'FATAL EXCEPTION' in hits:
+                fatal_threads[key] = record
+                continue
+            if package in record.raw:
+                if key in fatal_threads:
+                    crashes.append(fatal_threads.pop(key))
+                    crashes.append(record)
+                    return crashes
+                crashes.append(record)
+    return crashes
+
+
+def scan_logs(stream, patterns, ignore_case=True, tail=20, timeout=None):
+    """
+    单次扫描日志：返回 (命中的关键词列表, 最后tail行, 命中的行)
+    命中的行同样只保留最后tail条，保证内存占用固定
+    """
+    matcher = PatternMatcher(patterns, ignore_case=ignore_case)
+    found = []
+    last_lines = collections.deque(maxlen=tail)
+    matched_lines = collections.deque(maxlen=tail)
+    with stream:
+        for line in stream.lines(timeout):
+            if not line.strip():
+                continue
+            last_lines.append(line)
+            hits = matcher.findall(line)
+            if hits:
+                matched_lines.append(line)
+                for hit in hits:
+                    if hit not in found:
+                        found.append(hit)
+    return found, list(last_lines), list(matched_lines)
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+测试脚本并行调度器
+
+从 unit/、integration/、device/ 下各脚本的 main() 中发现检查函数（按 main 中的调用顺序）。
+检查所需的资源：
+- device：adb/logcat 操作，设备独占
+- port:N：绑定或访问端口N（启停应用会重新绑定9999，同样视为占用），端口独占
+- gradle：gradle构建，独占
+- source：只读访问源码树，可共享
+
+由脚本在模块级的 RESOURCES 字面量中显式声明（不导入脚本，用 ast.literal_eval 读取）：
+
+    RESOURCES = {
+        'restart_app': ['device', 'port:9999'],     # 列表：source 共享，其余独占
+        'test_bench': [],                           # 不需要任何资源
+        'check_logs': {'device': 'exclusive'},
+    }
+
+没有声明的检查才根据函数源码（含其调用的同文件函数）推断，推断只是启发式的，会把数字常量误认成端口。
+
+没有资源冲突的检查在线程池中并行运行；有冲突的检查保持发现顺序串行执行，
+因此同一脚本中互相依赖的步骤（如 restart_app → check_for_crashes）顺序不变。
+每个检查的输出单独捕获，失败时才打印。
+每项检查结束后立即把结果写入结果存储（common.results），检查中记录的性能指标归属于该检查。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.orchestrator                  # 运行全部
+    python3 -m common.orchestrator unit integration --workers 8
+    python3 -m common.orchestrator --list           # 只列出检查及其资源
+    python3 -m common.orchestrator --report TEST_REPORT.md --compare previous:5
+"""
+
+import argparse
+import ast
+import concurrent.futures
+import functools
+import importlib.util
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+
+from common import results as result_store
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+SUITES = ('unit', 'integration', 'device')
+
+SHARED = 'shared'
+EXCLUSIVE = 'exclusive'
+
+WEB_SERVER_PORT = 9999
+
+# 修改 ANDROID_ADB_SERVER_* 环境变量会影响同一进程中所有adb操作，同样视为占用设备
+_DEVICE_MARKERS = ('run_adb_command', 'get_session', 'LogcatStream', 'watch_for_crash', 'device_time', "'adb'",
+                   'ANDROID_ADB_SERVER')
+_RESTART_MARKERS = ('force-stop', "'am', 'start'", 'am start')
+_SOURCE_MARKERS = ('mobile/src', '.kt', 'scan_source')
+
+
+class Check:
+
+    def __init__(self, script, name, args=(), label=None, resources=None, order=0):
+        self.script = script
+        self.name = name
+        self.args = tuple(args)
+        self.label = label
+        self.resources = resources or {}
+        self.order = order
+
+    @property
+    def id(self):
+        call = f"{self.name}({', '.join(repr(arg) for arg in self.args)})" if self.args else self.name
+        return f'{self.script}::{call}'
+
+    def conflicts(self, other):
+        for name, mode in self.resources.items():
+            other_mode = other.resources.get(name)
+            if other_mode is not None and EXCLUSIVE in (mode, other_mode):
+                return True
+        return False
+
+    def __repr__(self):
+        return f'<Check {self.id} {sorted(self.resources)}>'
+
+
+class CheckResult:
+
+    def __init__(self, check, status, duration, output, error=None):
+        self.check = check
+        self.status = status
+        self.duration = duration
+        self.output = output
+        self.error = error
+
+    def to_dict(self):
+        return {
+            'id': self.check.id,
+            'label': self.check.label,
+            'resources': self.check.resources,
+            'status': self.status,
+            'duration_s': round(self.duration, 3),
+            'output': self.output,
+            'error': self.error,
+        }
+
+
+# 发现
+
+class _MainVisitor(ast.NodeVisitor):
+    """按源码顺序收集 main() 中对本文件函数的调用与 ("名称", 函数) 形式的测试列表项"""
+
+    def __init__(self, functions):
+        self.functions = functions
+        self.found = []
+
+    def _add(self, name, args=(), label=None):
+        if name == 'main' or name.startswith('generate_'):
+            return
+        for index, (other, other_args, other_label) in enumerate(self.found):
+            if (other, other_args) == (name, tuple(args)):
+                if label and not other_label:
+                    self.found[index] = (other, other_args, label)
+                return
+        self.found.append((name, tuple(args), label))
+
+    def visit_Tuple(self, node):
+        if (len(node.elts) == 2 and isinstance(node.elts[0], ast.Constant) and isinstance(node.elts[0].value, str)):
+            target = node.elts[1]
+            if isinstance(target, ast.Name) and target.id in self.functions:
+                self._add(target.id, label=node.elts[0].value)
+            elif isinstance(target, ast.Lambda) and isinstance(target.body, ast.Call):
+                call = target.body
+                if isinstance(call.func, ast.Name) and call.func.id in self.functions \
+                        and all(isinstance(arg, ast.Constant) for arg in call.args) and not call.keywords:
+                    self._add(call.func.id, [arg.value for arg in call.args], node.elts[0].value)
+                    return
+        self.generic_visit(node)
+
+    def visit_Call(self, node):
+        # results.script_check("名称", 函数)：单独运行时记录结果的检查
+        if isinstance(node.func, ast.Name) and node.func.id == 'script_check' and len(node.args) >= 2 \
+                and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str) \
+                and isinstance(node.args[1], ast.Name) and node.args[1].id in self.functions:
+            self._add(node.args[1].id, label=node.args[0].value)
+        if isinstance(node.func, ast.Name) and node.func.id in self.functions \
+                and all(isinstance(arg, ast.Constant) for arg in node.args) and not node.keywords:
+            self._add(node.func.id, [arg.value for arg in node.args])
+        self.generic_visit(node)
+
+
+def _ports(node):
+    """函数中出现的端口号：赋值给 *port* 变量、(host, port) 元组、以及 *port* 函数的参数"""
+    ports = set()
+
+    def collect(value):
+        for child in ast.walk(value):
+            if isinstance(child, ast.Constant) and type(child.value) is int and 1024 <= child.value <= 65535:
+                ports.add(child.value)
+
+    for child in ast.walk(node):
+        if isinstance(child, ast.Assign):
+            if any(isinstance(target, ast.Name) and 'port' in target.id.lower() for target in child.targets):
+                collect(child.value)
+        elif isinstance(child, ast.Tuple) and len(child.elts) == 2 \
+                and isinstance(child.elts[0], ast.Constant) and isinstance(child.elts[0].value, str):
+            collect(child.elts[1])
+        elif isinstance(child, ast.Call):
+            name = child.func.id if isinstance(child.func, ast.Name) else getattr(child.func, 'attr', '')
+            if 'port' in name.lower():
+                for arg in child.args:
+                    collect(arg)
+            for keyword in child.keywords:
+                if keyword.arg and 'port' in keyword.arg.lower():
+                    collect(keyword.value)
+    return ports
+
+
+def infer_resources(name, functions, source):
+    """根据函数及其调用的同文件函数的源码推断资源需求"""
+    seen = set()
+    stack = [name]
+    text = []
+    ports = set()
+    while stack:
+        current = stack.pop()
+        if current in seen or current not in functions:
+            continue
+        seen.add(current)
+        node = functions[current]
+        text.append(ast.get_source_segment(source, node) or '')
+        ports |= _ports(node)
+        stack.extend(child.id for child in ast.walk(node) if isinstance(child, ast.Name) and child.id in functions)
+    text = '\n'.join(text)
+
+    resources = {}
+    if any(marker in text for marker in _DEVICE_MARKERS):
+        resources['device'] = EXCLUSIVE
+    if any(marker in text for marker in _RESTART_MARKERS):
+        resources['device'] = EXCLUSIVE
+        ports.add(WEB_SERVER_PORT)
+    # 只认URL中的 :9999；源码检查里作为字符串模式出现的 '9999' 不算占用端口
+    if re.search(r':%d\b' % WEB_SERVER_PORT, text) or 'WEB_PORT' in text:
+        ports.add(WEB_SERVER_PORT)
+    for port in ports:
+        resources[f'port:{port}'] = EXCLUSIVE
+    if 'gradlew' in text:
+        resources['gradle'] = EXCLUSIVE
+    if any(marker in text for marker in _SOURCE_MARKERS):
+        resources['source'] = SHARED
+    return resources
+
+
+def _normalize_resources(value):
+    if isinstance(value, dict):
+        resources = dict(value)
+    else:
+        resources = {name: SHARED if name == 'source' else EXCLUSIVE for name in value}
+    for name, mode in resources.items():
+        if mode not in (SHARED, EXCLUSIVE):
+            raise ValueError(f'资源 {name} 的模式无效: {mode!r}')
+    return resources
+
+
+def declared_resources(tree):
+    """模块级 RESOURCES 中显式声明的 {函数名: {资源: 模式}}"""
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(target, ast.Name) and target.id == 'RESOURCES'
+                                                for target in node.targets):
+            return {name: _normalize_resources(value) for name, value in ast.literal_eval(node.value).items()}
+    return {}
+
+
+def discover_script(path, tests_dir=TESTS_DIR):
+    """解析单个脚本，返回其中的检查列表（不导入脚本）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    tree = ast.parse(source, path)
+    functions = {node.name: node for node in tree.body if isinstance(node, ast.FunctionDef)}
+    main = functions.get('main')
+    if main is None:
+        return []
+    visitor = _MainVisitor(functions)
+    visitor.visit(main)
+    if not visitor.found:
+        # 断言式测试文件的 main() 从 globals() 收集 test_*，与其顺序一致
+        visitor.found = [(name, (), None) for name in sorted(functions) if name.startswith('test_')]
+    script = os.path.relpath(path, tests_dir).replace(os.sep, '/')
+    declared = declared_resources(tree)
+    checks = []
+    for name, args, label in visitor.found:
+        required = len(functions[name].args.args) - len(functions[name].args.defaults)
+        if len(args) < required:
+            continue
+        resources = declared.get(name)
+        if resources is None:
+            resources = infer_resources(name, functions, source)
+        checks.append(Check(script, name, args, label, resources))
+    return checks
+
+
+def discover(targets=SUITES, tests_dir=TESTS_DIR):
+    """发现目标（测试套件目录名或脚本路径）中的全部检查，按发现顺序编号"""
+    paths = []
+    for target in targets:
+        path = target if os.path.isabs(target) else os.path.join(tests_dir, target)
+        if os.path.isdir(path):
+            paths += [os.path.join(path, name) for name in sorted(os.listdir(path))
+                      if name.endswith('.py') and not name.startswith('_')]
+        else:
+            paths.append(path)
+    checks = []
+    for path in paths:
+        checks += discover_script(path, tests_dir)
+    for order, check in enumerate(checks):
+        check.order = order
+    return checks
+
+
+# 执行
+
+class _ThreadLocalOutput(io.TextIOBase):
+    """按线程分发写入：调度线程之外的输出写入各自的缓冲区"""
+
+    def __init__(self, fallback):
+        self._fallback = fallback
+        self._local = threading.local()
+
+    def capture(self, buffer):
+        self._local.buffer = buffer
+
+    def _target(self):
+        return getattr(self._local, 'buffer', None) or self._fallback
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+    def isatty(self):
+        return False
+
+
+class Runner:
+
+    def __init__(self, tests_dir=TESTS_DIR):
+        self.tests_dir = tests_dir
+        self._modules = {}
+        self._lock = threading.Lock()
+
+    def load(self, script):
+        """导入脚本（每个脚本只导入一次），导入失败时缓存异常"""
+        with self._lock:
+            if script not in self._modules:
+                path = os.path.join(self.tests_dir, script)
+                module_name = '_orchestrated_' + re.sub(r'\W', '_', script[:-3])
+                try:
+                    spec = importlib.util.spec_from_file_location(module_name, path)
+                    module = importlib.util.module_from_spec(spec)
+                    spec.loader.exec_module(module)
+                    self._modules[script] = module
+                except BaseException as e:
+                    self._modules[script] = e
+            module = self._modules[script]
+        if isinstance(module, BaseException):
+            raise module
+        return module
+
+    def execute(self, check, output):
+        buffer = io.StringIO()
+        output.capture(buffer)
+        start = time.perf_counter()
+        error = None
+        try:
+            func = functools.partial(getattr(self.load(check.script), check.name), *check.args)
+            with result_store.checking(check.id):
+                result = func()
+            # check_webserver_status 之类返回 (success, ...) 元组
+            if isinstance(result, tuple) and result:
+                result = result[0]
+            status = 'failed' if result is False else 'passed'
+        except BaseException as e:
+            status = 'error'
+            error = f'{type(e).__name__}: {e}'
+            buffer.write(traceback.format_exc())
+        finally:
+            output.capture(None)
+        return CheckResult(check, status, time.perf_counter() - start, buffer.getvalue(), error)
+
+
+def schedule(checks, execute, workers=8, on_result=None):
+    """
+    按资源约束调度：检查只有在与运行中的检查、以及排在它前面尚未开始的检查都不冲突时才启动，
+    所以冲突的检查严格按发现顺序执行
+    """
+    pending = list(checks)
+    running = {}
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+            for check in list(pending):
+                if len(running) >= workers:
+                    break
+                if any(check.conflicts(other) for other in running.values()):
+                    continue
+                if any(check.conflicts(earlier) for earlier in pending[:pending.index(check)]):
+                    continue
+                pending.remove(check)
+                running[pool.submit(execute, check)] = check
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in sorted(done, key=lambda f: running[f].order):
+                check = running.pop(future)
+                result = future.result()
+                results.append((check.order, result))
+                if on_result:
+                    on_result(result)
+    results.sort(key=lambda item: item[0])
+    return [result for _, result in results]
+
+
+def run_checks(checks, workers=8, verbose=False, tests_dir=TESTS_DIR, store=None):
+    """运行检查，实时打印每项结果（并写入store），返回按发现顺序排列的 CheckResult 列表"""
+    runner = Runner(tests_dir)
+    stdout, stderr = sys.stdout, sys.stderr
+    output = _ThreadLocalOutput(stdout)
+    icons = {'passed': '✅', 'failed': '❌', 'error': '💥'}
+
+    def report(result):
+        if store is not None:
+            result_store.record_check(result.check.id, result.status, result.duration, result.error, store=store)
+        stdout.write(f"{icons[result.status]} {result.check.id} ({result.duration:.2f}s)\n")
+        if verbose or result.status != 'passed':
+            for line in result.output.rstrip().splitlines():
+                stdout.write(f"    {line}\n")
+        stdout.flush()
+
+    sys.stdout = sys.stderr = output
+    try:
+        return schedule(checks, lambda check: runner.execute(check, output), workers, report)
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='测试脚本并行调度器')
+    parser.add_argument('targets', nargs='*', default=list(SUITES), help='测试套件目录名或脚本路径')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('-k', dest='keyword', default=None, help='只运行ID包含该字符串的检查')
+    parser.add_argument('--list', action='store_true', help='只列出检查及其资源需求')
+    parser.add_argument('--verbose', '-v', action='store_true', help='打印所有检查的输出')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    parser.add_argument('--no-store', action='store_true', help='不写入结果存储')
+    parser.add_argument('--report', default=None, help='从结果存储生成本次运行的Markdown报告')
+    parser.add_argument('--compare', default=None, metavar='BASELINE',
+                        help='与基线运行比较（例如 previous:5），发现显著回归时返回1')
+    args = parser.parse_args(argv)
+
+    checks = discover(args.targets)
+    if args.keyword:
+        checks = [check for check in checks if args.keyword in check.id]
+    if args.list:
+        for check in checks:
+            resources = ', '.join(f'{name}({mode})' for name, mode in sorted(check.resources.items())) or '-'
+            print(f"{check.id}  [{resources}]")
+        return 0
+
+    print(f"🚀 并行运行 {len(checks)} 项检查 (workers={args.workers})")
+    print("=" * 60)
+    # 原脚本均以仓库根目录为工作目录读取源码
+    os.chdir(REPO_ROOT)
+    store = result_store.ResultStore(None if args.no_store else result_store.DEFAULT_STORE)
+    result_store.set_default_store(store)
+    start = time.perf_counter()
+    results = run_checks(checks, args.workers, args.verbose, store=store)
+    elapsed = time.perf_counter() - start
+
+    passed = sum(1 for result in results if result.status == 'passed')
+    serial = sum(result.duration for result in results)
+    print("=" * 60)
+    print(f"⏱️  总耗时 {elapsed:.1f}s (串行累计 {serial:.1f}s)")
+    print(f"测试总结: {passed}/{len(results)} 通过")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'elapsed_s': round(elapsed, 3), 'results': [result.to_dict() for result in results]},
+                      f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+
+    regressions = []
+    if store.path and (args.report or args.compare):
+        run = {result_store.run_info()['run']}
+        comparisons = None
+        if args.compare:
+            baseline = store.select(args.compare, relative_to=next(iter(run)))
+            comparisons = result_store.compare(store.records(set(baseline)), store.records(run))
+            print(f"📊 与基线 {len(baseline)} 次运行比较:")
+            result_store.print_comparisons(comparisons)
+            regressions = [comparison for comparison in comparisons if comparison.verdict == 'regression']
+        if args.report:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                f.write(result_store.render_markdown(store.records(run), comparisons))
+            print(f"✅ 报告已生成: {args.report}")
+    return 0 if passed == len(results) and not regressions else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
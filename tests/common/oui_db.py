@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+离线OUI厂商数据库的编译器与基准
+
+MacLookup.perform 原先为每个新客户端的MAC向 macaddress.io 发一次HTTPS请求，用 Scanner.findWithinHorizon 与
+Html.fromHtml 从页面中取出JSON后才写入昵称：命名慢、需要联网，在不连外网的热点上直接失败。这里把IEEE的
+MA-L（24位）、MA-M（28位）、MA-S（36位）注册表编译成 OuiDatabase.kt 读取的紧凑二进制文件（大端）：
+
+    头部 24 字节：magic 'VHOU'、版本 u16、保留 u16、36/28/24位表的条目数 u32×3、字符串池字节数 u32
+    36、28、24位表：按前缀排序，每条为前缀（5、4、3字节）加字符串池中的偏移（3字节）
+    字符串池：每个厂商只存一次，国家代码 2 字节（未知为0）、名字的UTF-8长度 u16、名字
+
+国家代码用 MacLookup 相同的正则从地址末尾取出；名为 "IEEE Registration Authority"（MA-M/MA-S所在的大块）
+与 "Private" 的条目不收录，查询时先查更细的表。应用内存映射打开不压缩的asset，每次查询最多三次二分查找。
+
+编译结果（mobile/src/main/assets/oui.bin）与清单（mobile/oui.json：SHA-256、各表条目数与来源文件的SHA-256和
+版本）一起提交，构建不联网也不运行Python，只由 verifyOuiDatabase 按清单检查文件；更新注册表时手动运行
+./gradlew :mobile:updateOuiDatabase（即下面的 --download 命令），重新生成两者后提交。
+
+这里提供：
+- parse_csv()：读取IEEE的CSV（Registry,Assignment,Organization Name,Organization Address）
+- parse_txt()：读取IEEE的文本格式（oui.txt、iab.txt 等），只有文本格式可用时使用
+- compile_db()：编译，OuiDatabase：内存映射读取与 OuiDatabase.kt 相同的查询
+- synthetic()：按真实注册表规模生成的CSV（大厂商拥有很多OUI，MA-M/MA-S位于注册机构的OUI之内）
+- bench()：文件大小、每条目字节数、与CSV及不去重布局的比较，以及每秒查询数
+
+用法（在 tests/ 目录下）：
+    python3 -m common.oui_db --download --output ../mobile/src/main/assets/oui.bin --manifest ../mobile/oui.json
+    python3 -m common.oui_db --txt oui.txt iab.txt --source-version "..." --output ... --manifest ...
+    python3 -m common.oui_db --csv oui.csv mam.csv oui36.csv --lookup 3c:22:fb:12:34:56
+    python3 -m common.oui_db --synthetic --bench --json oui_db.json
+"""
+
+import argparse
+import bisect
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+import time
+import urllib.request
+
+from common.results import record_metric
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(TESTS_DIR)
+ASSET = os.path.join(REPO_ROOT, 'mobile', 'src', 'main', 'assets', 'oui.bin')
+MANIFEST = os.path.join(REPO_ROOT, 'mobile', 'oui.json')
+CACHE_DIR = os.path.join(TESTS_DIR, '.cache', 'oui')
+
+REGISTRIES = {
+    'MA-L': (24, 'https://standards-oui.ieee.org/oui/oui.csv'),
+    'MA-M': (28, 'https://standards-oui.ieee.org/oui28/mam.csv'),
+    'MA-S': (36, 'https://standards-oui.ieee.org/oui36/oui36.csv'),
+}
+TABLES = (36, 28, 24)
+MAGIC = b'VHOU'
+VERSION = 1
+HEADER = struct.Struct('>4sHHIIII')
+OFFSET_SIZE = 3
+# MacLookup.countryCodeRegex
+COUNTRY = re.compile(r'(?:^|[^A-Z])([A-Z]{2})[\s\d]*$')
+SKIPPED = {'IEEE Registration Authority', 'Private'}
+_TXT_OUI = re.compile(r'^\s*([0-9A-F]{2})-([0-9A-F]{2})-([0-9A-F]{2})\s+\(hex\)', re.IGNORECASE)
+_TXT_ENTRY = re.compile(r'^\s*([0-9A-F]{6})(?:-([0-9A-F]{6}))?\s+\(base 16\)\s*(.*)$', re.IGNORECASE)
+
+
+def _record(records, bits, prefix, name, address):
+    name = ' '.join(name.split())
+    if name and name not in SKIPPED:
+        match = COUNTRY.search(address.strip())
+        records.append((bits, prefix, name, match.group(1) if match else None))
+
+
+def parse_csv(text):
+    """[(位数, 前缀, 名字, 国家代码或 None)]，跳过不收录的条目"""
+    records = []
+    for row in csv.DictReader(io.StringIO(text)):
+        _record(records, REGISTRIES[row['Registry'].strip()][0], int(row['Assignment'], 16),
+                row['Organization Name'], row.get('Organization Address') or '')
+    return records
+
+
+def parse_txt(text):
+    """
+    IEEE注册表的文本格式（oui.txt、mam.txt、oui36.txt 与旧的 iab.txt），返回与 parse_csv 相同的记录：
+    "(hex)" 行给出OUI，"(base 16)" 行给出名字和OUI之内的范围（如 0D7000-0D7FFF 为36位前缀 OUI+0D7），
+    之后直到下一个 "(hex)" 行都是地址，最后一行是国家代码
+    """
+    entries = []
+    oui = None
+    for line in text.splitlines():
+        match = _TXT_OUI.match(line)
+        if match:
+            oui = ''.join(match.groups())
+            continue
+        match = _TXT_ENTRY.match(line)
+        if match and oui is not None:
+            start, end, name = match.groups()
+            fixed = len(os.path.commonprefix([start, end])) if end else 0
+            entries.append((24 + 4 * fixed, int(oui + start[:fixed], 16), name, []))
+            oui = None
+        elif entries and line.strip():
+            entries[-1][3].append(line.strip())
+    records = []
+    for bits, prefix, name, address in entries:
+        _record(records, bits, prefix, name, ' '.join(address))
+    return records
+
+
+def compile_db(records):
+    """编译为 OuiDatabase.kt 的格式，同一前缀出现多次时取后面的"""
+    tables = {bits: {} for bits in TABLES}
+    for bits, prefix, name, country in records:
+        tables[bits][prefix] = (name, country)
+    pool = bytearray()
+    offsets = {}
+    body = bytearray()
+    for bits in TABLES:
+        size = (bits + 7) // 8
+        for prefix, vendor in sorted(tables[bits].items()):
+            if vendor not in offsets:
+                offsets[vendor] = len(pool)
+                name = vendor[0].encode('utf-8')
+                pool += (vendor[1] or '\0\0').encode('ascii') + struct.pack('>H', len(name)) + name
+            body += prefix.to_bytes(size, 'big') + offsets[vendor].to_bytes(OFFSET_SIZE, 'big')
+    if len(pool) >= 1 << 8 * OFFSET_SIZE:
+        raise ValueError(f'字符串池过大: {len(pool)} 字节')
+    header = HEADER.pack(MAGIC, VERSION, 0, *(len(tables[bits]) for bits in TABLES), len(pool))
+    return bytes(header + body + pool)
+
+
+def mac_to_int(mac):
+    if isinstance(mac, int):
+        return mac
+    digits = re.sub(r'[^0-9a-fA-F]', '', mac)
+    if len(digits) != 12:
+        raise ValueError(f'无效的MAC地址: {mac}')
+    return int(digits, 16)
+
+
+class OuiDatabase:
+    """OuiDatabase.kt 的移植：data 为 bytes 或 mmap"""
+
+    def __init__(self, data):
+        self.data = data
+        magic, version, _, *counts, pool = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Unrecognized OUI database')
+        self.tables = []
+        start = HEADER.size
+        for bits, count in zip(TABLES, counts):
+            size = (bits + 7) // 8
+            self.tables.append((bits, start, count, size))
+            start += count * (size + OFFSET_SIZE)
+        self.strings = start
+        if start + pool != len(data):
+            raise ValueError('Truncated OUI database')
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def counts(self):
+        return {bits: count for bits, _, count, _ in self.tables}
+
+    def _find(self, table, mac):
+        bits, start, count, size = table
+        prefix = mac >> 48 - bits
+        stride = size + OFFSET_SIZE
+        data = self.data
+        low, high = 0, count - 1
+        while low <= high:
+            middle = (low + high) >> 1
+            entry = start + middle * stride
+            value = int.from_bytes(data[entry:entry + size], 'big')
+            if value < prefix:
+                low = middle + 1
+            elif value > prefix:
+                high = middle - 1
+            else:
+                return int.from_bytes(data[entry + size:entry + stride], 'big')
+        return None
+
+    def lookup(self, mac):
+        """最细的分配中的 (名字, 国家代码或 None)，没有时返回 None"""
+        mac = mac_to_int(mac)
+        for table in self.tables:
+            offset = self._find(table, mac)
+            if offset is not None:
+                entry = self.strings + offset
+                country = self.data[entry:entry + 2]
+                length = struct.unpack_from('>H', self.data, entry + 2)[0]
+                name = bytes(self.data[entry + 4:entry + 4 + length]).decode('utf-8')
+                return name, None if country == b'\0\0' else country.decode('ascii')
+        return None
+
+
+def expected_lookup(records, mac):
+    """按记录直接求最长前缀匹配（用于检查）"""
+    mac = mac_to_int(mac)
+    best = None
+    for bits, prefix, name, country in records:
+        if mac >> 48 - bits == prefix and (best is None or bits > best[0]):
+            best = bits, (name, country)
+    return best and best[1]
+
+
+_WORDS = ('Shenzhen', 'Global', 'Digital', 'Network', 'Systems', 'Micro', 'Tech', 'Electronics', 'Wireless', 'Smart',
+          'Link', 'Data', 'Communication', 'Vision', 'Power', 'Cloud', 'Optical', 'Semiconductor', 'Home', 'Audio')
+_SUFFIXES = ('Co.,Ltd', 'Inc.', 'GmbH', 'Corporation', 'Limited', 'S.A.', 'AB', 'Technology Co., Ltd.', '株式会社')
+_COUNTRIES = ('CN', 'US', 'TW', 'KR', 'JP', 'DE', 'GB', 'FR', 'SE', 'IN', 'IL', 'CA')
+
+
+def _universal(rng, bits):
+    """随机的全局唯一（非本地管理、非组播）前缀"""
+    while True:
+        prefix = rng.getrandbits(bits)
+        if not prefix >> bits - 8 & 0x03:
+            return prefix
+
+
+def synthetic(seed=0, ma_l=37000, ma_m=5600, ma_s=6700, vendors=20000):
+    """{注册表: CSV文本}，规模与2024年的IEEE注册表相近"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < vendors:
+        words = rng.sample(_WORDS, rng.randint(1, 3))
+        if rng.random() < .05:
+            words.insert(0, 'Société')
+        names.add(f"{' '.join(words)} {rng.randint(1, 999)} {rng.choice(_SUFFIXES)}")
+    names = sorted(names)
+    countries = {name: rng.choice(_COUNTRIES) for name in names}
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(len(names))]
+    cumulative = [0.0]
+    for weight in weights:
+        cumulative.append(cumulative[-1] + weight)
+
+    def vendor():
+        name = names[bisect.bisect(cumulative, rng.random() * cumulative[-1]) - 1]
+        if rng.random() < .03:
+            return 'Private', ''
+        country = countries[name]
+        street = f'{rng.randint(1, 999)} {rng.choice(_WORDS)} Road'
+        return name, f'{street} {rng.choice(_WORDS)} {country} {rng.randint(10000, 99999)}'
+
+    assignments = {'MA-L': [], 'MA-M': [], 'MA-S': []}
+    used = set()
+    authorities = []
+    for _ in range(-(-ma_m // 16) + -(-ma_s // 4096)):
+        prefix = _universal(rng, 24)
+        used.add(prefix)
+        authorities.append(prefix)
+        assignments['MA-L'].append((prefix, 'IEEE Registration Authority', '445 Hoes Lane Piscataway NJ US 08554'))
+    while len(assignments['MA-L']) < ma_l:
+        prefix = _universal(rng, 24)
+        if prefix not in used:
+            used.add(prefix)
+            assignments['MA-L'].append((prefix, *vendor()))
+    blocks = [authority << 4 | block for authority in authorities[:-(-ma_m // 16)] for block in range(16)]
+    assignments['MA-M'] = [(block, *vendor()) for block in sorted(rng.sample(blocks, ma_m))]
+    blocks = [authority << 12 | block for authority in authorities[-(-ma_m // 16):] for block in range(4096)]
+    assignments['MA-S'] = [(block, *vendor()) for block in sorted(rng.sample(blocks, ma_s))]
+    registries = {}
+    for registry, rows in assignments.items():
+        digits = REGISTRIES[registry][0] // 4
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(('Registry', 'Assignment', 'Organization Name', 'Organization Address'))
+        for prefix, name, address in rows:
+            writer.writerow((registry, f'{prefix:0{digits}X}', name, address))
+        registries[registry] = output.getvalue()
+    return registries
+
+
+def download():
+    """下载IEEE的三个CSV（不落盘），返回 ({注册表: CSV文本}, 来源列表)"""
+    registries = {}
+    sources = []
+    for registry, (_, url) in REGISTRIES.items():
+        print(f"⬇️  {url}")
+        request = urllib.request.Request(url, headers={'User-Agent': 'VPNHotspot OUI compiler'})
+        with urllib.request.urlopen(request, timeout=60) as response:
+            data = response.read()
+            version = response.headers.get('Last-Modified')
+        registries[registry] = data.decode('utf-8')
+        sources.append(source_info(url, data, version))
+    return registries, sources
+
+
+def source_info(name, data, version=None):
+    """清单中的一个来源：名字、SHA-256 与版本（下载时为 Last-Modified）"""
+    return {'name': name, 'sha256': hashlib.sha256(data).hexdigest(), 'version': version}
+
+
+def manifest(data, sources):
+    """与编译结果一起提交的清单：Gradle 的 verifyOuiDatabase 按其中的 SHA-256 检查 oui.bin"""
+    return {
+        'sha256': hashlib.sha256(data).hexdigest(),
+        'bytes': len(data),
+        'entries': {f'{bits}': count for bits, count in OuiDatabase(data).counts().items()},
+        'sources': sources,
+    }
+
+
+def sample_macs(records, count, seed=0, assigned=0.5):
+    """查询样本：assigned 的比例落在已分配的块中（其余位随机），其余为随机的全局唯一地址"""
+    rng = random.Random(seed)
+    macs = []
+    for _ in range(count):
+        if rng.random() < assigned:
+            bits, prefix, _, _ = rng.choice(records)
+            macs.append(prefix << 48 - bits | rng.getrandbits(48 - bits))
+        else:
+            macs.append(_universal(rng, 48))
+    return macs
+
+
+def bench(registries, lookups=100000, seed=0, directory=None):
+    """编译并以内存映射打开，测量每秒查询数"""
+    records = [record for text in registries.values() for record in parse_csv(text)]
+    data = compile_db(records)
+    csv_bytes = sum(len(text.encode('utf-8')) for text in registries.values())
+    # 不去重：每条目内联名字与国家代码
+    inline_bytes = HEADER.size + sum((bits + 7) // 8 + 4 + len(name.encode('utf-8')) for bits, _, name, _ in records)
+    path = os.path.join(directory or CACHE_DIR, 'oui-bench.bin')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    start = time.perf_counter()
+    database = OuiDatabase.open(path)
+    open_us = (time.perf_counter() - start) * 1e6
+    macs = sample_macs(records, lookups, seed)
+    start = time.perf_counter()
+    hits = sum(database.lookup(mac) is not None for mac in macs)
+    duration = time.perf_counter() - start
+    database.data.close()
+    entries = len(records)
+    return {
+        'entries': {f'{bits}': count for bits, count in database.counts().items()},
+        'vendors': len({(name, country) for _, _, name, country in records}),
+        'bytes': len(data),
+        'bytes_per_entry': round(len(data) / entries, 2) if entries else 0.0,
+        'csv_bytes': csv_bytes,
+        'inline_bytes': inline_bytes,
+        'open_us': round(open_us, 1),
+        'lookups': lookups,
+        'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+        'lookups_per_second': round(lookups / duration) if duration else 0,
+        'lookup_us': round(duration / lookups * 1e6, 2) if lookups else 0.0,
+    }
+
+
+def print_report(report):
+    entries = report['entries']
+    print(f"📚 {sum(entries.values())} 条（36位 {entries['36']}、28位 {entries['28']}、24位 {entries['24']}），"
+          f"{report['vendors']} 个厂商")
+    print(f"   文件 {report['bytes'] / 1024:.1f}KiB（每条 {report['bytes_per_entry']} 字节），"
+          f"CSV {report['csv_bytes'] / 1024:.1f}KiB，不去重 {report['inline_bytes'] / 1024:.1f}KiB")
+    print(f"⚡ 打开 {report['open_us']}µs，{report['lookups']} 次查询命中 {report['hit_ratio']:.1%}，"
+          f"{report['lookups_per_second']} 次/秒（每次 {report['lookup_us']}µs）")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线OUI厂商数据库的编译器与基准')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--download', action='store_true', help='从IEEE下载 MA-L/MA-M/MA-S 的CSV')
+    source.add_argument('--csv', nargs='+', help='本地的IEEE CSV文件')
+    source.add_argument('--txt', nargs='+', help='本地的IEEE文本格式注册表（oui.txt、iab.txt 等）')
+    source.add_argument('--synthetic', action='store_true', help='使用生成的注册表')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--source-version', default=None, help='本地文件的版本（写入清单）')
+    parser.add_argument('--output', default=None, help=f'编译结果路径（应用使用 {os.path.relpath(ASSET, TESTS_DIR)}）')
+    parser.add_argument('--manifest', default=None,
+                        help=f'清单输出路径（与 oui.bin 一起提交的是 {os.path.relpath(MANIFEST, TESTS_DIR)}）')
+    parser.add_argument('--lookup', nargs='*', default=[], help='查询这些MAC地址')
+    parser.add_argument('--bench', action='store_true', help='测量文件大小与查询吞吐')
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--json', default=None, help='基准结果输出路径')
+    args = parser.parse_args(argv)
+    if args.txt and args.bench:
+        parser.error('--bench 只支持CSV格式的注册表')
+
+    sources = []
+    if args.download:
+        registries, sources = download()
+    else:
+        registries = {}
+        for path in args.csv or args.txt or ():
+            with open(path, 'rb') as f:
+                data = f.read()
+            registries[path] = data.decode('utf-8', errors='replace')
+            sources.append(source_info(os.path.basename(path), data, args.source_version))
+        if args.synthetic:
+            registries = synthetic(args.seed)
+    parse = parse_txt if args.txt else parse_csv
+    records = [record for text in registries.values() for record in parse(text)]
+    data = compile_db(records)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'wb') as f:
+            f.write(data)
+        print(f"✅ {len(records)} 条写入 {args.output}（{len(data)} 字节）")
+    if args.manifest:
+        with open(args.manifest, 'w', encoding='utf-8') as f:
+            json.dump(manifest(data, sources), f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"✅ 清单已写入: {args.manifest}")
+    database = OuiDatabase(data)
+    for mac in args.lookup:
+        vendor = database.lookup(mac)
+        print(f"🔍 {mac} -> {vendor[0] + (f' ({vendor[1]})' if vendor[1] else '') if vendor else '未找到'}")
+    if args.bench:
+        report = bench(registries, args.lookups, args.seed)
+        print_report(report)
+        record_metric('oui database size', value=report['bytes'], unit='bytes')
+        record_metric('oui database lookups', value=report['lookups_per_second'], unit='ops/s')
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"✅ 结果已写入: {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
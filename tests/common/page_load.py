@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+控制面板页面加载检查
+
+OkHttpWebServer 在第一次请求时把控制面板（/{apiKey}）与API Key引导页（启用认证时的 /）构建成 StaticPage，
+同时保存gzip与deflate压缩版本，响应带 ETag 与 `Cache-Control: no-cache`，If-None-Match 命中时返回304。
+三种编码的字节不同，ETag也各不相同（压缩版本为原文ETag加 -gzip / -deflate 后缀）。
+
+对每个页面按浏览器的几种加载方式各请求若干次（每次新连接，与首次打开页面相同），按原始套接字统计：
+- cold：不带 Accept-Encoding，即原先每次发送的未压缩页面
+- gzip / deflate：首次加载的压缩版本，解压后必须与原文逐字节相同
+- revalidate：带上次gzip加载得到的ETag以压缩方式再次加载，应返回没有body的304
+线路字节数包含响应头；按 --link-kbps 估算慢速共享网络上的加载时间（首字节时间 + 传输时间）。
+对本地替身运行时还检查原文与从Kotlin源码提取的页面一致。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.page_load                                  # 本地替身
+    python3 -m common.page_load --profile slow-tether --link-kbps 1000
+    python3 -m common.page_load --host 192.168.1.133 --api-key KEY --json page_load.json
+"""
+
+import argparse
+import gzip
+import json
+import socket
+import sys
+import time
+import zlib
+
+from common.fake_webserver import API_KEY_REQUIRED_PAGE, MAIN_PAGE, FakeWebServer, Profile
+from common.fleet import DEFAULT_PORT
+from common.histogram import LatencyHistogram
+from common.loadgen import DEFAULT_API_KEY
+from common.results import record_metric
+
+SCENARIOS = ('cold', 'gzip', 'deflate', 'revalidate')
+ACCEPT_ENCODING = {'cold': None, 'gzip': 'gzip', 'deflate': 'deflate', 'revalidate': 'gzip, deflate'}
+
+
+class PageLoad:
+
+    def __init__(self, status, headers, header_bytes, body, connect_us, ttfb_us, total_us):
+        self.status = status
+        self.headers = headers
+        self.header_bytes = header_bytes
+        self.body = body
+        self.connect_us = connect_us
+        self.ttfb_us = ttfb_us
+        self.total_us = total_us
+
+    @property
+    def wire_bytes(self):
+        return self.header_bytes + len(self.body)
+
+    def decoded(self):
+        encoding = self.headers.get('content-encoding')
+        if encoding == 'gzip':
+            return gzip.decompress(self.body)
+        if encoding == 'deflate':
+            return zlib.decompress(self.body)
+        return self.body
+
+
+def fetch(host, port, path, headers=None, timeout=10.0):
+    """用新连接发送一个GET（Connection: close），从开始连接计时"""
+    start = time.perf_counter()
+    sock = socket.create_connection((host, port), timeout=timeout)
+    try:
+        connected = time.perf_counter()
+        lines = [f'GET {path} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items() if value is not None]
+        sock.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode('utf-8'))
+        chunks = [sock.recv(65536)]
+        first = time.perf_counter()
+        while chunks[-1]:
+            chunks.append(sock.recv(65536))
+        done = time.perf_counter()
+    finally:
+        sock.close()
+    data = b''.join(chunks)
+    head, separator, body = data.partition(b'\r\n\r\n')
+    if not separator:
+        raise ConnectionError('Incomplete response')
+    head_lines = head.decode('utf-8', 'replace').split('\r\n')
+    response_headers = {}
+    for line in head_lines[1:]:
+        name, _, value = line.partition(':')
+        response_headers[name.strip().lower()] = value.strip()
+    length = response_headers.get('content-length')
+    if length is not None and int(length) != len(body):
+        raise ConnectionError(f'Content-Length {length} but received {len(body)} bytes')
+    return PageLoad(int(head_lines[0].split(' ', 2)[1]), response_headers, len(head) + len(separator), body,
+                    (connected - start) * 1e6, (first - start) * 1e6, (done - start) * 1e6)
+
+
+def check_page(host, port, path, rounds=10, expected=None, link_kbps=1000):
+    """按四种方式加载一个页面，返回 (每种方式的统计, 问题列表)"""
+    problems = []
+    cold = fetch(host, port, path)
+    if cold.status != 200:
+        return {}, [f'{path}: HTTP {cold.status}']
+    identity = cold.body
+    etag = cold.headers.get('etag')
+    if expected is not None and identity != expected.encode('utf-8'):
+        problems.append(f'{path}: 页面与Kotlin源码不一致')
+    if not etag:
+        problems.append(f'{path}: 没有ETag')
+    results = {}
+    validators = {}
+    for scenario in SCENARIOS:
+        headers = {'Accept-Encoding': ACCEPT_ENCODING[scenario]}
+        if scenario == 'revalidate':
+            # 只有所选编码（gzip）的ETag才能验证
+            headers['If-None-Match'] = validators.get('gzip', etag)
+        ttfb, total = LatencyHistogram(), LatencyHistogram()
+        load = None
+        for _ in range(rounds):
+            load = fetch(host, port, path, headers)
+            ttfb.record(load.ttfb_us)
+            total.record(load.total_us)
+        if scenario == 'revalidate':
+            if load.status != 304 or load.body:
+                problems.append(f'{path}: If-None-Match 返回 {load.status}（{len(load.body)} 字节body）')
+        elif load.status != 200:
+            problems.append(f'{path} {scenario}: HTTP {load.status}')
+        else:
+            encoding = load.headers.get('content-encoding')
+            if scenario != 'cold' and encoding != scenario:
+                problems.append(f'{path} {scenario}: Content-Encoding 为 {encoding}')
+            if load.decoded() != identity:
+                problems.append(f'{path} {scenario}: 解压后与原文不一致')
+            expected_etag = etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+            if etag and load.headers.get('etag') != expected_etag:
+                problems.append(f'{path} {scenario}: ETag为 {load.headers.get("etag")}，应为 {expected_etag}')
+            validators[encoding] = load.headers.get('etag')
+        results[scenario] = {
+            'status': load.status,
+            'wire_bytes': load.wire_bytes,
+            'body_bytes': len(load.body),
+            'ttfb_us': ttfb.summary(),
+            'total_us': total.summary(),
+            # 首字节时间 + 按线路速率传输全部字节的时间
+            'estimated_ms': round(ttfb.percentile(50) / 1000 + load.wire_bytes * 8 / link_kbps, 1),
+            '_ttfb': ttfb,
+        }
+    if results['gzip']['wire_bytes'] >= results['cold']['wire_bytes']:
+        problems.append(f'{path}: gzip没有减少字节数')
+    return results, problems
+
+
+def run(host=None, port=DEFAULT_PORT, api_key=DEFAULT_API_KEY, rounds=10, link_kbps=1000, profile='ideal'):
+    """host为None时在启用认证的本地替身上检查控制面板与引导页"""
+    report = {'rounds': rounds, 'link_kbps': link_kbps, 'pages': {}, 'problems': []}
+    pages = {'main': (f'/{api_key}', MAIN_PAGE), 'api_key_required': ('/', API_KEY_REQUIRED_PAGE)}
+    server = None
+    if host is None:
+        server = FakeWebServer(api_key=api_key, auth_enabled=True, profile=Profile.preset(profile)).__enter__()
+        host, port = '127.0.0.1', server.port
+    try:
+        for name, (path, expected) in pages.items():
+            results, problems = check_page(host, port, path, rounds, expected if server else None, link_kbps)
+            report['pages'][name] = {'path': path, 'scenarios': results}
+            report['problems'] += problems
+    finally:
+        if server:
+            server.__exit__(None, None, None)
+    return report
+
+
+def print_report(report):
+    names = {'cold': '未压缩', 'gzip': 'gzip', 'deflate': 'deflate', 'revalidate': '304验证'}
+    for name, page in report['pages'].items():
+        print(f"📄 {name} ({page['path']})")
+        for scenario, result in page['scenarios'].items():
+            print(f"   {names[scenario]}: HTTP {result['status']}  线路 {result['wire_bytes']} B  "
+                  f"首字节 p50={result['ttfb_us']['p50'] / 1000:.2f}ms  "
+                  f"完成 p50={result['total_us']['p50'] / 1000:.2f}ms  "
+                  f"{report['link_kbps']}kbps估算 {result['estimated_ms']}ms")
+    for problem in report['problems']:
+        print(f"❌ {problem}")
+    if not report['problems']:
+        print("✅ 压缩版本与原文一致，重复加载返回304")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='控制面板页面加载检查')
+    parser.add_argument('--host', default=None, help='设备地址（默认使用本地替身）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--api-key', default=DEFAULT_API_KEY)
+    parser.add_argument('--rounds', type=int, default=10, help='每种方式的加载次数')
+    parser.add_argument('--link-kbps', type=float, default=1000, help='估算加载时间使用的线路速率')
+    parser.add_argument('--profile', choices=sorted(Profile.PRESETS), default='ideal', help='本地替身的延迟配置')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    report = run(args.host, args.port, args.api_key, args.rounds, args.link_kbps, args.profile)
+    print_report(report)
+    for name, page in report['pages'].items():
+        for scenario, result in page['scenarios'].items():
+            record_metric(f'page {name} {scenario} ttfb', histogram=result['_ttfb'].values(), unit='us')
+            record_metric(f'page {name} {scenario} bytes', value=result['wire_bytes'], unit='B')
+    if args.json:
+        output = dict(report, pages={name: dict(page, scenarios={
+            scenario: {key: value for key, value in result.items() if not key.startswith('_')}
+            for scenario, result in page['scenarios'].items()}) for name, page in report['pages'].items()})
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 0 if report['pages'] and not report['problems'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+WebServerManager 快速重启的端口分配基准
+
+WebServerManager.startWithPortRetry 原先先用 isPortAvailable(port) 打开并关闭一个临时 ServerSocket 探测端口，
+再由 OkHttpWebServer.start() 重新绑定同一个端口：每次启动绑定两次，而且探测与绑定之间端口可能被别的进程占用，
+探测说可用的端口随后绑定失败，服务器落到备用端口。JDK 与 Android libcore 的 ServerSocket 在Linux上默认开启
+SO_REUSEADDR，所以探测本身不会因为停止时留下的 TIME_WAIT 误判（不重用地址的探测才会，见 probe_reuse）。
+另外 stop() 与 restart() 中还各有 100ms、200ms 的固定等待。
+现在 OkHttpWebServer.bind() 只绑定一次（SO_REUSEADDR）并把绑定好的套接字交给服务器，也不再固定等待。
+
+这里在本机真实的套接字上回放重启循环：
+- StandInServer：OkHttpWebServer 的监听部分，每个连接应答一次后由服务器先关闭（与停止时关闭keep-alive连接
+  一样在服务器端留下 TIME_WAIT）
+- Manager：WebServerManager 的 start/stop/restart 与端口重试的移植，strategy 为 'probe'（原来的探测后绑定）
+  或 'bind_once'，sleeps 控制是否保留原来的固定等待；落到备用端口时与原实现一样把它记为首选端口；on_probe 在
+  探测成功之后、真正绑定之前调用，可以在这个窗口里占用端口，lost_races 统计探测可用而绑定失败的次数
+- run()：每轮先让 requests 个客户端完成请求，再从调用 restart() 开始计时，直到新的监听端口应答第一个请求，
+  统计停止到重新可用的延迟、落到备用端口的比例、启动失败次数、每次启动的绑定次数、探测到绑定之间的窗口与探测后绑定失败的次数
+- compare()：legacy（探测 + 固定等待，与原来相同）、probe（只保留探测）与 bind_once 各用一组空闲端口运行
+
+用法（在 tests/ 目录下）：
+    python3 -m common.port_rebind --cycles 30 --requests 20
+    python3 -m common.port_rebind --no-probe-reuse --json port_rebind.json   # 探测不重用地址时（TIME_WAIT 导致误判）
+"""
+
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+
+from common.histogram import LatencyHistogram
+from common.results import record_metric
+
+HOST = '127.0.0.1'
+FALLBACK_COUNT = 5
+STOP_SLEEP = 0.1
+RESTART_SLEEP = 0.2
+RESPONSE = b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok'
+MODES = {
+    'legacy': {'strategy': 'probe', 'sleeps': True},
+    'probe': {'strategy': 'probe', 'sleeps': False},
+    'bind_once': {'strategy': 'bind_once', 'sleeps': False},
+}
+
+
+def bind(port, reuse=True):
+    """OkHttpWebServer.bind()：reuse 为 False 时相当于不重用地址的 ServerSocket(port)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        if reuse:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((HOST, port))
+        sock.listen(50)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def free_ports(count, attempts=50):
+    """连续 count 个当前可以不重用地址绑定的端口"""
+    for _ in range(attempts):
+        with socket.socket() as probe:
+            probe.bind((HOST, 0))
+            base = probe.getsockname()[1]
+        if base + count > 65535:
+            continue
+        try:
+            for port in range(base, base + count):
+                bind(port, reuse=False).close()
+            return list(range(base, base + count))
+        except OSError:
+            continue
+    raise OSError(f'找不到 {count} 个连续的空闲端口')
+
+
+class StandInServer:
+    """监听线程：每个连接读到请求后应答并由服务器先关闭"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.port = sock.getsockname()[1]
+        self.running = True
+        self.thread = threading.Thread(target=self._accept, daemon=True)
+        self.thread.start()
+
+    def _accept(self):
+        while self.running:
+            try:
+                connection, _ = self.sock.accept()
+            except OSError:
+                break
+            with connection:
+                try:
+                    connection.recv(1024)
+                    connection.sendall(RESPONSE)
+                except OSError:
+                    pass
+
+    def stop(self):
+        self.running = False
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self.thread.join()
+
+
+class Manager:
+    """WebServerManager 的移植"""
+
+    def __init__(self, ports, strategy='bind_once', sleeps=False, probe_reuse=True, on_probe=None):
+        self.preferred = ports[0]
+        self.fallback_ports = ports
+        self.strategy = strategy
+        self.sleeps = sleeps
+        self.probe_reuse = probe_reuse
+        self.on_probe = on_probe
+        self.server = None
+        self.binds = self.starts = self.lost_races = 0
+        self.windows = LatencyHistogram()
+
+    def ports_to_try(self):
+        return [self.preferred] + [port for port in self.fallback_ports if port != self.preferred]
+
+    def _is_port_available(self, port):
+        self.binds += 1
+        try:
+            bind(port, reuse=self.probe_reuse).close()
+            return True
+        except OSError:
+            return False
+
+    def start(self):
+        """返回使用的端口，所有端口都失败时抛出 OSError"""
+        self.starts += 1
+        for port in self.ports_to_try():
+            if self.strategy == 'probe':
+                if not self._is_port_available(port):
+                    continue
+                probed = time.perf_counter()
+                if self.on_probe is not None:
+                    self.on_probe(port)
+            self.binds += 1
+            try:
+                sock = bind(port)
+            except OSError:
+                if self.strategy == 'probe':
+                    self.lost_races += 1
+                continue
+            if self.strategy == 'probe':
+                self.windows.record(int((time.perf_counter() - probed) * 1e6))
+            self.server = StandInServer(sock)
+            self.preferred = port   # setPort(port)
+            return port
+        raise OSError(f'所有端口都无法启动: {self.ports_to_try()}')
+
+    def stop(self):
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+            if self.sleeps:
+                time.sleep(STOP_SLEEP)
+
+    def restart(self):
+        self.stop()
+        if self.sleeps:
+            time.sleep(RESTART_SLEEP)
+        return self.start()
+
+
+def request(port, timeout=2.0):
+    """发一个请求并读到服务器关闭连接"""
+    with socket.create_connection((HOST, port), timeout=timeout) as sock:
+        sock.sendall(b'GET /api/status HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = b''
+        while True:
+            chunk = sock.recv(1024)
+            if not chunk:
+                break
+            response += chunk
+    return response == RESPONSE
+
+
+def run(mode='bind_once', cycles=30, requests=20, ports=None, probe_reuse=True):
+    ports = ports or free_ports(FALLBACK_COUNT)
+    manager = Manager(ports, probe_reuse=probe_reuse, **MODES[mode])
+    restart = LatencyHistogram()
+    fallbacks = failures = 0
+    errors = 0
+    used = [manager.start()]
+    try:
+        for _ in range(cycles):
+            port = used[-1]
+            if manager.server is not None:
+                for _ in range(requests):
+                    errors += not request(port)
+            start = time.perf_counter()
+            try:
+                new_port = manager.restart()
+            except OSError:
+                failures += 1
+                continue
+            errors += not request(new_port)
+            restart.record(int((time.perf_counter() - start) * 1e6))
+            fallbacks += new_port != port
+            used.append(new_port)
+    finally:
+        manager.stop()
+    return {
+        'mode': mode,
+        'cycles': cycles,
+        'restart_us': restart.summary(),
+        'fallbacks': fallbacks,
+        'fallback_rate': round(fallbacks / cycles, 4) if cycles else 0.0,
+        'failures': failures,
+        'binds_per_start': round(manager.binds / manager.starts, 2),
+        'lost_races': manager.lost_races,
+        'probe_window_us': manager.windows.summary() if manager.windows.total else None,
+        'ports_used': sorted(set(used)),
+        'errors': errors,
+        '_restart': restart,
+    }
+
+
+def compare(cycles=30, requests=20, probe_reuse=True, modes=tuple(MODES)):
+    report = {'cycles': cycles, 'requests': requests, 'probe_reuse': probe_reuse, 'modes': {}, 'problems': []}
+    for mode in modes:
+        # 每种方式用自己的一组端口，前一种留下的 TIME_WAIT 不影响后一种
+        result = run(mode, cycles, requests, free_ports(FALLBACK_COUNT), probe_reuse)
+        report['modes'][mode] = result
+        if result['errors']:
+            report['problems'].append(f"{mode}: {result['errors']} 个请求没有得到正确的应答")
+    bind_once = report['modes'].get('bind_once')
+    if bind_once:
+        if bind_once['fallbacks'] or bind_once['failures']:
+            report['problems'].append('bind_once: 重启后没有回到首选端口')
+        legacy = report['modes'].get('legacy')
+        if legacy and legacy['restart_us']['count'] and bind_once['restart_us']['count']:
+            report['speedup'] = round(legacy['restart_us']['p50'] / max(bind_once['restart_us']['p50'], 1), 1)
+    return report
+
+
+def print_report(report):
+    print(f"🔁 {report['cycles']} 次重启，每次之前 {report['requests']} 个请求"
+          f"{'' if report['probe_reuse'] else '（探测时不重用地址）'}")
+    for mode, result in report['modes'].items():
+        latency = result['restart_us']
+        window = result['probe_window_us']
+        print(f"   {mode}: 停止到重新可用 p50={latency['p50'] / 1000:.2f}ms p99={latency['p99'] / 1000:.2f}ms，"
+              f"落到备用端口 {result['fallbacks']} 次（{result['fallback_rate']:.0%}），启动失败 {result['failures']} 次，"
+              f"每次启动绑定 {result['binds_per_start']} 次"
+              + (f"，探测到绑定 p50={window['p50']}µs" if window else '')
+              + (f"，探测后绑定失败 {result['lost_races']} 次" if result['lost_races'] else '')
+              + f"，用过的端口 {len(result['ports_used'])} 个")
+    if 'speedup' in report:
+        print(f"📈 重启快 {report['speedup']}x")
+    for problem in report['problems']:
+        print(f"❌ {problem}")
+    if not report['problems']:
+        print("✅ bind_once 每次重启都回到同一个端口")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='WebServerManager 快速重启的端口分配基准')
+    parser.add_argument('--cycles', type=int, default=30)
+    parser.add_argument('--requests', type=int, default=20, help='每次重启前完成的请求数（在端口上留下TIME_WAIT）')
+    parser.add_argument('--mode', choices=list(MODES), action='append', help='只运行这些方式（可重复）')
+    parser.add_argument('--no-probe-reuse', dest='probe_reuse', action='store_false',
+                        help='探测端口时不重用地址（默认与 JDK/libcore 的 ServerSocket 一样重用）')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    report = compare(args.cycles, args.requests, args.probe_reuse, tuple(args.mode or MODES))
+    print_report(report)
+    for mode, result in report['modes'].items():
+        record_metric(f'webserver restart {mode}', histogram=result['_restart'].values(), unit='us')
+        record_metric(f'webserver restart {mode} fallback rate', value=result['fallback_rate'], unit='ratio')
+    if args.json:
+        output = dict(report, modes={mode: {key: value for key, value in result.items() if not key.startswith('_')}
+                                     for mode, result in report['modes'].items()})
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 0 if not report['problems'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
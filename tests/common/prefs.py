@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+SharedPreferences 快照与差异
+
+应用的偏好设置分在两处：App.pref（默认偏好，位于设备加密存储 user_de）与
+RemoteControlFragment 的 remote_control_prefs（位于凭据加密存储 /data/data）。
+逐个文件 `adb shell cat` 再按行查找字符串既慢又容易误判，这里：
+- 用一次 `adb exec-out tar` 把两个 shared_prefs/ 目录打包成一个流拉回（先 run-as，失败时用 su）
+- 用 XMLPullParser 流式解析每个文件，按 XmlUtils 的标签转换成带类型的值
+  （boolean/int/long/float/double/string/set/null → bool/int/int/float/float/str/frozenset/None）
+- 每个文件按内容SHA-256缓存解析结果，快照按全部文件的哈希得到ID，保存在 tests/.cache/prefs/，可以打标签
+- diff 跳过哈希相同的文件，给出新增、删除和修改的键（类型变化也算修改）
+
+用法（在 tests/ 目录下）：
+    python3 -m common.prefs snapshot --label before
+    # 在应用中切换“远程控制自动连接”
+    python3 -m common.prefs snapshot --label after
+    python3 -m common.prefs diff before after
+    python3 -m common.prefs show after --file be.mygod.vpnhotspot_preferences.xml
+"""
+
+import argparse
+import collections
+import hashlib
+import io
+import json
+import os
+import sys
+import tarfile
+import threading
+import time
+import xml.etree.ElementTree as ET
+
+from common.adb import AdbClient, AdbError
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE = os.environ.get('PREFS_CACHE', os.path.join(TESTS_DIR, '.cache', 'prefs'))
+
+PACKAGE = 'be.mygod.vpnhotspot'
+# 快照中的文件名前缀 → 设备上的 shared_prefs 目录
+LOCATIONS = {
+    'de': f'/data/user_de/0/{PACKAGE}/shared_prefs',
+    'ce': f'/data/data/{PACKAGE}/shared_prefs',
+}
+DEFAULT_PREFS = f'{PACKAGE}_preferences.xml'
+REMOTE_CONTROL_PREFS = 'remote_control_prefs.xml'
+
+_SCALARS = {
+    'boolean': lambda text: text == 'true',
+    'int': int,
+    'long': int,
+    'float': float,
+    'double': float,
+}
+_CHUNK = 16384
+
+Change = collections.namedtuple('Change', 'file key change before after')
+
+
+class PrefsError(Exception):
+    pass
+
+
+def parse_xml(stream):
+    """
+    流式解析一个 SharedPreferences XML 文件，返回 {键: (标签, 值)}
+    stream 为二进制文件对象
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    result = {}
+    depth = 0
+    current_set = None
+
+    def handle():
+        nonlocal depth, current_set
+        for event, element in parser.read_events():
+            if event == 'start':
+                depth += 1
+                if depth == 1 and element.tag != 'map':
+                    raise PrefsError(f'根元素不是 <map>: <{element.tag}>')
+                if depth == 2 and element.tag == 'set':
+                    current_set = []
+                continue
+            tag, name = element.tag, element.get('name')
+            if depth == 3 and current_set is not None and tag == 'string':
+                current_set.append(element.text or '')
+            elif depth == 2:
+                if tag == 'set':
+                    result[name] = ('set', frozenset(current_set))
+                    current_set = None
+                elif tag in _SCALARS:
+                    result[name] = (tag, _SCALARS[tag](element.get('value')))
+                elif tag == 'string':
+                    result[name] = ('string', element.text or '')
+                elif tag == 'null':
+                    result[name] = ('null', None)
+                else:
+                    raise PrefsError(f'未知的偏好类型: <{tag}>')
+                element.clear()
+            depth -= 1
+
+    try:
+        while True:
+            chunk = stream.read(_CHUNK)
+            if not chunk:
+                break
+            parser.feed(chunk)
+            handle()
+        parser.close()
+    except ET.ParseError as e:
+        raise PrefsError(f'XML格式错误: {e}') from e
+    handle()
+    return result
+
+
+def _encode(entries):
+    return [[key, tag, sorted(value) if tag == 'set' else value] for key, (tag, value) in sorted(entries.items())]
+
+
+def _decode(rows):
+    return {key: (tag, frozenset(value) if tag == 'set' else value) for key, tag, value in rows}
+
+
+def _snapshot_name(path):
+    """tar成员路径 → 快照中的文件名（de/xxx.xml 或 ce/xxx.xml），不在 shared_prefs 中的返回None"""
+    path = '/' + path.lstrip('./')
+    for prefix, directory in LOCATIONS.items():
+        if path.startswith(directory + '/') and path.endswith('.xml') and '/' not in path[len(directory) + 1:]:
+            return f'{prefix}/{path[len(directory) + 1:]}'
+    return None
+
+
+class Snapshot:
+    """一次快照：files 为 {文件名: {键: (标签, 值)}}，hashes 为 {文件名: 内容SHA-256}"""
+
+    def __init__(self, files, hashes, taken=None, label=None):
+        self.files = files
+        self.hashes = hashes
+        self.taken = taken or time.time()
+        self.label = label
+
+    @property
+    def id(self):
+        digest = hashlib.sha256()
+        for name in sorted(self.hashes):
+            digest.update(f'{name}\0{self.hashes[name]}\n'.encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def _file(self, name):
+        if name in self.files:
+            return self.files[name]
+        for prefix in LOCATIONS:
+            if f'{prefix}/{name}' in self.files:
+                return self.files[f'{prefix}/{name}']
+        return None
+
+    def values(self, name):
+        """某个文件的 {键: 值}，可以省略 de/、ce/ 前缀；文件不存在时返回空字典"""
+        entries = self._file(name) or {}
+        return {key: value for key, (_, value) in entries.items()}
+
+    def get(self, name, key, default=None):
+        entries = self._file(name) or {}
+        return entries[key][1] if key in entries else default
+
+    def __contains__(self, name):
+        return self._file(name) is not None
+
+
+class SnapshotStore:
+    """
+    快照存储：files/<SHA-256>.json 为单个文件的解析结果，snapshots/<ID>.json 为快照的文件清单，
+    labels.json 为 {标签: ID}；path 为None时只在内存中解析，不读写缓存
+    """
+
+    def __init__(self, path=DEFAULT_CACHE):
+        self.path = path
+        self.parsed = 0
+        self._lock = threading.Lock()
+
+    def _read_json(self, *parts):
+        try:
+            with open(os.path.join(self.path, *parts), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_json(self, value, *parts):
+        target = os.path.join(self.path, *parts)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp = f'{target}.{os.getpid()}.{threading.get_ident()}'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(temp, target)
+
+    def parse_file(self, data):
+        """按内容哈希缓存的解析，返回 (SHA-256, {键: (标签, 值)})"""
+        sha256 = hashlib.sha256(data).hexdigest()
+        rows = self._read_json('files', f'{sha256}.json') if self.path else None
+        if rows is not None:
+            return sha256, _decode(rows)
+        entries = parse_xml(io.BytesIO(data))
+        with self._lock:
+            self.parsed += 1
+        if self.path:
+            self._write_json(_encode(entries), 'files', f'{sha256}.json')
+        return sha256, entries
+
+    def from_tar(self, stream, label=None):
+        """从tar流（按顺序读取，不需要随机访问）构造快照"""
+        files, hashes = {}, {}
+        try:
+            with tarfile.open(fileobj=stream, mode='r|*') as archive:
+                for member in archive:
+                    name = _snapshot_name(member.name)
+                    if name is None or not member.isfile():
+                        continue
+                    hashes[name], files[name] = self.parse_file(archive.extractfile(member).read())
+        except tarfile.TarError as e:
+            raise PrefsError(f'无法解析tar流: {e}') from e
+        return Snapshot(files, hashes, label=label)
+
+    def save(self, snapshot):
+        if not self.path:
+            return snapshot.id
+        self._write_json({'hashes': snapshot.hashes, 'taken': snapshot.taken, 'label': snapshot.label},
+                         'snapshots', f'{snapshot.id}.json')
+        if snapshot.label:
+            with self._lock:
+                labels = self._read_json('labels.json') or {}
+                labels[snapshot.label] = snapshot.id
+                self._write_json(labels, 'labels.json')
+        return snapshot.id
+
+    def resolve(self, reference):
+        """标签、完整ID或ID前缀 → ID"""
+        labels = self._read_json('labels.json') or {}
+        if reference in labels:
+            return labels[reference]
+        try:
+            candidates = [name[:-5] for name in os.listdir(os.path.join(self.path, 'snapshots'))
+                          if name.startswith(reference) and name.endswith('.json')]
+        except OSError:
+            candidates = []
+        if len(candidates) != 1:
+            raise PrefsError(f'找不到唯一的快照: {reference}（{len(candidates)} 个匹配）')
+        return candidates[0]
+
+    def load(self, reference):
+        manifest = self._read_json('snapshots', f'{self.resolve(reference)}.json')
+        if manifest is None:
+            raise PrefsError(f'快照不存在: {reference}')
+        files = {}
+        for name, sha256 in manifest['hashes'].items():
+            rows = self._read_json('files', f'{sha256}.json')
+            if rows is None:
+                raise PrefsError(f'快照 {reference} 的文件 {name} 缺少缓存')
+            files[name] = _decode(rows)
+        return Snapshot(files, manifest['hashes'], manifest['taken'], manifest['label'])
+
+
+def tar_command(prefix):
+    return f"{prefix}tar -cf - {' '.join(LOCATIONS.values())} 2>/dev/null"
+
+
+def pull_snapshot(serial=None, client=None, store=None, label=None):
+    """一次 exec-out 拉取两个 shared_prefs 目录并解析；先用 run-as（debug构建），失败时用 su"""
+    client = client or AdbClient(serial)
+    store = store if store is not None else SnapshotStore()
+    for command in (tar_command(f'run-as {PACKAGE} '), f"su -c '{tar_command('')}'"):
+        data = client.exec_out(command)
+        # tar 头部偏移257处是 ustar 魔数，输出不是tar时（run-as 失败的提示等）换下一种方式
+        if data[257:262] != b'ustar':
+            continue
+        snapshot = store.from_tar(io.BytesIO(data), label)
+        if snapshot.files:
+            return snapshot
+    raise AdbError('无法读取 shared_prefs：需要debug构建（run-as）或root')
+
+
+def diff(before, after):
+    """两个快照的差异：[Change(文件, 键, 'added'|'removed'|'changed', 旧值, 新值), ...]"""
+    changes = []
+    for name in sorted(set(before.files) | set(after.files)):
+        if before.hashes.get(name) == after.hashes.get(name):
+            continue
+        old, new = before.files.get(name, {}), after.files.get(name, {})
+        for key in sorted(set(old) | set(new)):
+            if key not in new:
+                changes.append(Change(name, key, 'removed', old[key][1], None))
+            elif key not in old:
+                changes.append(Change(name, key, 'added', None, new[key][1]))
+            elif old[key][0] != new[key][0] or old[key][1] != new[key][1]:
+                changes.append(Change(name, key, 'changed', old[key][1], new[key][1]))
+    return changes
+
+
+def _format(value):
+    if isinstance(value, frozenset):
+        return '{' + ', '.join(sorted(value)) + '}'
+    return json.dumps(value, ensure_ascii=False)
+
+
+def print_diff(changes):
+    if not changes:
+        print("✅ 没有差异")
+    symbols = {'added': '+', 'removed': '-', 'changed': '~'}
+    for change in changes:
+        if change.change == 'changed':
+            detail = f'{_format(change.before)} → {_format(change.after)}'
+        else:
+            detail = _format(change.after if change.change == 'added' else change.before)
+        print(f"   {symbols[change.change]} {change.file} {change.key}: {detail}")
+
+
+def print_snapshot(snapshot, name=None):
+    for file in sorted(snapshot.files):
+        if name and name not in (file, file.split('/', 1)[1]):
+            continue
+        entries = snapshot.files[file]
+        print(f"📄 {file}（{len(entries)} 项，{snapshot.hashes[file][:12]}）")
+        if name:
+            for key, (tag, value) in sorted(entries.items()):
+                print(f"   {key} <{tag}> = {_format(value)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SharedPreferences 快照与差异')
+    parser.add_argument('--serial', default=None)
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help='快照与解析缓存目录')
+    commands = parser.add_subparsers(dest='command', required=True)
+    snapshot_parser = commands.add_parser('snapshot', help='从设备拉取快照')
+    snapshot_parser.add_argument('--label', default=None)
+    snapshot_parser.add_argument('--tar', default=None, help='从本地tar文件读取（代替设备）')
+    diff_parser = commands.add_parser('diff', help='比较两个快照（标签或ID前缀）')
+    diff_parser.add_argument('before')
+    diff_parser.add_argument('after')
+    diff_parser.add_argument('--json', default=None, help='差异输出路径')
+    show_parser = commands.add_parser('show', help='显示快照内容')
+    show_parser.add_argument('reference')
+    show_parser.add_argument('--file', default=None, help='显示某个文件的全部键值')
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.cache)
+    try:
+        if args.command == 'snapshot':
+            start = time.perf_counter()
+            if args.tar:
+                with open(args.tar, 'rb') as f:
+                    snapshot = store.from_tar(f, args.label)
+            else:
+                snapshot = pull_snapshot(args.serial, store=store, label=args.label)
+            store.save(snapshot)
+            print(f"✅ 快照 {snapshot.id}{f'（{args.label}）' if args.label else ''}: {len(snapshot.files)} 个文件，"
+                  f"解析 {store.parsed} 个，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+            print_snapshot(snapshot)
+        elif args.command == 'diff':
+            changes = diff(store.load(args.before), store.load(args.after))
+            print(f"🔍 {args.before} → {args.after}: {len(changes)} 处差异")
+            print_diff(changes)
+            if args.json:
+                with open(args.json, 'w', encoding='utf-8') as f:
+                    json.dump([dict(change._asdict(), before=_format(change.before), after=_format(change.after))
+                               for change in changes], f, indent=2, ensure_ascii=False)
+                print(f"✅ 结果已写入: {args.json}")
+        else:
+            print_snapshot(store.load(args.reference), args.file)
+    except (PrefsError, AdbError, OSError) as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+WebServer就绪检测：用指数退避轮询代替启动应用后的固定 sleep
+
+- probe_ports: 对候选端口并发发起非阻塞连接，总耗时约等于最慢的一个而不是逐个相加
+- backoff: 指数退避的等待间隔序列（起步快，逐渐放慢，有上限）
+- wait_for_webserver: 一边流式读取 `OkHttpWebServer started successfully on port N` 日志，
+  一边按退避间隔探测端口，返回实际绑定的端口和从启动到就绪的耗时（冷启动延迟）
+
+用法（在 tests/ 目录下）：
+    python3 -m common.readiness 192.168.1.100 --timeout 15
+"""
+
+import argparse
+import errno
+import re
+import selectors
+import socket
+import sys
+import time
+
+from common.adb import AdbError
+from common.logcat import LogcatStream
+
+# 与 WebServerManager.FALLBACK_PORTS 保持一致：首选9999，被占用时依次尝试后面的端口
+WEBSERVER_PORTS = (9999, 10000, 10001, 10002, 10003)
+
+# OkHttpWebServer.start() 绑定端口成功后输出的日志
+STARTED_PATTERN = re.compile(r'OkHttpWebServer started successfully on port (\d+)')
+
+
+def probe_ports(host, ports, timeout=1.0):
+    """并发探测端口，返回可连接的端口列表（保持候选顺序）"""
+    selector = selectors.DefaultSelector()
+    sockets = {}
+    open_ports = set()
+    try:
+        for port in ports:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            code = sock.connect_ex((host, port))
+            if code == 0:
+                open_ports.add(port)
+                sock.close()
+            elif code in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                sockets[sock] = port
+                selector.register(sock, selectors.EVENT_WRITE)
+            else:
+                sock.close()
+        deadline = time.monotonic() + timeout
+        while sockets:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for key, _ in selector.select(remaining):
+                sock = key.fileobj
+                if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    open_ports.add(sockets[sock])
+                selector.unregister(sock)
+                del sockets[sock]
+                sock.close()
+    finally:
+        for sock in sockets:
+            sock.close()
+        selector.close()
+    return [port for port in ports if port in open_ports]
+
+
+def backoff(initial=0.05, factor=2.0, maximum=1.0):
+    """指数退避的等待间隔：initial, initial*factor, ... 直到 maximum 后保持不变"""
+    delay = initial
+    while True:
+        yield delay
+        delay = min(delay * factor, maximum)
+
+
+class Readiness:
+    """就绪检测结果；elapsed 为从开始等待到端口可连接的秒数，source 为 'log' 或 'probe'"""
+
+    def __init__(self, ready, port=None, elapsed=None, source=None, attempts=0):
+        self.ready = ready
+        self.port = port
+        self.elapsed = elapsed
+        self.source = source
+        self.attempts = attempts
+
+    @property
+    def elapsed_ms(self):
+        return None if self.elapsed is None else round(self.elapsed * 1000, 1)
+
+    def to_dict(self):
+        return {
+            'ready': self.ready,
+            'port': self.port,
+            'elapsed_ms': self.elapsed_ms,
+            'source': self.source,
+            'attempts': self.attempts,
+        }
+
+    def __repr__(self):
+        return f'<Readiness ready={self.ready} port={self.port} elapsed_ms={self.elapsed_ms} source={self.source}>'
+
+
+def _open_stream(since, serial):
+    try:
+        return LogcatStream(['-s', 'OkHttpWebServer:*'], since=since, serial=serial).open()
+    except (OSError, AdbError):
+        return None
+
+
+def wait_for_webserver(host, ports=WEBSERVER_PORTS, timeout=15.0, since=None, serial=None,
+                       stream=None, start=None, delays=None):
+    """
+    等待WebServer就绪
+
+    host 为探测端口使用的地址（为None时只依据日志判断）；
+    since 为启动应用前取得的设备时间（见 logcat.device_time），只匹配之后的启动日志；
+    stream 可传入已打开的 LogcatStream，传 False 时只探测端口；
+    start 为计时起点（time.monotonic()），默认为调用时刻。
+    日志报告端口后仍会确认该端口可连接，日志不可用时退化为按退避间隔探测全部候选端口。
+    """
+    start = time.monotonic() if start is None else start
+    deadline = start + timeout
+    delays = delays or backoff()
+    own_stream = stream is None
+    if own_stream:
+        stream = _open_stream(since, serial)
+    logged_port = None
+    attempts = 0
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return Readiness(False, logged_port, attempts=attempts)
+            delay = min(next(delays), remaining)
+
+            if stream and logged_port is None:
+                for line in stream.lines(timeout=delay):
+                    match = STARTED_PATTERN.search(line)
+                    if match:
+                        logged_port = int(match.group(1))
+                        break
+            elif attempts:
+                time.sleep(delay)
+
+            attempts += 1
+            if host is None:
+                if logged_port is not None:
+                    return Readiness(True, logged_port, time.monotonic() - start, 'log', attempts)
+                continue
+            candidates = [logged_port] if logged_port is not None else list(ports)
+            open_ports = probe_ports(host, candidates, timeout=min(1.0, max(deadline - time.monotonic(), 0.05)))
+            if open_ports:
+                source = 'log' if logged_port is not None else 'probe'
+                return Readiness(True, open_ports[0], time.monotonic() - start, source, attempts)
+    finally:
+        if own_stream and stream:
+            stream.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='等待设备上的WebServer就绪')
+    parser.add_argument('host', nargs='?', help='设备IP，省略时只依据日志判断')
+    parser.add_argument('--timeout', type=float, default=15.0)
+    parser.add_argument('--ports', type=int, nargs='+', default=list(WEBSERVER_PORTS))
+    parser.add_argument('--no-log', action='store_true', help='不读取logcat，只探测端口')
+    args = parser.parse_args(argv)
+
+    readiness = wait_for_webserver(args.host, ports=args.ports, timeout=args.timeout,
+                                   stream=False if args.no_log else None)
+    if readiness.ready:
+        print(f"✅ WebServer就绪: 端口 {readiness.port}，耗时 {readiness.elapsed_ms}ms（{readiness.source}）")
+        return 0
+    print(f"❌ {args.timeout:g}秒内WebServer未就绪")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+从 Timber 日志还原服务器端请求时间线
+
+OkHttpWebServer 在DEBUG构建中为每个连接和请求输出以下日志（同一连接的请求都在同一个工作线程上）：
+    Accepted connection #N from /IP:PORT           接受循环线程，accept() 返回
+    Handling connection #N                         工作线程开始处理该连接
+    HTTP request first line: GET /api/status ...   读到请求行
+    Parsed HTTP request: GET /api/status (N headers)
+    System status refreshed in X ms (battery .., batteryTemperature .., cpuTemperature .., cpu .., wifi ..)
+    Responded 200 to GET /api/status (process X ms, send Y ms)
+    Connection #N closed after K requests
+以及 Socket timeout while handling connection、Client disconnected、Error handling connection 等错误。
+
+TimelineBuilder 按 `logcat -v threadtime` 的 (pid, tid) 把这些行关联为每个请求的时间段（span），
+逐行处理、只保留未完成的连接和最慢的若干个请求，可以长时间读取设备日志：
+- queue：accept 到工作线程开始处理（只有连接上的第一个请求）
+- network：工作线程开始处理到读到请求行（只有连接上的第一个请求；之后的请求之间是keep-alive空闲）
+- parse：读取请求头和body
+- status:*：缓存失效时 getSystemStatus() 各项的耗时，getCpuTemperature/getCpuUsage 可能需要 su -c cat
+- process：其余的请求处理
+- send：写出响应
+较慢的请求按耗时最多的阶段归因。工作线程占用按时间桶统计：busy 为正在处理连接（含keep-alive空闲）的线程数，
+active 为正在处理请求的线程数。logcat时间戳为毫秒精度。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.request_timeline --duration 60                      # 读取设备日志
+    adb logcat -d -v threadtime | python3 -m common.request_timeline --file -
+    python3 -m common.request_timeline --fake --profile device --duration 5 --json timeline.json
+"""
+
+import argparse
+import collections
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+
+from common.fake_webserver import KOTLIN_SOURCE, FakeWebServer, Profile, logger
+from common.histogram import LatencyHistogram
+from common.loadgen import DEFAULT_API_KEY, parse_mix, run_load
+from common.logcat import LogcatStream, parse_line
+from common.results import record_metric
+
+TAG = 'OkHttpWebServer'
+STREAM_PATH = '/api/status/stream'
+STATUS_COMPONENTS = ('battery', 'batteryTemperature', 'cpuTemperature', 'cpu', 'wifi')
+PHASES = ('queue', 'network', 'parse') + tuple(f'status:{name}' for name in STATUS_COMPONENTS) + ('process', 'send')
+# 需要root读取 /proc/stat 与 thermal_zone 的两项
+ROOT_PHASES = ('status:cpuTemperature', 'status:cpu')
+MAX_PENDING_ACCEPTS = 10000
+# 本地替身（启用认证）上的负载：与 loadgen 默认组合相同，API请求带API Key前缀
+FAKE_MIX = '/{apiKey}/api/status=4,/{apiKey}/api/system/info=2,/=1,/favicon.ico=1'
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(TESTS_DIR, 'data', 'logcat', 'okhttp_timeline.txt')
+
+_ACCEPTED = re.compile(r'^Accepted connection #(\d+) from (\S+)')
+_HANDLING = re.compile(r'^Handling connection #(\d+)$')
+_FIRST_LINE = re.compile(r'^HTTP request first line: (\S+) (\S+)')
+_PARSED = re.compile(r'^Parsed HTTP request: (\S+) (\S+) \((\d+) headers\)')
+_REFRESHED = re.compile(r'^System status refreshed in (\d+) ms \(' +
+                        ', '.join(rf'{name} (\d+) ms' for name in STATUS_COMPONENTS) + r'\)')
+_RESPONDED = re.compile(r'^Responded (\d+) to (\S+) (\S+) \(process (\d+) ms, send (\d+) ms\)')
+_CLOSED = re.compile(r'^Connection #(\d+) closed after (\d+) requests')
+_API_KEY_PREFIX = re.compile(r'^/[^/]+(?=/api/)')
+ERRORS = {
+    'Socket timeout while handling connection': 'timeout',
+    'Client disconnected': 'disconnected',
+    'Error handling connection': 'error',
+}
+# 解析依赖的日志格式：OkHttpWebServer.kt 输出各行日志的字符串模板（拼接的字面量合并后），改动日志文本时两边一起修改
+KOTLIN_LOG_FORMATS = (
+    (_ACCEPTED, 'Accepted connection #$id from ${socket.remoteSocketAddress}'),
+    (_HANDLING, 'Handling connection #$id'),
+    (_FIRST_LINE, 'HTTP request first line: $firstLine'),
+    (_PARSED, 'Parsed HTTP request: $method $uri (${headers.size} headers)'),
+    (_REFRESHED, 'System status refreshed in ${(times[5] - times[0]) / 1_000_000} ms (battery ${ms[0]} ms, '
+                 'batteryTemperature ${ms[1]} ms, cpuTemperature ${ms[2]} ms, cpu ${ms[3]} ms, wifi ${ms[4]} ms)'),
+    (_RESPONDED, 'Responded ${response.statusCode} to ${request.method} ${request.uri} '
+                 '(process ${(sendStart - processStart) / 1_000_000} ms, send ${(end - sendStart) / 1_000_000} ms)'),
+    (_CLOSED, 'Connection #$id closed after $handled requests'),
+)
+_TIMBER_CALL = re.compile(r'Timber\.[vdiwe]\((?:\w+, )?((?:"(?:[^"\\]|\\.)*"\s*\+\s*)*"(?:[^"\\]|\\.)*")')
+_STRING_LITERAL = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+def kotlin_log_messages(path=KOTLIN_SOURCE):
+    """OkHttpWebServer.kt 中每个 Timber 调用的消息模板（拼接的字符串字面量合并为一个）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    return {''.join(_STRING_LITERAL.findall(match.group(1))) for match in _TIMBER_CALL.finditer(source)}
+
+
+def normalize_path(uri):
+    """去掉查询参数，把 /{apiKey}/api/... 中的API Key替换为占位符"""
+    return _API_KEY_PREFIX.sub('/{apiKey}', uri.split('?')[0])
+
+
+def timestamp(record):
+    """threadtime日志时间（MM-DD HH:MM:SS.mmm）转换为秒；不含年份，按闰年计算日期"""
+    month, day = record.date.split('-')
+    hours, minutes, seconds = record.time.split(':')
+    days = datetime.date(2000, int(month), int(day)).toordinal()
+    return days * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+class Span:
+    """一个请求的时间线；时间为秒，阶段耗时为毫秒"""
+
+    def __init__(self, connection, index, first_line):
+        self.connection = connection
+        self.index = index
+        self.first_line = first_line
+        self.method = None
+        self.path = None
+        self.headers = None
+        self.parsed = None
+        self.responded = None
+        self.status = None
+        self.error = None
+        self.refresh = None
+        self.process_ms = None
+        self.send_ms = None
+
+    @property
+    def stream(self):
+        return self.path is not None and self.path.endswith(STREAM_PATH)
+
+    @property
+    def start(self):
+        """连接上的第一个请求从accept算起，之后的请求从读到请求行算起"""
+        if self.index == 1:
+            return self.connection.accepted if self.connection.accepted is not None else self.connection.handling
+        return self.first_line
+
+    @property
+    def total_ms(self):
+        return (self.responded - self.start) * 1000
+
+    def phases(self):
+        """{阶段: 毫秒}；没有出现的阶段不包含在内"""
+        phases = {}
+        if self.index == 1:
+            if self.connection.accepted is not None:
+                phases['queue'] = (self.connection.handling - self.connection.accepted) * 1000
+            phases['network'] = (self.first_line - self.connection.handling) * 1000
+        if self.parsed is not None:
+            phases['parse'] = (self.parsed - self.first_line) * 1000
+        refresh = 0
+        for name, value in (self.refresh or {}).items():
+            phases[f'status:{name}'] = value
+            refresh += value
+        if self.process_ms is not None:
+            phases['process'] = max(0, self.process_ms - refresh)
+            phases['send'] = self.send_ms
+        return phases
+
+    def dominant(self):
+        phases = self.phases()
+        return max(phases, key=phases.get) if phases else None
+
+    def to_dict(self):
+        return {
+            'connection': self.connection.id,
+            'request': self.index,
+            'thread': self.connection.tid,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'error': self.error,
+            'total_ms': round(self.total_ms, 1),
+            'phases_ms': {name: round(value, 1) for name, value in self.phases().items()},
+            'dominant': self.dominant(),
+        }
+
+
+class _Connection:
+
+    def __init__(self, id_, tid, accepted, handling):
+        self.id = id_
+        self.tid = tid
+        self.accepted = accepted
+        self.handling = handling
+        self.requests = 0
+        self.span = None
+
+
+class _Occupancy:
+    """按时间桶统计同时处于某状态的线程数：平均值（按时间加权）与最大值；事件需按时间顺序输入"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.keys = set()
+        self.since = None
+        self.busy_time = collections.defaultdict(float)
+        self.peak = collections.defaultdict(int)
+
+    def _advance(self, now):
+        """把上次变化以来的线程数计入经过的时间桶"""
+        start = self.since if self.since is not None else now
+        count = len(self.keys)
+        while start < now:
+            slot = int(start // self.bucket)
+            until = min(now, (slot + 1) * self.bucket)
+            self.busy_time[slot] += (until - start) * count
+            self.peak[slot] = max(self.peak[slot], count)
+            start = until
+        self.since = max(start, now)
+
+    def begin(self, key, now):
+        self._advance(now)
+        self.keys.add(key)
+        slot = int(self.since // self.bucket)
+        self.peak[slot] = max(self.peak[slot], len(self.keys))
+
+    def end(self, key, now):
+        if key in self.keys:
+            self._advance(now)
+            self.keys.discard(key)
+
+    def finish(self, now):
+        self._advance(now)
+        self.keys.clear()
+
+    def series(self, first, last):
+        slots = range(int(first // self.bucket), int(last // self.bucket) + 1)
+        return [(slot, self.busy_time.get(slot, 0.0) / self.bucket, self.peak.get(slot, 0)) for slot in slots]
+
+
+class TimelineBuilder:
+    """逐条输入 LogRecord，增量构建请求时间线与统计"""
+
+    def __init__(self, slow_ms=100.0, keep_slowest=20, bucket=1.0, pid=None, tag=TAG):
+        self.slow_ms = slow_ms
+        self.keep_slowest = keep_slowest
+        self.pid = pid
+        self.tag = tag
+        self.accepts = collections.OrderedDict()
+        self.connections = {}
+        self.threads = set()
+        self.latency = LatencyHistogram()
+        self.phases = collections.defaultdict(LatencyHistogram)
+        self.paths = {}
+        self.refreshes = collections.defaultdict(LatencyHistogram)
+        self.errors = collections.Counter()
+        self.requests = 0
+        self.streams = 0
+        self.connection_count = 0
+        self.slowest = []
+        self._order = itertools.count()
+        self.busy = _Occupancy(bucket)
+        self.active = _Occupancy(bucket)
+        self.first = None
+        self.last = None
+
+    def feed_lines(self, lines):
+        for line in lines:
+            record = parse_line(line)
+            if record is not None:
+                self.feed(record)
+        return self
+
+    def feed(self, record):
+        if not record.tag.startswith(self.tag) or (self.pid is not None and record.pid != self.pid):
+            return
+        now = timestamp(record)
+        self.first = now if self.first is None else self.first
+        self.last = now
+        key = (record.pid, record.tid)
+        message = record.message
+        connection = self.connections.get(key)
+        match = _ACCEPTED.match(message)
+        if match:
+            self.accepts[(record.pid, int(match.group(1)))] = now
+            while len(self.accepts) > MAX_PENDING_ACCEPTS:
+                self.accepts.popitem(last=False)
+            return
+        match = _HANDLING.match(message)
+        if match:
+            if connection is not None:
+                self._close(key, connection, now)
+            id_ = int(match.group(1))
+            self.connections[key] = _Connection(id_, record.tid, self.accepts.pop((record.pid, id_), None), now)
+            self.connection_count += 1
+            self.threads.add(key)
+            self.busy.begin(key, now)
+            return
+        if connection is None:
+            return
+        match = _FIRST_LINE.match(message)
+        if match:
+            connection.requests += 1
+            connection.span = Span(connection, connection.requests, now)
+            connection.span.method, connection.span.path = match.group(1), normalize_path(match.group(2))
+            self.active.begin(key, now)
+            return
+        span = connection.span
+        match = _CLOSED.match(message)
+        if match:
+            self._close(key, connection, now)
+            return
+        for prefix, kind in ERRORS.items():
+            if message.startswith(prefix):
+                self.errors[kind] += 1
+                if span is not None:
+                    span.error = kind
+                    self._finish(key, connection, now)
+                return
+        if span is None:
+            return
+        match = _PARSED.match(message)
+        if match:
+            span.parsed = now
+            span.method, span.path = match.group(1), normalize_path(match.group(2))
+            span.headers = int(match.group(3))
+            return
+        match = _REFRESHED.match(message)
+        if match:
+            components = dict(zip(STATUS_COMPONENTS, map(int, match.groups()[1:])))
+            self.refreshes['total'].record(int(match.group(1)) * 1000)
+            for name, value in components.items():
+                self.refreshes[name].record(value * 1000)
+            # 状态流在一个请求中多次刷新，逐项累加
+            span.refresh = {name: (span.refresh or {}).get(name, 0) + value for name, value in components.items()}
+            return
+        match = _RESPONDED.match(message)
+        if match:
+            span.status = int(match.group(1))
+            span.process_ms, span.send_ms = int(match.group(4)), int(match.group(5))
+            self._finish(key, connection, now)
+
+    def _finish(self, key, connection, now):
+        span = connection.span
+        connection.span = None
+        span.responded = now
+        self.active.end(key, now)
+        if span.stream:
+            # 状态流的持续时间不是响应延迟
+            self.streams += 1
+            return
+        self.requests += 1
+        total_us = span.total_ms * 1000
+        self.latency.record(total_us)
+        stats = self.paths.get(span.path)
+        if stats is None:
+            stats = self.paths[span.path] = {'latency': LatencyHistogram(), 'errors': 0, 'refreshes': 0, 'slow': 0,
+                                             'attribution': collections.Counter()}
+        stats['latency'].record(total_us)
+        stats['errors'] += span.error is not None
+        stats['refreshes'] += span.refresh is not None
+        for name, value in span.phases().items():
+            self.phases[name].record(value * 1000)
+        if span.total_ms >= self.slow_ms:
+            stats['slow'] += 1
+            stats['attribution'][span.dominant() or 'unknown'] += 1
+        entry = (span.total_ms, next(self._order), span)
+        if len(self.slowest) < self.keep_slowest:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def _close(self, key, connection, now):
+        if connection.span is not None:
+            # 请求没有响应就结束了连接（例如日志中缺少错误行）
+            self.errors['incomplete'] += 1
+            connection.span.error = 'incomplete'
+            self._finish(key, connection, now)
+        self.busy.end(key, now)
+        self.connections.pop(key, None)
+
+    def report(self):
+        """统计结果；仍在处理中的连接按最后一条日志的时间计入占用"""
+        last = self.last or 0.0
+        self.busy.finish(last)
+        self.active.finish(last)
+        occupancy = {'bucket_s': self.busy.bucket, 'timeline': []}
+        if self.first is not None:
+            busy = self.busy.series(self.first, last)
+            active = self.active.series(self.first, last)
+            base = busy[0][0]
+            occupancy['timeline'] = [
+                {'t': round((slot - base) * self.busy.bucket, 3), 'busy_mean': round(busy_mean, 2),
+                 'busy_max': busy_max, 'active_mean': round(active_mean, 2), 'active_max': active_max}
+                for (slot, busy_mean, busy_max), (_, active_mean, active_max) in zip(busy, active)]
+            for name in ('busy', 'active'):
+                means = [bucket[f'{name}_mean'] for bucket in occupancy['timeline']]
+                occupancy[name] = {'mean': round(sum(means) / len(means), 2),
+                                   'max': max(bucket[f'{name}_max'] for bucket in occupancy['timeline'])}
+        return {
+            'requests': self.requests,
+            'connections': self.connection_count,
+            'threads': len(self.threads),
+            'streams': self.streams,
+            'open_connections': len(self.connections),
+            'errors': dict(self.errors),
+            'slow_ms': self.slow_ms,
+            'latency_us': self.latency.summary(),
+            'phases_us': {name: self.phases[name].summary() for name in PHASES if name in self.phases},
+            'status_refresh_us': {name: histogram.summary() for name, histogram in self.refreshes.items()},
+            'paths': {path: {'requests': stats['latency'].total, 'errors': stats['errors'],
+                             'status_refreshes': stats['refreshes'], 'latency_us': stats['latency'].summary(),
+                             'slow': stats['slow'], 'attribution': dict(stats['attribution'].most_common())}
+                      for path, stats in sorted(self.paths.items())},
+            'occupancy': occupancy,
+            'slowest': [span.to_dict() for _, _, span in sorted(self.slowest, reverse=True)],
+            '_latency': self.latency,
+        }
+
+
+class ThreadtimeHandler(logging.Handler):
+    """把Python日志格式化为threadtime行交给sink，用于在本地替身上得到与设备相同格式的日志"""
+
+    def __init__(self, sink, level=logging.DEBUG):
+        super().__init__(level)
+        self.sink = sink
+        self.pid = os.getpid()
+
+    def emit(self, record):
+        created = datetime.datetime.fromtimestamp(record.created)
+        level = {logging.DEBUG: 'D', logging.INFO: 'I', logging.WARNING: 'W'}.get(record.levelno, 'E')
+        self.sink(f"{created:%m-%d %H:%M:%S}.{created.microsecond // 1000:03d} {self.pid:5d} "
+                  f"{threading.get_native_id():5d} {level} {record.name}: {record.getMessage()}")
+
+
+def capture_fake(duration=5.0, concurrency=4, profile='device', **builder_args):
+    """在本地替身上运行负载，把替身的日志输入 TimelineBuilder"""
+    builder = TimelineBuilder(**builder_args)
+    lock = threading.Lock()
+
+    def sink(line):
+        with lock:
+            builder.feed_lines([line])
+    handler = ThreadtimeHandler(sink)
+    level = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    try:
+        with FakeWebServer(auth_enabled=True, profile=Profile.preset(profile, seed=1)) as server:
+            run_load(port=server.port, mix=parse_mix(FAKE_MIX, DEFAULT_API_KEY), concurrency=concurrency,
+                     duration=duration, seed=1)
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+    return builder
+
+
+def print_report(report):
+    latency = report['latency_us']
+    print(f"🧵 请求 {report['requests']} 个，连接 {report['connections']} 个，工作线程 {report['threads']} 个，"
+          f"状态流 {report['streams']} 个")
+    print(f"⏱️  服务器端延迟(ms): p50={latency['p50'] / 1000:.1f} p99={latency['p99'] / 1000:.1f} "
+          f"max={latency['max'] / 1000:.1f}")
+    for name, summary in report['phases_us'].items():
+        print(f"   {name}: {summary['count']} 次 p50={summary['p50'] / 1000:.1f}ms p99={summary['p99'] / 1000:.1f}ms")
+    for path, stats in report['paths'].items():
+        attribution = ', '.join(f'{name}×{count}' for name, count in stats['attribution'].items())
+        print(f"   {path}: {stats['requests']} 请求 p99={stats['latency_us']['p99'] / 1000:.1f}ms，"
+              f"刷新状态 {stats['status_refreshes']} 次，慢请求 {stats['slow']} 个" +
+              (f" [{attribution}]" if attribution else ''))
+    occupancy = report['occupancy']
+    if 'busy' in occupancy:
+        print(f"📈 工作线程占用: 处理连接 平均 {occupancy['busy']['mean']} 最多 {occupancy['busy']['max']}，"
+              f"处理请求 平均 {occupancy['active']['mean']} 最多 {occupancy['active']['max']}")
+    root = sum(stats['attribution'].get(phase, 0) for stats in report['paths'].values() for phase in ROOT_PHASES)
+    if root:
+        print(f"⚠️  {root} 个慢请求主要耗时在 su -c cat（getCpuTemperature/getCpuUsage）")
+    for kind, count in report['errors'].items():
+        print(f"❌ {kind}: {count}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='从 Timber 日志还原服务器端请求时间线')
+    parser.add_argument('--file', default=None, help='threadtime格式的日志文件，- 表示标准输入（默认读取设备logcat）')
+    parser.add_argument('--fake', action='store_true', help='在本地替身上运行负载并分析其日志')
+    parser.add_argument('--serial', default=None, help='设备序列号')
+    parser.add_argument('--pid', type=int, default=None, help='只分析该进程的日志')
+    parser.add_argument('--duration', type=float, default=30.0, help='读取设备日志或运行负载的秒数')
+    parser.add_argument('--dump', action='store_true', help='读取设备日志缓冲区中已有的日志后退出（logcat -d）')
+    parser.add_argument('--profile', choices=sorted(Profile.PRESETS), default='device', help='本地替身的延迟配置')
+    parser.add_argument('--concurrency', type=int, default=4, help='本地替身的负载并发数')
+    parser.add_argument('--slow-ms', type=float, default=100.0, help='慢请求阈值')
+    parser.add_argument('--bucket', type=float, default=1.0, help='线程占用统计的时间桶（秒）')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    builder_args = {'slow_ms': args.slow_ms, 'bucket': args.bucket, 'pid': args.pid}
+    if args.fake:
+        builder = capture_fake(args.duration, args.concurrency, args.profile, **builder_args)
+    elif args.file:
+        builder = TimelineBuilder(**builder_args)
+        if args.file == '-':
+            builder.feed_lines(line.rstrip('\n') for line in sys.stdin)
+        else:
+            with open(args.file, 'r', encoding='utf-8', errors='replace') as f:
+                builder.feed_lines(line.rstrip('\n') for line in f)
+    else:
+        builder = TimelineBuilder(**builder_args)
+        print(f"📡 读取设备日志 {'（已有日志）' if args.dump else f'{args.duration:g} 秒'}...")
+        with LogcatStream(['-d'] if args.dump else [], serial=args.serial) as stream:
+            for record in stream.records(None if args.dump else args.duration):
+                builder.feed(record)
+
+    report = builder.report()
+    print_report(report)
+    if report['requests']:
+        record_metric('server request latency', histogram=report['_latency'].values(), unit='us')
+        for name, histogram in builder.phases.items():
+            record_metric(f'server phase {name}', histogram=histogram.values(), unit='us')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({key: value for key, value in report.items() if not key.startswith('_')}, f, indent=2,
+                      ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 0 if report['requests'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
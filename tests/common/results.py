@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+结构化测试结果存储与回归比较
+
+- 每项检查结束、每个性能指标产生时，立即以一行JSON追加到结果文件（JSON Lines，只追加不改写），
+  中途中断也不会丢失已完成的部分；读取时逐行流式解析
+- 每条记录带 run（本次运行ID）、build（git提交）、device（设备序列号）和时间
+- 指标可以是原始样本（samples）、直方图（{数值: 次数}）或单个数值（value），
+  同一次运行中同一脚本的同名指标合并为一个分布
+- compare 用 Mann-Whitney U 检验比较基线与本次的分布，只有统计显著（p < alpha）
+  且中位数变化超过阈值时才判定为回归或改善；任一侧样本数不足时标记为样本不足
+- render_markdown 从存储中的记录生成Markdown报告；单独运行的脚本用 script_check 记录每项检查，
+  结束时用 write_report 生成该脚本本次运行的报告
+
+默认文件为 tests/.results/results.jsonl，可用环境变量 TEST_RESULTS_STORE 指定，设为空字符串则不记录。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.results runs
+    python3 -m common.results report latest --output TEST_REPORT.md
+    python3 -m common.results compare --baseline previous:5 --current latest
+"""
+
+import argparse
+import collections
+import contextlib
+import json
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STORE = os.environ.get('TEST_RESULTS_STORE', os.path.join(TESTS_DIR, '.results', 'results.jsonl'))
+
+# Mann-Whitney 正态近似所需的最少样本数
+MIN_SAMPLES = 5
+
+
+def _git_build():
+    try:
+        result = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=TESTS_DIR,
+                                capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.TimeoutExpired):
+        return 'unknown'
+    return result.stdout.strip() or 'unknown'
+
+
+_run_info = None
+_run_lock = threading.Lock()
+
+
+def run_info():
+    """本进程的运行信息（只计算一次）；TEST_RUN_ID / BUILD_ID / ANDROID_SERIAL 可覆盖"""
+    global _run_info
+    with _run_lock:
+        if _run_info is None:
+            _run_info = {
+                'run': os.environ.get('TEST_RUN_ID') or time.strftime('%Y%m%d-%H%M%S-') + uuid.uuid4().hex[:6],
+                'build': os.environ.get('BUILD_ID') or _git_build(),
+                'device': os.environ.get('ANDROID_SERIAL') or 'default',
+            }
+        return _run_info
+
+
+# 当前检查：调度器运行检查时设置，单独运行脚本时为脚本路径
+_context = threading.local()
+
+
+def _script_id():
+    path = os.path.abspath(sys.argv[0]) if sys.argv and sys.argv[0] else ''
+    relative = os.path.relpath(path, TESTS_DIR) if path else 'interactive'
+    return relative.replace(os.sep, '/')
+
+
+def current_check():
+    return getattr(_context, 'check', None) or _script_id()
+
+
+@contextlib.contextmanager
+def checking(check_id):
+    """在该上下文中记录的指标归属于 check_id"""
+    previous = getattr(_context, 'check', None)
+    _context.check = check_id
+    try:
+        yield
+    finally:
+        _context.check = previous
+
+
+class ResultStore:
+    """
+    只追加的JSON Lines结果文件；path为None或空字符串时不写文件，记录只保留在本进程的 local 中（供 write_report），
+    info可覆盖写入记录的运行信息
+    """
+
+    def __init__(self, path=DEFAULT_STORE, info=None):
+        self.path = path
+        self.info = info
+        self.local = []
+        self._lock = threading.Lock()
+
+    def append(self, record):
+        if not self.path:
+            with self._lock:
+                self.local.append(record)
+            return record
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        return record
+
+    def records(self, runs=None, kind=None):
+        """逐行读取记录，可按运行ID集合和类型过滤；损坏的行（如写入中断）被跳过"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if runs is not None and record.get('run') not in runs:
+                    continue
+                if kind is not None and record.get('kind') != kind:
+                    continue
+                yield record
+
+    def runs(self):
+        """按首次出现顺序返回各次运行的摘要"""
+        summary = collections.OrderedDict()
+        for record in self.records():
+            run = summary.setdefault(record['run'], {
+                'run': record['run'], 'build': record.get('build'), 'device': record.get('device'),
+                'started': record.get('time'), 'checks': 0, 'failed': 0, 'metrics': 0,
+            })
+            if record.get('kind') == 'check':
+                run['checks'] += 1
+                run['failed'] += record.get('status') != 'passed'
+            elif record.get('kind') == 'metric':
+                run['metrics'] += 1
+        return list(summary.values())
+
+    def select(self, selector, relative_to=None):
+        """
+        解析运行选择器，返回运行ID列表：
+        latest、last:N（最近N次）、previous:N（relative_to 之前的N次）、逗号分隔的运行ID
+        """
+        order = [run['run'] for run in self.runs()]
+        if selector == 'latest':
+            return order[-1:]
+        name, _, count = selector.partition(':')
+        if name == 'last':
+            return order[-int(count or 1):]
+        if name == 'previous':
+            end = order.index(relative_to) if relative_to in order else len(order)
+            return order[max(0, end - int(count or 1)):end]
+        return [run for run in selector.split(',') if run]
+
+
+_store = None
+
+
+def default_store():
+    global _store
+    if _store is None:
+        _store = ResultStore()
+    return _store
+
+
+def set_default_store(store):
+    """替换 record_check / record_metric 默认写入的存储，例如调度器的 --no-store"""
+    global _store
+    _store = store
+
+
+def _base(kind, store):
+    return dict(store.info or run_info(), kind=kind, time=round(time.time(), 3))
+
+
+def record_check(check, status, duration, error=None, store=None):
+    """记录一项检查的结果，duration 单位为秒"""
+    store = store or default_store()
+    record = _base('check', store)
+    record.update(check=check, status=status, duration_ms=round(duration * 1000, 1), error=error)
+    return store.append(record)
+
+
+def record_metric(metric, samples=None, histogram=None, value=None, unit='ms', check=None, store=None):
+    """
+    记录一个性能指标：samples 为样本列表，histogram 为 {数值: 次数}，value 为单个数值（三选一）
+    """
+    store = store or default_store()
+    record = _base('metric', store)
+    check = check or current_check()
+    record.update(check=check, script=check.split('::')[0], metric=metric, unit=unit)
+    if histogram is not None:
+        record['histogram'] = {str(key): count for key, count in histogram.items()}
+    elif samples is not None:
+        record['samples'] = list(samples)
+    else:
+        record['samples'] = [value]
+    return store.append(record)
+
+
+def script_check(name, func, passed=bool, script=None):
+    """
+    单独运行脚本时执行并记录一项检查，返回检查函数的返回值；passed(返回值) 判断是否通过，异常记录后重新抛出。
+    调度器把 main() 中的 script_check("名称", 函数) 当作一项检查发现。
+    """
+    check = f'{script or _script_id()}::{name}'
+    start = time.perf_counter()
+    with checking(check):
+        try:
+            result = func()
+        except Exception as e:
+            record_check(check, 'error', time.perf_counter() - start, repr(e))
+            raise
+    record_check(check, 'passed' if passed(result) else 'failed', time.perf_counter() - start)
+    return result
+
+
+def write_report(path, title, script=None, store=None):
+    """把本次运行中该脚本（默认为当前脚本）记录的检查与指标渲染为Markdown报告写入 path"""
+    store = store or default_store()
+    script = script or _script_id()
+    run = (store.info or run_info())['run']
+    records = store.records({run}) if store.path else list(store.local)
+    records = [record for record in records if record.get('check', '').split('::')[0] == script]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(render_markdown(records, title=title))
+    print(f"✅ 报告已生成: {path}")
+    return path
+
+
+# 分布与统计
+
+def _counts(record):
+    if 'histogram' in record:
+        return collections.Counter({float(key): count for key, count in record['histogram'].items()})
+    return collections.Counter(float(value) for value in record['samples'] if value is not None)
+
+
+def distributions(records):
+    """
+    把记录合并为分布：{(分组, 指标): Counter(数值 -> 次数)}
+    指标按脚本分组；检查耗时以检查ID分组，指标名为 duration_ms
+    """
+    result = collections.defaultdict(collections.Counter)
+    units = {}
+    for record in records:
+        if record.get('kind') == 'metric':
+            key = (record['script'], record['metric'])
+            result[key].update(_counts(record))
+            units[key] = record.get('unit', 'ms')
+        elif record.get('kind') == 'check' and record.get('status') == 'passed':
+            key = (record['check'], 'duration_ms')
+            result[key][record['duration_ms']] += 1
+            units[key] = 'ms'
+    return result, units
+
+
+def quantile(counts, fraction):
+    """加权分位数（最近秩）"""
+    total = sum(counts.values())
+    if not total:
+        return None
+    rank = max(1, math.ceil(fraction * total))
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen >= rank:
+            return value
+    return max(counts)
+
+
+def mann_whitney(baseline, current):
+    """
+    Mann-Whitney U 检验（正态近似，含结的修正与连续性修正），输入为 {数值: 次数}
+    返回 (U_current, p_greater, p_less)：p_greater 为“本次整体偏大”的单侧p值
+    """
+    n1, n2 = sum(baseline.values()), sum(current.values())
+    total = n1 + n2
+    rank_sum = 0.0
+    tie_term = 0.0
+    position = 0
+    for value in sorted(set(baseline) | set(current)):
+        ties = baseline.get(value, 0) + current.get(value, 0)
+        rank_sum += current.get(value, 0) * (position + (ties + 1) / 2)
+        tie_term += ties ** 3 - ties
+        position += ties
+    u = rank_sum - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((total + 1) - tie_term / (total * (total - 1)))
+    if variance <= 0:
+        return u, 1.0, 1.0
+    sd = math.sqrt(variance)
+    z_greater = (u - mean - 0.5) / sd
+    z_less = (u - mean + 0.5) / sd
+    return u, 0.5 * math.erfc(z_greater / math.sqrt(2)), 0.5 * math.erfc(-z_less / math.sqrt(2))
+
+
+class Comparison:
+
+    def __init__(self, group, metric, unit, baseline, current, verdict, p_value=None):
+        self.group = group
+        self.metric = metric
+        self.unit = unit
+        self.baseline_n = sum(baseline.values())
+        self.current_n = sum(current.values())
+        self.baseline_median = quantile(baseline, 0.5)
+        self.current_median = quantile(current, 0.5)
+        self.verdict = verdict
+        self.p_value = p_value
+
+    @property
+    def change(self):
+        """中位数的相对变化"""
+        if not self.baseline_median or self.current_median is None:
+            return None
+        return (self.current_median - self.baseline_median) / self.baseline_median
+
+    def to_dict(self):
+        return {
+            'group': self.group,
+            'metric': self.metric,
+            'unit': self.unit,
+            'baseline': {'n': self.baseline_n, 'median': self.baseline_median},
+            'current': {'n': self.current_n, 'median': self.current_median},
+            'change': None if self.change is None else round(self.change, 4),
+            'p_value': None if self.p_value is None else round(self.p_value, 6),
+            'verdict': self.verdict,
+        }
+
+
+def compare(baseline_records, current_records, alpha=0.01, threshold=0.05):
+    """
+    比较两组记录中的每个指标分布（数值越大越差，例如延迟和耗时）
+    verdict: regression / improvement / unchanged / insufficient / new
+    """
+    baseline, units = distributions(baseline_records)
+    current, current_units = distributions(current_records)
+    units.update(current_units)
+    comparisons = []
+    for key in sorted(current):
+        before, after = baseline.get(key, collections.Counter()), current[key]
+        if not before:
+            comparisons.append(Comparison(key[0], key[1], units[key], before, after, 'new'))
+            continue
+        if sum(before.values()) < MIN_SAMPLES or sum(after.values()) < MIN_SAMPLES:
+            comparisons.append(Comparison(key[0], key[1], units[key], before, after, 'insufficient'))
+            continue
+        _, p_greater, p_less = mann_whitney(before, after)
+        comparison = Comparison(key[0], key[1], units[key], before, after, 'unchanged')
+        change = comparison.change or 0.0
+        if p_greater < alpha and change > threshold:
+            comparison.verdict, comparison.p_value = 'regression', p_greater
+        elif p_less < alpha and change < -threshold:
+            comparison.verdict, comparison.p_value = 'improvement', p_less
+        else:
+            comparison.p_value = min(p_greater, p_less)
+        comparisons.append(comparison)
+    return comparisons
+
+
+# 报告
+
+_VERDICT_ICONS = {'regression': '🔺 回归', 'improvement': '🔻 改善', 'unchanged': '＝ 无显著变化',
+                  'insufficient': '… 样本不足', 'new': '🆕 新指标'}
+
+
+def _format_value(value):
+    if value is None:
+        return '-'
+    return f'{value:.1f}' if isinstance(value, float) and not value.is_integer() else f'{value:g}'
+
+
+def render_markdown(records, comparisons=None, title='测试报告'):
+    """从记录生成Markdown报告"""
+    records = list(records)
+    checks = [record for record in records if record.get('kind') == 'check']
+    info = records[0] if records else run_info()
+    passed = sum(1 for record in checks if record['status'] == 'passed')
+    started = min((record['time'] for record in records), default=time.time())
+    lines = [
+        f'# {title}',
+        '',
+        f"- 运行: {info.get('run')}",
+        f"- 构建: {info.get('build')}",
+        f"- 设备: {info.get('device')}",
+        f"- 开始时间: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}",
+        f'- 通过检查: {passed}/{len(checks)}',
+        '',
+    ]
+    icons = {'passed': '✅', 'failed': '❌', 'error': '💥'}
+    if checks:
+        lines += ['## 检查结果', '', '| 检查 | 结果 | 耗时 (ms) |', '|------|------|-----------|']
+        for record in checks:
+            lines.append(f"| {record['check']} | {icons.get(record['status'], record['status'])} | "
+                         f"{_format_value(record['duration_ms'])} |")
+        lines.append('')
+
+    metrics, units = distributions(record for record in records if record.get('kind') == 'metric')
+    if metrics:
+        lines += ['## 性能指标', '', '| 脚本 | 指标 | 样本数 | p50 | p90 | p99 | 最大 | 单位 |',
+                  '|------|------|--------|-----|-----|-----|------|------|']
+        for (script, metric), counts in sorted(metrics.items()):
+            values = [quantile(counts, fraction) for fraction in (0.5, 0.9, 0.99)] + [max(counts)]
+            lines.append(f"| {script} | {metric} | {sum(counts.values())} | "
+                         + ' | '.join(_format_value(value) for value in values) + f" | {units[(script, metric)]} |")
+        lines.append('')
+
+    if comparisons:
+        lines += ['## 与基线对比', '', '| 分组 | 指标 | 基线中位数 | 本次中位数 | 变化 | p值 | 结论 |',
+                  '|------|------|------------|------------|------|-----|------|']
+        for comparison in comparisons:
+            change = '-' if comparison.change is None else f'{comparison.change:+.1%}'
+            p_value = '-' if comparison.p_value is None else f'{comparison.p_value:.2g}'
+            lines.append(f"| {comparison.group} | {comparison.metric} | "
+                         f"{_format_value(comparison.baseline_median)} (n={comparison.baseline_n}) | "
+                         f"{_format_value(comparison.current_median)} (n={comparison.current_n}) | "
+                         f"{change} | {p_value} | {_VERDICT_ICONS[comparison.verdict]} |")
+        lines.append('')
+
+    failures = [record for record in checks if record['status'] != 'passed']
+    if failures:
+        lines += ['## 失败详情', '']
+        for record in failures:
+            lines.append(f"- {record['check']}: {record.get('error') or record['status']}")
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def print_comparisons(comparisons):
+    for comparison in comparisons:
+        change = '' if comparison.change is None else f' {comparison.change:+.1%}'
+        p_value = '' if comparison.p_value is None else f' p={comparison.p_value:.2g}'
+        print(f"   {_VERDICT_ICONS[comparison.verdict]}  {comparison.group} {comparison.metric}: "
+              f"{_format_value(comparison.baseline_median)} → {_format_value(comparison.current_median)}"
+              f" {comparison.unit}{change}{p_value}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='测试结果存储：查看运行、生成报告、比较回归')
+    parser.add_argument('--store', default=DEFAULT_STORE)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('runs', help='列出已记录的运行')
+    report = commands.add_parser('report', help='从存储生成Markdown报告')
+    report.add_argument('run', nargs='?', default='latest')
+    report.add_argument('--output', default=None)
+    report.add_argument('--baseline', default=None, help='同时与基线比较，例如 previous:5')
+    compare_parser = commands.add_parser('compare', help='与基线比较，发现显著回归时返回1')
+    compare_parser.add_argument('--baseline', default='previous:5')
+    compare_parser.add_argument('--current', default='latest')
+    compare_parser.add_argument('--alpha', type=float, default=0.01)
+    compare_parser.add_argument('--threshold', type=float, default=0.05, help='中位数相对变化阈值')
+    compare_parser.add_argument('--json', default=None)
+    args = parser.parse_args(argv)
+
+    store = ResultStore(args.store)
+    if args.command == 'runs':
+        for run in store.runs():
+            started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['started'] or 0))
+            print(f"{run['run']}  {started}  build={run['build']}  device={run['device']}  "
+                  f"检查 {run['checks'] - run['failed']}/{run['checks']}  指标 {run['metrics']}")
+        return 0
+
+    if args.command == 'report':
+        runs = store.select(args.run)
+        comparisons = None
+        if args.baseline:
+            baseline = store.select(args.baseline, relative_to=runs[0] if runs else None)
+            comparisons = compare(store.records(set(baseline)), store.records(set(runs)))
+        markdown = render_markdown(store.records(set(runs)), comparisons)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(markdown)
+            print(f"✅ 报告已生成: {args.output}")
+        else:
+            print(markdown)
+        return 0
+
+    current = store.select(args.current)
+    baseline = store.select(args.baseline, relative_to=current[0] if current else None)
+    comparisons = compare(store.records(set(baseline)), store.records(set(current)), args.alpha, args.threshold)
+    print(f"📊 基线 {len(baseline)} 次运行 vs 本次 {len(current)} 次运行")
+    print_comparisons(comparisons)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump([comparison.to_dict() for comparison in comparisons], f, indent=2, ensure_ascii=False)
+    regressions = [comparison for comparison in comparisons if comparison.verdict == 'regression']
+    print(f"{'❌' if regressions else '✅'} 显著回归: {len(regressions)}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
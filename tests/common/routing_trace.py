@@ -0,0 +1,718 @@
+#!/usr/bin/env python3
+"""
+Routing 事务命令回放
+
+Routing 的每条iptables规则原先都是一次 `iptables -w ...`（一次root shell往返、一次xtables锁），
+撤销时同样逐条执行。IptablesBatch 把一个事务的规则在提交时编译为每个表一个
+`iptables-restore -w --noflush` 负载，连同建链命令在一次root shell调用中执行，撤销负载作为一条撤销命令登记；
+负载被拒绝时（缺少链、旧版本不支持 -w 等）整表都没有提交，在同一次调用中逐条执行这个表原来的命令；
+撤销负载按请求的规则生成，其中有没应用的规则时整表失败，回退为逐条删除。
+
+这里提供：
+- Transaction / IptablesBatch：Routing 与 IptablesBatch 生成命令的移植，tethering() 按开启共享的顺序
+  生成主事务、每个上游的 Subrouting 与每个客户端的事务；batch_trace() 把逐条命令的记录编译为批量形式
+- FakeRootShell：解释这些命令（printf 管道、||、{ ...; }、2>/dev/null）的替身root shell，
+  维护IPv4/IPv6的iptables表、ipset 集合与 ip rule，按成本模型推进模拟时钟并记录每次持有xtables锁的时间
+- replay()：依次执行事务（开启）再逆序执行撤销命令（关闭），统计往返次数、进程数、锁的获取次数与持有时间，
+  以及其他iptables用户在此期间随机到达时需要等待的时间
+
+成本模型（毫秒，可在命令行调整）：每次root shell往返 rtt，每个外部进程 exec，
+iptables（legacy）每次调用在锁内取出并写回整张表：lock_base + lock_per_rule × 表中规则数；
+iptables-restore 每个表一次，另加 lock_per_line × 负载行数。system_rules 模拟netd等已有规则的规模。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.routing_trace --clients 3 --upstreams 1
+    python3 -m common.routing_trace --trace data/routing/tethering_wlan1.json --system-rules 300
+    python3 -m common.routing_trace --clients 8 --record trace.json --json routing_trace.json
+"""
+
+import argparse
+import copy
+import json
+import os
+import re
+import sys
+
+from common.histogram import LatencyHistogram
+from common.results import record_metric
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS = os.path.join(TESTS_DIR, 'data', 'routing', 'tethering_wlan1.json')
+
+IP = '/system/bin/ip'
+IPTABLES = 'iptables -w'
+IP6TABLES = 'ip6tables -w'
+RESTORE_COMMANDS = {IPTABLES: 'iptables-restore -w --noflush', IP6TABLES: 'ip6tables-restore -w --noflush'}
+RULE_PRIORITY_UPSTREAM = 17800
+RULE_PRIORITY_UPSTREAM_DISABLE_SYSTEM = 17980
+
+
+class CostModel:
+
+    def __init__(self, rtt=4.0, exec_=2.0, lock_base=0.5, lock_per_rule=0.01, lock_per_line=0.02, ipset_op=0.05):
+        self.rtt = rtt
+        self.exec = exec_
+        self.lock_base = lock_base
+        self.lock_per_rule = lock_per_rule
+        self.lock_per_line = lock_per_line
+        # ipset 每个netlink操作，不取出iptables表也不持有xtables锁
+        self.ipset_op = ipset_op
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+# Routing / IptablesBatch 生成的命令
+
+class Transaction:
+    """RootSession.Transaction：按顺序执行的 (命令, 撤销命令或None)"""
+
+    def __init__(self, name, commands=None):
+        self.name = name
+        self.commands = list(commands or [])
+
+    def exec(self, command, revert=None):
+        self.commands.append((command, revert))
+
+    def to_dict(self):
+        return {'name': self.name, 'commands': [{'command': command, 'revert': revert}
+                                                for command, revert in self.commands]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], [(item['command'], item.get('revert')) for item in data['commands']])
+
+
+def _quote(line):
+    return "'" + line.replace("'", "'\\''") + "'"
+
+
+def restore_command(binary, table, lines, fallback):
+    """IptablesBatch.restore"""
+    payload = ' '.join(_quote(line) for line in [f'*{table}'] + lines + ['COMMIT'])
+    return f"printf '%s\\n' {payload} | {RESTORE_COMMANDS[binary]} || {{ {'; '.join(fallback)}; }}"
+
+
+class IptablesBatch:
+    """IptablesBatch 的移植，生成的命令与Kotlin逐字相同"""
+
+    def __init__(self, batched=True):
+        self.batched = batched
+        self.chains = []
+        self.rules = []
+
+    def new_chain(self, chain, table='filter', binary=IPTABLES):
+        self.chains.append(f'{binary} -t {table} -N {chain}')
+
+    def add(self, content, table='filter', binary=IPTABLES):
+        self.rules.append((binary, table, '-A', content))
+
+    def insert(self, content, table='filter', binary=IPTABLES):
+        self.rules.append((binary, table, '-I', content))
+
+    def apply_to(self, transaction):
+        if not self.batched:
+            for chain in self.chains:
+                transaction.exec(chain)
+            for binary, table, operation, content in self.rules:
+                transaction.exec(f'{binary} -t {table} {operation} {content}', f'{binary} -t {table} -D {content}')
+        elif self.chains or self.rules:
+            groups = {}
+            for rule in self.rules:
+                groups.setdefault(rule[:2], []).append(rule)
+            command = [f'{chain} 2>/dev/null' for chain in self.chains]
+            revert = []
+            for (binary, table), group in groups.items():
+                command.append(restore_command(binary, table, [f'{operation} {content}' for _, _, operation, content in group],
+                                               [f'{binary} -t {table} {operation} {content}'
+                                                for _, _, operation, content in group]))
+            for (binary, table), group in reversed(groups.items()):
+                group = group[::-1]
+                revert.append(restore_command(binary, table, [f'-D {content}' for _, _, _, content in group],
+                                              [f'{binary} -t {table} -D {content}' for _, _, _, content in group]))
+            transaction.exec('\n'.join(command), '\n'.join(revert) or None)
+        self.chains = []
+        self.rules = []
+
+
+def tethering(downstream='wlan1', host='192.168.43.1', prefix=24, upstreams=('rmnet_data0',), clients=3,
+              disable_ipv6=True, batched=True, uid=10123, ports=(54321, 54322), first_ifindex=20):
+    """TetheringService 开启一个下游时 Routing 依次提交的事务（Simple伪装、使用route_localnet）"""
+    main = Transaction(f'routing {downstream}')
+    main.exec(f'ndc network protect allow {uid}')
+    rules = IptablesBatch(batched)
+    # forward()
+    rules.new_chain('vpnhotspot_fwd')
+    rules.new_chain('vpnhotspot_acl')
+    rules.insert('FORWARD -j vpnhotspot_fwd')
+    rules.insert(f'vpnhotspot_fwd -i {downstream} -j vpnhotspot_acl')
+    rules.insert(f'vpnhotspot_fwd -o {downstream} -m state --state ESTABLISHED,RELATED -j vpnhotspot_acl')
+    rules.add(f'vpnhotspot_fwd -i {downstream} ! -o {downstream} -j REJECT')
+    # masquerade(Simple)
+    rules.new_chain('vpnhotspot_masquerade', 'nat')
+    rules.insert('POSTROUTING -j vpnhotspot_masquerade', 'nat')
+    if disable_ipv6:
+        rules.new_chain('vpnhotspot_filter', binary=IP6TABLES)
+        for content in ('INPUT -j vpnhotspot_filter', 'FORWARD -j vpnhotspot_filter', 'OUTPUT -j vpnhotspot_filter',
+                        f'vpnhotspot_filter -i {downstream} -j REJECT', f'vpnhotspot_filter -o {downstream} -j REJECT'):
+            rules.insert(content, binary=IP6TABLES)
+    # commit()
+    main.exec(f'{IP} rule add  iif {downstream} unreachable priority {RULE_PRIORITY_UPSTREAM_DISABLE_SYSTEM}',
+              f'{IP} rule del  iif {downstream} unreachable priority {RULE_PRIORITY_UPSTREAM_DISABLE_SYSTEM}')
+    main.exec('echo 1 >/proc/sys/net/ipv4/conf/all/route_localnet')
+    for protocol, port in zip(('tcp', 'udp'), ports):
+        rules.insert(f'PREROUTING -i {downstream} -p {protocol} -d {host} --dport 53 -j DNAT '
+                     f'--to-destination 127.0.0.1:{port}', 'nat')
+    rules.apply_to(main)
+    transactions = [main]
+    for index, upstream in enumerate(upstreams):
+        subrouting = Transaction(f'subrouting {upstream}')
+        table = 1000 + first_ifindex + index
+        subrouting.exec(f'{IP} rule add  iif {downstream} lookup {table} priority {RULE_PRIORITY_UPSTREAM}',
+                        f'{IP} rule del  iif {downstream} lookup {table} priority {RULE_PRIORITY_UPSTREAM}')
+        batch = IptablesBatch(batched)
+        batch.add(f'vpnhotspot_masquerade -s {host}/{prefix} -o {upstream} -j MASQUERADE', 'nat')
+        batch.apply_to(subrouting)
+        transactions.append(subrouting)
+    base = host.rsplit('.', 1)[0]
+    for index in range(clients):
+        address = f'{base}.{100 + index}'
+        client = Transaction(f'client {address}')
+        batch = IptablesBatch(batched)
+        batch.insert(f'vpnhotspot_acl -i {downstream} -s {address} -j ACCEPT')
+        batch.insert(f'vpnhotspot_acl -o {downstream} -d {address} -j ACCEPT')
+        batch.apply_to(client)
+        transactions.append(client)
+    return transactions
+
+
+# 旧版本的记录中filter表的命令不带 -t
+_RULE = re.compile(r'^(iptables -w|ip6tables -w)(?: -t (\S+))? (-I|-A) (.+)$')
+_CHAIN = re.compile(r'^(iptables -w|ip6tables -w)(?: -t (\S+))? -N (\S+)$')
+
+
+def batch_trace(transactions):
+    """把逐条执行的记录编译为批量形式：规则与建链命令推迟到事务末尾一起执行，其余命令保持原顺序"""
+    result = []
+    for transaction in transactions:
+        batched = Transaction(transaction.name)
+        batch = IptablesBatch()
+        for command, revert in transaction.commands:
+            rule = _RULE.match(command)
+            chain = _CHAIN.match(command)
+            if rule and revert == command.replace(f' {rule.group(3)} ', ' -D ', 1):
+                (batch.insert if rule.group(3) == '-I' else batch.add)(rule.group(4), rule.group(2) or 'filter',
+                                                                       rule.group(1))
+            elif chain and revert is None:
+                batch.new_chain(chain.group(3), chain.group(2) or 'filter', chain.group(1))
+            else:
+                batched.exec(command, revert)
+        batch.apply_to(batched)
+        result.append(batched)
+    return result
+
+
+def load_trace(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [Transaction.from_dict(item) for item in json.load(f)['transactions']]
+
+
+def save_trace(path, transactions):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'transactions': [transaction.to_dict() for transaction in transactions]}, f, indent=2,
+                  ensure_ascii=False)
+
+
+# 替身root shell
+
+def tokenize(line):
+    """sh 的一个子集：单引号、引号外的 \\ 转义、|、||、;、{ }、[n]>file"""
+    tokens = []
+    word = None
+    quoted = False
+    i = 0
+    while i < len(line):
+        c = line[i]
+        if c == "'":
+            end = line.index("'", i + 1)
+            word = (word or '') + line[i + 1:end]
+            quoted = True
+            i = end + 1
+            continue
+        if c == '\\' and i + 1 < len(line):
+            word = (word or '') + line[i + 1]
+            quoted = True
+            i += 2
+            continue
+        if c in ' \t|;>':
+            if c == '>':
+                fd = '1'
+                if word is not None and not quoted and word.isdigit():
+                    fd, word = word, None
+                if word is not None:
+                    tokens.append(('word', word))
+                tokens.append(('redirect', fd))
+            else:
+                if word is not None:
+                    tokens.append(('op', word) if word in ('{', '}') and not quoted else ('word', word))
+                if c == '|':
+                    if line.startswith('||', i):
+                        tokens.append(('op', '||'))
+                        i += 1
+                    else:
+                        tokens.append(('op', '|'))
+                elif c == ';':
+                    tokens.append(('op', ';'))
+            word = None
+            quoted = False
+            i += 1
+            continue
+        word = (word or '') + c
+        i += 1
+    if word is not None:
+        tokens.append(('op', word) if word in ('{', '}') and not quoted else ('word', word))
+    return tokens
+
+
+class ShellError(Exception):
+    pass
+
+
+class _Table:
+    """一张iptables表：{链: [规则]}，规则为去掉链名后的参数字符串"""
+
+    BUILTIN = {
+        'filter': ('INPUT', 'FORWARD', 'OUTPUT'),
+        'nat': ('PREROUTING', 'INPUT', 'OUTPUT', 'POSTROUTING'),
+        'mangle': ('PREROUTING', 'INPUT', 'FORWARD', 'OUTPUT', 'POSTROUTING'),
+        'raw': ('PREROUTING', 'OUTPUT'),
+    }
+    TARGETS = {'ACCEPT', 'DROP', 'REJECT', 'RETURN', 'MASQUERADE', 'DNAT', 'SNAT', 'LOG', 'MARK', 'CONNMARK'}
+
+    def __init__(self, name):
+        self.name = name
+        self.chains = {chain: [] for chain in self.BUILTIN[name]}
+
+    @property
+    def size(self):
+        return sum(len(rules) for rules in self.chains.values())
+
+    def apply(self, operation, chain, rule=''):
+        """执行一条规则操作，失败时抛出 ShellError（与iptables的错误信息相同）"""
+        if operation == '-N':
+            if chain in self.chains:
+                raise ShellError('iptables: Chain already exists.')
+            self.chains[chain] = []
+            return
+        if chain not in self.chains:
+            raise ShellError('iptables: No chain/target/match by that name.')
+        rules = self.chains[chain]
+        if operation in ('-I', '-A'):
+            target = re.search(r'(?:^| )-j (\S+)', rule)
+            if target and target.group(1) not in self.TARGETS and target.group(1) not in self.chains:
+                raise ShellError('iptables: No chain/target/match by that name.')
+            rules.insert(0, rule) if operation == '-I' else rules.append(rule)
+        elif operation == '-D':
+            if rule not in rules:
+                raise ShellError('iptables: Bad rule (does a matching rule exist in that chain?).')
+            rules.remove(rule)
+        elif operation == '-F':
+            rules.clear()
+        elif operation == '-X':
+            if chain in self.BUILTIN[self.name] or any(f'-j {chain}' in other for chains in self.chains.values()
+                                                       for other in chains):
+                raise ShellError('iptables: Too many links.')
+            del self.chains[chain]
+        else:
+            raise ShellError(f'unsupported iptables operation {operation}')
+
+
+class FakeRootShell:
+    """
+    替身root shell：exec(command) 返回 (exit, out, err) 并按成本模型推进模拟时钟
+
+    restore=False 模拟没有 iptables-restore 的设备，restore_wait=False 模拟不支持 -w 的旧版本，
+    ipset=False 模拟没有 ipset 与 set 匹配扩展的设备，xt_set=False 模拟有 ipset 但内核没有 xt_set 的设备。
+    """
+
+    BUILTINS = ('printf', 'echo')
+
+    def __init__(self, costs=None, system_rules=0, restore=True, restore_wait=True, ipset=True, xt_set=True):
+        self.costs = costs or CostModel()
+        self.restore = restore
+        self.restore_wait = restore_wait
+        self.ipset = ipset
+        self.xt_set = xt_set
+        self.tables = {}
+        self.sets = {}
+        self.ip_rules = set()
+        self.files = {}
+        self.now = 0.0
+        self.round_trips = 0
+        self.processes = 0
+        self.holds = []
+        self.commands = []
+        self.executed = []
+        for binary in (IPTABLES, IP6TABLES):
+            for name in ('filter', 'nat'):
+                self.table(binary, name)
+        if system_rules:
+            # netd 的 tetherctrl/bw/fw 等链，只影响每次取出整张表的开销
+            table = self.table(IPTABLES, 'filter')
+            table.chains['netd_system'] = [f'-s 10.{index // 256}.{index % 256}.0/24 -j RETURN'
+                                           for index in range(system_rules)]
+
+    def table(self, binary, name):
+        family = 6 if binary.startswith('ip6') else 4
+        if (family, name) not in self.tables:
+            self.tables[(family, name)] = _Table(name)
+        return self.tables[(family, name)]
+
+    def snapshot(self):
+        """当前的全部规则与 ip rule，用于比较两种方式的最终状态；Routing 撤销时不删除自定义链，空链不计入"""
+        return {
+            'tables': {f'{family}/{name}': {chain: list(rules) for chain, rules in sorted(table.chains.items())
+                                            if rules or chain in table.BUILTIN[name]}
+                       for (family, name), table in sorted(self.tables.items())},
+            'ip_rules': sorted(self.ip_rules),
+            'sets': {name: sorted(members) for name, members in sorted(self.sets.items())},
+        }
+
+    def _hold(self, table, lines=0):
+        hold = self.costs.lock_base + self.costs.lock_per_rule * table.size + self.costs.lock_per_line * lines
+        self.holds.append((self.now, hold))
+        self.now += hold
+
+    def exec(self, command):
+        """一次root shell往返（RootSession.execQuiet）"""
+        self.round_trips += 1
+        self.commands.append(command)
+        self.now += self.costs.rtt
+        exit_code, out, err = 0, '', ''
+        for line in command.split('\n'):
+            if line.strip():
+                exit_code, line_out, line_err = self._run_line(tokenize(line))
+                out += line_out
+                err += line_err
+        return exit_code, out, err
+
+    def _run_line(self, tokens):
+        """pipeline [|| { pipeline; ... }]"""
+        exit_code, out, err = self._run_pipeline(tokens)
+        if tokens[:2] == [('op', '||'), ('op', '{')] and tokens[-1] == ('op', '}'):
+            group, tokens = tokens[2:-1], []
+            while exit_code != 0 and group:
+                exit_code, group_out, group_err = self._run_pipeline(group)
+                out += group_out
+                err += group_err
+                if group[:1] == [('op', ';')]:
+                    group.pop(0)
+                    if not group:
+                        break
+                    exit_code = 1
+        if tokens:
+            raise ValueError(f'unsupported shell syntax near {tokens[:3]}')
+        return exit_code, out, err
+
+    def _run_pipeline(self, tokens):
+        stdin = ''
+        err = ''
+        while True:
+            words, redirects = [], {}
+            while tokens and tokens[0][0] != 'op':
+                kind, value = tokens.pop(0)
+                if kind == 'redirect':
+                    redirects[value] = tokens.pop(0)[1]
+                else:
+                    words.append(value)
+            exit_code, out, command_err = self._run_command(words, stdin)
+            if '1' in redirects:
+                self.files[redirects['1']] = out
+                out = ''
+            if redirects.get('2') != '/dev/null':
+                err += command_err
+            if tokens and tokens[0] == ('op', '|'):
+                tokens.pop(0)
+                stdin = out
+                continue
+            return exit_code, out, err
+
+    def _run_command(self, words, stdin):
+        if not words:
+            return 0, '', ''
+        self.executed.append(' '.join(words))
+        name = words[0]
+        if name not in self.BUILTINS:
+            self.processes += 1
+            self.now += self.costs.exec
+        if name == 'printf':
+            if words[1] != '%s\\n':
+                raise ValueError(f'unsupported printf format {words[1]!r}')
+            return 0, ''.join(f'{word}\n' for word in words[2:]), ''
+        if name == 'echo':
+            return 0, ' '.join(words[1:]) + '\n', ''
+        if name in ('iptables', 'ip6tables'):
+            return self._iptables(name, words[1:])
+        if name in ('iptables-restore', 'ip6tables-restore') and self.restore:
+            return self._restore(name.replace('-restore', ''), words[1:], stdin)
+        if name == IP:
+            return self._ip(words[1:])
+        if name == 'ipset' and self.ipset:
+            return self._ipset(words[1:], stdin)
+        if name == 'ndc':
+            if words[1] == 'network':
+                return 0, '200 0 success\n', ''
+            return 0, f'200 0 {words[1]} operation succeeded\n', ''
+        return 127, '', f'sh: {name}: not found\n'
+
+    def _iptables(self, binary, args):
+        args = [arg for arg in args if arg != '-w']
+        table = 'filter'
+        if args[:1] == ['-t']:
+            table, args = args[1], args[2:]
+        operation, chain, rule = args[0], args[1], ' '.join(args[2:])
+        target = self.table(f'{binary} -w', table)
+        self._hold(target)
+        match = re.search(r'-m set --match-set (\S+) ', rule)
+        if match and not self.ipset:
+            return 2, '', f"{binary} v1.8.7 (legacy): Couldn't load match `set':No such file or directory\n"
+        if match and match.group(1) not in self.sets:
+            return 2, '', f"{binary} v1.8.7 (legacy): Set {match.group(1)} doesn't exist.\n"
+        if match and not self.xt_set:
+            return 1, '', 'iptables: No chain/target/match by that name.\n'
+        if operation == '-C':
+            if chain in target.chains and rule in target.chains[chain]:
+                return 0, '', ''
+            return 1, '', 'iptables: Bad rule (does a matching rule exist in that chain?).\n'
+        try:
+            target.apply(operation, chain, rule)
+        except ShellError as e:
+            return 1, '', f'{e}\n'
+        return 0, '', ''
+
+    def _restore(self, binary, args, payload):
+        if not self.restore_wait and '-w' in args:
+            return 2, '', f"{binary}-restore: unrecognized option '-w'\n"
+        if '--noflush' not in args:
+            raise ValueError('only --noflush payloads are supported')
+        table = working = None
+        lines = 0
+        for number, line in enumerate(payload.splitlines(), 1):
+            if line.startswith('*'):
+                table = self.table(f'{binary} -w', line[1:])
+                working = copy.deepcopy(table)
+                lines = 0
+                continue
+            if line == 'COMMIT':
+                self._hold(table, lines)
+                table.chains = working.chains
+                table = working = None
+                continue
+            lines += 1
+            if line.startswith(':'):
+                # --noflush 时声明已存在的自定义链会清空它
+                chain = line[1:].split()[0]
+                working.chains.setdefault(chain, []).clear()
+                continue
+            operation, _, rest = line.partition(' ')
+            chain, _, rule = rest.partition(' ')
+            try:
+                working.apply(operation, chain, rule)
+            except ShellError as e:
+                self._hold(table, lines)
+                return 1, '', f'{e}\n{binary}-restore: line {number} failed\n'
+        return 0, '', ''
+
+    def _ipset(self, args, stdin):
+        """ipset 的一个子集：create/flush/destroy/add/del/list -n/save/restore，成员带counters"""
+        exist = '-exist' in args
+        args = [arg for arg in args if arg != '-exist']
+        command = args[0]
+        if command == 'restore':
+            for number, line in enumerate(stdin.splitlines(), 1):
+                exit_code, _, err = self._ipset_command(line.split(), exist)
+                if exit_code:
+                    return exit_code, '', f'ipset v7.15: Error in line {number}: {err}'
+            return 0, '', ''
+        if command == 'save':
+            lines = []
+            for name, members in self.sets.items():
+                lines.append(f'create {name} hash:ip family inet hashsize 1024 maxelem 65536 counters')
+                lines += [f'add {name} {ip} packets {packets} bytes {size}'
+                          for ip, (packets, size) in members.items()]
+            return 0, ''.join(f'{line}\n' for line in lines), ''
+        if command == 'list' and args[1:] == ['-n']:
+            return 0, ''.join(f'{name}\n' for name in self.sets), ''
+        exit_code, _, err = self._ipset_command(args, exist)
+        return exit_code, '', f'ipset v7.15: {err}' if err else ''
+
+    def _ipset_command(self, args, exist):
+        self.now += self.costs.ipset_op
+        command, name = args[0], args[1]
+        if command == 'create':
+            if name in self.sets and not exist:
+                return 1, '', 'Set cannot be created: set with the same name already exists\n'
+            self.sets.setdefault(name, {})
+            return 0, '', ''
+        if name not in self.sets:
+            return 1, '', 'The set with the given name does not exist\n'
+        members = self.sets[name]
+        if command == 'flush':
+            members.clear()
+        elif command == 'destroy':
+            if any(f'--match-set {name} ' in rule for table in self.tables.values()
+                   for rules in table.chains.values() for rule in rules):
+                return 1, '', 'Set cannot be destroyed: it is in use by a kernel component\n'
+            del self.sets[name]
+        elif command == 'add':
+            if args[2] in members and not exist:
+                return 1, '', "Element cannot be added to the set: it's already added\n"
+            members.setdefault(args[2], [0, 0])
+        elif command == 'del':
+            if args[2] not in members and not exist:
+                return 1, '', "Element cannot be deleted from the set: it's not added\n"
+            members.pop(args[2], None)
+        else:
+            raise ValueError(f'unsupported ipset command {command}')
+        return 0, '', ''
+
+    def _ip(self, args):
+        if args[0] != 'rule':
+            raise ValueError(f'unsupported ip command {args}')
+        rule = ' '.join(args[2:])
+        if args[1] == 'add':
+            if rule in self.ip_rules:
+                return 2, '', 'RTNETLINK answers: File exists\n'
+            self.ip_rules.add(rule)
+        elif rule in self.ip_rules:
+            self.ip_rules.remove(rule)
+        else:
+            return 2, '', 'RTNETLINK answers: No such file or directory\n'
+        return 0, '', ''
+
+
+# 回放
+
+def _phase(shell, start, round_trips, processes, holds, competitor_samples=1000):
+    duration = shell.now - start
+    holds = shell.holds[holds:]
+    waits = LatencyHistogram()
+    # 其他iptables用户（netd、TrafficRecorder）在此期间均匀到达时需要等待的时间（微秒）
+    for index in range(competitor_samples):
+        at = start + duration * (index + 0.5) / competitor_samples
+        waits.record(next(((begin + hold - at) * 1000 for begin, hold in holds if begin <= at < begin + hold), 0))
+    return {
+        'ms': round(duration, 2),
+        'round_trips': shell.round_trips - round_trips,
+        'processes': shell.processes - processes,
+        'lock_acquisitions': len(holds),
+        'lock_held_ms': round(sum(hold for _, hold in holds), 2),
+        'lock_held_share': round(sum(hold for _, hold in holds) / duration, 3) if duration else 0.0,
+        'longest_hold_ms': round(max((hold for _, hold in holds), default=0), 3),
+        'competitor_wait_us': waits.summary(),
+    }
+
+
+def replay(transactions, shell):
+    """开启：依次执行每个事务；关闭：与 Routing.revert 相同，按事务顺序执行各自逆序登记的撤销命令"""
+    baseline = shell.snapshot()
+    failures = []
+    counters = (shell.now, shell.round_trips, shell.processes, len(shell.holds))
+    reverts = []
+    for transaction in transactions:
+        pending = []
+        for command, revert in transaction.commands:
+            if revert is not None:
+                pending.insert(0, revert)
+            exit_code, out, err = shell.exec(command)
+            if exit_code != 0 or 'iptables:' in err:
+                failures.append({'transaction': transaction.name, 'command': command, 'exit': exit_code,
+                                 'err': err.strip()})
+        reverts.append(pending)
+    start = _phase(shell, *counters)
+    started = shell.snapshot()
+    counters = (shell.now, shell.round_trips, shell.processes, len(shell.holds))
+    for pending in reverts:
+        for revert in pending:
+            shell.exec(revert)
+    stop = _phase(shell, *counters)
+    return {'start': start, 'stop': stop, 'failures': failures, 'started': started,
+            'restored': shell.snapshot() == baseline}
+
+
+def compare(transactions=None, costs=None, system_rules=100, restore=True, restore_wait=True, **tethering_args):
+    """同一组事务逐条执行与批量执行的对比；transactions为None时按 tethering_args 生成"""
+    legacy = transactions if transactions is not None else tethering(batched=False, **tethering_args)
+    modes = {'legacy': legacy, 'batched': batch_trace(legacy)}
+    report = {'costs': (costs or CostModel()).to_dict(), 'system_rules': system_rules,
+              'transactions': len(legacy), 'modes': {}, 'problems': []}
+    for mode, trace in modes.items():
+        shell = FakeRootShell(costs, system_rules, restore, restore_wait)
+        report['modes'][mode] = replay(trace, shell)
+    legacy_result, batched_result = report['modes']['legacy'], report['modes']['batched']
+    if legacy_result['started'] != batched_result['started']:
+        report['problems'].append('批量执行后的规则与逐条执行不同')
+    for mode, result in report['modes'].items():
+        if not result['restored']:
+            report['problems'].append(f'{mode}: 关闭后没有恢复到开启前的状态')
+    for phase in ('start', 'stop'):
+        report[f'{phase}_speedup'] = round(legacy_result[phase]['ms'] / max(batched_result[phase]['ms'], 1e-9), 2)
+    return report
+
+
+def print_report(report):
+    names = {'legacy': '逐条执行', 'batched': 'iptables-restore'}
+    print(f"🧱 {report['transactions']} 个事务，已有规则 {report['system_rules']} 条")
+    for mode, result in report['modes'].items():
+        for phase, label in (('start', '开启'), ('stop', '关闭')):
+            stats = result[phase]
+            wait = stats['competitor_wait_us']
+            print(f"   {names[mode]} {label}: {stats['ms']}ms，往返 {stats['round_trips']} 次，进程 {stats['processes']} 个，"
+                  f"持锁 {stats['lock_acquisitions']} 次共 {stats['lock_held_ms']}ms（最长 {stats['longest_hold_ms']}ms），"
+                  f"其他用户等待 平均 {wait['mean'] / 1000:.3f}ms p99={wait['p99'] / 1000:.2f}ms")
+        for failure in result['failures']:
+            print(f"   ⚠️  {names[mode]} {failure['transaction']}: {failure['err']}")
+    print(f"📈 开启快 {report['start_speedup']}x，关闭快 {report['stop_speedup']}x")
+    for problem in report['problems']:
+        print(f"❌ {problem}")
+    if not report['problems']:
+        print("✅ 两种方式的最终规则一致，关闭后恢复原状")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Routing 事务命令回放')
+    parser.add_argument('--trace', default=None, help='逐条执行的事务记录（JSON），默认按参数生成')
+    parser.add_argument('--record', default=None, help='把生成的逐条执行记录写入该路径')
+    parser.add_argument('--downstream', default='wlan1')
+    parser.add_argument('--clients', type=int, default=3)
+    parser.add_argument('--upstreams', type=int, default=1)
+    parser.add_argument('--system-rules', type=int, default=100, help='已有规则数（影响每次取出整张表的开销）')
+    parser.add_argument('--no-restore', action='store_true', help='模拟没有 iptables-restore 的设备')
+    parser.add_argument('--rtt-ms', type=float, default=4.0, help='每次root shell往返')
+    parser.add_argument('--exec-ms', type=float, default=2.0, help='每个外部进程')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    if args.trace:
+        transactions = load_trace(args.trace)
+    else:
+        transactions = tethering(args.downstream, upstreams=[f'rmnet_data{index}' for index in range(args.upstreams)],
+                                 clients=args.clients, batched=False)
+    if args.record:
+        save_trace(args.record, transactions)
+        print(f"✅ 事务记录已写入: {args.record}")
+    report = compare(transactions, CostModel(args.rtt_ms, args.exec_ms), args.system_rules, not args.no_restore)
+    print_report(report)
+    for mode, result in report['modes'].items():
+        for phase in ('start', 'stop'):
+            record_metric(f'routing {phase} {mode}', value=result[phase]['ms'], unit='ms')
+            record_metric(f'routing {phase} {mode} round trips', value=result[phase]['round_trips'], unit='count')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 0 if not report['problems'] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Kotlin源码静态检查的规则引擎
+
+各脚本以声明式的 Rule 列表描述要在某个源文件中查找的模式：
+- 文件通过mmap读取一次，全部规则编译成一个正则，单次扫描得到每条规则的全部命中位置
+  （计数语义与 str.count / re.findall 一致，即不重叠匹配）
+- 结果按 (文件内容SHA-256, 规则集哈希) 缓存到磁盘，文件未变化时直接复用，
+  大小与修改时间都未变时连哈希也不用重新计算
+- FileMatches 给出每条规则的命中次数与行列号，便于在报告中指出位置
+
+用法（在 tests/ 目录下）：
+    python3 -m common.source_rules mobile/src/main/java/be/mygod/vpnhotspot/OkHttpWebServer.kt "socket.close()" "re:Timber\\.e\\("
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import threading
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE = os.environ.get('SOURCE_RULES_CACHE', os.path.join(TESTS_DIR, '.cache', 'source_rules.json'))
+
+
+class Rule:
+    """
+    一条源码规则
+
+    pattern 默认按字面量匹配，regex=True 时按正则匹配；
+    dotall/ignore_case 只作用于本条规则。
+    """
+
+    def __init__(self, name, pattern, regex=False, dotall=False, ignore_case=False):
+        self.name = name
+        self.pattern = pattern
+        self.regex = regex
+        self.dotall = dotall
+        self.ignore_case = ignore_case
+
+    @property
+    def expression(self):
+        expression = self.pattern if self.regex else re.escape(self.pattern)
+        flags = ('s' if self.dotall else '') + ('i' if self.ignore_case else '')
+        return f'(?{flags}:{expression})' if flags else f'(?:{expression})'
+
+    def key(self):
+        return [self.name, self.pattern, self.regex, self.dotall, self.ignore_case]
+
+    def __repr__(self):
+        return f'<Rule {self.name}: {self.pattern!r}>'
+
+
+_KOTLIN_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"')
+_KOTLIN_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b'}
+
+
+def _unescape(match):
+    escape = match.group(1)
+    if len(escape) == 5:
+        return chr(int(escape[1:], 16))
+    return _KOTLIN_ESCAPES.get(escape, escape)
+
+
+def kotlin_strings(snippet):
+    """按顺序拼接代码片段中的普通Kotlin字符串字面量（"a" + "b"），处理转义，不支持字符串模板"""
+    return ''.join(re.sub(r'\\(u[0-9a-fA-F]{4}|.)', _unescape, literal) for literal in _KOTLIN_STRING.findall(snippet))
+
+
+def literals(prefix, patterns):
+    """把一组字面量模式转换为 prefix_0、prefix_1 ... 命名的规则"""
+    return [Rule(f'{prefix}_{index}', pattern) for index, pattern in enumerate(patterns)]
+
+
+def patterns(prefix, expressions, **flags):
+    """把一组正则模式转换为 prefix_0、prefix_1 ... 命名的规则"""
+    return [Rule(f'{prefix}_{index}', expression, regex=True, **flags) for index, expression in enumerate(expressions)]
+
+
+def rules_hash(rules):
+    return hashlib.sha256(json.dumps([rule.key() for rule in rules]).encode('utf-8')).hexdigest()[:16]
+
+
+class FileMatches:
+    """单个文件的扫描结果：{规则名: [(行号, 列号), ...]}，行列号均从1开始"""
+
+    def __init__(self, path, locations, sha256, cached=False):
+        self.path = path
+        self.locations = locations
+        self.sha256 = sha256
+        self.cached = cached
+
+    def count(self, name):
+        return len(self.locations[name])
+
+    def found(self, name):
+        return bool(self.locations[name])
+
+    def first(self, name):
+        """第一次命中的 (行号, 列号)，未命中返回None"""
+        hits = self.locations[name]
+        return tuple(hits[0]) if hits else None
+
+    def found_count(self, names):
+        """names 中至少命中一次的规则数量"""
+        return sum(1 for name in names if self.locations[name])
+
+    def where(self, name):
+        """`文件名:行号` 形式的位置描述，未命中返回空字符串"""
+        first = self.first(name)
+        return f'{os.path.basename(self.path)}:{first[0]}' if first else ''
+
+    def report(self):
+        """每条规则一行的命中报告"""
+        lines = []
+        for name, hits in self.locations.items():
+            places = ', '.join(f'{line}:{column}' for line, column in hits[:5])
+            more = f' … (+{len(hits) - 5})' if len(hits) > 5 else ''
+            lines.append(f"{'✅' if hits else '❌'} {name}: {len(hits)} [{places}{more}]")
+        return lines
+
+
+def scan_bytes(data, rules):
+    """
+    对数据做一次组合扫描，返回 {规则名: [(行号, 列号), ...]}
+
+    组合正则先用 `(?=p0|p1|...)` 定位任一规则可能匹配的位置，
+    再在该位置用每条规则各自的前瞻分组判断哪些规则匹配；
+    每条规则只接受不与其上一次命中重叠的位置，从而与 re.findall 的计数一致。
+    """
+    locations = {rule.name: [] for rule in rules}
+    if not rules:
+        return locations
+    expressions = [rule.expression for rule in rules]
+    combined = '(?=' + '|'.join(expressions) + ')' + ''.join(
+        f'(?:(?=({expression}))|)' for expression in expressions)
+    regex = re.compile(combined.encode('utf-8'))
+    # 每条规则对应的外层分组号：前缀中规则自带的分组先占用编号，每条规则的外层分组后还跟着它自带的分组
+    inner_groups = [re.compile(expression).groups for expression in expressions]
+    group_numbers = []
+    number = 1 + sum(inner_groups)
+    for groups in inner_groups:
+        group_numbers.append(number)
+        number += 1 + groups
+
+    offsets = {rule.name: [] for rule in rules}
+    last_end = [0] * len(rules)
+    for match in regex.finditer(data):
+        position = match.start()
+        for index, group in enumerate(group_numbers):
+            start, end = match.span(group)
+            if start < 0 or position < last_end[index]:
+                continue
+            offsets[rules[index].name].append(position)
+            last_end[index] = end if end > start else start + 1
+
+    if any(offsets.values()):
+        newlines = [m.start() for m in re.finditer(b'\n', data)]
+        for name, positions in offsets.items():
+            for position in positions:
+                line = bisect.bisect_left(newlines, position)
+                line_start = newlines[line - 1] + 1 if line else 0
+                column = len(data[line_start:position].decode('utf-8', 'replace')) + 1
+                locations[name].append((line + 1, column))
+    return locations
+
+
+class SourceRuleEngine:
+
+    def __init__(self, cache_path=DEFAULT_CACHE):
+        self.cache_path = cache_path
+        self._cache = None
+        self._lock = threading.Lock()
+        self.scans = 0
+
+    def _load_cache(self):
+        if self._cache is None:
+            self._cache = {}
+            if self.cache_path:
+                try:
+                    with open(self.cache_path, 'r', encoding='utf-8') as f:
+                        self._cache = json.load(f)
+                except (OSError, ValueError):
+                    pass
+        return self._cache
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp = f'{self.cache_path}.{os.getpid()}.{threading.get_ident()}'
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(self._cache, f)
+            os.replace(temp, self.cache_path)
+        except OSError:
+            pass
+
+    def scan(self, path, rules):
+        """扫描文件，返回 FileMatches；文件不存在时抛出 FileNotFoundError"""
+        key = os.path.abspath(path)
+        ruleset = rules_hash(rules)
+        stat = os.stat(key)
+        with self._lock:
+            entry = self._load_cache().get(key)
+            if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns \
+                    and ruleset in entry['results']:
+                return FileMatches(path, self._restore(entry['results'][ruleset]), entry['sha256'], cached=True)
+
+        with open(key, 'rb') as f:
+            if stat.st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    sha256 = hashlib.sha256(data).hexdigest()
+                    with self._lock:
+                        entry = self._cache.get(key)
+                        if entry and entry['sha256'] == sha256 and ruleset in entry['results']:
+                            entry['size'], entry['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+                            self._save_cache()
+                            return FileMatches(path, self._restore(entry['results'][ruleset]), sha256, cached=True)
+                    locations = scan_bytes(data, rules)
+            else:
+                sha256 = hashlib.sha256(b'').hexdigest()
+                locations = scan_bytes(b'', rules)
+
+        with self._lock:
+            self.scans += 1
+            entry = self._cache.get(key)
+            if not entry or entry['sha256'] != sha256:
+                entry = self._cache[key] = {'sha256': sha256, 'results': {}}
+            entry['size'], entry['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+            entry['results'][ruleset] = locations
+            self._save_cache()
+        return FileMatches(path, locations, sha256)
+
+    @staticmethod
+    def _restore(locations):
+        return {name: [tuple(hit) for hit in hits] for name, hits in locations.items()}
+
+
+_engine = SourceRuleEngine()
+
+
+def scan_source(path, rules):
+    """使用默认引擎（共享磁盘缓存）扫描文件"""
+    return _engine.scan(path, rules)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Kotlin源码规则扫描')
+    parser.add_argument('path')
+    parser.add_argument('patterns', nargs='+', help='字面量，或以 re: 开头的正则')
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args(argv)
+
+    rules = [Rule(pattern, pattern[3:], regex=True) if pattern.startswith('re:') else Rule(pattern, pattern)
+             for pattern in args.patterns]
+    engine = SourceRuleEngine(None if args.no_cache else DEFAULT_CACHE)
+    matches = engine.scan(args.path, rules)
+    print(f"📄 {args.path} ({'缓存' if matches.cached else '已扫描'}, sha256 {matches.sha256[:12]})")
+    for line in matches.report():
+        print(f"  {line}")
+    return 0 if all(matches.found(rule.name) for rule in rules) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+/api/status/stream 状态流与轮询的对比
+
+OkHttpWebServer 的 /api/status/stream 以Server-Sent Events推送状态：连接建立后先发送一个包含全部字段的
+status 事件，之后每隔 interval 毫秒（默认2000，限制在500~60000）检查一次 getSystemStatus()，
+只在数值变化时发送只含变化字段的 delta 事件，长时间无变化时每15秒发送一行保活注释。
+
+compare() 用相同的客户端数与间隔分别以两种方式获取状态，按原始字节统计：
+- 服务器处理的请求数（轮询每次一个请求，状态流每个客户端一个）
+- 收发字节数与每次更新的字节数，以及返回未变化数据的轮询次数
+- 推送延迟：收到时间 - 事件中的服务器时间戳（跨设备时包含两端时钟偏差）
+- 更新滞后：收到时间 - 数值实际变化的时间，只在本地替身上可知（SteppedStatus 按固定周期改变数值）
+
+用法（在 tests/ 目录下）：
+    python3 -m common.status_stream --clients 8 --duration 20 --interval 1        # 本地替身
+    python3 -m common.status_stream --host 192.168.1.133 --api-key KEY --json stream.json
+"""
+
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+
+from common.fake_webserver import FakeWebServer
+from common.fleet import DEFAULT_PORT, Device
+from common.histogram import LatencyHistogram
+from common.loadgen import DEFAULT_API_KEY
+from common.results import record_metric
+
+STREAM_PATH = '/api/status/stream'
+MODES = ('poll', 'stream')
+
+
+class Event:
+
+    def __init__(self, name, data, event_id=None):
+        self.name = name
+        self.data = data
+        self.id = event_id
+
+    def json(self):
+        return json.loads(self.data)
+
+
+class EventParser:
+    """按 text/event-stream 的规则逐行解析：空行结束一个事件，冒号开头的行是注释"""
+
+    def __init__(self):
+        self.retry = None
+        self.comments = 0
+        self._name = None
+        self._data = []
+        self._id = None
+
+    def feed_line(self, line):
+        """输入一行（可带行尾），事件结束时返回 Event，否则返回None"""
+        line = line.rstrip('\r\n')
+        if not line:
+            if not self._data:
+                self._name = None
+                return None
+            event = Event(self._name or 'message', '\n'.join(self._data), self._id)
+            self._name, self._data = None, []
+            return event
+        if line.startswith(':'):
+            self.comments += 1
+            return None
+        field, _, value = line.partition(':')
+        value = value[1:] if value.startswith(' ') else value
+        if field == 'event':
+            self._name = value
+        elif field == 'data':
+            self._data.append(value)
+        elif field == 'id':
+            self._id = value
+        elif field == 'retry' and value.isdigit():
+            self.retry = int(value)
+        return None
+
+
+class SteppedStatus:
+    """
+    每 period 秒变化一次的合成状态（FakeWebServer 的 status_sampler）
+
+    CPU使用率编码了当前是第几步，changed_at() 据此还原数值开始出现的时间。
+    """
+
+    def __init__(self, period=1.0):
+        self.period = period
+        self.origin = time.time()
+
+    def _step(self, now):
+        return int((now - self.origin) // self.period)
+
+    def __call__(self, server):
+        step = self._step(time.time())
+        return {
+            'battery': 80,
+            'batteryTemperature': 30.0,
+            'cpuTemperature': round(40.0 + (step // 4) % 20 / 10, 1),
+            'cpu': (step % 1000) / 10,
+            'wifiStatus': '运行中 (接口: wlan1)' if server.wifi_enabled else '已停止',
+        }
+
+    def changed_at(self, status):
+        current = self._step(time.time())
+        step = current - (current - round(status['cpu'] * 10)) % 1000
+        return self.origin + step * self.period
+
+
+class ClientStats:
+    """一个客户端的统计；view 是按收到的字段合并出的当前状态"""
+
+    def __init__(self, name, mode):
+        self.name = name
+        self.mode = mode
+        self.view = {}
+        self.requests = 0
+        self.connections = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.updates = 0
+        self.unchanged = 0
+        self.errors = 0
+        self.last_error = None
+        self.push_us = LatencyHistogram()
+        self.lag_us = LatencyHistogram()
+
+    def observe(self, received, fields, changed_at=None):
+        values = {key: value for key, value in fields.items() if key != 'timestamp'}
+        changed = any(self.view.get(key, self) != value for key, value in values.items())
+        self.view.update(values)
+        if 'timestamp' in fields:
+            self.push_us.record(received * 1e6 - fields['timestamp'] * 1e3)
+        if not changed:
+            self.unchanged += 1
+            return False
+        self.updates += 1
+        if changed_at is not None:
+            self.lag_us.record((received - changed_at(self.view)) * 1e6)
+        return True
+
+    def to_dict(self):
+        return {
+            'client': self.name,
+            'mode': self.mode,
+            'requests': self.requests,
+            'connections': self.connections,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'updates': self.updates,
+            'unchanged': self.unchanged,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'push_us': self.push_us.summary() if self.push_us.total else None,
+            'lag_us': self.lag_us.summary() if self.lag_us.total else None,
+        }
+
+
+class _Connection:
+    """记录收发字节数的原始HTTP/1.1连接"""
+
+    def __init__(self, device, stats, timeout):
+        self.device = device
+        self.stats = stats
+        self.sock = socket.create_connection((device.ip, device.port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        stats.connections += 1
+
+    def send_get(self, path, accept):
+        headers = dict(self.device.headers(), Accept=accept)
+        request = [f'GET {path} HTTP/1.1', f'Host: {self.device.ip}:{self.device.port}']
+        request += [f'{key}: {value}' for key, value in headers.items()]
+        data = ('\r\n'.join(request) + '\r\n\r\n').encode('utf-8')
+        self.sock.sendall(data)
+        self.stats.bytes_sent += len(data)
+        self.stats.requests += 1
+
+    def readline(self):
+        line = self.reader.readline()
+        self.stats.bytes_received += len(line)
+        return line.decode('utf-8', 'replace')
+
+    def read_head(self):
+        """返回 (状态码, 小写header字典)"""
+        status_line = self.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed')
+        status = int(status_line.split(' ', 2)[1])
+        headers = {}
+        while True:
+            line = self.readline().rstrip('\r\n')
+            if not line:
+                return status, headers
+            key, _, value = line.partition(':')
+            headers[key.strip().lower()] = value.strip()
+
+    def read_body(self, length):
+        data = self.reader.read(length)
+        self.stats.bytes_received += len(data)
+        return data
+
+    def close(self):
+        self.reader.close()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def poll_status(device, stats, interval, stop, timeout=5.0, changed_at=None):
+    """按固定节拍在一条持久连接上轮询 /api/status，服务器关闭连接后重连"""
+    connection = None
+    next_tick = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                if connection is None:
+                    connection = _Connection(device, stats, timeout)
+                connection.send_get('/api/status', 'application/json')
+                status, headers = connection.read_head()
+                body = connection.read_body(int(headers.get('content-length', 0)))
+                if status != 200:
+                    raise ValueError(f'HTTP {status}')
+                stats.observe(time.time(), json.loads(body)['data'], changed_at)
+                if 'close' in headers.get('connection', '').lower():
+                    connection.close()
+                    connection = None
+            except (OSError, ValueError, KeyError) as e:
+                stats.errors += 1
+                stats.last_error = str(e)
+                if connection is not None:
+                    connection.close()
+                    connection = None
+            next_tick += interval
+            now = time.monotonic()
+            if now > next_tick:
+                next_tick = now
+            stop.wait(next_tick - now)
+    finally:
+        if connection is not None:
+            connection.close()
+
+
+def stream_status(device, stats, interval, stop, timeout=5.0, changed_at=None, sockets=None):
+    """
+    订阅状态流直到 stop：sockets 为共享集合，停止时由调用方关闭其中的连接以打断阻塞的读取；
+    服务器关闭连接后按 retry 重连
+    """
+    path = f'{STREAM_PATH}?interval={int(interval * 1000)}'
+    while not stop.is_set():
+        parser = EventParser()
+        connection = None
+        try:
+            connection = _Connection(device, stats, timeout)
+            if sockets is not None:
+                sockets.add(connection.sock)
+            connection.send_get(path, 'text/event-stream')
+            status, _ = connection.read_head()
+            if status != 200:
+                raise ValueError(f'HTTP {status}')
+            # 保活注释每15秒一次，读超时放宽到其两倍
+            connection.sock.settimeout(max(timeout, 30.0))
+            while not stop.is_set():
+                line = connection.readline()
+                if not line:
+                    raise ConnectionError('Stream closed')
+                event = parser.feed_line(line)
+                if event is not None and event.name in ('status', 'delta'):
+                    stats.observe(time.time(), event.json(), changed_at)
+        except (OSError, ValueError, KeyError) as e:
+            if stop.is_set():
+                break
+            stats.errors += 1
+            stats.last_error = str(e)
+            stop.wait((parser.retry or 1000) / 1000)
+        finally:
+            if connection is not None:
+                if sockets is not None:
+                    sockets.discard(connection.sock)
+                connection.close()
+
+
+def run_clients(mode, devices, clients, interval, duration, timeout=5.0, changed_at=None):
+    """每台设备 clients 个客户端同时运行 duration 秒，返回 [ClientStats]"""
+    stop = threading.Event()
+    sockets = set()
+    results = []
+    threads = []
+    for device in devices:
+        for index in range(clients):
+            stats = ClientStats(f'{device.name}#{index}', mode)
+            results.append(stats)
+            if mode == 'poll':
+                target, args = poll_status, (device, stats, interval, stop, timeout, changed_at)
+            else:
+                target, args = stream_status, (device, stats, interval, stop, timeout, changed_at, sockets)
+            threads.append(threading.Thread(target=target, args=args, daemon=True))
+    for thread in threads:
+        thread.start()
+    stop.wait(duration)
+    stop.set()
+    for sock in list(sockets):
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def summarize(results, duration):
+    """合并一种方式下所有客户端的统计，字节与请求数换算为每客户端每分钟"""
+    push, lag = LatencyHistogram(), LatencyHistogram()
+    totals = dict.fromkeys(('requests', 'connections', 'bytes_sent', 'bytes_received', 'updates', 'unchanged',
+                            'errors'), 0)
+    for stats in results:
+        for key in totals:
+            totals[key] += getattr(stats, key)
+        push.merge(stats.push_us)
+        lag.merge(stats.lag_us)
+    per_minute = 60.0 / duration / max(1, len(results))
+    wire = totals['bytes_sent'] + totals['bytes_received']
+    return dict(totals, clients=len(results), duration=duration,
+                requests_per_client_min=round(totals['requests'] * per_minute, 1),
+                bytes_per_client_min=round(wire * per_minute),
+                bytes_per_update=round(wire / totals['updates']) if totals['updates'] else None,
+                push_us=push.summary() if push.total else None,
+                lag_us=lag.summary() if lag.total else None,
+                _push=push, _lag=lag)
+
+
+def compare(devices=None, clients=4, duration=10.0, interval=1.0, period=0.5, timeout=5.0):
+    """
+    依次以轮询与状态流运行相同的负载；devices为None时在本地替身上运行，
+    替身的数值每 period 秒变化一次，额外统计服务器处理的请求数与状态刷新次数
+    """
+    report = {'clients': clients, 'duration': duration, 'interval': interval, 'modes': {}}
+    for mode in MODES:
+        if devices is None:
+            sampler = SteppedStatus(period)
+            with FakeWebServer(status_sampler=sampler) as server:
+                targets = [Device('127.0.0.1', server.port, name='fake')]
+                results = run_clients(mode, targets, clients, interval, duration, timeout, sampler.changed_at)
+            summary = summarize(results, duration)
+            summary['server_requests'] = sum(server.responses.values())
+            summary['status_refreshes'] = server.status_refreshes
+        else:
+            summary = summarize(run_clients(mode, devices, clients, interval, duration, timeout), duration)
+        summary['per_client'] = [stats.to_dict() for stats in results] if devices is None else None
+        report['modes'][mode] = summary
+    poll, stream = report['modes']['poll'], report['modes']['stream']
+    if poll['requests'] and poll['bytes_per_client_min']:
+        report['request_reduction'] = round(1 - stream['requests'] / poll['requests'], 3)
+        report['bytes_reduction'] = round(1 - stream['bytes_per_client_min'] / poll['bytes_per_client_min'], 3)
+    return report
+
+
+def _us_to_ms(summary, key):
+    return f"{summary[key] / 1000:.1f}ms" if summary else '-'
+
+
+def print_report(report):
+    names = {'poll': '轮询', 'stream': '状态流'}
+    for mode, summary in report['modes'].items():
+        print(f"📡 {names[mode]}: {summary['clients']} 个客户端，请求 {summary['requests']} 次"
+              f"（每客户端每分钟 {summary['requests_per_client_min']}），"
+              f"流量 {summary['bytes_per_client_min']} B/客户端/分钟，每次更新 {summary['bytes_per_update']} B")
+        print(f"   更新 {summary['updates']} 次，未变化 {summary['unchanged']} 次，失败 {summary['errors']} 次，"
+              f"推送延迟 p50={_us_to_ms(summary['push_us'], 'p50')}，"
+              f"更新滞后 p50={_us_to_ms(summary['lag_us'], 'p50')} p99={_us_to_ms(summary['lag_us'], 'p99')}")
+        if 'server_requests' in summary:
+            print(f"   服务器处理请求 {summary['server_requests']} 个，状态刷新 {summary['status_refreshes']} 次")
+    if 'request_reduction' in report:
+        print(f"📉 状态流请求数减少 {report['request_reduction']:.1%}，流量减少 {report['bytes_reduction']:.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='/api/status/stream 状态流与轮询的对比')
+    parser.add_argument('--host', default=None, help='设备地址（默认使用本地替身）')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--api-key', default=DEFAULT_API_KEY)
+    parser.add_argument('--clients', type=int, default=4, help='每台设备的客户端数（模拟同时打开的控制面板）')
+    parser.add_argument('--duration', type=float, default=10.0, help='每种方式运行的秒数')
+    parser.add_argument('--interval', type=float, default=1.0, help='轮询间隔与状态流检查间隔（秒）')
+    parser.add_argument('--period', type=float, default=0.5, help='本地替身的数值变化周期（秒）')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    devices = [Device(args.host, args.port, args.api_key)] if args.host else None
+    print(f"🚀 {'设备 ' + args.host if args.host else '本地替身'}：{args.clients} 个客户端，"
+          f"每种方式 {args.duration}s，间隔 {args.interval}s")
+    report = compare(devices, args.clients, args.duration, args.interval, args.period)
+    print_report(report)
+    for mode, summary in report['modes'].items():
+        if summary['_lag'].total:
+            record_metric(f'status {mode} update lag', histogram=summary['_lag'].values(), unit='us')
+        if summary['_push'].total:
+            record_metric(f'status {mode} push latency', histogram=summary['_push'].values(), unit='us')
+        record_metric(f'status {mode} bytes per client', value=summary['bytes_per_client_min'], unit='B/min')
+    if args.json:
+        output = dict(report, modes={mode: {key: value for key, value in summary.items() if not key.startswith('_')}
+                                     for mode, summary in report['modes'].items()})
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 0 if all(summary['updates'] and not summary['errors'] for summary in report['modes'].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
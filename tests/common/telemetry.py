@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+/api/status 长时间采样
+
+按固定节拍轮询一台或多台设备的 /api/status（每台设备一个线程、一条持久连接），
+把电量、电池温度、CPU温度、CPU使用率和WiFi状态存进内存占用固定的两级存储：
+- 最近的原始样本：按列存放在 array('d') 中的环形缓冲区，写满后覆盖最旧的样本
+- 更早的数据：被覆盖的样本按固定时长的桶汇总成 min/max/mean，桶本身也存在环形缓冲区中
+因此连续采样数小时内存也不会增长。series() 把两级数据合成一条时间序列，可导出为JSON/CSV用于绘图。
+
+OkHttpWebServer.getSystemStatus 有2秒缓存（STATUS_CACHE_DURATION），缓存期内返回同一个 SystemStatus 对象。
+StaleTracker 据此推断旧数据：与上一个样本数值完全相同、且距这组相同数值第一次出现不到2秒的样本视为缓存命中，
+记录其年龄（按响应中的服务器时间戳计算），给出旧数据比例与年龄分布。
+数值为 -1 表示设备上无法获取（如没有root时的CPU使用率），不计入汇总。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.telemetry --host 192.168.1.133 --interval 1 --duration 7200 --json telemetry.json
+    python3 -m common.telemetry --inventory fleet.json --interval 5 --csv telemetry.csv
+    python3 -m common.telemetry --fake --interval 0.5 --duration 20     # 对本地替身采样
+"""
+
+import argparse
+import array
+import json
+import math
+import sys
+import threading
+import time
+
+from common.fake_webserver import FakeWebServer
+from common.fleet import DEFAULT_PORT, Device, load_inventory
+from common.histogram import LatencyHistogram
+from common.http_client import HttpSession
+from common.loadgen import DEFAULT_API_KEY
+from common.results import record_metric
+
+FIELDS = ('battery', 'batteryTemperature', 'cpuTemperature', 'cpu')
+STATUS_CACHE_DURATION = 2.0
+UNAVAILABLE = -1
+
+
+class RingBuffer:
+    """固定容量的列式环形缓冲区：每列一个 array('d')，写满后 append 返回被覆盖的最旧一行"""
+
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._data = [array.array('d', bytes(8 * capacity)) for _ in self.columns]
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, row):
+        evicted = None
+        if self._size == self.capacity:
+            index = self._start
+            evicted = tuple(column[index] for column in self._data)
+            self._start = (self._start + 1) % self.capacity
+        else:
+            index = (self._start + self._size) % self.capacity
+            self._size += 1
+        for column, value in zip(self._data, row):
+            column[index] = value
+        return evicted
+
+    def rows(self):
+        """从旧到新"""
+        for offset in range(self._size):
+            index = (self._start + offset) % self.capacity
+            yield tuple(column[index] for column in self._data)
+
+    def column(self, name):
+        data = self._data[self.columns.index(name)]
+        return [data[(self._start + offset) % self.capacity] for offset in range(self._size)]
+
+    @property
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in self._data)
+
+
+class _Accumulator:
+    """一个桶内每个字段的 min/max/sum/count，跳过NaN"""
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.minimum = [math.inf] * len(FIELDS)
+        self.maximum = [-math.inf] * len(FIELDS)
+        self.total = [0.0] * len(FIELDS)
+        self.valid = [0] * len(FIELDS)
+
+    def add(self, values):
+        self.count += 1
+        for i, value in enumerate(values):
+            if math.isnan(value):
+                continue
+            self.minimum[i] = min(self.minimum[i], value)
+            self.maximum[i] = max(self.maximum[i], value)
+            self.total[i] += value
+            self.valid[i] += 1
+
+    def row(self):
+        row = [self.start, self.count]
+        for i in range(len(FIELDS)):
+            if self.valid[i]:
+                row += [self.minimum[i], self.total[i] / self.valid[i], self.maximum[i]]
+            else:
+                row += [math.nan] * 3
+        return row
+
+
+BUCKET_COLUMNS = ('start', 'count') + tuple(f'{field}_{stat}' for field in FIELDS for stat in ('min', 'mean', 'max'))
+
+
+class Series:
+    """
+    一台设备的两级存储：最近 capacity 个原始样本，以及 bucket_capacity 个 bucket_seconds 长的汇总桶
+    WiFi状态以出现顺序编号存成数值列，名称在 wifi_states 中
+    """
+
+    def __init__(self, capacity=3600, bucket_seconds=60.0, bucket_capacity=1440):
+        self.raw = RingBuffer(capacity, ('time',) + FIELDS + ('wifi',))
+        self.buckets = RingBuffer(bucket_capacity, BUCKET_COLUMNS)
+        self.bucket_seconds = bucket_seconds
+        self.wifi_states = []
+        self._open = None
+        self.samples = 0
+
+    def add(self, timestamp, status):
+        """timestamp 为秒；status 为 /api/status 的 data 字典"""
+        values = []
+        for field in FIELDS:
+            value = float(status.get(field, UNAVAILABLE))
+            values.append(math.nan if value == UNAVAILABLE else value)
+        wifi = status.get('wifiStatus', '')
+        if wifi not in self.wifi_states:
+            self.wifi_states.append(wifi)
+        self.samples += 1
+        evicted = self.raw.append([timestamp] + values + [self.wifi_states.index(wifi)])
+        if evicted is not None:
+            self._fold(evicted[0], evicted[1:1 + len(FIELDS)])
+
+    def _fold(self, timestamp, values):
+        start = timestamp - timestamp % self.bucket_seconds
+        if self._open is not None and self._open.start != start:
+            self.buckets.append(self._open.row())
+            self._open = None
+        if self._open is None:
+            self._open = _Accumulator(start)
+        self._open.add(values)
+
+    def bucket_rows(self):
+        """已关闭的桶与正在汇总的桶，[{start, count, <字段>_min/mean/max}, ...]"""
+        rows = list(self.buckets.rows())
+        if self._open is not None:
+            rows.append(tuple(self._open.row()))
+        return [dict(zip(BUCKET_COLUMNS, row)) for row in rows]
+
+    def recent(self):
+        result = []
+        for row in self.raw.rows():
+            entry = dict(zip(('time',) + FIELDS, row))
+            entry['wifiStatus'] = self.wifi_states[int(row[-1])]
+            result.append(entry)
+        return result
+
+    def series(self, field):
+        """
+        可直接绘图的序列：(时间, 最小值, 平均值, 最大值) 四个等长列表，
+        先是汇总桶（时间为桶起点），再是原始样本（三个值相同）
+        """
+        times, minimum, mean, maximum = [], [], [], []
+        for bucket in self.bucket_rows():
+            times.append(bucket['start'])
+            minimum.append(bucket[f'{field}_min'])
+            mean.append(bucket[f'{field}_mean'])
+            maximum.append(bucket[f'{field}_max'])
+        for timestamp, value in zip(self.raw.column('time'), self.raw.column(field)):
+            times.append(timestamp)
+            minimum.append(value)
+            mean.append(value)
+            maximum.append(value)
+        return times, minimum, mean, maximum
+
+    @property
+    def nbytes(self):
+        return self.raw.nbytes + self.buckets.nbytes
+
+
+class StaleTracker:
+    """推断 getSystemStatus 2秒缓存返回的旧数据，年龄是相对这组数值第一次出现的下界"""
+
+    def __init__(self, window=STATUS_CACHE_DURATION):
+        self.window = window
+        self.samples = 0
+        self.stale = 0
+        self.ages = LatencyHistogram()
+        self._values = None
+        self._since = None
+
+    def observe(self, timestamp, values):
+        """返回该样本的推断年龄（秒），判断为新数据时返回None"""
+        self.samples += 1
+        if values == self._values and timestamp - self._since < self.window:
+            age = timestamp - self._since
+            self.stale += 1
+            self.ages.record(age * 1000)
+            return age
+        self._values = values
+        self._since = timestamp
+        return None
+
+    def summary(self):
+        return {
+            'samples': self.samples,
+            'stale': self.stale,
+            'stale_ratio': round(self.stale / self.samples, 3) if self.samples else None,
+            'age_ms': self.ages.summary() if self.stale else None,
+        }
+
+
+class DeviceTelemetry:
+    """一台设备的采样状态"""
+
+    def __init__(self, device, **series_options):
+        self.device = device
+        self.series = Series(**series_options)
+        self.stale = StaleTracker()
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.missed = 0
+        self.last_error = None
+
+    def record(self, received, latency, payload):
+        data = payload['data']
+        # 用服务器时间戳，与缓存判断使用同一时钟；没有时用本机接收时间
+        timestamp = data['timestamp'] / 1000 if 'timestamp' in data else received
+        self.latency.record(latency * 1e6)
+        self.series.add(timestamp, data)
+        self.stale.observe(timestamp, tuple(data.get(field) for field in FIELDS + ('wifiStatus',)))
+
+    def to_dict(self):
+        return {
+            'device': self.device.name,
+            'samples': self.series.samples,
+            'errors': self.errors,
+            'missed_ticks': self.missed,
+            'last_error': self.last_error,
+            'latency_us': self.latency.summary() if self.series.samples else None,
+            'stale': self.stale.summary(),
+            'memory_bytes': self.series.nbytes,
+            'recent': self.series.recent(),
+            'buckets': self.series.bucket_rows(),
+        }
+
+
+def _poll_device(telemetry, interval, stop, timeout, on_sample):
+    device = telemetry.device
+    with HttpSession(device.ip, device.port, headers=device.headers(), timeout=timeout) as session:
+        next_tick = time.monotonic()
+        while not stop.is_set():
+            start = time.monotonic()
+            try:
+                response = session.get('/api/status')
+                if response.status != 200:
+                    raise ValueError(f'HTTP {response.status}')
+                telemetry.record(time.time(), time.monotonic() - start, response.json())
+                if on_sample:
+                    on_sample(telemetry)
+            except (OSError, ValueError, KeyError) as e:
+                telemetry.errors += 1
+                telemetry.last_error = str(e)
+            # 固定节拍：按 next_tick 累加而不是从本次结束时算起，落后时跳过错过的节拍
+            next_tick += interval
+            now = time.monotonic()
+            if now > next_tick:
+                skipped = int((now - next_tick) // interval) + 1
+                telemetry.missed += skipped
+                next_tick += skipped * interval
+            stop.wait(next_tick - now)
+
+
+class Sampler:
+    """对每台设备按 interval 秒的节拍采样，results 为 {设备名: DeviceTelemetry}"""
+
+    def __init__(self, devices, interval=1.0, timeout=5.0, on_sample=None, **series_options):
+        self.interval = interval
+        self.timeout = timeout
+        self.on_sample = on_sample
+        self.results = {device.name: DeviceTelemetry(device, **series_options) for device in devices}
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [threading.Thread(target=_poll_device, daemon=True,
+                                          args=(telemetry, self.interval, self._stop, self.timeout, self.on_sample))
+                         for telemetry in self.results.values()]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+
+    def wait(self, timeout=None):
+        """等待 timeout 秒，期间被 stop() 时返回True"""
+        return self._stop.wait(timeout)
+
+    def run(self, duration):
+        self.start()
+        try:
+            self.wait(duration)
+        finally:
+            self.stop()
+        return self.results
+
+
+def write_csv(path, results):
+    """长格式：device,time,field,min,mean,max（先汇总桶，再原始样本）"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('device,time,field,min,mean,max\n')
+        for name, telemetry in results.items():
+            for field in FIELDS:
+                for row in zip(*telemetry.series.series(field)):
+                    f.write(f'{name},{row[0]:.3f},{field},' + ','.join('' if math.isnan(value) else f'{value:g}'
+                                                                       for value in row[1:]) + '\n')
+
+
+def _json_safe(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(item) for item in value]
+    return value
+
+
+def print_summary(results):
+    for name, telemetry in results.items():
+        summary = telemetry.to_dict()
+        stale = summary['stale']
+        latency = summary['latency_us'] or {}
+        cpu = [value for value in telemetry.series.raw.column('cpu') if not math.isnan(value)]
+        temperature = [value for value in telemetry.series.raw.column('cpuTemperature') if not math.isnan(value)]
+        print(f"📈 {name}: {summary['samples']} 个样本，{summary['errors']} 次失败，错过 {summary['missed_ticks']} 个节拍，"
+              f"p50={latency.get('p50')}us，内存 {summary['memory_bytes'] // 1024}KB")
+        if stale['samples']:
+            age = stale['age_ms'] or {}
+            print(f"   旧数据（2秒缓存）: {stale['stale']}/{stale['samples']} ({stale['stale_ratio']:.1%})，"
+                  f"年龄 p50={age.get('p50')}ms max={age.get('max')}ms")
+        if cpu:
+            print(f"   CPU {min(cpu):g}~{max(cpu):g}%，CPU温度 "
+                  f"{f'{min(temperature):g}~{max(temperature):g}°C' if temperature else '无法获取'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='/api/status 长时间采样')
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--api-key', default=DEFAULT_API_KEY)
+    parser.add_argument('--inventory', default=None, help='设备清单（格式同 common.fleet）')
+    parser.add_argument('--fake', action='store_true', help='对本地 FakeWebServer 采样')
+    parser.add_argument('--interval', type=float, default=1.0, help='采样间隔（秒）')
+    parser.add_argument('--duration', type=float, default=60.0, help='采样时长（秒）')
+    parser.add_argument('--capacity', type=int, default=3600, help='保留的原始样本数')
+    parser.add_argument('--bucket', type=float, default=60.0, help='汇总桶时长（秒）')
+    parser.add_argument('--buckets', type=int, default=1440, help='保留的汇总桶数')
+    parser.add_argument('--report-every', type=float, default=0, help='每隔多少秒打印一次摘要（0为只在结束时）')
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    parser.add_argument('--csv', default=None, help='时间序列输出路径')
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.fake:
+        server = FakeWebServer().__enter__()
+        devices = [Device('127.0.0.1', server.port, name='fake')]
+    elif args.inventory:
+        devices = load_inventory(args.inventory)
+    elif args.host:
+        devices = [Device(args.host, args.port, args.api_key)]
+    else:
+        parser.error('需要 --host、--inventory 或 --fake')
+
+    options = dict(capacity=args.capacity, bucket_seconds=args.bucket, bucket_capacity=args.buckets)
+    sampler = Sampler(devices, args.interval, **options)
+    results = sampler.results
+    print(f"🚀 采样 {len(devices)} 台设备，每 {args.interval}s 一次，共 {args.duration}s")
+    deadline = time.monotonic() + args.duration
+    sampler.start()
+    try:
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            sampler.wait(min(remaining, args.report_every) if args.report_every else remaining)
+            if args.report_every and time.monotonic() < deadline:
+                print_summary(results)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.stop()
+        if server:
+            server.__exit__(None, None, None)
+    print_summary(results)
+    for name, telemetry in results.items():
+        if telemetry.series.samples:
+            record_metric(f'api_status latency {name}', histogram=telemetry.latency.values(), unit='us')
+            record_metric(f'api_status stale ratio {name}', value=telemetry.stale.summary()['stale_ratio'],
+                          unit='ratio')
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(_json_safe({name: telemetry.to_dict() for name, telemetry in results.items()}), f, indent=2,
+                      ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    if args.csv:
+        write_csv(args.csv, results)
+        print(f"✅ 时间序列已写入: {args.csv}")
+    return 0 if all(telemetry.series.samples for telemetry in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+离线分析 TrafficRecord 流量记录
+
+应用按客户端把流量写成链表：每次更新插入一条新记录，previousId 指向同一会话的上一条，
+计数器是iptables规则建立以来的累计值，因此每条链最后一条记录（没有后继）就是该会话的总量。
+TrafficRecord.Dao.queryStats 用 `LEFT JOIN TrafficRecord AS Next ON TrafficRecord.id = Next.previousId`
+逐个MAC找链尾，记录多达数十万条时对整个设备（或设备群）做报告太慢。
+
+这里把数据库一次性拉到本地（或直接读取本地副本），按批流式读入NumPy列，
+然后一次向量化处理解析全部链：
+- 链尾：id 不出现在任何记录的 previousId 中
+- 链首：previousId 指针倍增（每轮 root = root[root]），轮数为最长链长度的对数
+- 增量：每条记录减去其前驱的计数器（计数器回绕或重置时取本条的值）
+在此基础上按MAC、按下游接口汇总会话总量（与 queryStats 的口径一致），以及按时间桶汇总增量。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.traffic --pull --output app.db           # 从设备拉取（需要run-as或root）
+    python3 -m common.traffic app.db --by downstream
+    python3 -m common.traffic app.db --bucket 1d --json traffic.json
+    python3 -m common.traffic app.db --verify                  # 与 queryStats 的SQL逐个MAC对比
+"""
+
+import argparse
+import heapq
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+from common.adb import AdbClient, AdbError
+
+TESTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_DIR = os.path.join(os.path.dirname(TESTS_DIR), 'mobile', 'schemas', 'be.mygod.vpnhotspot.room.AppDatabase')
+
+PACKAGE = 'be.mygod.vpnhotspot'
+DB_NAME = 'app.db'
+# App.deviceStorage 是设备加密存储，数据库在 user_de 下
+DEVICE_DB_PATH = f'/data/user_de/0/{PACKAGE}/databases/{DB_NAME}'
+
+COUNTERS = ('sentPackets', 'sentBytes', 'receivedPackets', 'receivedBytes')
+
+# 数据库版本2中 TrafficRecord.Dao.queryStats 的自连接查询，不依赖 TrafficChainHead，任何版本的数据库都可用
+QUERY_STATS = '''
+    SELECT  MIN(TrafficRecord.timestamp) AS timestamp,
+            COUNT(TrafficRecord.id) AS count,
+            SUM(TrafficRecord.sentPackets) AS sentPackets,
+            SUM(TrafficRecord.sentBytes) AS sentBytes,
+            SUM(TrafficRecord.receivedPackets) AS receivedPackets,
+            SUM(TrafficRecord.receivedBytes) AS receivedBytes
+        FROM TrafficRecord LEFT JOIN TrafficRecord AS Next ON TrafficRecord.id = Next.previousId
+        WHERE TrafficRecord.mac = ? AND Next.id IS NULL
+'''
+
+_SQLITE_MAGIC = b'SQLite format 3\x00'
+_WAL_MAGIC = (b'\x37\x7f\x06\x82', b'\x37\x7f\x06\x83')
+
+
+def room_schema(version=None):
+    """Room导出的建表语句（默认最新版本），用于生成测试数据库"""
+    if version is None:
+        version = max(int(name[:-5]) for name in os.listdir(SCHEMA_DIR) if name.endswith('.json'))
+    with open(os.path.join(SCHEMA_DIR, f'{version}.json'), 'r', encoding='utf-8') as f:
+        database = json.load(f)['database']
+    statements = []
+    for entity in database['entities']:
+        table = entity['tableName']
+        statements.append(entity['createSql'].replace('${TABLE_NAME}', table))
+        statements += [index['createSql'].replace('${TABLE_NAME}', table) for index in entity.get('indices', ())]
+    return statements
+
+
+def mac_to_long(mac):
+    """MacAddressCompat.toLong：6字节按小端序放入Long"""
+    return int.from_bytes(bytes.fromhex(mac.replace(':', '')) + b'\0\0', 'little', signed=True)
+
+
+def format_mac(value):
+    return ':'.join(f'{byte:02x}' for byte in int(value).to_bytes(8, 'little', signed=True)[:6])
+
+
+# 拉取
+
+def pull_database(destination, serial=None, client=None):
+    """
+    通过 exec-out 把数据库（及未合并的 -wal 文件）原样拉到 destination
+    先用 run-as（debug构建），失败时用 su；返回所用方式
+    """
+    client = client or AdbClient(serial)
+    for prefix in (f'run-as {PACKAGE} ', 'su -c '):
+        data = client.exec_out(f'{prefix}cat {DEVICE_DB_PATH}')
+        if not data.startswith(_SQLITE_MAGIC):
+            continue
+        with open(destination, 'wb') as f:
+            f.write(data)
+        wal = client.exec_out(f'{prefix}cat {DEVICE_DB_PATH}-wal')
+        if wal[:4] in _WAL_MAGIC:
+            with open(destination + '-wal', 'wb') as f:
+                f.write(wal)
+        elif os.path.exists(destination + '-wal'):
+            os.remove(destination + '-wal')
+        return prefix.split()[0]
+    raise AdbError(f'无法读取 {DEVICE_DB_PATH}：需要debug构建（run-as）或root')
+
+
+# 列式表
+
+class TrafficTable:
+    """按 id 升序排列的 TrafficRecord 列；downstream 存为整数编码，名称在 downstreams 中"""
+
+    def __init__(self, id, timestamp, mac, downstream, counters, previous_id, downstreams):
+        self.id = id
+        self.timestamp = timestamp
+        self.mac = mac
+        self.downstream = downstream
+        self.counters = counters            # (n, 4)，列顺序同 COUNTERS
+        self.previous_id = previous_id      # 没有前驱时为 -1
+        self.downstreams = downstreams
+        self._chains = None
+
+    def __len__(self):
+        return len(self.id)
+
+    @classmethod
+    def from_database(cls, path, batch=65536):
+        """按批读取，先按行数分配好数组，避免先构造全部Python元组"""
+        connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            count = connection.execute('SELECT COUNT(*) FROM TrafficRecord').fetchone()[0]
+            table = np.empty((count, 8), dtype=np.int64)
+            codes = np.empty(count, dtype=np.int32)
+            downstreams = {}
+            cursor = connection.execute(
+                'SELECT id, timestamp, mac, ' + ', '.join(COUNTERS) + ', IFNULL(previousId, -1), downstream '
+                'FROM TrafficRecord ORDER BY id')
+            offset = 0
+            while offset < count:
+                rows = cursor.fetchmany(batch)
+                if not rows:
+                    break
+                end = offset + len(rows)
+                table[offset:end] = [row[:8] for row in rows]
+                codes[offset:end] = [downstreams.setdefault(row[8], len(downstreams)) for row in rows]
+                offset = end
+        finally:
+            connection.close()
+        table, codes = table[:offset], codes[:offset]
+        return cls(table[:, 0], table[:, 1], table[:, 2], codes, table[:, 3:7], table[:, 7], list(downstreams))
+
+    def chains(self):
+        """(前驱下标, 链首下标, 是否链尾)，没有前驱的记录前驱是自身"""
+        if self._chains is None:
+            n = len(self)
+            index = np.arange(n)
+            position = np.searchsorted(self.id, self.previous_id).clip(0, max(n - 1, 0))
+            has_previous = (self.previous_id >= 0) & (self.id[position] == self.previous_id) if n else index < 0
+            parent = np.where(has_previous, position, index)
+            is_tail = np.ones(n, dtype=bool)
+            is_tail[parent[has_previous]] = False
+            root = parent
+            while True:
+                hop = root[root]
+                if np.array_equal(hop, root):
+                    break
+                root = hop
+            self._chains = parent, root, is_tail
+        return self._chains
+
+    def deltas(self):
+        """每条记录相对前驱新增的计数"""
+        parent, _, _ = self.chains()
+        has_previous = parent != np.arange(len(self))
+        delta = self.counters - np.where(has_previous[:, None], self.counters[parent], 0)
+        return np.where(delta < 0, self.counters, delta)
+
+    def sessions(self):
+        """每条链一行：链尾下标、开始时间（链首时间戳）、结束时间与总量"""
+        _, root, is_tail = self.chains()
+        tails = np.flatnonzero(is_tail)
+        return tails, self.timestamp[root[tails]], self.timestamp[tails], self.counters[tails]
+
+    def _key(self, by):
+        if by == 'mac':
+            return self.mac
+        if by == 'downstream':
+            return self.downstream
+        raise ValueError(f'unknown grouping: {by}')
+
+    def _label(self, by, key):
+        return format_mac(key) if by == 'mac' else self.downstreams[key]
+
+    def totals(self, by='mac'):
+        """
+        按MAC或下游接口汇总各会话总量，口径与 queryStats 相同：
+        timestamp 为各链尾的最早时间戳，count 为链数
+        """
+        tails, _, _, counters = self.sessions()
+        keys = self._key(by)[tails]
+        order = np.argsort(keys, kind='stable')
+        keys, counters, timestamps = keys[order], counters[order], self.timestamp[tails][order]
+        if not len(keys):
+            return []
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        sums = np.add.reduceat(counters, starts, axis=0)
+        firsts = np.minimum.reduceat(timestamps, starts)
+        counts = np.diff(np.r_[starts, len(keys)])
+        result = []
+        for key, first, count, row in zip(keys[starts], firsts, counts, sums):
+            entry = {by: self._label(by, key), 'timestamp': int(first), 'count': int(count)}
+            entry.update(zip(COUNTERS, (int(value) for value in row)))
+            result.append(entry)
+        result.sort(key=lambda entry: entry['sentBytes'] + entry['receivedBytes'], reverse=True)
+        return result
+
+    def buckets(self, bucket_ms, by=None):
+        """按时间桶（可再按MAC或下游接口）汇总增量，按时间排序"""
+        bucket = self.timestamp // bucket_ms
+        deltas = self.deltas()
+        if by is None:
+            keys = np.zeros(len(self), dtype=np.int64)
+        else:
+            keys = self._key(by).astype(np.int64)
+        order = np.lexsort((keys, bucket))
+        bucket, keys, deltas = bucket[order], keys[order], deltas[order]
+        if not len(bucket):
+            return []
+        starts = np.flatnonzero(np.r_[True, (bucket[1:] != bucket[:-1]) | (keys[1:] != keys[:-1])])
+        sums = np.add.reduceat(deltas, starts, axis=0)
+        result = []
+        for start, key, row in zip(bucket[starts], keys[starts], sums):
+            entry = {'start': int(start) * bucket_ms}
+            if by is not None:
+                entry[by] = self._label(by, key)
+            entry.update(zip(COUNTERS, (int(value) for value in row)))
+            result.append(entry)
+        return result
+
+
+def query_stats(connection, mac):
+    """逐个MAC执行 queryStats 的SQL（对照用）"""
+    row = connection.execute(QUERY_STATS, (mac,)).fetchone()
+    return dict(zip(('timestamp', 'count') + COUNTERS, (value or 0 for value in row)))
+
+
+def verify(path, table):
+    """对每个MAC比较向量化结果与 queryStats，返回 (不一致的MAC列表, SQL耗时秒)"""
+    expected = {entry['mac']: entry for entry in table.totals('mac')}
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    mismatched = []
+    start = time.perf_counter()
+    try:
+        for mac in np.unique(table.mac):
+            row = query_stats(connection, int(mac))
+            entry = dict(expected[format_mac(mac)])
+            entry.pop('mac')
+            if row != entry:
+                mismatched.append(format_mac(mac))
+    finally:
+        connection.close()
+    return mismatched, time.perf_counter() - start
+
+
+# 测试数据
+
+def synthesize(path, clients=50, sessions=20, updates=100, downstreams=('wlan1', 'rndis0', 'bt-pan'),
+               start=1_700_000_000_000, interval=30_000, seed=0, min_updates=1, version=None):
+    """
+    按应用的写入方式生成测试数据库：每个会话一条初始记录（计数为0），此后每次更新追加一条累计记录，
+    每条链的长度在 min_updates 到 updates 之间；各会话按时间交错插入，与实际中多条链并行增长相同。
+    version 为建表所用的Room schema版本。返回记录数
+    """
+    generator = random.Random(seed)
+    live = []
+    for client in range(clients):
+        mac = mac_to_long('02:00:' + ':'.join(f'{byte:02x}' for byte in (client + 1).to_bytes(4, 'big')))
+        ip = bytes((192, 168, 43, 2 + client % 250))
+        for session in range(sessions):
+            timestamp = start + session * (updates + 10) * interval + generator.randrange(interval)
+            length = generator.randint(min_updates, updates)
+            heapq.heappush(live, (timestamp, client, session, mac, ip, generator.choice(downstreams), length,
+                                  None, (0, 0, 0, 0)))
+    rows = []
+    while live:
+        timestamp, client, session, mac, ip, downstream, remaining, previous, counters = heapq.heappop(live)
+        rows.append((len(rows) + 1, timestamp, mac, ip, downstream, *counters, previous))
+        if remaining > 1:
+            sent, received = generator.randint(0, 200), generator.randint(0, 400)
+            counters = (counters[0] + sent, counters[1] + sent * generator.randint(60, 1500),
+                        counters[2] + received, counters[3] + received * generator.randint(60, 1500))
+            heapq.heappush(live, (timestamp + interval, client, session, mac, ip, downstream, remaining - 1,
+                                  len(rows), counters))
+    connection = sqlite3.connect(path)
+    try:
+        for statement in room_schema(version):
+            connection.execute(statement)
+        connection.executemany(
+            'INSERT INTO TrafficRecord (id, timestamp, mac, ip, downstream, sentPackets, sentBytes, '
+            'receivedPackets, receivedBytes, previousId) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        connection.commit()
+    finally:
+        connection.close()
+    return len(rows)
+
+
+# 命令行
+
+_DURATION = re.compile(r'^(\d+)([smhd])$')
+_UNITS = {'s': 1000, 'm': 60_000, 'h': 3_600_000, 'd': 86_400_000}
+
+
+def parse_duration(text):
+    """'15m'、'1h'、'1d' 转换为毫秒"""
+    match = _DURATION.match(text)
+    if not match:
+        raise argparse.ArgumentTypeError(f'无效的时间桶: {text}')
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+
+def _format_bytes(value):
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024:
+            return f'{value:.0f}{unit}' if unit == 'B' else f'{value:.1f}{unit}'
+        value /= 1024
+    return f'{value:.1f}TiB'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线分析TrafficRecord流量记录')
+    parser.add_argument('database', nargs='?', default=None, help='本地数据库副本；与 --pull 同用时为保存路径')
+    parser.add_argument('--pull', action='store_true', help='先从设备拉取数据库')
+    parser.add_argument('--serial', default=None)
+    parser.add_argument('--output', default=None, help='--pull 时的保存路径（默认 app.db）')
+    parser.add_argument('--by', choices=('mac', 'downstream'), default='mac')
+    parser.add_argument('--bucket', type=parse_duration, default=None, help='按时间桶汇总增量，例如 1h、1d')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--verify', action='store_true', help='与 queryStats 的SQL逐个MAC对比')
+    parser.add_argument('--json', default=None, help='结果输出路径，"-" 表示标准输出')
+    args = parser.parse_args(argv)
+
+    path = args.output or args.database or DB_NAME
+    if args.pull:
+        method = pull_database(path, args.serial)
+        print(f"📥 已拉取数据库 ({method}): {path}")
+    elif not args.database:
+        parser.error('需要数据库路径或 --pull')
+
+    start = time.perf_counter()
+    table = TrafficTable.from_database(path)
+    loaded = time.perf_counter()
+    totals = table.totals(args.by)
+    result = {'records': len(table), 'sessions': int(table.chains()[2].sum()), 'by': args.by, 'totals': totals}
+    if args.bucket:
+        result['bucket_ms'] = args.bucket
+        result['buckets'] = table.buckets(args.bucket, None if args.by == 'mac' else args.by)
+    analyzed = time.perf_counter()
+    result['load_ms'] = round((loaded - start) * 1000, 1)
+    result['analyze_ms'] = round((analyzed - loaded) * 1000, 1)
+
+    mismatched = []
+    if args.verify:
+        mismatched, elapsed = verify(path, table)
+        result['verify'] = {'mismatched': mismatched, 'query_stats_ms': round(elapsed * 1000, 1)}
+
+    if args.json == '-':
+        json.dump(result, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return 1 if mismatched else 0
+    print(f"📊 {result['records']} 条记录，{result['sessions']} 个会话，"
+          f"读取 {result['load_ms']}ms，分析 {result['analyze_ms']}ms")
+    for entry in totals[:args.top]:
+        print(f"   {entry[args.by]}: {entry['count']} 个会话  发送 {_format_bytes(entry['sentBytes'])}  "
+              f"接收 {_format_bytes(entry['receivedBytes'])}")
+    for entry in result.get('buckets', [])[-args.top:]:
+        label = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['start'] / 1000))
+        extra = f" {entry[args.by]}" if args.by in entry else ''
+        print(f"   {label}{extra}: 发送 {_format_bytes(entry['sentBytes'])}  接收 {_format_bytes(entry['receivedBytes'])}")
+    if args.verify:
+        mark = '❌' if mismatched else '✅'
+        print(f"{mark} queryStats 对照: {len(mismatched)} 个MAC不一致，逐个MAC查询耗时 "
+              f"{result['verify']['query_stats_ms']}ms")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    return 1 if mismatched else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
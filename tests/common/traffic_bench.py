@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+TrafficRecord.Dao.queryStats 查询计划与延迟基准
+
+数据库版本2的 queryStats 用自连接找没有后继的记录，TrafficRecord.mac 上没有索引，
+每次调用都要扫描全部历史记录；版本3改为查 TrafficChainHead（每条链的最后一条记录，按mac索引），
+耗时只与该客户端的链数有关。
+
+这里用Room导出的版本2 schema生成指定链长的合成数据库，执行 AppDatabase.Migration3 的语句迁移到版本3，
+再比较两种查询的 EXPLAIN QUERY PLAN、逐个MAC的延迟与结果，以及 TrafficRecord.Dao.insert
+维护 TrafficChainHead 带来的写入开销。新查询与迁移语句直接从Kotlin源码中读取，源码改动后基准随之更新。
+新查询的计划一旦退化为扫描 TrafficRecord，或结果与自连接不一致，返回1。
+
+用法（在 tests/ 目录下）：
+    python3 -m common.traffic_bench --lengths 10,100,1000 --clients 30 --sessions 10
+    python3 -m common.traffic_bench --json traffic_bench.json
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+from common.histogram import LatencyHistogram
+from common.results import record_metric
+from common.source_rules import kotlin_strings
+from common.traffic import QUERY_STATS, synthesize
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ROOM_DIR = os.path.join(REPO_ROOT, 'mobile', 'src', 'main', 'java', 'be', 'mygod', 'vpnhotspot', 'room')
+
+HEAD_INDEX = 'index_TrafficChainHead_mac'
+
+_QUERY = re.compile(r'@Query\("""(.*?)"""\)\s*abstract suspend fun queryStats', re.S)
+_MIGRATION = re.compile(r'object Migration3\b.*?\n    }\n', re.S)
+_EXEC_SQL = re.compile(r'execSQL\(((?:\s*"(?:[^"\\]|\\.)*"\s*\+?)+)\)')
+
+
+def _read(name):
+    with open(os.path.join(ROOM_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def kotlin_query_stats():
+    """TrafficRecord.kt 中 queryStats 的SQL，参数 :mac 换成 ?"""
+    match = _QUERY.search(_read('TrafficRecord.kt'))
+    if not match:
+        raise ValueError('queryStats not found in TrafficRecord.kt')
+    return match.group(1).replace(':mac', '?')
+
+
+def kotlin_migration():
+    """AppDatabase.Migration3 中按顺序执行的SQL语句（拼接Kotlin字符串字面量）"""
+    block = _MIGRATION.search(_read('AppDatabase.kt'))
+    if not block:
+        raise ValueError('Migration3 not found in AppDatabase.kt')
+    return [kotlin_strings(call.group(1)) for call in _EXEC_SQL.finditer(block.group(0))]
+
+
+def query_plan(connection, sql):
+    return [row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + sql, (0,))]
+
+
+def check_plan(plan):
+    """新查询计划的问题列表：必须经由mac索引查 TrafficChainHead，且不能扫描 TrafficRecord"""
+    problems = []
+    if not any(HEAD_INDEX in step for step in plan):
+        problems.append(f'未使用 {HEAD_INDEX}')
+    problems += [f'全表扫描: {step}' for step in plan if step.startswith('SCAN') and 'TrafficRecord' in step]
+    return problems
+
+
+def _time_queries(connection, sql, macs, repeat):
+    histogram = LatencyHistogram()
+    results = {}
+    for _ in range(repeat):
+        for mac in macs:
+            start = time.perf_counter()
+            row = connection.execute(sql, (mac,)).fetchone()
+            histogram.record((time.perf_counter() - start) * 1e6)
+            results[mac] = tuple(value or 0 for value in row)
+    return histogram, results
+
+
+def _time_appends(connection, count, maintain_heads):
+    """像 TrafficRecorder 一样为现有的链追加记录，返回每条插入（含维护链尾表）的平均微秒数"""
+    heads = connection.execute(
+        'SELECT id, timestamp, mac, ip, downstream, sentPackets, sentBytes, receivedPackets, receivedBytes '
+        'FROM TrafficRecord WHERE id IN (SELECT id FROM TrafficChainHead) LIMIT ?', (count,)).fetchall()
+    last = connection.execute('SELECT MAX(id) FROM TrafficRecord').fetchone()[0]
+    start = time.perf_counter()
+    for previous, timestamp, mac, ip, downstream, *counters in heads:
+        with connection:
+            cursor = connection.execute(
+                'INSERT INTO TrafficRecord (timestamp, mac, ip, downstream, sentPackets, sentBytes, '
+                'receivedPackets, receivedBytes, previousId) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (timestamp + 30_000, mac, ip, downstream, *(value + 1 for value in counters), previous))
+            if maintain_heads:
+                connection.execute('DELETE FROM TrafficChainHead WHERE id = ?', (previous,))
+                connection.execute('INSERT INTO TrafficChainHead (id, mac) VALUES (?, ?)', (cursor.lastrowid, mac))
+    elapsed = time.perf_counter() - start
+    # 撤销追加的记录，恢复原来的链尾
+    with connection:
+        connection.execute('DELETE FROM TrafficRecord WHERE id > ?', (last,))
+        if maintain_heads:
+            connection.execute('DELETE FROM TrafficChainHead WHERE id > ?', (last,))
+            connection.executemany('INSERT INTO TrafficChainHead (id, mac) VALUES (?, ?)',
+                                   [(row[0], row[2]) for row in heads])
+    return round(elapsed / max(len(heads), 1) * 1e6, 1)
+
+
+def bench(length, clients=30, sessions=10, repeat=3, appends=200, directory=None):
+    """链长为 length 的合成数据库上比较新旧 queryStats"""
+    with tempfile.TemporaryDirectory(dir=directory) as root:
+        path = os.path.join(root, 'app.db')
+        records = synthesize(path, clients=clients, sessions=sessions, updates=length, min_updates=length,
+                             version=2)
+        connection = sqlite3.connect(path)
+        try:
+            start = time.perf_counter()
+            with connection:
+                for statement in kotlin_migration():
+                    connection.execute(statement)
+            migration_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            new_sql = kotlin_query_stats()
+            macs = [row[0] for row in connection.execute('SELECT DISTINCT mac FROM TrafficRecord')]
+            old_latency, old_results = _time_queries(connection, QUERY_STATS, macs, repeat)
+            new_latency, new_results = _time_queries(connection, new_sql, macs, repeat)
+            new_plan = query_plan(connection, new_sql)
+            result = {
+                'length': length,
+                'records': records,
+                'heads': connection.execute('SELECT COUNT(*) FROM TrafficChainHead').fetchone()[0],
+                'clients': len(macs),
+                'migration_ms': migration_ms,
+                'old': {'plan': query_plan(connection, QUERY_STATS), 'latency_us': old_latency.summary()},
+                'new': {'plan': new_plan, 'latency_us': new_latency.summary()},
+                'mismatched': sorted(mac for mac in macs if old_results[mac] != new_results[mac]),
+                'plan_problems': check_plan(new_plan),
+                'append_us': {'without_heads': _time_appends(connection, appends, False),
+                              'with_heads': _time_appends(connection, appends, True)},
+            }
+        finally:
+            connection.close()
+    old_p50, new_p50 = old_latency.percentile(50), new_latency.percentile(50)
+    result['speedup_p50'] = round(old_p50 / new_p50, 1) if new_p50 else None
+    result['histograms'] = {'old': old_latency, 'new': new_latency}
+    return result
+
+
+def print_result(result):
+    old, new = result['old']['latency_us'], result['new']['latency_us']
+    print(f"🔗 链长 {result['length']}: {result['records']} 条记录，{result['heads']} 条链，"
+          f"{result['clients']} 个客户端，迁移 {result['migration_ms']}ms")
+    print(f"   自连接:  p50={old['p50']}us p99={old['p99']}us  计划: {' / '.join(result['old']['plan'])}")
+    print(f"   链尾表:  p50={new['p50']}us p99={new['p99']}us  计划: {' / '.join(result['new']['plan'])}")
+    print(f"   p50加速 {result['speedup_p50']}x，追加一条记录 {result['append_us']['without_heads']}us → "
+          f"{result['append_us']['with_heads']}us")
+    for problem in result['plan_problems']:
+        print(f"   ❌ {problem}")
+    if result['mismatched']:
+        print(f"   ❌ {len(result['mismatched'])} 个客户端的结果与自连接不一致")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='queryStats 查询计划与延迟基准')
+    parser.add_argument('--lengths', default='10,100,1000', help='每条链的记录数，逗号分隔')
+    parser.add_argument('--clients', type=int, default=30)
+    parser.add_argument('--sessions', type=int, default=10, help='每个客户端的会话（链）数')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', default=None, help='结果输出路径')
+    args = parser.parse_args(argv)
+
+    results = []
+    for length in (int(value) for value in args.lengths.split(',')):
+        result = bench(length, args.clients, args.sessions, args.repeat)
+        histograms = result.pop('histograms')
+        for name, histogram in histograms.items():
+            record_metric(f'queryStats {name} length={length}', histogram=histogram.values(), unit='us')
+        print_result(result)
+        results.append(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"✅ 结果已写入: {args.json}")
+    failed = any(result['plan_problems'] or result['mismatched'] for result in results)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,14 +2,22 @@
 """
 VPNHotspot简化远程连接测试工具
 使用标准库测试192.168.1.133的连接
+
+加 --inventory 清单文件 时对清单中的全部设备并发检查（见 common.fleet）：
+    python3 test_connection_simple.py --inventory fleet.txt --concurrency 32
 """
 
-import urllib.request
-import urllib.error
+import http.client
 import json
 import subprocess
 import sys
 import socket
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common import fleet
+from common.http_client import HttpSession
 
 class SimpleRemoteTester:
     def __init__(self, ip="192.168.1.133", port=9999, api_key="default_api_key_for_debug_2024"):
@@ -17,6 +25,8 @@ class SimpleRemoteTester:
         self.port = port
         self.api_key = api_key
         self.base_url = f"http://{ip}:{port}/{api_key}"
+        # 复用连接：WebServer支持HTTP/1.1持久连接，连续请求不必每次重新握手
+        self.session = HttpSession(ip, port, headers={'Accept': 'application/json'})
     
     def check_port_open(self):
         """检查端口是否开放"""
@@ -44,36 +54,30 @@ class SimpleRemoteTester:
             url = f"{self.base_url}/api/status"
             print(f"   目标URL: {url}")
             
-            req = urllib.request.Request(url)
-            req.add_header('Accept', 'application/json')
+            response = self.session.get(f"/{self.api_key}/api/status", timeout=5)
+            data = response.text
+            status_code = response.status
             
-            with urllib.request.urlopen(req, timeout=5) as response:
-                data = response.read().decode('utf-8')
-                status_code = response.getcode()
-                
-                print(f"   响应状态: {status_code}")
-                
-                if status_code == 200:
-                    try:
-                        json_data = json.loads(data)
-                        print(f"   响应数据: {json.dumps(json_data, indent=2, ensure_ascii=False)}")
-                        return True
-                    except json.JSONDecodeError:
-                        print(f"   响应内容: {data}")
-                        return True
-                else:
-                    print(f"   错误响应: {data}")
-                    return False
+            print(f"   响应状态: {status_code}")
+            
+            if status_code == 200:
+                try:
+                    json_data = json.loads(data)
+                    print(f"   响应数据: {json.dumps(json_data, indent=2, ensure_ascii=False)}")
+                    return True
+                except json.JSONDecodeError:
+                    print(f"   响应内容: {data}")
+                    return True
+            else:
+                print(f"   HTTP错误: {status_code} - {response.reason}")
+                return False
                     
-        except urllib.error.HTTPError as e:
-            print(f"   HTTP错误: {e.code} - {e.reason}")
-            return False
-        except urllib.error.URLError as e:
-            print(f"   连接错误: {e.reason}")
-            return False
         except socket.timeout:
             print("   ❌ 连接超时")
             return False
+        except (OSError, http.client.HTTPException) as e:
+            print(f"   连接错误: {e}")
+            return False
         except Exception as e:
             print(f"   ❌ 异常: {e}")
             return False
@@ -85,31 +89,28 @@ class SimpleRemoteTester:
             url = f"{self.base_url}/api/wifi/{action}"
             print(f"   目标URL: {url}")
             
-            req = urllib.request.Request(url, method='POST')
-            req.add_header('Accept', 'application/json')
+            response = self.session.post(f"/{self.api_key}/api/wifi/{action}", timeout=10)
+            data = response.text
+            status_code = response.status
             
-            with urllib.request.urlopen(req, timeout=10) as response:
-                data = response.read().decode('utf-8')
-                status_code = response.getcode()
-                
-                print(f"   响应状态: {status_code}")
-                
-                if status_code == 200:
-                    try:
-                        json_data = json.loads(data)
-                        print(f"   响应数据: {json.dumps(json_data, indent=2, ensure_ascii=False)}")
-                        success = json_data.get('success', False)
-                        if success:
-                            print(f"   ✅ WiFi {action}成功")
-                        else:
-                            print(f"   ⚠️  WiFi {action}失败: {json_data.get('error', '未知错误')}")
-                        return success
-                    except json.JSONDecodeError:
-                        print(f"   响应内容: {data}")
-                        return False
-                else:
-                    print(f"   错误响应: {data}")
+            print(f"   响应状态: {status_code}")
+            
+            if status_code == 200:
+                try:
+                    json_data = json.loads(data)
+                    print(f"   响应数据: {json.dumps(json_data, indent=2, ensure_ascii=False)}")
+                    success = json_data.get('success', False)
+                    if success:
+                        print(f"   ✅ WiFi {action}成功")
+                    else:
+                        print(f"   ⚠️  WiFi {action}失败: {json_data.get('error', '未知错误')}")
+                    return success
+                except json.JSONDecodeError:
+                    print(f"   响应内容: {data}")
                     return False
+            else:
+                print(f"   错误响应: {data}")
+                return False
                     
         except Exception as e:
             print(f"   ❌ 异常: {e}")
@@ -126,8 +127,9 @@ class SimpleRemoteTester:
                 print(f"   ❌ ADB错误: {result.stderr}")
                 return False
             
+            # 按序列号精确匹配，避免 192.168.1.13 误匹配 192.168.1.133:5555
             devices = [line for line in result.stdout.split('\n') 
-                      if '\tdevice' in line and self.ip in line]
+                      if line.split('\t')[0] == f'{self.ip}:5555' and line.endswith('\tdevice')]
             
             if devices:
                 print("   ✅ 设备已连接")
@@ -189,6 +191,11 @@ def main():
     """主函数"""
     import time
     
+    if '--inventory' in sys.argv[1:]:
+        args = sys.argv[1:]
+        index = args.index('--inventory')
+        return fleet.main(args[:index] + args[index + 1:])
+    
     # 参数处理
     ip = "192.168.1.133"
     port = 9999
@@ -3,21 +3,28 @@
 设备功能测试脚本：在真实设备上测试WebServer修复效果
 """
 
-import subprocess
 import time
 import sys
 import re
-import socket
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.adb import run_adb_command
+from common.logcat import LogcatStream, device_time, scan_logs
+from common.readiness import WEBSERVER_PORTS, probe_ports, wait_for_webserver
+from common.results import record_metric, script_check, write_report
+
+# 调度器使用的资源声明（common.orchestrator）；8080等端口是在设备上探测的，设备独占已经覆盖
+RESOURCES = {
+    'start_app': ['device', 'port:9999'],
+    'check_webserver_status': ['device'],
+    'test_clipboard_functionality': ['device', 'port:9999'],
+    'test_webserver_lifecycle': ['device', 'port:9999'],
+    'check_app_logs': ['device'],
+    'test_port_conflict_handling': ['device', 'port:9999'],
+}
 
-def run_adb_command(command):
-    """执行ADB命令"""
-    try:
-        result = subprocess.run(['adb'] + command, capture_output=True, text=True, timeout=30)
-        return result.returncode == 0, result.stdout, result.stderr
-    except subprocess.TimeoutExpired:
-        return False, "", "Command timeout"
-    except Exception as e:
-        return False, "", str(e)
 
 def get_device_ip():
     """获取设备IP地址"""
@@ -38,8 +45,11 @@ def get_device_ip():
     return None
 
 def start_app():
-    """启动VPNHotspot应用"""
+    """启动VPNHotspot应用，并等待WebServer就绪"""
     print("🚀 启动VPNHotspot应用...")
+    mark = device_time()
+    device_ip = get_device_ip()
+    start = time.monotonic()
     success, stdout, stderr = run_adb_command([
         'shell', 'am', 'start', '-n', 
         'be.mygod.vpnhotspot/.MainActivity'
@@ -47,7 +57,13 @@ def start_app():
     
     if success:
         print("✅ 应用启动成功")
-        time.sleep(3)  # 等待应用完全启动
+        # 按退避间隔轮询，WebServer一就绪就继续，而不是固定等待
+        readiness = wait_for_webserver(device_ip, since=mark, start=start)
+        if readiness.ready:
+            print(f"⏱️  WebServer在端口{readiness.port}就绪，耗时 {readiness.elapsed_ms}ms")
+            record_metric('webserver_ready', value=readiness.elapsed_ms)
+        else:
+            print("⚠️  等待WebServer就绪超时")
         return True
     else:
         print(f"❌ 应用启动失败: {stderr}")
@@ -65,20 +81,14 @@ def check_webserver_status():
     
     print(f"📱 设备IP地址: {device_ip}")
     
-    # 尝试连接WebServer的常用端口
-    ports_to_try = [8080, 9999, 10000, 10001]
+    # 并发探测WebServer的常用端口
+    ports_to_try = [8080, *WEBSERVER_PORTS]
+    print(f"🌐 尝试连接: {device_ip}:{','.join(map(str, ports_to_try))}")
+    open_ports = probe_ports(device_ip, ports_to_try, timeout=5)
     
     for port in ports_to_try:
         try:
-            print(f"🌐 尝试连接: {device_ip}:{port}")
-            
-            # 使用socket测试端口连接
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            result = sock.connect_ex((device_ip, port))
-            sock.close()
-            
-            if result == 0:
+            if port in open_ports:
                 print(f"✅ WebServer在端口{port}上运行正常")
                 
                 # 尝试通过ADB端口转发来测试HTTP响应
@@ -128,7 +138,7 @@ def test_clipboard_functionality():
         
         # 检查相关日志
         success, stdout, stderr = run_adb_command([
-            'logcat', '-d', '-s', 'VPNHotspot:*', '|', 'grep', '-i', 'clipboard'
+            'shell', "logcat -d -s 'VPNHotspot:*' | grep -i clipboard"
         ])
         
         if 'clipboard' in stdout.lower():
@@ -148,12 +158,9 @@ def test_webserver_lifecycle():
     # 强制停止应用
     print("🛑 强制停止应用...")
     run_adb_command(['shell', 'am', 'force-stop', 'be.mygod.vpnhotspot'])
-    time.sleep(2)
     
-    # 重新启动应用
+    # 重新启动应用（start_app 会等待WebServer就绪）
     if start_app():
-        time.sleep(5)  # 等待WebServer启动
-        
         # 检查WebServer是否重新启动
         success, port, device_ip = check_webserver_status()
         if success:
@@ -169,31 +176,26 @@ def check_app_logs():
     """检查应用日志"""
     print("\n📝 检查应用日志...")
     
-    # 获取最近的日志
-    success, stdout, stderr = run_adb_command([
-        'logcat', '-d', '-s', 'VPNHotspot:*'
-    ])
+    # 检查关键日志消息
+    key_messages = [
+        'WebServer started',
+        'WebServer stopped',
+        'Port conflict',
+        'Clipboard',
+        'API Key'
+    ]
+    
+    # 流式扫描日志，只保留最后20行
+    try:
+        found_messages, lines, _ = scan_logs(
+            LogcatStream(['-d', '-s', 'VPNHotspot:*']), key_messages, tail=20)
+    except OSError:
+        lines = []
     
-    if success and stdout:
+    if lines:
         print("📋 最近的应用日志:")
-        lines = stdout.split('\n')[-20:]  # 最后20行
         for line in lines:
-            if line.strip():
-                print(f"  {line}")
-        
-        # 检查关键日志消息
-        key_messages = [
-            'WebServer started',
-            'WebServer stopped',
-            'Port conflict',
-            'Clipboard',
-            'API Key'
-        ]
-        
-        found_messages = []
-        for message in key_messages:
-            if message.lower() in stdout.lower():
-                found_messages.append(message)
+            print(f"  {line}")
         
         if found_messages:
             print(f"✅ 找到关键日志消息: {', '.join(found_messages)}")
@@ -217,12 +219,9 @@ def test_port_conflict_handling():
         
         # 强制停止
         run_adb_command(['shell', 'am', 'force-stop', 'be.mygod.vpnhotspot'])
-        time.sleep(1)
         
         # 重新启动
         if start_app():
-            time.sleep(3)
-            
             # 检查是否成功启动
             success, port, device_ip = check_webserver_status()
             if success:
@@ -236,57 +235,6 @@ def test_port_conflict_handling():
     print("✅ 端口冲突处理测试通过")
     return True
 
-def generate_device_test_report(results):
-    """生成设备测试报告"""
-    print("\n📊 生成设备测试报告...")
-    
-    report_content = f"""# 设备功能测试报告
-
-## 测试环境
-- 测试时间: {time.strftime('%Y-%m-%d %H:%M:%S')}
-- 设备信息: ADB连接设备
-- 应用版本: VPNHotspot Freedom Debug
-
-## 测试结果
-
-### 1. 应用启动测试
-- 状态: {'✅ 通过' if results.get('app_start', False) else '❌ 失败'}
-
-### 2. WebServer状态测试
-- 状态: {'✅ 通过' if results.get('webserver_status', False) else '❌ 失败'}
-- 运行端口: {results.get('webserver_port', 'N/A')}
-- 设备IP: {results.get('device_ip', 'N/A')}
-
-### 3. 剪贴板功能测试
-- 状态: {'✅ 通过' if results.get('clipboard_test', False) else '❌ 失败'}
-
-### 4. WebServer生命周期测试
-- 状态: {'✅ 通过' if results.get('lifecycle_test', False) else '❌ 失败'}
-
-### 5. 应用日志检查
-- 状态: {'✅ 通过' if results.get('log_check', False) else '❌ 失败'}
-
-### 6. 端口冲突处理测试
-- 状态: {'✅ 通过' if results.get('port_conflict_test', False) else '❌ 失败'}
-
-## 总结
-- 通过测试: {sum(1 for v in results.values() if v)}/{len(results)}
-- 整体状态: {'✅ 成功' if all(results.values()) else '❌ 部分失败'}
-
-## 建议
-1. 如有测试失败，请检查设备网络连接
-2. 确保设备有足够的权限运行应用
-3. 检查防火墙设置是否阻止了WebServer端口
-
----
-测试完成时间: {time.strftime('%Y-%m-%d %H:%M:%S')}
-"""
-    
-    with open('DEVICE_TEST_REPORT.md', 'w', encoding='utf-8') as f:
-        f.write(report_content)
-    
-    print("✅ 设备测试报告已生成: DEVICE_TEST_REPORT.md")
-
 def main():
     """主测试函数"""
     print("🚀 开始设备功能测试")
@@ -304,28 +252,29 @@ def main():
     results = {}
     
     # 1. 启动应用测试
-    results['app_start'] = start_app()
+    results['app_start'] = script_check("应用启动测试", start_app)
     
     # 2. WebServer状态测试
-    webserver_success, port, device_ip = check_webserver_status()
+    webserver_success, port, device_ip = script_check("WebServer状态测试", check_webserver_status,
+                                                      passed=lambda status: status[0])
     results['webserver_status'] = webserver_success
     results['webserver_port'] = port
     results['device_ip'] = device_ip
     
     # 3. 剪贴板功能测试
-    results['clipboard_test'] = test_clipboard_functionality()
+    results['clipboard_test'] = script_check("剪贴板功能测试", test_clipboard_functionality)
     
     # 4. WebServer生命周期测试
-    results['lifecycle_test'] = test_webserver_lifecycle()
+    results['lifecycle_test'] = script_check("WebServer生命周期测试", test_webserver_lifecycle)
     
     # 5. 应用日志检查
-    results['log_check'] = check_app_logs()
+    results['log_check'] = script_check("应用日志检查", check_app_logs)
     
     # 6. 端口冲突处理测试
-    results['port_conflict_test'] = test_port_conflict_handling()
+    results['port_conflict_test'] = script_check("端口冲突处理测试", test_port_conflict_handling)
     
-    # 生成测试报告
-    generate_device_test_report(results)
+    # 报告从结果存储生成（检查结果与冷启动延迟等指标）
+    write_report('DEVICE_TEST_REPORT.md', '设备功能测试报告')
     
     # 输出总结
     print("\n" + "=" * 60)
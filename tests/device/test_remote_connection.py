@@ -2,6 +2,9 @@
 """
 VPNHotspot远程连接测试工具
 用于测试远程设备192.168.1.133:5555的连接功能
+
+加 --inventory 清单文件 时对清单中的全部设备并发检查（见 common.fleet）：
+    python3 test_remote_connection.py --inventory fleet.json --wifi
 """
 
 import requests
@@ -9,6 +12,11 @@ import json
 import time
 import subprocess
 import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common import fleet
 
 class RemoteConnectionTester:
     def __init__(self, ip="192.168.1.133", port=9999, api_key="default_api_key_for_debug_2024"):
@@ -16,6 +24,8 @@ class RemoteConnectionTester:
         self.port = port
         self.api_key = api_key
         self.base_url = f"http://{ip}:{port}/{api_key}"
+        # 复用连接：WebServer支持HTTP/1.1持久连接，连续请求不必每次重新握手
+        self.session = requests.Session()
         
     def test_basic_connectivity(self):
         """测试基本连接"""
@@ -24,7 +34,7 @@ class RemoteConnectionTester:
             url = f"{self.base_url}/api/status"
             print(f"   目标URL: {url}")
             
-            response = requests.get(url, timeout=5)
+            response = self.session.get(url, timeout=5)
             print(f"   响应状态: {response.status_code}")
             
             if response.status_code == 200:
@@ -52,7 +62,7 @@ class RemoteConnectionTester:
             url = f"{self.base_url}/api/wifi/{action}"
             print(f"   目标URL: {url}")
             
-            response = requests.post(url, timeout=10)
+            response = self.session.post(url, timeout=10)
             print(f"   响应状态: {response.status_code}")
             
             if response.status_code == 200:
@@ -67,6 +77,27 @@ class RemoteConnectionTester:
             print(f"   ❌ 异常: {e}")
             return False
     
+    def test_batch_status(self):
+        """测试批量请求：一次往返获取状态、系统信息与认证状态"""
+        print("📦 测试批量请求...")
+        try:
+            url = f"{self.base_url}/api/batch"
+            paths = ['/api/status', '/api/system/info', '/api/auth-status']
+            response = self.session.post(url, json={'requests': [{'path': path} for path in paths]}, timeout=5)
+            if response.status_code == 404:
+                print("   ⚠️  设备上的应用不支持 /api/batch")
+                return True
+            if response.status_code != 200:
+                print(f"   错误响应: {response.status_code} {response.text}")
+                return False
+            results = response.json()['data']['responses']
+            for item in results:
+                print(f"   {item['path']}: {item['status']}")
+            return all(item['status'] == 200 for item in results)
+        except Exception as e:
+            print(f"   ❌ 异常: {e}")
+            return False
+    
     def test_api_key_validation(self):
         """测试API Key验证"""
         print("🔑 测试API Key验证...")
@@ -74,7 +105,7 @@ class RemoteConnectionTester:
         # 测试无效API Key
         invalid_url = f"http://{self.ip}:{self.port}/invalid_key/api/status"
         try:
-            response = requests.get(invalid_url, timeout=5)
+            response = self.session.get(invalid_url, timeout=5)
             if response.status_code == 404:
                 print("   ✅ 无效API Key正确被拒绝")
             else:
@@ -86,14 +117,16 @@ class RemoteConnectionTester:
         """检查设备ADB连接"""
         print("🔍 检查ADB设备连接...")
         try:
+            serial = f"{self.ip}:5555"
             result = subprocess.run(["adb", "devices"], capture_output=True, text=True)
-            if "192.168.1.133:5555" in result.stdout and "device" in result.stdout:
+            devices = dict(line.split('\t', 1) for line in result.stdout.splitlines() if '\t' in line)
+            if devices.get(serial, '').strip() == "device":
                 print("   ✅ 设备已连接")
                 return True
             else:
                 print("   ❌ 设备未连接")
                 print("   尝试连接...")
-                result = subprocess.run(["adb", "connect", "192.168.1.133:5555"], 
+                result = subprocess.run(["adb", "connect", serial], 
                                       capture_output=True, text=True)
                 if "connected" in result.stdout.lower():
                     print("   ✅ 设备已连接")
@@ -141,6 +174,9 @@ class RemoteConnectionTester:
             print("   ❌ 基本连接测试失败")
             return False
         
+        if not self.test_batch_status():
+            print("   ⚠️  批量请求失败")
+        
         # 3. API Key验证
         self.test_api_key_validation()
         
@@ -174,7 +210,7 @@ class RemoteConnectionTester:
         # 测试网络连通性
         print("🔍 测试网络连通性...")
         try:
-            response = requests.get(f"http://{self.ip}:{self.port}", timeout=3)
+            response = self.session.get(f"http://{self.ip}:{self.port}", timeout=3)
             print("   ✅ 设备网络可达")
         except:
             print("   ❌ 设备网络不可达")
@@ -197,6 +233,11 @@ class RemoteConnectionTester:
 
 def main():
     """主函数"""
+    if '--inventory' in sys.argv[1:]:
+        args = sys.argv[1:]
+        index = args.index('--inventory')
+        return fleet.main(args[:index] + args[index + 1:])
+    
     if len(sys.argv) > 1:
         ip = sys.argv[1]
     else:
@@ -3,10 +3,55 @@
 综合测试脚本：验证所有WebServer修复都能正常工作
 """
 
-import re
 import sys
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.results import script_check, write_report
+from common.source_rules import Rule, literals, scan_source
+
+SETTINGS_FRAGMENT = 'mobile/src/main/java/be/mygod/vpnhotspot/SettingsPreferenceFragment.kt'
+MAIN_ACTIVITY = 'mobile/src/main/java/be/mygod/vpnhotspot/MainActivity.kt'
+WEB_SERVER_MANAGER = 'mobile/src/main/java/be/mygod/vpnhotspot/util/WebServerManager.kt'
+OKHTTP_WEB_SERVER = 'mobile/src/main/java/be/mygod/vpnhotspot/OkHttpWebServer.kt'
+
+# 代码质量检查对每个文件都要统计，与各文件的专项规则放在同一规则集里，每个文件只扫描一次
+QUALITY_RULES = [Rule('timber', 'Timber.'), Rule('try', 'try'), Rule('catch', 'catch')]
+
+RULES = {
+    SETTINGS_FRAGMENT: [
+        Rule('duplicate_copy', 'copyWebBackendUrlToClipboard(currentApiKey)'),
+        Rule('security_exception', r'catch\s*\(\s*e:\s*SecurityException\s*\)', regex=True),
+        Rule('fallback', 'fallbackCopyApiKey'),
+    ] + literals('feedback', [
+        '剪贴板服务不可用',
+        '权限被拒绝',
+        '剪贴板复制可能不完整'
+    ]) + QUALITY_RULES,
+    MAIN_ACTIVITY: [
+        Rule('on_destroy', 'override fun onDestroy()'),
+        Rule('manager_stop', 'WebServerManager.stop()'),
+    ] + QUALITY_RULES,
+    WEB_SERVER_MANAGER: [
+        Rule('current_server_let', 'currentServer?.let'),
+        Rule('server_stop', 'server.stop()'),
+        Rule('current_server_null', 'currentServer = null'),
+        Rule('exception', 'Exception'),
+    ] + literals('backup_port', ['9999', '10000', '10001']) + QUALITY_RULES,
+    OKHTTP_WEB_SERVER: [
+        Rule('finally', 'finally'),
+        Rule('socket_close', 'socket.close()'),
+        Rule('executor_shutdown', 'executor.shutdown()'),
+        Rule('await_termination', 'awaitTermination'),
+        Rule('scope_cancel', 'scope.cancel('),
+    ] + QUALITY_RULES,
+}
+
+
+def scan(path):
+    return scan_source(path, RULES[path])
+
 def test_clipboard_functionality():
     """测试剪贴板复制功能"""
     print("=" * 60)
@@ -14,14 +59,13 @@ def test_clipboard_functionality():
     print("=" * 60)
     
     try:
-        with open('mobile/src/main/java/be/mygod/vpnhotspot/SettingsPreferenceFragment.kt', 'r', encoding='utf-8') as f:
-            content = f.read()
+        matches = scan(SETTINGS_FRAGMENT)
     except FileNotFoundError:
         print("❌ ERROR: SettingsPreferenceFragment.kt not found")
         return False
     
     # 测试1.1: 检查重复调用是否已修复
-    duplicate_calls = content.count('copyWebBackendUrlToClipboard(currentApiKey)')
+    duplicate_calls = matches.count('duplicate_copy')
     if duplicate_calls <= 1:
         print("✅ 重复剪贴板复制调用已修复")
     else:
@@ -29,7 +73,7 @@ def test_clipboard_functionality():
         return False
     
     # 测试1.2: 检查SecurityException处理
-    security_exceptions = len(re.findall(r'catch\s*\(\s*e:\s*SecurityException\s*\)', content))
+    security_exceptions = matches.count('security_exception')
     if security_exceptions >= 2:
         print("✅ SecurityException处理已实现")
     else:
@@ -37,20 +81,14 @@ def test_clipboard_functionality():
         return False
     
     # 测试1.3: 检查回退行为
-    if 'fallbackCopyApiKey' in content:
-        print("✅ IP地址获取失败的回退行为已实现")
+    if matches.found('fallback'):
+        print(f"✅ IP地址获取失败的回退行为已实现 ({matches.where('fallback')})")
     else:
         print("❌ ERROR: 回退行为未实现")
         return False
     
     # 测试1.4: 检查用户反馈
-    feedback_patterns = [
-        '剪贴板服务不可用',
-        '权限被拒绝',
-        '剪贴板复制可能不完整'
-    ]
-    
-    feedback_count = sum(1 for pattern in feedback_patterns if pattern in content)
+    feedback_count = matches.found_count(['feedback_0', 'feedback_1', 'feedback_2'])
     if feedback_count >= 2:
         print("✅ 用户反馈消息已实现")
     else:
@@ -68,21 +106,20 @@ def test_webserver_lifecycle():
     
     # 检查MainActivity
     try:
-        with open('mobile/src/main/java/be/mygod/vpnhotspot/MainActivity.kt', 'r', encoding='utf-8') as f:
-            main_content = f.read()
+        matches = scan(MAIN_ACTIVITY)
     except FileNotFoundError:
         print("❌ ERROR: MainActivity.kt not found")
         return False
     
     # 测试2.1: 检查onDestroy实现
-    if 'override fun onDestroy()' in main_content and 'WebServerManager.stop()' in main_content:
-        print("✅ MainActivity onDestroy中的WebServer停止已实现")
+    if matches.found('on_destroy') and matches.found('manager_stop'):
+        print(f"✅ MainActivity onDestroy中的WebServer停止已实现 ({matches.where('manager_stop')})")
     else:
         print("❌ ERROR: MainActivity onDestroy中的WebServer停止未实现")
         return False
     
     # 测试2.2: 检查错误处理
-    if 'try' in main_content and 'catch' in main_content:
+    if matches.found('try') and matches.found('catch'):
         print("✅ WebServer启动错误处理已实现")
     else:
         print("❌ ERROR: WebServer启动错误处理未实现")
@@ -98,22 +135,20 @@ def test_webserver_manager_enhancements():
     print("=" * 60)
     
     try:
-        with open('mobile/src/main/java/be/mygod/vpnhotspot/util/WebServerManager.kt', 'r', encoding='utf-8') as f:
-            content = f.read()
+        matches = scan(WEB_SERVER_MANAGER)
     except FileNotFoundError:
         print("❌ ERROR: WebServerManager.kt not found")
         return False
     
     # 测试3.1: 检查资源清理
-    if ('currentServer?.let' in content or 'server.stop()' in content) and 'currentServer = null' in content:
+    if (matches.found('current_server_let') or matches.found('server_stop')) and matches.found('current_server_null'):
         print("✅ WebServerManager资源清理已实现")
     else:
         print("❌ ERROR: WebServerManager资源清理未实现")
         return False
     
     # 测试3.2: 检查端口冲突处理
-    backup_ports = ['9999', '10000', '10001']
-    port_retry_found = any(port in content for port in backup_ports)
+    port_retry_found = matches.found_count(['backup_port_0', 'backup_port_1', 'backup_port_2']) > 0
     if port_retry_found:
         print("✅ 端口冲突和重试机制已实现")
     else:
@@ -121,8 +156,7 @@ def test_webserver_manager_enhancements():
         return False
     
     # 测试3.3: 检查异常处理
-    exception_patterns = ['try', 'catch', 'Exception']
-    exception_count = sum(content.count(pattern) for pattern in exception_patterns)
+    exception_count = sum(matches.count(name) for name in ('try', 'catch', 'exception'))
     if exception_count >= 10:  # 应该有足够的异常处理
         print("✅ 全面的异常处理已实现")
     else:
@@ -139,29 +173,28 @@ def test_okhttp_webserver_improvements():
     print("=" * 60)
     
     try:
-        with open('mobile/src/main/java/be/mygod/vpnhotspot/OkHttpWebServer.kt', 'r', encoding='utf-8') as f:
-            content = f.read()
+        matches = scan(OKHTTP_WEB_SERVER)
     except FileNotFoundError:
         print("❌ ERROR: OkHttpWebServer.kt not found")
         return False
     
     # 测试4.1: 检查套接字清理
-    if 'try' in content and 'finally' in content and 'socket.close()' in content:
-        print("✅ 套接字清理已实现")
+    if matches.found('try') and matches.found('finally') and matches.found('socket_close'):
+        print(f"✅ 套接字清理已实现 ({matches.where('socket_close')})")
     else:
         print("❌ ERROR: 套接字清理未实现")
         return False
     
     # 测试4.2: 检查线程池关闭
-    if 'executor.shutdown()' in content and 'awaitTermination' in content:
-        print("✅ 线程池关闭已实现")
+    if matches.found('executor_shutdown') and matches.found('await_termination'):
+        print(f"✅ 线程池关闭已实现 ({matches.where('executor_shutdown')})")
     else:
         print("❌ ERROR: 线程池关闭未实现")
         return False
     
     # 测试4.3: 检查协程作用域清理
-    if 'scope.cancel(' in content:
-        print("✅ 协程作用域清理已实现")
+    if matches.found('scope_cancel'):
+        print(f"✅ 协程作用域清理已实现 ({matches.where('scope_cancel')})")
     else:
         print("❌ ERROR: 协程作用域清理未实现")
         return False
@@ -240,10 +273,10 @@ def test_code_quality():
     print("=" * 60)
     
     files_to_check = [
-        'mobile/src/main/java/be/mygod/vpnhotspot/SettingsPreferenceFragment.kt',
-        'mobile/src/main/java/be/mygod/vpnhotspot/util/WebServerManager.kt',
-        'mobile/src/main/java/be/mygod/vpnhotspot/OkHttpWebServer.kt',
-        'mobile/src/main/java/be/mygod/vpnhotspot/MainActivity.kt'
+        SETTINGS_FRAGMENT,
+        WEB_SERVER_MANAGER,
+        OKHTTP_WEB_SERVER,
+        MAIN_ACTIVITY
     ]
     
     for file_path in files_to_check:
@@ -252,23 +285,18 @@ def test_code_quality():
             return False
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 检查基本代码质量指标
-            lines = content.split('\n')
-            non_empty_lines = [line for line in lines if line.strip()]
+            matches = scan(file_path)
             
             # 检查是否有足够的日志记录
-            timber_count = content.count('Timber.')
+            timber_count = matches.count('timber')
             if timber_count >= 3:
                 print(f"✅ {os.path.basename(file_path)}: 日志记录充足 ({timber_count} instances)")
             else:
                 print(f"⚠️  {os.path.basename(file_path)}: 日志记录可能不足 ({timber_count} instances)")
             
             # 检查异常处理
-            try_count = content.count('try')
-            catch_count = content.count('catch')
+            try_count = matches.count('try')
+            catch_count = matches.count('catch')
             if try_count >= 2 and catch_count >= 2:
                 print(f"✅ {os.path.basename(file_path)}: 异常处理充足")
             else:
@@ -281,89 +309,6 @@ def test_code_quality():
     print("✅ 代码质量检查完成\n")
     return True
 
-def generate_test_report():
-    """生成测试报告"""
-    print("=" * 60)
-    print("生成测试报告")
-    print("=" * 60)
-    
-    report_content = """# WebServer修复综合测试报告
-
-## 测试概述
-本报告总结了对VPNHotspot WebServer修复的综合测试结果。
-
-## 测试结果
-
-### 1. 剪贴板复制功能 ✅
-- 重复调用问题已修复
-- SecurityException处理已实现
-- IP地址获取失败的回退行为已实现
-- 用户反馈消息已完善
-
-### 2. WebServer生命周期管理 ✅
-- MainActivity onDestroy中的WebServer停止已实现
-- WebServer启动错误处理已实现
-- 生命周期日志记录已添加
-
-### 3. WebServerManager增强功能 ✅
-- 资源清理机制已完善
-- 端口冲突检测和重试机制已实现
-- 全面的异常处理已添加
-
-### 4. OkHttpWebServer改进 ✅
-- 套接字清理已实现
-- 线程池关闭机制已完善
-- 协程作用域清理已实现
-
-### 5. 编译测试 ✅
-- Freedom变体编译成功
-- Google变体编译成功
-- 所有语法错误已修复
-
-### 6. 代码质量 ✅
-- 日志记录充足
-- 异常处理完善
-- 代码结构清晰
-
-## 修复的问题
-
-1. **重复剪贴板复制调用**: 移除了SettingsPreferenceFragment中的重复调用
-2. **WebServer生命周期**: 在MainActivity中添加了适当的启动和停止逻辑
-3. **资源泄漏**: 改进了WebServerManager和OkHttpWebServer的资源清理
-4. **端口冲突**: 实现了端口冲突检测和备用端口重试机制
-5. **错误处理**: 为所有关键操作添加了全面的异常处理
-6. **用户体验**: 改进了错误消息和用户反馈
-
-## 测试覆盖的需求
-
-- **需求1.1-1.4**: 剪贴板操作相关需求 ✅
-- **需求2.1-2.6**: WebServer生命周期管理需求 ✅
-- **需求3.1-3.5**: 资源管理和清理需求 ✅
-
-## 结论
-
-所有WebServer相关的修复都已成功实现并通过测试。代码质量良好，编译无错误，功能完整。
-
-## 建议
-
-1. 在实际设备上进行更多的手动测试
-2. 考虑添加单元测试以确保长期稳定性
-3. 监控生产环境中的WebServer性能
-
----
-测试日期: {test_date}
-测试环境: macOS with Java 17
-"""
-    
-    from datetime import datetime
-    report_content = report_content.format(test_date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    
-    with open('WEBSERVER_FIXES_TEST_REPORT.md', 'w', encoding='utf-8') as f:
-        f.write(report_content)
-    
-    print("✅ 测试报告已生成: WEBSERVER_FIXES_TEST_REPORT.md")
-    return True
-
 def main():
     """主测试函数"""
     print("🚀 开始WebServer修复综合测试")
@@ -383,7 +328,7 @@ def main():
     
     for test_name, test_func in tests:
         try:
-            if test_func():
+            if script_check(test_name, test_func):
                 passed_tests += 1
             else:
                 print(f"❌ {test_name} 测试失败")
@@ -395,7 +340,7 @@ def main():
     
     if passed_tests == total_tests:
         print("🎉 所有测试通过！WebServer修复验证成功！")
-        generate_test_report()
+        write_report('WEBSERVER_FIXES_TEST_REPORT.md', 'WebServer修复综合测试报告')
         return 0
     else:
         print("❌ 部分测试失败，请检查上述错误信息")
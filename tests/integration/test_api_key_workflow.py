@@ -7,16 +7,24 @@ import subprocess
 import time
 import sys
 import re
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.adb import run_adb_command
+from common.results import script_check, write_report
+
+
+# 调度器使用的资源声明（common.orchestrator）
+RESOURCES = {
+    'test_without_api_key': ['port:9999'],
+    'test_disable_api_key_auth': ['device'],
+    'test_with_fake_api_key': ['port:9999'],
+    'test_api_endpoints': ['port:9999'],
+    'test_favicon': ['port:9999'],
+    'test_cors_headers': ['port:9999'],
+}
 
-def run_adb_command(command):
-    """执行ADB命令"""
-    try:
-        result = subprocess.run(['adb'] + command, capture_output=True, text=True, timeout=30)
-        return result.returncode == 0, result.stdout, result.stderr
-    except subprocess.TimeoutExpired:
-        return False, "", "Command timeout"
-    except Exception as e:
-        return False, "", str(e)
 
 def test_without_api_key():
     """测试没有API Key的访问"""
@@ -158,77 +166,6 @@ def test_cors_headers():
         print("❌ 请求失败")
         return False
 
-def generate_test_report():
-    """生成测试报告"""
-    print("\n📊 生成API Key工作流程测试报告...")
-    
-    report = """# API Key工作流程测试报告
-
-## 测试概述
-本报告验证了WebServer的API Key认证机制和HTTP处理修复。
-
-## 测试结果
-
-### 1. 基础HTTP功能 ✅
-- HTTP请求解析正常
-- 响应格式正确
-- 连接处理稳定
-
-### 2. API Key认证机制 ✅
-- 无API Key时正确显示引导页面
-- 无效API Key时正确返回401错误
-- API端点正确要求认证
-
-### 3. CORS支持 ✅
-- 正确设置CORS头
-- 支持跨域访问
-
-### 4. 错误处理 ✅
-- 空请求错误已修复
-- 连接超时处理正常
-- 异常情况处理完善
-
-## 修复验证
-
-### 原问题: "Empty request" 和 "Socket is closed"
-- **状态**: ✅ 已修复
-- **解决方案**: 改进HTTP请求解析逻辑，添加超时处理
-- **验证**: 多次请求测试全部成功
-
-### 原问题: 后台页面空白
-- **状态**: ✅ 已修复  
-- **解决方案**: 添加API Key引导页面，改进请求路由
-- **验证**: 现在显示清晰的使用指南
-
-### 原问题: 连接不稳定
-- **状态**: ✅ 已修复
-- **解决方案**: 优化连接处理和资源清理
-- **验证**: 连续请求测试稳定
-
-## 使用指南
-
-### 访问WebServer
-1. **无API Key认证时**: 直接访问 http://设备IP:端口
-2. **有API Key认证时**: 
-   - 访问 http://设备IP:端口 查看引导页面
-   - 通过应用获取API Key
-   - 访问 http://设备IP:端口/your_api_key
-
-### 获取API Key
-1. 打开VPNHotspot应用
-2. 进入设置页面
-3. 找到"API Key管理"
-4. 选择"复制后台地址"或"显示二维码"
-
-## 结论
-WebServer HTTP处理问题已完全修复，现在可以正常访问和使用。
-"""
-    
-    with open('API_KEY_WORKFLOW_TEST_REPORT.md', 'w', encoding='utf-8') as f:
-        f.write(report)
-    
-    print("✅ 测试报告已生成: API_KEY_WORKFLOW_TEST_REPORT.md")
-
 def main():
     """主测试函数"""
     print("🚀 开始API Key工作流程测试")
@@ -249,7 +186,7 @@ def main():
     for test_name, test_func in tests:
         print(f"\n--- {test_name} ---")
         try:
-            if test_func():
+            if script_check(test_name, test_func):
                 passed_tests += 1
                 print(f"✅ {test_name} 通过")
             else:
@@ -257,8 +194,8 @@ def main():
         except Exception as e:
             print(f"❌ {test_name} 异常: {e}")
     
-    # 生成测试报告
-    generate_test_report()
+    # 报告从结果存储生成
+    write_report('API_KEY_WORKFLOW_TEST_REPORT.md', 'API Key工作流程测试报告')
     
     print("\n" + "=" * 50)
     print(f"测试总结: {passed_tests}/{total_tests} 通过")
@@ -4,67 +4,97 @@ Test script to verify comprehensive error handling for clipboard operations
 in SettingsPreferenceFragment.kt
 """
 
-import re
+import os
 import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.source_rules import Rule, literals, patterns, scan_source
+
+SETTINGS_FRAGMENT = 'mobile/src/main/java/be/mygod/vpnhotspot/SettingsPreferenceFragment.kt'
+
+# Both tests share one rule set so the file is scanned once (and cached across runs)
+CLIPBOARD_RULES = [
+    Rule('security_exception', r'catch\s*\(\s*e:\s*SecurityException\s*\)', regex=True),
+    Rule('fallback_function', r'private\s+fun\s+fallbackCopyApiKey', regex=True),
+    Rule('clipboard_null_check', r'clipboard\s*==\s*null', regex=True),
+    Rule('clip_verification', r'primaryClip.*itemCount.*getItemAt', regex=True, dotall=True),
+    Rule('illegal_state', r'catch\s*\(\s*e:\s*IllegalStateException\s*\)', regex=True),
+] + patterns('ip_error', [
+    r'Timber\.w.*static IP settings',
+    r'Timber\.w.*network interfaces',
+    r'SecurityException.*network interfaces',
+]) + literals('feedback', [
+    '剪贴板服务不可用',
+    '权限被拒绝',
+    '剪贴板复制可能不完整',
+    '无法获取IP地址，已复制API Key',
+]) + patterns('ip_validation', [
+    r'Timber\.d.*IP validation',
+    r'NumberFormatException',
+    r'parts\.withIndex\(\)',
+]) + patterns('browser_error', [
+    r'ActivityNotFoundException',
+    r'未找到可用的浏览器应用',
+    r'FLAG_ACTIVITY_NEW_TASK',
+]) + patterns('confirmation', [
+    r'Web后台地址已复制到剪贴板',
+    r'已复制API Key到剪贴板',
+    r'Toast\.makeText.*复制',
+]) + patterns('fallback', [
+    r'fallbackCopyApiKey',
+    r'无法获取IP地址.*已复制API Key',
+    r'ip\s*==\s*null.*fallback',
+], dotall=True)
+
+
+def names(prefix):
+    return [rule.name for rule in CLIPBOARD_RULES if rule.name.startswith(prefix + '_')]
+
+
 def test_clipboard_error_handling():
     """Test that comprehensive error handling is implemented for clipboard operations"""
     
     print("Testing clipboard error handling implementation...")
     
-    # Read the SettingsPreferenceFragment.kt file
     try:
-        with open('mobile/src/main/java/be/mygod/vpnhotspot/SettingsPreferenceFragment.kt', 'r', encoding='utf-8') as f:
-            content = f.read()
+        matches = scan_source(SETTINGS_FRAGMENT, CLIPBOARD_RULES)
     except FileNotFoundError:
         print("❌ ERROR: SettingsPreferenceFragment.kt not found")
         return False
     
     # Test 1: Check for SecurityException handling in copyWebBackendUrlToClipboard
-    security_exception_pattern = r'catch\s*\(\s*e:\s*SecurityException\s*\)'
-    security_exceptions = re.findall(security_exception_pattern, content)
+    security_exceptions = matches.count('security_exception')
     
-    if len(security_exceptions) >= 2:  # Should have at least 2 SecurityException catches
-        print("✅ SecurityException handling found in clipboard operations")
+    if security_exceptions >= 2:  # Should have at least 2 SecurityException catches
+        print(f"✅ SecurityException handling found in clipboard operations ({matches.where('security_exception')})")
     else:
-        print(f"❌ ERROR: Insufficient SecurityException handling found (expected >= 2, found {len(security_exceptions)})")
+        print(f"❌ ERROR: Insufficient SecurityException handling found (expected >= 2, found {security_exceptions})")
         return False
     
     # Test 2: Check for fallback behavior when IP address cannot be obtained
-    fallback_function_pattern = r'private\s+fun\s+fallbackCopyApiKey'
-    if re.search(fallback_function_pattern, content):
-        print("✅ Fallback function for API Key copy found")
+    if matches.found('fallback_function'):
+        print(f"✅ Fallback function for API Key copy found ({matches.where('fallback_function')})")
     else:
         print("❌ ERROR: Fallback function for API Key copy not found")
         return False
     
     # Test 3: Check for clipboard service availability check
-    clipboard_null_check = r'clipboard\s*==\s*null'
-    if re.search(clipboard_null_check, content):
-        print("✅ Clipboard service availability check found")
+    if matches.found('clipboard_null_check'):
+        print(f"✅ Clipboard service availability check found ({matches.where('clipboard_null_check')})")
     else:
         print("❌ ERROR: Clipboard service availability check not found")
         return False
     
     # Test 4: Check for clipboard content verification
-    verification_pattern = r'primaryClip.*itemCount.*getItemAt'
-    if re.search(verification_pattern, content, re.DOTALL):
-        print("✅ Clipboard content verification found")
+    if matches.found('clip_verification'):
+        print(f"✅ Clipboard content verification found ({matches.where('clip_verification')})")
     else:
         print("❌ ERROR: Clipboard content verification not found")
         return False
     
     # Test 5: Check for enhanced IP address error handling
-    ip_error_patterns = [
-        r'Timber\.w.*static IP settings',
-        r'Timber\.w.*network interfaces',
-        r'SecurityException.*network interfaces'
-    ]
-    
-    ip_error_handling_count = 0
-    for pattern in ip_error_patterns:
-        if re.search(pattern, content):
-            ip_error_handling_count += 1
+    ip_error_handling_count = matches.found_count(names('ip_error'))
     
     if ip_error_handling_count >= 2:
         print("✅ Enhanced IP address error handling found")
@@ -73,17 +103,7 @@ def test_clipboard_error_handling():
         return False
     
     # Test 6: Check for improved user feedback messages
-    feedback_patterns = [
-        r'剪贴板服务不可用',
-        r'权限被拒绝',
-        r'剪贴板复制可能不完整',
-        r'无法获取IP地址，已复制API Key'
-    ]
-    
-    feedback_count = 0
-    for pattern in feedback_patterns:
-        if re.search(pattern, content):
-            feedback_count += 1
+    feedback_count = matches.found_count(names('feedback'))
     
     if feedback_count >= 3:
         print("✅ Comprehensive user feedback messages found")
@@ -92,24 +112,14 @@ def test_clipboard_error_handling():
         return False
     
     # Test 7: Check for IllegalStateException handling (fragment lifecycle)
-    illegal_state_pattern = r'catch\s*\(\s*e:\s*IllegalStateException\s*\)'
-    if re.search(illegal_state_pattern, content):
-        print("✅ IllegalStateException handling for fragment lifecycle found")
+    if matches.found('illegal_state'):
+        print(f"✅ IllegalStateException handling for fragment lifecycle found ({matches.where('illegal_state')})")
     else:
         print("❌ ERROR: IllegalStateException handling for fragment lifecycle not found")
         return False
     
     # Test 8: Check for enhanced IP validation with logging
-    ip_validation_patterns = [
-        r'Timber\.d.*IP validation',
-        r'NumberFormatException',
-        r'parts\.withIndex\(\)'
-    ]
-    
-    ip_validation_count = 0
-    for pattern in ip_validation_patterns:
-        if re.search(pattern, content):
-            ip_validation_count += 1
+    ip_validation_count = matches.found_count(names('ip_validation'))
     
     if ip_validation_count >= 2:
         print("✅ Enhanced IP validation with logging found")
@@ -118,16 +128,7 @@ def test_clipboard_error_handling():
         return False
     
     # Test 9: Check for browser opening error handling
-    browser_error_patterns = [
-        r'ActivityNotFoundException',
-        r'未找到可用的浏览器应用',
-        r'FLAG_ACTIVITY_NEW_TASK'
-    ]
-    
-    browser_error_count = 0
-    for pattern in browser_error_patterns:
-        if re.search(pattern, content):
-            browser_error_count += 1
+    browser_error_count = matches.found_count(names('browser_error'))
     
     if browser_error_count >= 2:
         print("✅ Enhanced browser opening error handling found")
@@ -144,23 +145,13 @@ def test_requirements_coverage():
     print("\nTesting requirements coverage...")
     
     try:
-        with open('mobile/src/main/java/be/mygod/vpnhotspot/SettingsPreferenceFragment.kt', 'r', encoding='utf-8') as f:
-            content = f.read()
+        matches = scan_source(SETTINGS_FRAGMENT, CLIPBOARD_RULES)
     except FileNotFoundError:
         print("❌ ERROR: SettingsPreferenceFragment.kt not found")
         return False
     
     # Requirement 1.3: 当剪贴板复制操作完成时，系统应显示确认操作的提示消息
-    confirmation_patterns = [
-        r'Web后台地址已复制到剪贴板',
-        r'已复制API Key到剪贴板',
-        r'Toast\.makeText.*复制'
-    ]
-    
-    confirmation_count = 0
-    for pattern in confirmation_patterns:
-        if re.search(pattern, content):
-            confirmation_count += 1
+    confirmation_count = matches.found_count(names('confirmation'))
     
     if confirmation_count >= 2:
         print("✅ Requirement 1.3: Confirmation messages for clipboard operations")
@@ -169,16 +160,7 @@ def test_requirements_coverage():
         return False
     
     # Requirement 1.4: 如果无法获取设备IP地址，系统应回退到仅复制API Key
-    fallback_patterns = [
-        r'fallbackCopyApiKey',
-        r'无法获取IP地址.*已复制API Key',
-        r'ip\s*==\s*null.*fallback'
-    ]
-    
-    fallback_count = 0
-    for pattern in fallback_patterns:
-        if re.search(pattern, content, re.DOTALL):
-            fallback_count += 1
+    fallback_count = matches.found_count(names('fallback'))
     
     if fallback_count >= 2:
         print("✅ Requirement 1.4: Fallback behavior when IP address cannot be obtained")
@@ -6,16 +6,25 @@
 import subprocess
 import time
 import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.adb import run_adb_command
+from common.logcat import LogcatStream, device_time, watch_for_crash
+from common.results import script_check, write_report
+
+
+# 调度器使用的资源声明（common.orchestrator）
+RESOURCES = {
+    'clear_logs': ['device'],
+    'restart_app': ['device', 'port:9999'],
+    'check_for_crashes': ['device'],
+    'test_webserver': ['port:9999'],
+    'test_multiple_restarts': ['device', 'port:9999'],
+    'test_fragment_lifecycle': ['device', 'port:9999'],
+}
 
-def run_adb_command(command):
-    """执行ADB命令"""
-    try:
-        result = subprocess.run(['adb'] + command, capture_output=True, text=True, timeout=30)
-        return result.returncode == 0, result.stdout, result.stderr
-    except subprocess.TimeoutExpired:
-        return False, "", "Command timeout"
-    except Exception as e:
-        return False, "", str(e)
 
 def clear_logs():
     """清除日志"""
@@ -43,44 +52,25 @@ def restart_app():
         print(f"❌ 应用启动失败: {stderr}")
         return False
 
-def check_for_crashes(duration=10):
-    """检查崩溃"""
-    print(f"🔍 监控崩溃 ({duration}秒)...")
-    
-    time.sleep(duration)
+def check_for_crashes(duration=10, since=None):
+    """检查崩溃：流式读取logcat，发现崩溃立即返回"""
+    print(f"🔍 监控崩溃 (最长{duration}秒)...")
     
-    success, stdout, stderr = run_adb_command(['logcat', '-d'])
+    try:
+        # since为None时从缓冲区开头读取，与原先 logcat -d 的范围一致
+        crashes_found = watch_for_crash(duration, stream=LogcatStream(since=since))
+    except OSError as e:
+        print(f"❌ 无法获取日志: {e}")
+        return False
     
-    if success:
-        # 检查崩溃关键词
-        crash_indicators = [
-            'FATAL EXCEPTION',
-            'AndroidRuntime',
-            'java.lang.NullPointerException',
-            'APP CRASH',
-            'Process: be.mygod.vpnhotspot'
-        ]
-        
-        crashes_found = []
-        lines = stdout.split('\n')
-        
-        for line in lines:
-            for indicator in crash_indicators:
-                if indicator in line and 'be.mygod.vpnhotspot' in line:
-                    crashes_found.append(line)
-                    break
-        
-        if crashes_found:
-            print("❌ 发现崩溃:")
-            for crash in crashes_found[-5:]:  # 显示最后5个崩溃
-                print(f"  {crash}")
-            return False
-        else:
-            print("✅ 没有发现崩溃")
-            return True
-    else:
-        print("❌ 无法获取日志")
+    if crashes_found:
+        print("❌ 发现崩溃:")
+        for crash in crashes_found[-5:]:  # 显示最后5个崩溃
+            print(f"  {crash.raw}")
         return False
+    else:
+        print("✅ 没有发现崩溃")
+        return True
 
 def test_webserver():
     """测试WebServer功能"""
@@ -112,10 +102,10 @@ def test_multiple_restarts():
     for i in range(total_restarts):
         print(f"  第{i+1}次重启...")
         
+        mark = device_time()
         if restart_app():
-            time.sleep(3)  # 等待应用稳定
-            
-            if check_for_crashes(5):  # 检查5秒
+            # 等待应用稳定与崩溃检查合并为同一个监控窗口，发现崩溃立即结束
+            if check_for_crashes(8, since=mark):
                 success_count += 1
                 print(f"  ✅ 第{i+1}次重启成功")
             else:
@@ -149,84 +139,17 @@ def test_fragment_lifecycle():
     
     for i, operation in enumerate(operations):
         print(f"  执行操作 {i+1}: {' '.join(operation[2:])}")
+        mark = device_time()
         run_adb_command(operation)
-        time.sleep(2)
         
         # 检查是否有崩溃
-        if not check_for_crashes(2):
+        if not check_for_crashes(4, since=mark):
             print(f"  ❌ 操作 {i+1} 后发现崩溃")
             return False
     
     print("✅ Fragment生命周期测试通过")
     return True
 
-def generate_crash_fix_report():
-    """生成崩溃修复报告"""
-    print("\n📊 生成崩溃修复报告...")
-    
-    report = """# 应用崩溃修复报告
-
-## 问题描述
-应用在RemoteControlFragment中出现NullPointerException崩溃，错误位置：
-- 文件: RemoteControlFragment.kt:28
-- 方法: getBinding()
-- 原因: 在Fragment生命周期结束后仍然访问binding
-
-## 修复方案
-
-### 1. 改进binding访问安全性
-```kotlin
-// 修复前
-private val binding get() = _binding!!
-
-// 修复后  
-private val binding get() = _binding ?: throw IllegalStateException("Fragment binding is null")
-```
-
-### 2. 协程中的安全binding访问
-```kotlin
-// 在协程中检查Fragment状态
-if (!isAdded || _binding == null) {
-    return@launch
-}
-
-// 使用安全的binding访问
-_binding?.let { binding ->
-    binding.progressBar.visibility = View.GONE
-}
-```
-
-### 3. 方法级别的binding检查
-```kotlin
-private fun displayRemoteStatus(data: JSONObject) {
-    val currentBinding = _binding ?: return
-    // 使用currentBinding而不是binding
-}
-```
-
-## 修复验证
-
-### 测试结果
-- ✅ 应用启动无崩溃
-- ✅ WebServer功能正常
-- ✅ 多次重启稳定
-- ✅ Fragment生命周期安全
-
-### 修复的具体问题
-1. **NullPointerException**: 完全修复
-2. **Fragment生命周期**: 添加了安全检查
-3. **协程中的binding访问**: 添加了状态验证
-4. **资源清理**: 改进了finally块的安全性
-
-## 结论
-应用崩溃问题已完全修复，现在可以安全使用。
-"""
-    
-    with open('CRASH_FIX_REPORT.md', 'w', encoding='utf-8') as f:
-        f.write(report)
-    
-    print("✅ 崩溃修复报告已生成: CRASH_FIX_REPORT.md")
-
 def main():
     """主测试函数"""
     print("🚀 开始应用崩溃修复测试")
@@ -247,7 +170,7 @@ def main():
     for test_name, test_func in tests:
         print(f"\n--- {test_name} ---")
         try:
-            if test_func():
+            if script_check(test_name, test_func):
                 passed_tests += 1
                 print(f"✅ {test_name} 通过")
             else:
@@ -255,8 +178,8 @@ def main():
         except Exception as e:
             print(f"❌ {test_name} 异常: {e}")
     
-    # 生成报告
-    generate_crash_fix_report()
+    # 报告从结果存储生成
+    write_report('CRASH_FIX_REPORT.md', '应用崩溃修复报告')
     
     print("\n" + "=" * 50)
     print(f"测试总结: {passed_tests}/{total_tests} 通过")
@@ -1,22 +1,40 @@
 #!/usr/bin/env python3
 """
 测试WebServer HTTP修复的脚本
+
+加 --local 参数时在本机启动 OkHttpWebServer 替身（common.fake_webserver），
+只运行HTTP相关测试，无需连接设备。
 """
 
+import asyncio
 import subprocess
 import time
 import socket
 import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.adb import run_adb_command
+from common.fake_webserver import FakeWebServer
+from common.loadgen import LoadGenerator, default_mix, print_summary
+from common.logcat import device_time
+from common.readiness import wait_for_webserver
+from common.results import record_metric
+
+WEB_PORT = 9999
+
+
+# 调度器使用的资源声明（common.orchestrator）
+RESOURCES = {
+    'test_tcp_connection': ['port:9999'],
+    'test_http_response': ['port:9999'],
+    'test_multiple_requests': ['port:9999'],
+    'test_concurrent_requests': ['port:9999'],
+    'check_webserver_logs': ['device'],
+    'restart_app_and_test': ['device', 'port:9999'],
+}
 
-def run_adb_command(command):
-    """执行ADB命令"""
-    try:
-        result = subprocess.run(['adb'] + command, capture_output=True, text=True, timeout=30)
-        return result.returncode == 0, result.stdout, result.stderr
-    except subprocess.TimeoutExpired:
-        return False, "", "Command timeout"
-    except Exception as e:
-        return False, "", str(e)
 
 def test_http_response():
     """测试HTTP响应"""
@@ -27,7 +45,7 @@ def test_http_response():
         result = subprocess.run([
             'curl', '--noproxy', '*', '-s', '-w', 
             'HTTP_CODE:%{http_code}\nTIME_TOTAL:%{time_total}\nSIZE_DOWNLOAD:%{size_download}',
-            'http://localhost:9999'
+            f'http://localhost:{WEB_PORT}'
         ], capture_output=True, text=True, timeout=10)
         
         if result.returncode == 0:
@@ -66,7 +84,7 @@ def test_tcp_connection():
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(5)
-        result = sock.connect_ex(('127.0.0.1', 9999))
+        result = sock.connect_ex(('127.0.0.1', WEB_PORT))
         sock.close()
         
         if result == 0:
@@ -90,7 +108,7 @@ def test_multiple_requests():
         try:
             result = subprocess.run([
                 'curl', '--noproxy', '*', '-s', '-w', '%{http_code}',
-                'http://localhost:9999'
+                f'http://localhost:{WEB_PORT}'
             ], capture_output=True, text=True, timeout=5)
             
             if result.returncode == 0 and '200' in result.stdout:
@@ -111,6 +129,30 @@ def test_multiple_requests():
         print(f"⚠️  {success_count}/{total_requests} 个请求成功")
         return success_count > total_requests // 2
 
+def test_concurrent_requests():
+    """测试并发请求：多个客户端同时轮询时的延迟与错误"""
+    print("⚡ 测试并发请求...")
+    
+    try:
+        generator = LoadGenerator(host='127.0.0.1', port=WEB_PORT, mix=default_mix(),
+                                  concurrency=8, duration=10, requests=200, timeout=10)
+        results = asyncio.run(generator.run())
+    except Exception as e:
+        print(f"❌ 并发测试异常: {e}")
+        return False
+    
+    print_summary(results)
+    for path, stats in generator.stats.items():
+        record_metric(f'latency {path}', histogram=stats.histogram.values(), unit='us')
+    overall = results['overall']
+    errors = sum(overall['errors'].values())
+    if overall['requests'] and errors == 0:
+        print(f"✅ {overall['requests']} 个并发请求全部得到响应")
+        return True
+    else:
+        print(f"⚠️  {errors}/{overall['requests']} 个请求失败")
+        return False
+
 def check_webserver_logs():
     """检查WebServer日志"""
     print("📝 检查WebServer日志...")
@@ -156,9 +198,10 @@ def restart_app_and_test():
     
     # 强制停止应用
     run_adb_command(['shell', 'am', 'force-stop', 'be.mygod.vpnhotspot'])
-    time.sleep(2)
     
     # 重新启动应用
+    mark = device_time()
+    start = time.monotonic()
     success, stdout, stderr = run_adb_command([
         'shell', 'am', 'start', '-n', 'be.mygod.vpnhotspot/.MainActivity'
     ])
@@ -168,13 +211,20 @@ def restart_app_and_test():
         return False
     
     print("✅ 应用重新启动")
-    time.sleep(5)  # 等待WebServer启动
+    # 等待WebServer启动：日志报告端口或端口可连接即返回
+    readiness = wait_for_webserver('127.0.0.1', ports=(WEB_PORT,), since=mark, start=start)
+    if readiness.ready:
+        print(f"⏱️  WebServer就绪耗时 {readiness.elapsed_ms}ms")
+    else:
+        print("⚠️  等待WebServer就绪超时")
     
     # 测试连接
     return test_tcp_connection() and test_http_response()
 
 def main():
     """主测试函数"""
+    global WEB_PORT
+    local = '--local' in sys.argv[1:]
     print("🚀 开始WebServer HTTP修复测试")
     print("=" * 50)
     
@@ -182,10 +232,21 @@ def main():
         ("TCP连接测试", test_tcp_connection),
         ("HTTP响应测试", test_http_response),
         ("多请求测试", test_multiple_requests),
-        ("日志检查", check_webserver_logs),
-        ("重启测试", restart_app_and_test)
+        ("并发请求测试", test_concurrent_requests),
     ]
     
+    if local:
+        # 替身随机分配端口，避免与本机已有的9999冲突
+        server = FakeWebServer(port=0).__enter__()
+        WEB_PORT = server.port
+        print(f"🧪 使用本地替身: {server.base_url}")
+    else:
+        server = None
+        tests += [
+            ("日志检查", check_webserver_logs),
+            ("重启测试", restart_app_and_test)
+        ]
+    
     passed_tests = 0
     total_tests = len(tests)
     
@@ -200,6 +261,9 @@ def main():
         except Exception as e:
             print(f"❌ {test_name} 异常: {e}")
     
+    if server is not None:
+        server.__exit__(None, None, None)
+    
     print("\n" + "=" * 50)
     print(f"测试总结: {passed_tests}/{total_tests} 通过")
     
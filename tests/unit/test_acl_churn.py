@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+客户端ACL回放测试：ClientAcl.IpSet 生成的命令、两种后端在上下线回放中的放行结果与开销、回退与 ipset save 计数器解析
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.acl_churn import IpSetAcl, LiveTransaction, Routing, compare, parse_save, replay, set_match_works
+from common.iptables_counters import parse_dump
+from common.ip_neigh import load_corpus, synthetic
+from common.routing_trace import FakeRootShell
+
+
+def test_ipset_commands():
+    """ClientAcl.IpSet 的移植生成与Kotlin相同的命令（期望与 ClientAclTest 相同）"""
+    acl = IpSetAcl('wlan1')
+    assert acl.probe.split('\n') == [
+        'ipset -exist create vpnhotspot_src_wlan1 hash:ip family inet counters',
+        'ipset flush vpnhotspot_src_wlan1',
+        'ipset -exist create vpnhotspot_dst_wlan1 hash:ip family inet counters',
+        'ipset flush vpnhotspot_dst_wlan1',
+        'iptables -w -C FORWARD -m set --match-set vpnhotspot_src_wlan1 src -j ACCEPT',
+    ]
+    assert acl.restore('add', '192.168.43.100') == ("printf '%s\\n' 'add vpnhotspot_src_wlan1 192.168.43.100' "
+                                                    "'add vpnhotspot_dst_wlan1 192.168.43.100' | ipset -exist restore")
+
+
+def test_corpus():
+    """采集的监视输出：两种后端放行相同的客户端，集合后端的链长不变"""
+    report = compare(load_corpus('monitor.txt'))
+    assert report['problems'] == []
+    rules, sets = report['backends']['rules'], report['backends']['ipset']
+    assert (rules['joins'], rules['leaves']) == (5, 1) and sets['backend'] == 'ipset'
+    assert sets['chain_length']['max'] == 2 and rules['chain_length']['max'] > 2
+    assert sets['counted_clients'] is True
+
+
+def test_churn():
+    """频繁上下线：命令数相同，集合后端不持有xtables锁，每个包匹配的规则数不随客户端增长"""
+    report = compare(synthetic(800, clients=80, seed=1, ifaces=('wlan1',)))
+    assert report['problems'] == [] and report['speedup'] > 1
+    rules, sets = report['backends']['rules'], report['backends']['ipset']
+    assert rules['joins'] > 50 and rules['leaves'] > 10
+    assert rules['round_trips'] == sets['round_trips'] == rules['joins'] + rules['leaves']
+    assert sets['lock_acquisitions'] == 0 and rules['lock_acquisitions'] == rules['round_trips']
+    assert sets['rules_per_packet']['max'] <= 2 and rules['rules_per_packet']['mean'] > 20
+    assert rules['change_us']['p50'] > sets['change_us']['p50']
+
+
+def test_fallback():
+    """没有 ipset 时探测失败，回退到逐条规则且不留下集合"""
+    lines = synthetic(300, clients=30, seed=2, ifaces=('wlan1',))
+    fallback = replay(lines, 'ipset', ipset=False)
+    rules = replay(lines, 'rules')
+    assert fallback['backend'] == 'rules' and fallback['restored'] and fallback['mismatches'] == 0
+    assert fallback['chain_length'] == rules['chain_length'] and fallback['round_trips'] == rules['round_trips']
+    shell = FakeRootShell(ipset=False)
+    routing = Routing(shell, backend='ipset')
+    assert routing.acl.name == 'rules' and shell.sets == {}
+
+
+def test_no_set_match():
+    """内核没有 xt_set 时 -C 同样返回1，但没有报告规则不存在：回退到逐条规则且不留下集合"""
+    assert set_match_works(1, 'iptables: Bad rule (does a matching rule exist in that chain?).\n')
+    assert not set_match_works(1, 'iptables: No chain/target/match by that name.\n')
+    assert not set_match_works(2, "iptables v1.8.7 (legacy): Couldn't load match `set':No such file or directory\n")
+    shell = FakeRootShell(xt_set=False)
+    routing = Routing(shell, backend='ipset')
+    assert routing.acl.name == 'rules' and shell.sets == {}
+    lines = synthetic(300, clients=30, seed=2, ifaces=('wlan1',))
+    fallback = replay(lines, 'ipset', xt_set=False)
+    assert fallback['backend'] == 'rules' and fallback['restored'] and fallback['mismatches'] == 0
+
+
+def test_counters():
+    """ipset save 的成员计数器按方向对应收发，集合的匹配规则在 iptables 计数器解析中跳过"""
+    shell = FakeRootShell()
+    routing = Routing(shell)
+    client = LiveTransaction(shell)
+    routing.acl.allow(client, '192.168.43.100')
+    shell.sets['vpnhotspot_src_wlan1']['192.168.43.100'] = [3, 180]
+    shell.sets['vpnhotspot_dst_wlan1']['192.168.43.100'] = [5, 6200]
+    saved = shell.exec('ipset save')[1]
+    assert parse_save(saved) == {('192.168.43.100', 'wlan1'): [3, 180, 5, 6200]}
+    # 仍被规则引用的集合不能销毁
+    assert shell.exec('ipset destroy vpnhotspot_src_wlan1')[0] == 1
+    dump = ('Chain vpnhotspot_acl (2 references)\n'
+            '    pkts      bytes target     prot opt in     out     source               destination         \n'
+            '       3      180 ACCEPT     all  --  wlan1  *       0.0.0.0/0            0.0.0.0/0            '
+            'match-set vpnhotspot_src_wlan1 src\n')
+    assert parse_dump(dump, {('192.168.43.100', 'wlan1')}) == ({}, [])
+    client.revert()
+    routing.revert()
+    assert shell.sets == {}
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 客户端ACL回放测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+共享ADB会话层测试：针对本地adb server替身离线运行
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common import adb
+from common.adb import AdbClient, AdbError, ShellSession
+from common.fake_adb import FakeAdbServer
+
+
+def test_host_services():
+    """测试host:version与host:devices"""
+    with FakeAdbServer(serials=['emulator-5554', '192.168.1.133:5555']) as server:
+        client = AdbClient(port=server.port)
+        assert client.version() == 41
+        assert client.devices() == [('emulator-5554', 'device'), ('192.168.1.133:5555', 'device')]
+
+
+def test_session_reuses_single_connection():
+    """多条命令复用同一个shell服务"""
+    with FakeAdbServer() as server:
+        with ShellSession(AdbClient(port=server.port)) as session:
+            for i in range(10):
+                code, output = session.run(f'echo line{i}')
+                assert code == 0
+                assert output == f'line{i}\n'
+        assert server.count('shell:') == 1
+
+
+def test_session_exit_code_and_partial_lines():
+    """退出码、stderr合并以及无换行结尾的输出"""
+    with FakeAdbServer() as server:
+        with ShellSession(AdbClient(port=server.port)) as session:
+            assert session.run('printf abc') == (0, 'abc')
+            code, output = session.run('echo oops >&2; exit_code() { return 3; }; exit_code')
+            assert code == 3
+            assert output == 'oops\n'
+            # 命令不会读走后续流水线内容
+            assert session.run('cat') == (0, '')
+
+
+def test_pipelined_execution():
+    """流水线批量执行按顺序返回结果"""
+    with FakeAdbServer() as server:
+        with ShellSession(AdbClient(port=server.port)) as session:
+            results = session.run_many([f'echo {i}; false' if i % 2 else f'echo {i}' for i in range(50)])
+        assert [output for _, output in results] == [f'{i}\n' for i in range(50)]
+        assert [code for code, _ in results] == [1 if i % 2 else 0 for i in range(50)]
+
+
+def test_session_closed_by_device():
+    """设备端shell退出后报错，下一次调用自动重建会话"""
+    with FakeAdbServer() as server:
+        session = ShellSession(AdbClient(port=server.port))
+        try:
+            session.run('exit')
+            assert False, 'expected AdbError'
+        except AdbError:
+            pass
+        assert not session.is_open
+        assert session.run('echo back') == (0, 'back\n')
+        session.close()
+        assert server.count('shell:') == 2
+
+
+def test_unknown_serial():
+    """未知设备返回FAIL信息"""
+    with FakeAdbServer() as server:
+        try:
+            AdbClient(serial='missing', port=server.port).shell('true')
+            assert False, 'expected AdbError'
+        except AdbError as e:
+            assert 'not found' in str(e)
+
+
+def test_run_adb_command_compat():
+    """run_adb_command 保持原有 (success, stdout, stderr) 语义"""
+    with FakeAdbServer() as server:
+        os.environ['ANDROID_ADB_SERVER_PORT'] = str(server.port)
+        try:
+            assert adb.run_adb_command(['shell', 'echo', 'hi', '|', 'tr', 'a-z', 'A-Z']) == (True, 'HI\n', '')
+            success, stdout, stderr = adb.run_adb_command(['shell', 'ls /nonexistent'])
+            assert not success and stderr == stdout != ''
+            success, stdout, _ = adb.run_adb_command(['devices'])
+            assert success and 'emulator-5554\tdevice' in stdout
+            assert server.count('shell:') == 1
+        finally:
+            adb.close_sessions()
+            del os.environ['ANDROID_ADB_SERVER_PORT']
+
+
+def test_subprocess_fallback():
+    """adb server不可达时回退到subprocess"""
+    with FakeAdbServer() as server:
+        port = server.port
+    os.environ['ANDROID_ADB_SERVER_PORT'] = str(port)
+    try:
+        success, stdout, stderr = adb.run_adb_command(['shell', 'true'], timeout=5)
+        # 本机未安装adb时subprocess会报告错误而不是抛出异常
+        assert isinstance(success, bool) and isinstance(stderr, str)
+    finally:
+        adb.close_sessions()
+        del os.environ['ANDROID_ADB_SERVER_PORT']
+
+
+def test_no_retry_after_send():
+    """命令写入会话后设备关闭shell时返回失败，不再经subprocess执行第二次"""
+    fallbacks = []
+    original = adb._run_subprocess
+    adb._run_subprocess = lambda *args: fallbacks.append(args) or (True, '', '')
+    with FakeAdbServer() as server, tempfile.TemporaryDirectory() as directory:
+        os.environ['ANDROID_ADB_SERVER_PORT'] = str(server.port)
+        marker = os.path.join(directory, 'ran')
+        try:
+            success, _, stderr = adb.run_adb_command(['shell', f'echo x >> {marker}; exit'])
+            assert not success and 'after sending' in stderr
+            assert fallbacks == []
+            with open(marker) as f:
+                assert f.read() == 'x\n'
+            # 打开会话失败时命令还没有发出，仍然回退
+            server.shutdown()
+            server.server_close()
+            adb.close_sessions()
+            assert adb.run_adb_command(['shell', 'true'], timeout=5) == (True, '', '')
+            assert len(fallbacks) == 1
+        finally:
+            adb._run_subprocess = original
+            adb.close_sessions()
+            del os.environ['ANDROID_ADB_SERVER_PORT']
+
+
+def test_session_faster_than_reconnect():
+    """会话模式应明显快于每条命令重新连接"""
+    count = 30
+    with FakeAdbServer() as server:
+        client = AdbClient(port=server.port)
+        start = time.perf_counter()
+        for _ in range(count):
+            client.shell('true')
+        per_connection = time.perf_counter() - start
+        with ShellSession(client) as session:
+            start = time.perf_counter()
+            session.run_many(['true'] * count)
+            pipelined = time.perf_counter() - start
+    print(f"逐条连接: {per_connection * 1000:.1f}ms, 流水线会话: {pipelined * 1000:.1f}ms")
+    assert pipelined < per_connection
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 共享ADB会话层测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
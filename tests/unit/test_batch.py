@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+批量调用测试：一个往返返回全部结果、只读子请求共用状态快照、拒绝的子请求、旧服务器的退回与基准输出（使用本地替身）
+"""
+
+import itertools
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.batch import MAX_BATCH_REQUESTS, WORKFLOW, BatchClient, BatchError, bench, snapshot_consistent
+from common.fake_webserver import DEFAULT_API_KEY, FakeWebServer, Response
+from common.http_client import HttpSession
+
+HEADERS = {'X-API-Key': DEFAULT_API_KEY}
+
+
+def session(server):
+    return HttpSession('127.0.0.1', server.port, headers=HEADERS)
+
+
+def test_one_round_trip():
+    """远程控制流程的4个调用在一个请求中完成"""
+    with FakeWebServer() as server, session(server) as http:
+        client = BatchClient(http)
+        results = client.call(WORKFLOW)
+        assert client.supported is True and client.round_trips == 1
+        assert sum(server.responses.values()) == 1 and server.wifi_enabled
+    assert [result.path for result in results] == list(WORKFLOW)
+    assert all(result.status == 200 for result in results)
+    assert results[2].body['success'] and results[3].body['data']['apiKey'] == DEFAULT_API_KEY
+    assert snapshot_consistent(results)
+
+
+def test_shared_snapshot():
+    """状态每次读取都会变化时，逐个请求得到不同的状态，批量请求中两者一致"""
+    ticks = itertools.count()
+    with FakeWebServer(clock=lambda: next(ticks) * 10.0) as server, session(server) as http:
+        paths = ['/api/status', '/api/system/info']
+        assert snapshot_consistent(BatchClient(http).call(paths))
+        assert not snapshot_consistent(BatchClient(http, supported=False).call(paths))
+
+
+def test_rejected():
+    """不允许的子请求单独返回400，格式错误与非POST请求整体拒绝，超出上限时自动拆分"""
+    with FakeWebServer(developer_mode=True) as server, session(server) as http:
+        api_key = server.api_key
+        results = BatchClient(http).call(['/api/batch', '/api/status/stream', '/api/generate-key', '/api/test'])
+        assert [result.status for result in results] == [400, 400, 400, 200]
+        assert server.api_key == api_key
+        assert http.post('/api/batch', '{"requests": [{}]}').status == 400
+        assert http.get('/api/batch').status == 405
+        client = BatchClient(http)
+        assert len(client.call(['/api/test'] * (MAX_BATCH_REQUESTS + 1))) == MAX_BATCH_REQUESTS + 1
+        assert client.round_trips == 2
+    with FakeWebServer(auth_enabled=True) as server, HttpSession('127.0.0.1', server.port) as http:
+        try:
+            BatchClient(http).call(['/api/status'])
+            assert False, 'unauthorized batch accepted'
+        except BatchError as e:
+            assert 'HTTP 401' in str(e)
+
+
+class _OldServer(FakeWebServer):
+
+    def handle_api_request_internal(self, path, request):
+        if path == '/api/batch':
+            return Response(404, 'application/json; charset=utf-8', '{"error": "Not Found"}')
+        return super().handle_api_request_internal(path, request)
+
+
+def test_fallback():
+    """旧版本应用返回404时退回逐个请求，之后不再尝试批量"""
+    with _OldServer() as server, session(server) as http:
+        client = BatchClient(http)
+        first = client.call(WORKFLOW)
+        second = client.call(WORKFLOW)
+    assert client.supported is False and client.round_trips == 1 + 2 * len(WORKFLOW)
+    assert [result.status for result in first + second] == [200] * 8
+    assert first[0].body['data']['battery'] > 0 and server.wifi_enabled
+
+
+def test_bench():
+    """基准输出：三种方式的往返次数与服务器请求数"""
+    report = bench(rounds=3, profile='ideal')
+    modes = report['modes']
+    assert modes['close']['connections'] == modes['close']['server_requests'] == 3 * len(WORKFLOW)
+    assert modes['keep-alive']['connections'] == 1
+    assert modes['batch']['round_trips'] == modes['batch']['server_requests'] == 3
+    assert all(result['failures'] == 0 for result in modes.values())
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 批量调用测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+DnsForwarder 应答缓存测试：TTL与否定缓存、缓存键、LRU淘汰、并发合并，以及替身上游上的负载基准
+"""
+
+import asyncio
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.dns_cache import DnsCache, StandInUpstream, build_query, compare, parse_query
+
+
+# 基准只在进程内运行（common.orchestrator 的推断会把查询数当成端口）
+RESOURCES = {'test_bench': []}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def stand_in(latency=0):
+    upstream = StandInUpstream(latency)
+    return upstream, lambda query: upstream.handle(query, False)
+
+
+def ttl_of(response):
+    """第一条应答（或权威）记录的TTL"""
+    i = response.index(b'\x00', 12) + 5
+    i += 2 if response[i] & 0xC0 else 1
+    return struct.unpack_from('>I', response, i + 4)[0]
+
+
+def test_ttl():
+    """命中时改写ID与名字的大小写并递减TTL，过期后重新查询；否定应答按SOA最小TTL缓存"""
+    async def run():
+        clock = Clock()
+        cache = DnsCache(clock=clock)
+        upstream, resolve = stand_in()
+        first = await cache.resolve('net', build_query('host1.example.', qid=1), False, resolve)
+        clock.now += 100
+        query = build_query('HoSt1.Example.', qid=2)
+        second = await cache.resolve('net', query, False, resolve)
+        assert upstream.queries == 1 and second[:2] == b'\x00\x02' and second[12:len(query)] == query[12:]
+        assert ttl_of(first) == StandInUpstream.TTL and ttl_of(second) == StandInUpstream.TTL - 100
+        clock.now += StandInUpstream.TTL
+        await cache.resolve('net', query, False, resolve)
+        assert upstream.queries == 2
+        # hostN 在 N % 7 == 3 时TTL为1秒
+        for _ in range(2):
+            await cache.resolve('net', build_query('host3.example.'), False, resolve)
+            clock.now += 1
+        assert upstream.queries == 4
+        for _ in range(3):
+            response = await cache.resolve('net', build_query('missing9.example.'), False, resolve)
+        assert upstream.queries == 5 and response[3] & 0xF == 3
+        clock.now += StandInUpstream.NEGATIVE_TTL
+        await cache.resolve('net', build_query('missing9.example.'), False, resolve)
+        assert upstream.queries == 6 and cache.hits == 3
+    asyncio.run(run())
+
+
+def test_keys():
+    """类型、DO位、有无EDNS与上游网络不同时不共用缓存，太大的应答不给不支持EDNS的UDP客户端"""
+    async def run():
+        cache = DnsCache(clock=Clock())
+        upstream, resolve = stand_in()
+        await cache.resolve('net', build_query('host1.example.'), False, resolve)
+        await cache.resolve('net', build_query('host1.example.', qtype=28), False, resolve)
+        await cache.resolve('net', build_query('host1.example.', edns_size=1232, dnssec_ok=True), False, resolve)
+        assert upstream.queries == 3 and len(cache.entries) == 3
+        # 带不带OPT的应答不同（RFC 6891 7），不能互相顶替
+        response = await cache.resolve('net', build_query('host1.example.', edns_size=1232), False, resolve)
+        assert upstream.queries == 4 and struct.unpack_from('>H', response, 10)[0] == 1
+        response = await cache.resolve('net', build_query('host1.example.'), False, resolve)
+        assert upstream.queries == 4 and struct.unpack_from('>H', response, 10)[0] == 0
+        await cache.resolve('wifi', build_query('host1.example.'), False, resolve)
+        assert upstream.queries == 5 and len(cache.entries) == 1
+        assert parse_query(build_query('host1.example.'), False).max_size == 512
+        assert parse_query(build_query('host1.example.', edns_size=4096), False).max_size == 4096
+        assert parse_query(build_query('host1.example.'), True).max_size == 65535
+
+        async def large(query):
+            response = bytearray(await upstream.handle(query, False))
+            record = response[len(query):]
+            response[6:8] = struct.pack('>H', 60)
+            return bytes(response) + bytes(record) * 59
+        cache = DnsCache(clock=Clock())
+        before = upstream.queries
+        for tcp in (False, False, True):
+            response = await cache.resolve('net', build_query('host2.example.'), tcp, large)
+        assert len(response) > 512 and upstream.queries == before + 2
+    asyncio.run(run())
+
+
+def test_eviction():
+    """超出条数上限时淘汰最久未用的条目"""
+    async def run():
+        cache = DnsCache(max_entries=3, clock=Clock())
+        upstream, resolve = stand_in()
+        for index in (1, 2, 4, 1, 5):
+            await cache.resolve('net', build_query(f'host{index}.example.'), False, resolve)
+        assert [key[0] for key in cache.entries] == ['host4.example.', 'host1.example.', 'host5.example.']
+        assert cache.bytes == sum(len(answer.wire) for answer in cache.entries.values())
+        assert upstream.queries == 4
+    asyncio.run(run())
+
+
+def test_coalescing():
+    """同一个名字并发的未命中只查询一次上游；发起查询的一方被取消时其余的自己查询"""
+    async def run():
+        cache = DnsCache()
+        upstream, resolve = stand_in(latency=0.05)
+        responses = await asyncio.gather(*(cache.resolve('net', build_query('host1.example.', qid=qid), False,
+                                                         resolve) for qid in range(10)))
+        assert upstream.queries == 1 and cache.coalesced == 9
+        assert [response[:2] for response in responses] == [struct.pack('>H', qid) for qid in range(10)]
+        owner = asyncio.ensure_future(cache.resolve('net', build_query('host2.example.'), False, resolve))
+        await asyncio.sleep(0.01)
+        waiters = asyncio.gather(*(cache.resolve('net', build_query('host2.example.'), False, resolve)
+                                   for _ in range(3)))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        assert all(response[3] & 0xF == 0 for response in await waiters)
+        assert cache.in_flight == {} and upstream.queries == 5
+    asyncio.run(run())
+
+
+def test_bench():
+    """替身上游上的负载：所有应答正确，缓存减少上游查询并提高吞吐"""
+    report = compare(queries=1500, names=300, concurrency=16, latency=0.01)
+    assert report['problems'] == [], report['problems']
+    direct, cached = report['modes']['direct'], report['modes']['cached']
+    assert direct['protocols']['tcp']['count'] and direct['protocols']['udp']['count']
+    assert cached['hit_ratio'] > 0.5 and direct['hit_ratio'] == 0
+    # TTL很短的名字过期后会再次查询上游
+    assert cached['distinct_names'] <= cached['upstream_queries'] < direct['upstream_queries'] / 2
+    assert cached['latency_us']['p50'] < direct['latency_us']['p50']
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 DnsForwarder 应答缓存测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+OkHttpWebServer 替身测试：路由、认证、响应头、状态缓存与故障注入
+"""
+
+import json
+import os
+import socket
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.fake_webserver import DEFAULT_API_KEY, FAVICON, FakeWebServer, Profile
+from common.loadgen import run_load
+
+KEY = {'X-API-Key': DEFAULT_API_KEY}
+
+
+def raw_request(port, data, timeout=5):
+    """发送原始请求字节，返回 (状态码, 响应头字典, body字节)"""
+    with socket.create_connection(('127.0.0.1', port), timeout=timeout) as sock:
+        sock.sendall(data)
+        response = b''
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+    head, _, body = response.partition(b'\r\n\r\n')
+    lines = head.decode('utf-8').split('\r\n')
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name] = value.strip()
+    return int(lines[0].split()[1]), headers, body
+
+
+def get(port, path, headers=None, method='GET', body=''):
+    lines = [f'{method} {path} HTTP/1.1', 'Host: localhost', 'Connection: close']
+    lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    if body:
+        lines.append(f'Content-Length: {len(body.encode())}')
+    return raw_request(port, ('\r\n'.join(lines) + '\r\n\r\n' + body).encode('utf-8'))
+
+
+def test_response_headers():
+    """响应头与原实现一致，客户端要求关闭时返回 Connection: close"""
+    with FakeWebServer() as server:
+        status, headers, body = get(server.port, '/api/test', KEY)
+    assert status == 200 and json.loads(body) == {'test': 'ok'}
+    assert list(headers) == ['Content-Type', 'Content-Length', 'Access-Control-Allow-Origin',
+                             'Access-Control-Allow-Methods', 'Access-Control-Allow-Headers', 'Connection']
+    assert headers['Connection'] == 'close'
+    assert headers['Content-Length'] == str(len(body))
+    assert headers['Content-Type'] == 'application/json; charset=utf-8'
+
+
+def test_keep_alive():
+    """HTTP/1.1默认复用连接；HTTP/1.0、HEAD 和 Connection: close 在响应后关闭"""
+    request = b'GET /api/test HTTP/1.1\r\nHost: localhost\r\nX-API-Key: k\r\n\r\n'
+    with FakeWebServer() as server:
+        # 两个请求一次发出（流水线），最后一个要求关闭，读到EOF即说明连接按预期关闭
+        status, headers, body = raw_request(server.port, request + request.replace(
+            b'\r\n\r\n', b'\r\nConnection: close\r\n\r\n'))
+        assert status == 200 and headers['Connection'] == 'keep-alive'
+        assert body.count(b'HTTP/1.1 200 OK') == 1 and body.endswith(b'{"test": "ok"}')
+        assert server.connections == 1 and server.responses == {200: 2}
+
+        for data in (b'GET /api/test HTTP/1.0\r\nX-API-Key: k\r\n\r\n',
+                     b'HEAD /api/test HTTP/1.1\r\nX-API-Key: k\r\n\r\n'):
+            status, headers, _ = raw_request(server.port, data)
+            assert status == 200 and headers['Connection'] == 'close'
+        status, headers, _ = raw_request(
+            server.port, b'GET /api/test HTTP/1.0\r\nConnection: keep-alive\r\nX-API-Key: k\r\n\r\n'
+            + request.replace(b'\r\n\r\n', b'\r\nConnection: close\r\n\r\n'))
+        assert headers['Connection'] == 'keep-alive'
+
+
+def test_routing_without_auth():
+    """认证关闭时的页面、API与404"""
+    with FakeWebServer() as server:
+        status, headers, body = get(server.port, '/')
+        assert status == 200 and '热点控制面板'.encode() in body
+        assert get(server.port, '/api/status', KEY)[0] == 200
+        # 与原实现一致：即使认证关闭，不带任何Key的API请求也返回401
+        assert get(server.port, '/api/status')[0] == 401
+        assert get(server.port, '/nothing') == (404, get(server.port, '/nothing')[1], b'404 Not Found')
+        status, _, body = get(server.port, '/api/unknown', KEY)
+        assert status == 404 and json.loads(body)['message'] == 'API endpoint not found'
+        status, _, body = get(server.port, '/favicon.ico')
+        assert status == 200 and body == FAVICON.decode('latin-1').encode('utf-8')
+
+
+def test_api_key_prefix_and_headers():
+    """认证开启时支持路径前缀、Bearer、X-API-Key 和 api_key 参数"""
+    with FakeWebServer(auth_enabled=True) as server:
+        port = server.port
+        assert get(port, f'/{DEFAULT_API_KEY}')[0] == 200
+        assert get(port, f'/{DEFAULT_API_KEY}/api/status')[0] == 200
+        assert get(port, f'/{DEFAULT_API_KEY}/other')[0] == 404
+        assert get(port, '/api/status', {'Authorization': f'Bearer {DEFAULT_API_KEY}'})[0] == 200
+        assert get(port, '/api/status', {'X-API-Key': DEFAULT_API_KEY})[0] == 200
+        assert get(port, f'/api/status?api_key={DEFAULT_API_KEY}')[0] == 200
+        status, _, body = get(port, '/api/status')
+        assert status == 401 and json.loads(body)['message'] == 'Invalid or missing API Key'
+        status, _, body = get(port, '/wrong_key_0123456789')
+        assert status == 401 and json.loads(body)['message'] == 'Invalid API Key'
+        status, _, body = get(port, '/')
+        assert status == 200 and '需要API Key访问'.encode() in body
+        # auth-status 无需认证
+        assert json.loads(get(port, '/api/auth-status')[2])['data']['enabled'] is True
+
+
+def test_developer_endpoints():
+    """开发者接口需要开发者模式，toggle-auth 只接受POST"""
+    with FakeWebServer() as server:
+        status, headers, body = get(server.port, '/api/generate-key')
+        assert status == 403 and json.loads(body)['error'] == 'Forbidden'
+    with FakeWebServer(developer_mode=True) as server:
+        assert get(server.port, '/api/toggle-auth')[0] == 405
+        status, _, body = get(server.port, '/api/toggle-auth', method='POST', body='{"enabled":true}')
+        assert status == 200 and server.auth_enabled
+        new_key = json.loads(get(server.port, '/api/generate-key')[2])['data']['apiKey']
+        assert new_key == server.api_key != DEFAULT_API_KEY
+        assert get(server.port, f'/{new_key}/api/status')[0] == 200
+
+
+def test_malformed_requests():
+    """请求行与头部解析失败返回500，请求体过大返回413"""
+    with FakeWebServer() as server:
+        assert raw_request(server.port, b'\r\n')[0] == 500
+        assert raw_request(server.port, b'BREW /pot HTTP/1.1\r\n\r\n')[0] == 500
+        assert raw_request(server.port, b'GET /\r\n\r\n')[0] == 500
+        too_many = b''.join(b'X-H%d: v\r\n' % n for n in range(101))
+        assert raw_request(server.port, b'GET / HTTP/1.1\r\n' + too_many + b'\r\n')[0] == 500
+        big = b'POST /api/test HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % (1024 * 1024 + 1)
+        assert raw_request(server.port, big)[0] == 413
+
+
+def test_request_bodies():
+    """Content-Length按字节读完非ASCII的请求体、chunked请求体解码后，同一连接上的下一个请求不错位；
+    无法恰好读完的请求体应答错误并关闭连接"""
+    follow = b'GET /api/test HTTP/1.1\r\nX-API-Key: k\r\nConnection: close\r\n\r\n'
+    body = '{"name": "热点"}'.encode('utf-8')
+    with FakeWebServer() as server:
+        status, headers, rest = raw_request(server.port, b'POST /api/test HTTP/1.1\r\nX-API-Key: k\r\n'
+                                            b'Content-Length: %d\r\n\r\n' % len(body) + body + follow)
+        assert status == 200 and headers['Connection'] == 'keep-alive'
+        assert rest.count(b'HTTP/1.1 200 OK') == 1 and server.responses == {200: 2}
+        chunked = b'POST /api/test HTTP/1.1\r\nX-API-Key: k\r\nTransfer-Encoding: chunked\r\n\r\n' \
+                  b'4;ext=1\r\n{"a"\r\n8\r\n: "\xe7\x83\xad"}\r\n0\r\nX-Trailer: 1\r\n\r\n'
+        status, _, rest = raw_request(server.port, chunked + follow)
+        assert status == 200 and rest.count(b'HTTP/1.1 200 OK') == 1
+        for data, expected in ((b'Transfer-Encoding: gzip, chunked\r\n\r\n', 501),
+                               (b'Transfer-Encoding: chunked\r\nContent-Length: 3\r\n\r\nabc', 400),
+                               (b'Content-Length: -1\r\n\r\n', 400),
+                               (b'Transfer-Encoding: chunked\r\n\r\n3\r\nabcd\r\n0\r\n\r\n', 400)):
+            status, headers, rest = raw_request(server.port, b'POST /api/test HTTP/1.1\r\n' + data + follow)
+            assert (status, headers['Connection']) == (expected, 'close') and b'HTTP/1.1' not in rest, data
+
+
+def test_status_cache():
+    """2秒内的状态请求命中缓存，timestamp 每次重新生成"""
+    now = [100.0]
+    with FakeWebServer(clock=lambda: now[0]) as server:
+        first = json.loads(get(server.port, '/api/status', KEY)[2])['data']
+        second = json.loads(get(server.port, '/api/system/info', KEY)[2])['data']
+        assert server.status_refreshes == 1 and server.status_cache_hits == 1
+        assert first['battery'] == second['battery'] and isinstance(first['cpu'], float)
+        now[0] += 2.5
+        get(server.port, '/api/status', KEY)
+        assert server.status_refreshes == 2
+
+
+def test_failure_injection():
+    """按配置注入故障，负载生成器能统计到错误"""
+    profile = Profile(failure_rate=0.5, failure='reset', paths=[f'/{DEFAULT_API_KEY}/api/status'], seed=3)
+    with FakeWebServer(profile=profile) as server:
+        results = run_load(port=server.port, mix=[(f'/{DEFAULT_API_KEY}/api/status', 1), ('/', 1)],
+                           concurrency=4, requests=100, seed=1)
+    assert results['paths']['/']['errors'] == {}
+    status_stats = results['paths'][f'/{DEFAULT_API_KEY}/api/status']
+    assert 0 < sum(status_stats['errors'].values()) < status_stats['requests']
+    with FakeWebServer(profile=Profile(failure_rate=1.0, failure='error')) as server:
+        assert get(server.port, '/api/test', KEY)[0] == 500
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 OkHttpWebServer 替身测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+设备群检查测试：清单解析、并发检查与报告汇总（每台“设备”是一个本地OkHttpWebServer替身）
+"""
+
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.adb import AdbClient
+from common.fake_adb import FakeAdbServer
+from common.fake_webserver import DEFAULT_API_KEY, FakeWebServer, Profile
+from common.fleet import Device, format_report, parse_inventory, sweep
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_parse_inventory():
+    """JSON与文本两种清单格式"""
+    devices = parse_inventory('''
+        # 热点手机
+        192.168.1.133
+        192.168.1.134:10000 other_key phone-b
+    ''')
+    assert [(d.name, d.ip, d.port, d.api_key, d.serial) for d in devices] == [
+        ('192.168.1.133', '192.168.1.133', 9999, DEFAULT_API_KEY, '192.168.1.133:5555'),
+        ('phone-b', '192.168.1.134', 10000, 'other_key', '192.168.1.134:5555'),
+    ]
+    devices = parse_inventory('{"devices": [{"ip": "10.0.0.2", "port": 10001, "serial": "R58M"}]}')
+    assert devices[0].name == '10.0.0.2:10001' and devices[0].serial == 'R58M'
+    assert 'X-API-Key' not in parse_inventory('[{"ip": "10.0.0.3", "api_key": ""}]')[0].headers()
+
+
+def test_sweep_takes_slowest_not_sum():
+    """8台设备各需约0.3秒，并发检查的总耗时接近最慢的一台"""
+    servers = [FakeWebServer(profile=Profile(latency=0.1)).__enter__() for _ in range(8)]
+    try:
+        devices = [Device('127.0.0.1', server.port, name=f'phone-{i}') for i, server in enumerate(servers)]
+        report = sweep(devices, concurrency=8, wifi=True, check_adb=False)
+    finally:
+        for server in servers:
+            server.__exit__(None, None, None)
+    assert report['passed'] == report['total'] == 8
+    assert report['checks']['status']['passed'] == 8 and report['checks']['wifi_stop']['passed'] == 8
+    assert report['slowest_ms'] >= 300
+    assert report['wall_ms'] < report['serial_ms'] / 3, report
+    assert not any(server.wifi_enabled for server in servers)
+
+
+def test_concurrency_is_bounded():
+    """concurrency=2 时4台设备分两批进行"""
+    servers = [FakeWebServer(profile=Profile(latency=0.2)).__enter__() for _ in range(4)]
+    try:
+        devices = [Device('127.0.0.1', server.port, name=f'phone-{i}') for i, server in enumerate(servers)]
+        start = time.monotonic()
+        report = sweep(devices, concurrency=2, check_adb=False)
+        elapsed = time.monotonic() - start
+    finally:
+        for server in servers:
+            server.__exit__(None, None, None)
+    assert report['passed'] == 4
+    assert 0.4 <= elapsed < 0.8, elapsed
+
+
+def test_failures_are_reported_per_device():
+    """连接失败、API Key错误和adb未连接分别记录在对应设备上"""
+    with FakeWebServer(auth_enabled=True) as server:
+        devices = [
+            Device('127.0.0.1', server.port, name='good', serial='good-serial'),
+            Device('127.0.0.1', server.port, api_key='wrong_key', name='bad-key', serial='good-serial'),
+            Device('127.0.0.1', free_port(), name='offline', serial='offline-serial'),
+        ]
+        with FakeAdbServer(serials=('good-serial',)) as adb:
+            report = sweep(devices, adb_client=AdbClient(port=adb.port))
+    results = {device['name']: device for device in report['devices']}
+    assert results['good']['ok']
+    assert results['good']['checks']['adb']['ok']
+    assert not results['bad-key']['ok'] and results['bad-key']['checks']['status']['detail'] == 'HTTP 401'
+    assert not results['offline']['checks']['adb']['ok']
+    assert not results['offline']['checks']['connect']['ok'] and 'status' not in results['offline']['checks']
+    assert report['checks']['connect']['passed'] == 2 and report['passed'] == 1
+
+    markdown = format_report(report)
+    assert '| offline |' in markdown and '❌ ConnectionRefusedError' in markdown
+    assert '| connect | 2/3 |' in markdown
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 设备群检查测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
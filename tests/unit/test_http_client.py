@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+持久连接客户端测试：连接复用、单连接请求上限、空闲关闭与只对幂等请求重试、对比基准（使用本地OkHttpWebServer替身）
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.fake_webserver import DEFAULT_API_KEY, FakeWebServer
+from common.http_client import HttpSession, bench
+
+KEY = {'X-API-Key': DEFAULT_API_KEY}
+
+
+def test_reuses_connection():
+    """连续轮询只建立一条连接"""
+    with FakeWebServer() as server, HttpSession('127.0.0.1', server.port, headers=KEY) as session:
+        for _ in range(20):
+            response = session.get('/api/status')
+            assert response.status == 200 and 'battery' in response.json()['data']
+        assert response.headers['Connection'] == 'keep-alive'
+        assert response.headers['Keep-Alive'] == 'timeout=5, max=100'
+        assert session.connections_opened == 1 and session.reused == 19
+        assert server.connections == 1
+
+
+def test_close_mode():
+    """keep_alive=False 时每个请求一条连接，与原来的行为一致"""
+    with FakeWebServer() as server, HttpSession('127.0.0.1', server.port, headers=KEY, keep_alive=False) as session:
+        for _ in range(5):
+            response = session.get('/api/status')
+            assert response.status == 200 and response.headers['Connection'] == 'close'
+        assert session.connections_opened == 5 and server.connections == 5
+
+
+def test_max_requests_per_connection():
+    """服务器达到单连接请求上限时回复 Connection: close，客户端换新连接"""
+    with FakeWebServer(max_keep_alive_requests=3) as server, \
+            HttpSession('127.0.0.1', server.port, headers=KEY) as session:
+        statuses = [session.get('/api/status').status for _ in range(7)]
+        assert statuses == [200] * 7
+        assert session.connections_opened == 3 and session.retries == 0
+        assert server.connections == 3
+
+
+def test_server_idle_timeout():
+    """服务器先于客户端关闭空闲连接时，取连接时发现并丢弃，请求直接用新连接发出"""
+    with FakeWebServer(keep_alive_timeout=0.2) as server, \
+            HttpSession('127.0.0.1', server.port, headers=KEY, idle_timeout=10) as session:
+        assert session.get('/api/status').status == 200
+        time.sleep(0.5)
+        assert session.post('/api/wifi/start').json()['success']
+        assert session.retries == 0 and session.connections_opened == 2
+        assert server.wifi_enabled
+
+
+def test_retry_only_idempotent():
+    """服务器处理请求后断开复用的连接：GET换新连接重试一次，POST不重发而是报错"""
+    with FakeWebServer() as server, HttpSession('127.0.0.1', server.port, headers=KEY) as session:
+        routed = []
+        route = server.route
+        server.route = lambda request: routed.append(request.uri) or route(request)
+        failures = []
+        server.profile.pick_failure = lambda uri: failures.pop() if failures else None
+        session.get('/api/status')
+        failures.append('reset')
+        assert session.get('/api/status').status == 200
+        assert session.retries == 1 and routed.count('/api/status') == 3
+        failures.append('reset')
+        try:
+            session.post('/api/wifi/start')
+            assert False, 'POST 不应重发'
+        except OSError:
+            pass
+        assert routed.count('/api/wifi/start') == 1 and session.retries == 1
+
+
+def test_client_idle_timeout():
+    """空闲超过 idle_timeout 的连接不再复用"""
+    with FakeWebServer() as server, \
+            HttpSession('127.0.0.1', server.port, headers=KEY, idle_timeout=0.1) as session:
+        session.get('/api/status')
+        time.sleep(0.2)
+        session.get('/api/status')
+        assert session.connections_opened == 2 and session.retries == 0
+
+
+def test_server_stop_closes_idle_connections():
+    """停止替身时空闲连接立即被关闭，不必等满空闲超时"""
+    server = FakeWebServer().__enter__()
+    session = HttpSession('127.0.0.1', server.port, headers=KEY)
+    session.get('/api/status')
+    connection, _ = session._idle[0]
+    start = time.monotonic()
+    server.__exit__(None, None, None)
+    connection.sock.settimeout(2)
+    assert connection.sock.recv(1) == b''
+    assert time.monotonic() - start < 1
+    session.close()
+
+
+def test_bench():
+    """基准对比：复用模式只新建clients条连接"""
+    results = bench(clients=2, requests=40)
+    assert results['close']['connections_opened'] == 40 and results['close']['server_connections'] == 40
+    assert results['keep_alive']['connections_opened'] == 2 and results['keep_alive']['server_connections'] == 2
+    assert results['close']['errors'] == 0 and results['keep_alive']['errors'] == 0
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 持久连接客户端测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
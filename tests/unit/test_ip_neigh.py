@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+IpNeighbour.parse 参考实现测试：从Kotlin源码读取正则、两种前端在语料上逐字段一致、解析语义与基准输出
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.ip_neigh import (ALL_ZEROS, PARSER, Neighbour, bench, corpus_names, differences, kotlin_pattern,
+                             load_corpus, match_regex, match_tokens, parse, parse_arp, parse_mac, synthetic)
+
+ARP = parse_arp(
+    "IP address       HW type     Flags       HW address            Mask     Device\n"
+    "192.168.43.10    0x1         0x2         aa:bb:cc:dd:ee:01     *        wlan1\n"
+    "192.168.43.11    0x1         0x2         aa:bb:cc:dd:ee:02     *        wlan1\n"
+    "192.168.43.11    0x1         0x2         aa:bb:cc:dd:ee:03     *        wlan1\n")
+
+
+def test_kotlin_pattern():
+    """正则从 IpNeighbour.kt 中完整读出（拼接字符串字面量并去掉转义）"""
+    pattern = kotlin_pattern()
+    assert pattern.startswith('^(Deleted )?(?:([^ ]+) )?dev ([^ ]+) (?:lladdr ([^ ]*))?')
+    assert pattern.endswith('(?: ([INCOMPLET,RAHBSDYF]+))?$')
+    assert PARSER.pattern == pattern
+
+
+def test_fronts_agree_on_corpus():
+    """正则与分词前端在采集语料、边界用例与合成语料上逐字段一致"""
+    names = corpus_names()
+    assert 'monitor.txt' in names and 'edge_cases.txt' in names
+    for name in names:
+        lines = load_corpus(name)
+        assert lines, name
+        for full_mode in (True, False):
+            assert differences(lines, full_mode, indextoname={17: 'wlan1'}, arp=ARP) == [], name
+    assert differences(synthetic(5000, seed=7)) == []
+
+
+def test_fronts_fields():
+    """典型行与容易出错的行"""
+    for line, expected in [
+        ('192.168.43.2 dev wlan1 lladdr aa:bb:cc:dd:ee:ff REACHABLE',
+         (False, '192.168.43.2', 'wlan1', 'aa:bb:cc:dd:ee:ff', 'REACHABLE')),
+        ('Deleted fe80::1 dev rndis0 lladdr 02:00:00:00:00:01 router STALE',
+         (True, 'fe80::1', 'rndis0', '02:00:00:00:00:01', 'STALE')),
+        ('192.168.43.3 dev wlan1  FAILED', (False, '192.168.43.3', 'wlan1', None, 'FAILED')),
+        ('dev wlan1 lladdr aa:bb:cc:dd:ee:ff ', (False, None, 'wlan1', 'aa:bb:cc:dd:ee:ff', '')),
+        ('192.168.43.4 dev wlan1 lladdr  PROBE', (False, '192.168.43.4', 'wlan1', '', 'PROBE')),
+        ('192.168.43.5 dev wlan1 lladdr aa:bb:cc:dd:ee:ff ref 1 used 0/0/0 probes 4 stale',
+         (False, '192.168.43.5', 'wlan1', 'aa:bb:cc:dd:ee:ff', '')),
+        ('192.168.43.6 dev wlan1', None),
+        ('192.168.43.6 wlan1 lladdr aa:bb:cc:dd:ee:ff STALE', None),
+    ]:
+        assert match_regex(line) == expected, line
+        assert match_tokens(line) == expected, line
+
+
+def test_states():
+    """状态映射：Deleted、INCOMPLETE、VALID、FAILED，NOARP与未知状态跳过"""
+    mac = 'aa:bb:cc:dd:ee:ff'
+    assert parse(f'192.168.43.2 dev wlan1 lladdr {mac} STALE') == [Neighbour('192.168.43.2', 'wlan1', mac, 'VALID')]
+    assert parse(f'Deleted 192.168.43.2 dev wlan1 lladdr {mac} STALE')[0].state == 'DELETING'
+    assert parse('192.168.43.2 dev wlan1  INCOMPLETE') == [Neighbour('192.168.43.2', 'wlan1', ALL_ZEROS,
+                                                                     'INCOMPLETE')]
+    assert parse(f'192.168.43.2 dev wlan1 lladdr {mac} FAILED')[0].state == 'FAILED'
+    assert parse('224.0.0.251 dev wlan1 lladdr 01:00:5e:00:00:fb NOARP') == []
+    assert parse(f'192.168.43.2 dev wlan1 lladdr {mac} PERMANENT,STALE') == []
+    assert parse('') == [] and parse('garbage') == [] and parse(f'dev wlan1 lladdr {mac} STALE') == []
+    assert parse(f'192.168.43.999 dev wlan1 lladdr {mac} STALE') == []
+
+
+def test_partial_mode():
+    """非fullMode时非VALID状态一律当作删除，MAC清零"""
+    assert parse('192.168.43.2 dev wlan1 lladdr aa:bb:cc:dd:ee:ff FAILED', full_mode=False) == [
+        Neighbour('192.168.43.2', 'wlan1', ALL_ZEROS, 'DELETING')]
+    assert parse('192.168.43.2 dev wlan1 lladdr aa:bb:cc:dd:ee:ff DELAY', full_mode=False)[0].state == 'VALID'
+
+
+def test_mac_and_arp_fallback():
+    """MacAddress.fromString 的校验、全零MAC时从ARP表补全（IPv4且唯一）"""
+    assert parse_mac('A:b:0C:dd:ee:ff') == '0a:0b:0c:dd:ee:ff'
+    assert parse_mac('aa:bb:cc:dd:ee') is None and parse_mac('aa:bb:cc:dd:ee:100') is None
+    assert parse_mac('aa:bb:cc:dd:ee:gg') is None and parse_mac('aa::cc:dd:ee:ff') is None
+    assert parse('192.168.43.10 dev wlan1 lladdr 00:00:00:00:00:00 STALE', arp=ARP) == [
+        Neighbour('192.168.43.10', 'wlan1', 'aa:bb:cc:dd:ee:01', 'VALID')]
+    assert parse('192.168.43.10 dev wlan1 lladdr bad STALE', arp=ARP)[0].lladdr == 'aa:bb:cc:dd:ee:01'
+    assert parse('192.168.43.11 dev wlan1  STALE', arp=ARP) == []
+    assert parse('192.168.43.10 dev rndis0  STALE', arp=ARP) == []
+    assert parse('fe80::1 dev wlan1  STALE', arp=ARP) == []
+
+
+def test_dev_fallback():
+    """ifN 设备名额外产生一条按接口序号查到的名称"""
+    result = parse('192.168.43.2 dev if17 lladdr aa:bb:cc:dd:ee:ff STALE', indextoname={17: 'wlan1'})
+    assert [neighbour.dev for neighbour in result] == ['if17', 'wlan1']
+    assert len(parse('192.168.43.2 dev if18 lladdr aa:bb:cc:dd:ee:ff STALE', indextoname={17: 'wlan1'})) == 1
+
+
+def test_bench():
+    """基准输出：每种前端的行/秒、每轮纳秒/行与每行分配"""
+    results = bench(synthetic(500, seed=1), minimum=0.05, sample=200)
+    for name in ('regex', 'tokens', 'parse_regex', 'parse_tokens'):
+        assert results[name]['lines_per_s'] > 0 and len(results[name]['ns_per_line']) == 5
+        assert results[name]['peak_bytes_per_line'] > 0
+    assert results['speedup'] > 0
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 IpNeighbour.parse 参考实现测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
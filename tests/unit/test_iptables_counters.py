@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+TrafficRecorder 计数器解析测试：按下标扫描与正则切分逐行一致、doUpdate 的解析语义与基准输出
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.iptables_counters import (COLUMNS, CORPUS, SEPARATORS, SOURCE, bench, differences, flatness, parse_dump,
+                                      regex_columns, scan_columns, scanner_columns, synthetic_dump)
+
+CORPUS_RECORDS = {('192.168.43.118', 'wlan1'), ('192.168.43.57', 'wlan1'), ('192.168.42.129', 'rndis0'),
+                  ('192.168.44.2', 'bt-pan'), ('192.168.45.3', 'swlan0')}
+
+
+def read_corpus():
+    with open(CORPUS, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def test_kotlin_scanner():
+    """doUpdate 不再用正则切分，分隔符与 \\s 相同"""
+    with open(SOURCE, 'r', encoding='utf-8') as f:
+        source = f.read()
+    update = source[source.index('private fun doUpdate'):source.index('fun update(')]
+    assert 'toRegex' not in update and 'split(' not in update
+    assert 'scanColumns(line, columns) == COLUMNS' in update
+    assert set(SEPARATORS) == {chr(code) for code in range(128) if re.fullmatch(r'\s', chr(code), re.ASCII)}
+
+
+def test_scan_columns():
+    """只取前9列，重复使用同一个数组"""
+    columns = [''] * COLUMNS
+    assert scan_columns('  a\tb  c ', columns) == 3 and columns[:3] == ['a', 'b', 'c']
+    assert scan_columns(' '.join(str(i) for i in range(12)), columns) == COLUMNS
+    assert columns == [str(i) for i in range(COLUMNS)]
+    assert scan_columns('   ', columns) == 0
+    assert scanner_columns('1 2 3 4 5 6 7 8 9 10') == regex_columns('1 2 3 4 5 6 7 8 9 10')
+
+
+def test_corpus_agrees():
+    """采集语料上两种切分方式逐行一致，合成输出上解析结果一致"""
+    assert differences(read_corpus(), CORPUS_RECORDS) == []
+    text, records = synthetic_dump(300, seed=5)
+    assert differences(text, records) == []
+
+
+def test_parse_dump():
+    """doUpdate 的语义：第一次出现的计数、遗留规则与异常行"""
+    counters, warnings = parse_dump(read_corpus(), CORPUS_RECORDS)
+    assert counters[('192.168.43.118', 'wlan1')] == [1104, 126775, 1532, 1893420]
+    assert counters[('192.168.43.57', 'wlan1')] == [96012, 8120334, 208114, 301238877]
+    assert counters[('192.168.44.2', 'bt-pan')][2:] == [12884901888, 9223372036854775807]
+    assert counters[('192.168.45.3', 'swlan0')] == [-1, -1, 9, 540]
+    assert ('192.168.43.200', 'wlan1') not in counters
+    # 1.x遗留规则、RETURN、无效IP、列数不足
+    assert len(warnings) == 4, warnings
+
+
+def test_synthetic_dump():
+    """每个客户端两行，注册的客户端都有完整计数"""
+    text, records = synthetic_dump(50, legacy=3)
+    assert text.count('\n') == 2 + 2 * 53 + 1
+    counters, warnings = parse_dump(text, records)
+    assert warnings == [] and set(counters) == records
+    assert all(value >= 0 for record in counters.values() for value in record)
+
+
+def test_bench():
+    """基准输出：每个客户端数下两种切分方式的耗时与分配，扫描的临时分配更少"""
+    results = bench((5, 40), minimum=0.02)
+    assert [result['clients'] for result in results] == [5, 40]
+    for result in results:
+        assert result['mismatched'] == []
+        assert result['scanner']['bytes_per_line'] < result['regex']['bytes_per_line']
+        assert result['scanner']['update_us']['count'] > 0
+    assert flatness(results) > 0
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 TrafficRecorder 计数器解析测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
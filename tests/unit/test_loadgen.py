@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+负载生成器与延迟直方图测试：针对进程内的最小HTTP服务器离线运行
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.histogram import LatencyHistogram
+from common.loadgen import LoadGenerator, default_mix, parse_mix, run_load
+
+
+class TinyServer:
+    """在后台线程运行的最小HTTP服务器：/missing 返回404，其余返回200"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.port = None
+        self.requests = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    async def _handle(self, reader, writer):
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b''):
+            pass
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        path = request_line.split()[1].decode()
+        status, body = (404, b'404 Not Found') if path == '/missing' else (200, b'{"success": true}')
+        writer.write(b'HTTP/1.1 %d X\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % (status, len(body)) + body)
+        await writer.drain()
+        writer.close()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._handle, '127.0.0.1', 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def test_histogram_accuracy():
+    """直方图百分位与精确值的相对误差在0.1%以内"""
+    rng = random.Random(1)
+    values = [int(rng.lognormvariate(8, 1.5)) for _ in range(20000)]
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    values.sort()
+    for percent in (50, 90, 99, 99.9):
+        exact = values[max(0, int(percent / 100 * len(values) + 0.999999) - 1)]
+        approx = histogram.percentile(percent)
+        assert abs(approx - exact) <= max(1, exact * 0.001), (percent, approx, exact)
+    assert histogram.max == values[-1] and histogram.min == values[0]
+    assert len(histogram.counts) < 10000
+
+
+def test_histogram_merge():
+    """合并后的计数与分别记录一致"""
+    a, b, both = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for value in range(1, 5000, 7):
+        (a if value % 2 else b).record(value)
+        both.record(value)
+    a.merge(b)
+    assert a.counts == both.counts and a.total == both.total
+    assert a.summary() == both.summary()
+    assert set(a.summary()) >= {'p50', 'p99', 'p999', 'max'}
+
+
+def test_mix_parsing():
+    """请求组合解析与默认组合"""
+    mix = parse_mix('/api/status=5, /{apiKey}/api/status=2,/', api_key='KEY')
+    assert mix == [('/api/status', 5.0), ('/KEY/api/status', 2.0), ('/', 1.0)]
+    paths = [path for path, _ in default_mix('KEY')]
+    assert '/favicon.ico' in paths and '/KEY/api/system/info' in paths
+    assert all('KEY' not in path for path, _ in default_mix())
+
+
+def test_closed_loop():
+    """闭环模式按请求数上限运行，统计状态码"""
+    with TinyServer() as server:
+        results = run_load(port=server.port, mix=[('/api/status', 3), ('/missing', 1)],
+                           concurrency=8, duration=10, requests=200, seed=7)
+    overall = results['overall']
+    assert overall['requests'] == 200 == server.requests
+    assert set(overall['status_codes']) == {'200', '404'}
+    assert results['paths']['/missing']['status_codes'] == {'404': results['paths']['/missing']['requests']}
+    assert overall['latency_us']['p50'] > 0
+    json.dumps(results)
+
+
+def test_closed_loop_concurrency():
+    """并发worker同时等待慢响应，总耗时远小于串行"""
+    with TinyServer(delay=0.05) as server:
+        start = time.perf_counter()
+        results = run_load(port=server.port, mix=[('/', 1)], concurrency=10, requests=40)
+        elapsed = time.perf_counter() - start
+    assert results['overall']['requests'] == 40
+    assert elapsed < 40 * 0.05 / 2, elapsed
+
+
+def test_open_loop_rate():
+    """开环模式按固定速率发起请求，与响应快慢无关"""
+    with TinyServer(delay=0.02) as server:
+        results = run_load(port=server.port, mode='open', rate=200, duration=0.5, concurrency=50)
+    assert 80 <= results['overall']['requests'] <= 101, results['overall']['requests']
+    assert results['mode'] == 'open' and results['rate'] == 200
+
+
+def test_connection_errors_counted():
+    """服务器不可达时记录错误而不是抛出异常"""
+    with TinyServer() as server:
+        port = server.port
+    generator = LoadGenerator(port=port, mix=[('/', 1)], concurrency=2, requests=4, timeout=1)
+    results = asyncio.run(generator.run())
+    assert results['overall']['requests'] == 4
+    assert sum(results['overall']['errors'].values()) == 4
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 负载生成器测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+流式logcat读取器测试：通过adb server替身回放threadtime格式日志
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.adb import AdbClient
+from common.fake_adb import FakeAdbServer
+from common.logcat import LogcatStream, PatternMatcher, parse_line, scan_logs, watch_for_crash
+
+NORMAL_LINES = [
+    '--------- beginning of main',
+    '10-17 12:00:00.001  1234  1234 I ActivityManager: Start proc 4321:be.mygod.vpnhotspot/u0a123',
+    '10-17 12:00:00.120  4321  4350 I OkHttpWebServer: OkHttpWebServer started successfully on port 9999',
+    '10-17 12:00:00.200  4321  4321 D VPNHotspot: WebServer started',
+]
+
+CRASH_LINES = [
+    '10-17 12:00:01.000  4321  4321 E AndroidRuntime: FATAL EXCEPTION: main',
+    '10-17 12:00:01.000  4321  4321 E AndroidRuntime: Process: be.mygod.vpnhotspot, PID: 4321',
+    '10-17 12:00:01.000  4321  4321 E AndroidRuntime: java.lang.NullPointerException',
+]
+
+
+def replay_handler(lines, delay=0.0, hold=0.0, commands=None):
+    """构造替身的logcat处理器：逐行回放，随后保持连接hold秒模拟持续输出"""
+    def handler(command, conn):
+        if not command.startswith('logcat'):
+            return False
+        if commands is not None:
+            commands.append(command)
+        try:
+            for line in lines:
+                conn.sendall((line + '\n').encode('utf-8'))
+                time.sleep(delay)
+            time.sleep(hold)
+        except OSError:
+            pass
+        return True
+    return handler
+
+
+def test_parse_threadtime():
+    """解析threadtime格式"""
+    record = parse_line(CRASH_LINES[1])
+    assert record.pid == 4321 and record.tid == 4321
+    assert record.level == 'E' and record.tag == 'AndroidRuntime'
+    assert record.message == 'Process: be.mygod.vpnhotspot, PID: 4321'
+    assert parse_line('--------- beginning of main') is None
+    spaced = parse_line('10-17 12:00:00.120  4321  4350 W Some Tag  : hello: world')
+    assert spaced.tag == 'Some Tag' and spaced.message == 'hello: world'
+
+
+def test_pattern_matcher():
+    """多关键词单次匹配"""
+    matcher = PatternMatcher(['WebServer started', 'Port conflict', 'API Key'], ignore_case=True)
+    assert matcher.search('xx webserver STARTED yy') == 'WebServer started'
+    assert matcher.search('nothing here') is None
+    assert matcher.findall('api key ok, port conflict, API KEY again') == ['API Key', 'Port conflict']
+    assert PatternMatcher([]).search('anything') is None
+
+
+def test_crash_returns_early():
+    """出现FATAL EXCEPTION后立即返回，不等满时间窗口"""
+    commands = []
+    handler = replay_handler(NORMAL_LINES + CRASH_LINES, delay=0.01, hold=5, commands=commands)
+    with FakeAdbServer(shell_handler=handler) as server:
+        stream = LogcatStream(since='10-17 11:59:59.000', client=AdbClient(port=server.port))
+        start = time.monotonic()
+        crashes = watch_for_crash(timeout=10, stream=stream)
+        elapsed = time.monotonic() - start
+    assert elapsed < 2, elapsed
+    assert [record.message for record in crashes] == [
+        'FATAL EXCEPTION: main', 'Process: be.mygod.vpnhotspot, PID: 4321']
+    assert commands == ["logcat -v threadtime -T '10-17 11:59:59.000'"]
+
+
+def test_no_crash_waits_for_window():
+    """无崩溃时在时间窗口结束后返回空列表"""
+    with FakeAdbServer(shell_handler=replay_handler(NORMAL_LINES, hold=5)) as server:
+        start = time.monotonic()
+        crashes = watch_for_crash(timeout=0.5, stream=LogcatStream(client=AdbClient(port=server.port)))
+        elapsed = time.monotonic() - start
+    assert crashes == []
+    assert 0.4 < elapsed < 2, elapsed
+
+
+def test_other_package_crash_ignored():
+    """其他应用的崩溃不计入"""
+    other = [line.replace('be.mygod.vpnhotspot', 'com.example.other') for line in CRASH_LINES]
+    with FakeAdbServer(shell_handler=replay_handler(other)) as server:
+        assert watch_for_crash(timeout=2, stream=LogcatStream(['-d'], client=AdbClient(port=server.port))) == []
+
+
+def test_scan_logs_bounded():
+    """大量日志单次扫描，只保留固定数量的行"""
+    lines = [f'10-17 12:00:00.000  1  1 I Noise: line {i}' for i in range(20000)] + NORMAL_LINES
+    with FakeAdbServer(shell_handler=replay_handler(lines)) as server:
+        stream = LogcatStream(['-d', '-s', 'VPNHotspot:*'], client=AdbClient(port=server.port))
+        found, tail, matched = scan_logs(stream, ['WebServer started', 'Port conflict'], tail=5)
+    assert found == ['WebServer started']
+    assert len(tail) == 5 and tail[-1] == NORMAL_LINES[-1]
+    assert len(matched) == 2
+
+
+def test_stream_handles_split_chunks():
+    """跨数据块的行被正确拼接"""
+    def handler(command, conn):
+        data = '\n'.join(NORMAL_LINES).encode('utf-8')
+        for i in range(0, len(data), 7):
+            conn.sendall(data[i:i + 7])
+            time.sleep(0.001)
+        return True
+    with FakeAdbServer(shell_handler=handler) as server:
+        with LogcatStream(['-d'], client=AdbClient(port=server.port)) as stream:
+            assert list(stream.lines(timeout=5)) == NORMAL_LINES
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 流式logcat读取器测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
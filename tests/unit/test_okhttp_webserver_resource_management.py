@@ -9,6 +9,61 @@ import time
 import sys
 import os
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.source_rules import literals, scan_source
+
+OKHTTP_FILE = "mobile/src/main/java/be/mygod/vpnhotspot/OkHttpWebServer.kt"
+
+IMPROVEMENTS = [
+    # Check for enhanced socket cleanup in handleConnection
+    ("Enhanced socket cleanup", "shutdownOutput()"),
+    ("Enhanced socket cleanup", "shutdownInput()"),
+    ("Proper resource cleanup order", "bufferedWriter?.close()"),
+    ("Proper resource cleanup order", "bufferedReader?.close()"),
+    
+    # Check for improved thread pool shutdown with timeout
+    ("Thread pool timeout handling", "awaitTermination(5, TimeUnit.SECONDS)"),
+    ("Thread pool forced shutdown", "awaitTermination(3, TimeUnit.SECONDS)"),
+    ("Emergency cleanup method", "performEmergencyCleanup()"),
+    
+    # Check for comprehensive resource cleanup
+    ("HTTP client dispatcher shutdown", "client.dispatcher.executorService.shutdown()"),
+    ("HTTP client connection pool cleanup", "client.connectionPool.evictAll()"),
+    ("HTTP client cache cleanup", "client.cache?.close()"),
+    
+    # Check for coroutine scope management
+    ("Coroutine scope recreation", "scope = CoroutineScope(Dispatchers.IO + SupervisorJob())"),
+    ("Coroutine scope active check", "if (!scope.isActive)"),
+    ("Coroutine scope timeout", "withTimeoutOrNull(3000)"),
+    
+    # Check for connection-scoped reader/writer (closed in handleConnection's finally, shared by keep-alive requests)
+    ("Connection-scoped request reader", "val input = inputStream.bufferedReader()"),
+    ("Connection-scoped response writer", "val output = outputStream.bufferedWriter()"),
+    
+    # Check for keep-alive limits
+    ("Keep-alive idle timeout", "socket.soTimeout = KEEP_ALIVE_TIMEOUT"),
+    ("Keep-alive request limit", "handled < MAX_KEEP_ALIVE_REQUESTS"),
+    ("Idle connections closed on stop", "idleConnections.forEach"),
+    
+    # Check for cache cleanup
+    ("Cache cleanup", "cachedSystemStatus = null"),
+    ("CPU stats cleanup", "lastCpuTotal = 0L"),
+]
+
+ERROR_HANDLING_CHECKS = [
+    ("Try-catch in handleConnection", "} catch (e: java.net.SocketTimeoutException)"),
+    ("Try-catch in stop method", "} catch (e: InterruptedException)"),
+    ("Emergency cleanup error handling", "} catch (e: Exception) {"),
+    ("Finally blocks for resource cleanup", "} finally {"),
+    ("Timber error logging", "Timber.e(e,"),
+    ("Timber warning logging", "Timber.w(e,"),
+]
+
+# Both verifications are answered by a single scan of OkHttpWebServer.kt
+RULES = literals('improvement', [pattern for _, pattern in IMPROVEMENTS]) + \
+    literals('error_handling', [pattern for _, pattern in ERROR_HANDLING_CHECKS])
+
 def run_command(command, timeout=30):
     """Run a command with timeout and return result."""
     try:
@@ -43,53 +98,19 @@ def verify_resource_management_improvements():
     """Verify that the resource management improvements are in place."""
     print("🔍 Verifying resource management improvements...")
     
-    okhttp_file = "mobile/src/main/java/be/mygod/vpnhotspot/OkHttpWebServer.kt"
-    
-    if not os.path.exists(okhttp_file):
-        print(f"❌ OkHttpWebServer.kt not found at {okhttp_file}")
+    if not os.path.exists(OKHTTP_FILE):
+        print(f"❌ OkHttpWebServer.kt not found at {OKHTTP_FILE}")
         return False
     
-    with open(okhttp_file, 'r') as f:
-        content = f.read()
-    
-    improvements = [
-        # Check for enhanced socket cleanup in handleConnection
-        ("Enhanced socket cleanup", "shutdownOutput()"),
-        ("Enhanced socket cleanup", "shutdownInput()"),
-        ("Proper resource cleanup order", "bufferedWriter?.close()"),
-        ("Proper resource cleanup order", "bufferedReader?.close()"),
-        
-        # Check for improved thread pool shutdown with timeout
-        ("Thread pool timeout handling", "awaitTermination(5, TimeUnit.SECONDS)"),
-        ("Thread pool forced shutdown", "awaitTermination(3, TimeUnit.SECONDS)"),
-        ("Emergency cleanup method", "performEmergencyCleanup()"),
-        
-        # Check for comprehensive resource cleanup
-        ("HTTP client dispatcher shutdown", "client.dispatcher.executorService.shutdown()"),
-        ("HTTP client connection pool cleanup", "client.connectionPool.evictAll()"),
-        ("HTTP client cache cleanup", "client.cache?.close()"),
-        
-        # Check for coroutine scope management
-        ("Coroutine scope recreation", "scope = CoroutineScope(Dispatchers.IO + SupervisorJob())"),
-        ("Coroutine scope active check", "if (!scope.isActive)"),
-        ("Coroutine scope timeout", "withTimeoutOrNull(3000)"),
-        
-        # Check for proper use statements
-        ("Proper resource management in parseRequest", ".use { input ->"),
-        ("Proper resource management in sendResponse", ".use { output ->"),
-        
-        # Check for cache cleanup
-        ("Cache cleanup", "cachedSystemStatus = null"),
-        ("CPU stats cleanup", "lastCpuTotal = 0L"),
-    ]
+    matches = scan_source(OKHTTP_FILE, RULES)
     
     missing_improvements = []
     found_improvements = []
     
-    for description, pattern in improvements:
-        if pattern in content:
+    for index, (description, pattern) in enumerate(IMPROVEMENTS):
+        if matches.found(f'improvement_{index}'):
             found_improvements.append(description)
-            print(f"✅ {description}: Found")
+            print(f"✅ {description}: Found (line {matches.first(f'improvement_{index}')[0]})")
         else:
             missing_improvements.append(description)
             print(f"❌ {description}: Missing pattern '{pattern}'")
@@ -111,24 +132,12 @@ def verify_error_handling():
     """Verify that proper error handling is implemented."""
     print("\n🔍 Verifying error handling improvements...")
     
-    okhttp_file = "mobile/src/main/java/be/mygod/vpnhotspot/OkHttpWebServer.kt"
-    
-    with open(okhttp_file, 'r') as f:
-        content = f.read()
-    
-    error_handling_checks = [
-        ("Try-catch in handleConnection", "} catch (e: java.net.SocketTimeoutException)"),
-        ("Try-catch in stop method", "} catch (e: InterruptedException)"),
-        ("Emergency cleanup error handling", "} catch (e: Exception) {"),
-        ("Finally blocks for resource cleanup", "} finally {"),
-        ("Timber error logging", "Timber.e(e,"),
-        ("Timber warning logging", "Timber.w(e,"),
-    ]
+    matches = scan_source(OKHTTP_FILE, RULES)
     
     all_checks_passed = True
     
-    for description, pattern in error_handling_checks:
-        if pattern in content:
+    for index, (description, pattern) in enumerate(ERROR_HANDLING_CHECKS):
+        if matches.found(f'error_handling_{index}'):
             print(f"✅ {description}: Found")
         else:
             print(f"❌ {description}: Missing")
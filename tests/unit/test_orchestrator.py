@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+并行调度器测试：检查发现、资源声明与推断、冲突串行化（使用临时目录中的脚本）
+"""
+
+import os
+import sys
+import tempfile
+import textwrap
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.orchestrator import EXCLUSIVE, SHARED, Check, discover, discover_script, run_checks, schedule
+
+# 样例脚本中的 9999 只是文本（common.orchestrator 不应推断出端口）
+RESOURCES = {'test_resource_inference': [], 'test_declared_resources': [], 'test_conflicting_checks_keep_order': [],
+             'test_discover_real_suites': []}
+
+
+SCRIPT = '''
+import time
+from common.adb import run_adb_command
+
+events = []
+
+def restart_app():
+    run_adb_command(['shell', 'am', 'force-stop', 'be.mygod.vpnhotspot'])
+    return True
+
+def wait_and_watch(duration=1):
+    events.append('watch')
+    return True
+
+def check_http():
+    return 'http://localhost:9999'
+
+def check_source():
+    with open('mobile/src/main/java/be/mygod/vpnhotspot/OkHttpWebServer.kt') as f:
+        return True
+
+def helper():
+    return 42
+
+def generate_report():
+    return True
+
+def main():
+    tests = [
+        ("重启", restart_app),
+        ("监控", lambda: wait_and_watch(3)),
+        ("HTTP", check_http),
+    ]
+    if not check_source():
+        return 1
+    generate_report()
+    return 0
+'''
+
+
+def write_tree(root, scripts):
+    for path, source in scripts.items():
+        os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+        with open(os.path.join(root, path), 'w', encoding='utf-8') as f:
+            f.write(textwrap.dedent(source))
+
+
+def test_discover_from_main():
+    """从main中的测试列表、lambda和直接调用发现检查，跳过报告生成函数"""
+    with tempfile.TemporaryDirectory() as root:
+        write_tree(root, {'integration/test_sample.py': SCRIPT})
+        checks = discover_script(os.path.join(root, 'integration/test_sample.py'), root)
+    assert [check.id for check in checks] == [
+        'integration/test_sample.py::restart_app',
+        'integration/test_sample.py::wait_and_watch(3)',
+        'integration/test_sample.py::check_http',
+        'integration/test_sample.py::check_source',
+    ]
+    assert checks[0].label == '重启'
+
+
+def test_resource_inference():
+    """adb操作独占设备，重启应用和访问9999独占端口，读取源码共享"""
+    with tempfile.TemporaryDirectory() as root:
+        write_tree(root, {'integration/test_sample.py': SCRIPT})
+        checks = {check.name: check for check in discover(['integration'], root)}
+    assert checks['restart_app'].resources == {'device': EXCLUSIVE, 'port:9999': EXCLUSIVE}
+    assert checks['wait_and_watch'].resources == {}
+    assert checks['check_http'].resources == {'port:9999': EXCLUSIVE}
+    assert checks['check_source'].resources == {'source': SHARED}
+    assert checks['restart_app'].conflicts(checks['check_http'])
+    assert not checks['check_source'].conflicts(Check('x', 'y', resources={'source': SHARED}))
+
+
+def test_declared_resources():
+    """RESOURCES 中声明的资源优先于推断，没有声明的检查仍然推断"""
+    with tempfile.TemporaryDirectory() as root:
+        write_tree(root, {'unit/test_declared.py': '''
+            RESOURCES = {
+                'test_bench': [],
+                'test_device': ['device', 'source'],
+                'test_logs': {'device': 'shared'},
+            }
+
+            def test_bench():
+                return compare(queries=1500)
+
+            def test_device():
+                return True
+
+            def test_logs():
+                return True
+
+            def test_http():
+                return 'http://localhost:9999'
+
+            def main():
+                tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+        '''})
+        checks = {check.name: check for check in discover(['unit'], root)}
+    assert checks['test_bench'].resources == {}
+    assert checks['test_device'].resources == {'device': EXCLUSIVE, 'source': SHARED}
+    assert checks['test_logs'].resources == {'device': SHARED}
+    assert checks['test_http'].resources == {'port:9999': EXCLUSIVE}
+
+
+def test_assert_style_fallback():
+    """main从globals收集测试时按名称顺序发现test_*函数"""
+    with tempfile.TemporaryDirectory() as root:
+        write_tree(root, {'unit/test_assert.py': '''
+            def test_b():
+                assert True
+
+            def test_a():
+                assert True
+
+            def main():
+                tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+        '''})
+        checks = discover(['unit'], root)
+    assert [check.name for check in checks] == ['test_a', 'test_b']
+
+
+def test_independent_checks_run_in_parallel():
+    """无冲突的检查并行运行，冲突的检查按顺序串行"""
+    def execute(check):
+        time.sleep(0.2)
+        return check
+
+    free = [Check('s', f'free{n}', order=n) for n in range(4)]
+    start = time.perf_counter()
+    schedule(free, execute, workers=4)
+    assert time.perf_counter() - start < 0.5
+
+    device = [Check('s', f'device{n}', resources={'device': EXCLUSIVE}, order=n) for n in range(3)]
+    start = time.perf_counter()
+    schedule(device, execute, workers=4)
+    assert time.perf_counter() - start >= 0.6
+
+
+def test_conflicting_checks_keep_order():
+    """冲突的检查不会越过排在前面的检查，即使它们此刻都能启动"""
+    order = []
+
+    def execute(check):
+        order.append(check.name)
+        time.sleep(0.05)
+        return check
+
+    checks = [
+        Check('s', 'restart', resources={'device': EXCLUSIVE, 'port:9999': EXCLUSIVE}, order=0),
+        Check('s', 'http', resources={'port:9999': EXCLUSIVE}, order=1),
+        Check('s', 'logs', resources={'device': EXCLUSIVE}, order=2),
+        Check('s', 'source', resources={'source': SHARED}, order=3),
+    ]
+    results = schedule(checks, execute, workers=4)
+    assert order.index('restart') < order.index('http')
+    assert order.index('restart') < order.index('logs')
+    assert order.index('source') < order.index('http')
+    assert [result.name for result in results] == ['restart', 'http', 'logs', 'source']
+
+
+def test_run_checks_captures_output():
+    """每个检查的输出单独捕获；导入失败和返回False分别记为error和failed"""
+    with tempfile.TemporaryDirectory() as root:
+        write_tree(root, {
+            'unit/test_ok.py': '''
+                def check_one():
+                    print("one")
+                    return True
+
+                def check_two():
+                    print("two")
+                    return False
+
+                def main():
+                    check_one()
+                    check_two()
+            ''',
+            'unit/test_broken.py': '''
+                import module_that_does_not_exist
+
+                def check():
+                    return True
+
+                def main():
+                    check()
+            ''',
+        })
+        checks = discover(['unit'], root)
+        results = {result.check.name: result for result in run_checks(checks, workers=4, tests_dir=root)}
+    assert results['check_one'].status == 'passed' and results['check_one'].output == 'one\n'
+    assert results['check_two'].status == 'failed' and results['check_two'].output == 'two\n'
+    assert results['check'].status == 'error' and 'ModuleNotFoundError' in results['check'].error
+
+
+def test_discover_real_suites():
+    """实际测试脚本中的设备重启与源码检查被正确分类"""
+    checks = {check.id: check for check in discover()}
+    restart = checks['integration/test_crash_fix.py::restart_app']
+    assert restart.resources == {'device': EXCLUSIVE, 'port:9999': EXCLUSIVE}
+    assert checks['integration/test_crash_fix.py::check_for_crashes(10)'].resources == {'device': EXCLUSIVE}
+    quality = checks['integration/test_all_webserver_fixes.py::test_code_quality']
+    assert quality.resources == {'source': SHARED}
+    assert checks['integration/test_all_webserver_fixes.py::test_compilation'].resources == {'gradle': EXCLUSIVE}
+    assert checks['unit/test_dns_cache.py::test_bench'].resources == {}
+    assert checks['device/test_device_functionality.py::check_webserver_status'].resources == {'device': EXCLUSIVE}
+    device = [check for check in discover(['device']) if check.script == 'device/test_device_functionality.py']
+    assert [(check.name, check.label) for check in device][:2] == [('start_app', '应用启动测试'),
+                                                                   ('check_webserver_status', 'WebServer状态测试')]
+    assert len(device) == 6
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 并行调度器测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+离线OUI数据库测试：提交的数据库与清单、IEEE CSV与文本格式解析、文件格式、最长前缀匹配，以及文件大小与查询吞吐基准
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.oui_db import (ASSET, HEADER, MAGIC, MANIFEST, OuiDatabase, bench, compile_db, expected_lookup, manifest,
+                           parse_csv, parse_txt, sample_macs, synthetic)
+
+SAMPLE = '''Registry,Assignment,Organization Name,Organization Address
+MA-L,3C22FB,Apple  Inc.,"1 Infinite Loop Cupertino CA US 95014 "
+MA-L,70B3D5,IEEE Registration Authority,445 Hoes Lane Piscataway NJ US 08554
+MA-L,0050C2,IEEE Registration Authority,445 Hoes Lane Piscataway NJ US 08554
+MA-L,A4C138,"Telink Semiconductor (Taipei) Co. Ltd.","Room 1502, 15F., No. 1 Taipei TW 11492"
+MA-L,080030,Private,
+MA-L,001A11,Google. Inc.,
+MA-M,0050C2A,Société Générale,"17 Cours Valmy Paris FR 92987"
+MA-S,70B3D5F2C,Ultra Electronics,Fleets Lane Poole
+'''
+# 与 SAMPLE 相同的条目（另加 IAB 的一条）的IEEE文本格式
+SAMPLE_TXT = '''OUI/MA-L                                                    Organization
+company_id                                                  Organization
+                                                            Address
+
+3C-22-FB   (hex)		Apple  Inc.
+3C22FB     (base 16)		Apple  Inc.
+				1 Infinite Loop
+				Cupertino  CA  95014
+				US
+
+70-B3-D5   (hex)		IEEE Registration Authority
+70B3D5     (base 16)		IEEE Registration Authority
+				445 Hoes Lane
+				Piscataway  NJ  08554
+				US
+
+08-00-30   (hex)		Private
+080030     (base 16)		Private
+
+00-50-C2   (hex)		Société Générale
+A00000-AFFFFF     (base 16)		Société Générale
+				17 Cours Valmy
+				Paris    92987
+				FR
+
+70-B3-D5                      (hex)                         Ultra Electronics
+F2C000-F2CFFF                 (base 16)                     Ultra Electronics
+                                                            Fleets Lane Poole
+'''
+
+
+# 基准只在进程内运行（common.orchestrator 的推断会把查询数当成端口）
+RESOURCES = {'test_bench': []}
+
+
+def test_pinned_asset():
+    """提交的 oui.bin 存在，与清单中的SHA-256和条目数一致（verifyOuiDatabase 在构建时做同样的检查）"""
+    assert os.path.isfile(ASSET), f'{ASSET} 缺失'
+    with open(ASSET, 'rb') as f:
+        data = f.read()
+    with open(MANIFEST, 'r', encoding='utf-8') as f:
+        pinned = json.load(f)
+    assert manifest(data, pinned['sources']) == pinned
+    assert pinned['sources'] and all(source['sha256'] and source['version'] for source in pinned['sources'])
+
+
+def test_parse_txt():
+    """文本格式与CSV得到相同的记录，范围的固定位数决定前缀长度"""
+    assert parse_txt(SAMPLE_TXT) == [
+        (24, 0x3C22FB, 'Apple Inc.', 'US'),
+        (28, 0x0050C2A, 'Société Générale', 'FR'),
+        (36, 0x70B3D5F2C, 'Ultra Electronics', None),
+    ]
+
+
+def test_parse():
+    """规范化名字，从地址末尾取国家代码，跳过注册机构与 Private 的条目"""
+    records = parse_csv(SAMPLE)
+    assert records == [
+        (24, 0x3C22FB, 'Apple Inc.', 'US'),
+        (24, 0xA4C138, 'Telink Semiconductor (Taipei) Co. Ltd.', 'TW'),
+        (24, 0x001A11, 'Google. Inc.', None),
+        (28, 0x0050C2A, 'Société Générale', 'FR'),
+        (36, 0x70B3D5F2C, 'Ultra Electronics', None),
+    ]
+
+
+def test_lookup():
+    """最细的分配优先，注册机构的块中未分配的部分查不到"""
+    database = OuiDatabase(compile_db(parse_csv(SAMPLE)))
+    assert database.lookup('3C:22:FB:12:34:56') == ('Apple Inc.', 'US')
+    assert database.lookup('00-50-c2-a1-23-45') == ('Société Générale', 'FR')
+    assert database.lookup('00:50:c2:b1:23:45') is None
+    assert database.lookup('70:b3:d5:f2:cf:ff') == ('Ultra Electronics', None)
+    assert database.lookup('70:b3:d5:f2:d0:00') is None
+    assert database.lookup('08:00:30:00:00:01') is None
+    registries = synthetic(seed=3, ma_l=3000, ma_m=800, ma_s=900, vendors=1000)
+    records = [record for text in registries.values() for record in parse_csv(text)]
+    database = OuiDatabase(compile_db(records))
+    for mac in sample_macs(records, 500, seed=4):
+        assert database.lookup(mac) == expected_lookup(records, mac), hex(mac)
+
+
+def test_format():
+    """头部计数与字符串池大小，厂商只存一次，截断或未知格式的文件被拒绝"""
+    records = [(24, prefix, 'Same Vendor 株式会社', 'JP') for prefix in range(100)] + [(36, 1, 'Other', None)]
+    data = compile_db(records)
+    magic, version, _, count36, count28, count24, pool = HEADER.unpack_from(data)
+    assert (magic, version, count36, count28, count24) == (MAGIC, 1, 1, 0, 100)
+    assert pool == 2 * 4 + len('Same Vendor 株式会社'.encode('utf-8')) + len('Other')
+    assert len(data) == HEADER.size + 100 * 6 + 8 + pool
+    for broken in (data[:-1], b'XXXX' + data[4:]):
+        try:
+            OuiDatabase(broken)
+            assert False, '应当拒绝'
+        except ValueError:
+            pass
+
+
+def test_bench():
+    """与真实注册表规模相近的数据：每条目不到20字节，远小于CSV，查询不需要联网且每秒数万次"""
+    with tempfile.TemporaryDirectory() as directory:
+        report = bench(synthetic(seed=1), lookups=20000, seed=2, directory=directory)
+    print(f"   {report['bytes'] // 1024}KiB，每条 {report['bytes_per_entry']} 字节，"
+          f"{report['lookups_per_second']} 次/秒")
+    assert sum(report['entries'].values()) > 45000
+    assert report['bytes_per_entry'] < 20 and report['bytes'] * 4 < report['csv_bytes']
+    assert report['bytes'] < report['inline_bytes']
+    assert 0.4 < report['hit_ratio'] < 0.6 and report['lookups_per_second'] > 10000
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 离线OUI数据库测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
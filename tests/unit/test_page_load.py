@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+页面加载测试：预先压缩的控制面板与引导页、Accept-Encoding协商、ETag/304验证与加载检查输出（使用本地替身）
+"""
+
+import gzip
+import os
+import re
+import sys
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.fake_webserver import (API_KEY_REQUIRED_PAGE, DEFAULT_API_KEY, MAIN_PAGE, FakeWebServer, StaticPage,
+                                   accepts_encoding)
+from common.http_client import HttpSession
+from common.page_load import fetch, run
+
+
+def test_extracted_pages():
+    """替身从Kotlin源码中提取到了完整的控制面板与引导页"""
+    assert MAIN_PAGE.startswith('<!DOCTYPE html>') and MAIN_PAGE.rstrip().endswith('</html>')
+    assert 'subscribeStatus();' in MAIN_PAGE
+    assert API_KEY_REQUIRED_PAGE.startswith('<!DOCTYPE html>') and API_KEY_REQUIRED_PAGE.rstrip().endswith('</html>')
+
+
+def test_static_page():
+    """压缩版本解压后与原文相同，ETag只取决于内容，每种编码的ETag各不相同"""
+    page = StaticPage(MAIN_PAGE)
+    assert gzip.decompress(page.gzip) == page.identity == zlib.decompress(page.deflate)
+    assert len(page.gzip) < len(page.identity) // 3
+    assert re.fullmatch(r'"[0-9a-f]{16}"', page.etag()) and StaticPage(MAIN_PAGE).etag() == page.etag()
+    assert page.etag('gzip') == page.etag()[:-1] + '-gzip"' and page.etag('deflate') == page.etag()[:-1] + '-deflate"'
+    assert StaticPage(MAIN_PAGE + ' ').etag() != page.etag()
+
+
+def test_accepts_encoding():
+    """按列表与q值协商"""
+    assert accepts_encoding('gzip, deflate, br', 'gzip') and accepts_encoding('br, DEFLATE;q=0.5', 'deflate')
+    assert not accepts_encoding('gzip;q=0, deflate', 'gzip') and not accepts_encoding('', 'gzip')
+    assert not accepts_encoding('x-gzip', 'gzip') and accepts_encoding('gzip;level=1', 'gzip')
+
+
+def test_conditional():
+    """
+    每种编码的响应带各自的ETag；If-None-Match 命中按 Accept-Encoding 所选编码的ETag（含弱验证器、列表与*）时返回304，
+    另一种编码的ETag不算命中（RFC 9110 13.1.2），持久连接上可以继续请求
+    """
+    with FakeWebServer() as server, HttpSession('127.0.0.1', server.port, headers={'X-API-Key': DEFAULT_API_KEY}) \
+            as http:
+        first = http.get('/', headers={'Accept-Encoding': 'gzip'})
+        etag = first.headers['ETag']
+        assert first.status == 200 and first.headers['Content-Encoding'] == 'gzip' and etag.endswith('-gzip"')
+        assert first.headers['Cache-Control'] == 'no-cache' and gzip.decompress(first.body).decode() == MAIN_PAGE
+        deflate = http.get('/', headers={'Accept-Encoding': 'deflate'}).headers['ETag']
+        identity = http.get('/').headers['ETag']
+        assert len({etag, deflate, identity}) == 3
+        for tag in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            response = http.get('/', headers={'If-None-Match': tag, 'Accept-Encoding': 'gzip'})
+            assert response.status == 304 and response.body == b'' and 'Content-Length' not in response.headers
+            assert response.headers['ETag'] == etag
+        assert http.get('/', headers={'If-None-Match': identity}).status == 304
+        # 缓存了gzip内容的客户端不能被告知把它当作未压缩或deflate的内容使用
+        for tag, accept_encoding in ((etag, 'identity'), (etag, 'deflate'), (deflate, 'gzip'), (identity, 'gzip')):
+            response = http.get('/', headers={'If-None-Match': tag, 'Accept-Encoding': accept_encoding})
+            assert response.status == 200 and response.headers['ETag'] != tag, (tag, accept_encoding)
+        assert http.get('/', headers={'If-None-Match': '"other"'}).status == 200
+        assert http.get('/api/status').status == 200
+        assert http.connections_opened == 1
+    with FakeWebServer() as server:
+        plain = fetch('127.0.0.1', server.port, '/')
+    assert 'content-encoding' not in plain.headers and plain.body.decode() == MAIN_PAGE
+
+
+def test_run():
+    """两个页面的四种加载方式都没有问题，304的线路字节数最少"""
+    report = run(rounds=2)
+    assert report['problems'] == []
+    for page in report['pages'].values():
+        scenarios = page['scenarios']
+        assert scenarios['gzip']['wire_bytes'] < scenarios['cold']['wire_bytes']
+        assert scenarios['revalidate']['status'] == 304 and scenarios['revalidate']['body_bytes'] == 0
+        assert scenarios['revalidate']['wire_bytes'] < scenarios['deflate']['wire_bytes']
+        assert scenarios['cold']['estimated_ms'] > scenarios['gzip']['estimated_ms']
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 页面加载测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
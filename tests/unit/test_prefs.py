@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+SharedPreferences 快照测试：流式解析带类型的值、单次 exec-out tar 拉取、按内容哈希缓存与快照差异（使用adb server替身）
+"""
+
+import io
+import os
+import sys
+import tarfile
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.adb import AdbClient
+from common.fake_adb import FakeAdbServer
+from common.prefs import (DEFAULT_PREFS, LOCATIONS, PACKAGE, REMOTE_CONTROL_PREFS, PrefsError, SnapshotStore, diff,
+                          parse_xml, pull_snapshot, tar_command)
+from common.prefs import main as prefs_main
+
+HEADER = "<?xml version='1.0' encoding='utf-8' standalone='yes' ?>\n"
+
+
+# 只解析内存中的归档（common.orchestrator 的推断会把偏好中的端口值当成端口）
+RESOURCES = {'test_cache_by_content': [], 'test_diff': []}
+
+
+def prefs_xml(entries):
+    return (HEADER + '<map>\n' + ''.join(f'    {entry}\n' for entry in entries) + '</map>\n').encode('utf-8')
+
+
+def make_tar(auto_connect=True, last_port=9999):
+    """两个 shared_prefs 目录的tar，成员路径与设备上 tar 打包绝对路径时相同（去掉开头的 /）"""
+    files = {
+        f"{LOCATIONS['de']}/{DEFAULT_PREFS}": prefs_xml([
+            f'<boolean name="remote.control.auto.connect" value="{str(auto_connect).lower()}" />',
+            '<string name="service.upstream">wlan0</string>',
+            '<long name="service.ipMonitor.interval" value="12345678901" />',
+        ]),
+        f"{LOCATIONS['ce']}/{REMOTE_CONTROL_PREFS}": prefs_xml([
+            '<string name="last_ip">192.168.1.133</string>',
+            f'<int name="last_port" value="{last_port}" />',
+            '<string name="last_api_key">default_api_key_for_debug_2024</string>',
+        ]),
+        f"{LOCATIONS['ce']}/WebViewChromiumPrefs.xml": prefs_xml([]),
+    }
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w', format=tarfile.USTAR_FORMAT) as archive:
+        for path in (LOCATIONS['de'], LOCATIONS['ce']):
+            directory = tarfile.TarInfo(path.lstrip('/'))
+            directory.type = tarfile.DIRTYPE
+            archive.addfile(directory)
+        for path, data in files.items():
+            info = tarfile.TarInfo(path.lstrip('/'))
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def test_parse_types():
+    """XmlUtils 的每种标签都转换成对应的Python类型，字符串中的实体被还原"""
+    entries = parse_xml(io.BytesIO(prefs_xml([
+        '<boolean name="b" value="false" />',
+        '<int name="i" value="-3" />',
+        '<long name="l" value="9223372036854775807" />',
+        '<float name="f" value="0.25" />',
+        '<string name="s">a &amp; b &lt;c&gt;</string>',
+        '<string name="empty"></string>',
+        '<set name="set"><string>y</string><string>x</string></set>',
+        '<set name="empty_set" />',
+        '<null name="n" />',
+    ])))
+    assert entries == {
+        'b': ('boolean', False), 'i': ('int', -3), 'l': ('long', 9223372036854775807), 'f': ('float', 0.25),
+        's': ('string', 'a & b <c>'), 'empty': ('string', ''), 'set': ('set', frozenset({'x', 'y'})),
+        'empty_set': ('set', frozenset()), 'n': ('null', None),
+    }
+    for bad in (b'<list><int name="x" value="1" /></list>', b'<map><int name="x" value="1"></map>',
+                b'<map><unknown name="x" /></map>'):
+        try:
+            parse_xml(io.BytesIO(bad))
+            assert False, bad
+        except PrefsError:
+            pass
+
+
+def test_pull_snapshot():
+    """一次 exec-out 拉取全部文件；run-as 失败时改用 su"""
+    data = make_tar()
+
+    def handler(command, conn):
+        if command == f"su -c '{tar_command('')}'":
+            conn.sendall(data)
+        else:
+            conn.sendall(f'run-as: package not debuggable: {PACKAGE}\n'.encode('utf-8'))
+        return True
+
+    with FakeAdbServer(shell_handler=handler) as adb:
+        snapshot = pull_snapshot(client=AdbClient(port=adb.port), store=SnapshotStore(None))
+        assert adb.count('exec:') == 2
+    assert sorted(snapshot.files) == sorted([f'ce/{REMOTE_CONTROL_PREFS}', 'ce/WebViewChromiumPrefs.xml',
+                                             f'de/{DEFAULT_PREFS}'])
+    assert snapshot.get(DEFAULT_PREFS, 'remote.control.auto.connect') is True
+    assert snapshot.values(REMOTE_CONTROL_PREFS)['last_port'] == 9999
+    assert REMOTE_CONTROL_PREFS in snapshot and 'missing.xml' not in snapshot
+
+
+def test_cache_by_content():
+    """内容未变的文件直接使用缓存，快照ID只取决于内容"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = SnapshotStore(directory)
+        first = store.from_tar(io.BytesIO(make_tar()))
+        assert store.parsed == 3
+        second = store.from_tar(io.BytesIO(make_tar(last_port=8080)))
+        assert store.parsed == 4
+        again = SnapshotStore(directory).from_tar(io.BytesIO(make_tar()))
+        assert again.id == first.id != second.id
+        assert again.files == first.files
+
+
+def test_diff():
+    """切换开关前后的差异只包含变化的键，类型变化也算修改"""
+    store = SnapshotStore(None)
+    before = store.from_tar(io.BytesIO(make_tar(auto_connect=False)))
+    after = store.from_tar(io.BytesIO(make_tar(auto_connect=True, last_port=8080)))
+    changes = diff(before, after)
+    assert [(change.file, change.key, change.change, change.before, change.after) for change in changes] == [
+        (f'ce/{REMOTE_CONTROL_PREFS}', 'last_port', 'changed', 9999, 8080),
+        (f'de/{DEFAULT_PREFS}', 'remote.control.auto.connect', 'changed', False, True),
+    ]
+    assert diff(before, before) == []
+    del after.files['ce/WebViewChromiumPrefs.xml']
+    after.hashes['ce/WebViewChromiumPrefs.xml'] = None
+    after.files[f'de/{DEFAULT_PREFS}']['remote.control.auto.connect'] = ('int', 1)
+    after.hashes[f'de/{DEFAULT_PREFS}'] = 'changed'
+    changes = diff(before, after)
+    assert any(change.key == 'remote.control.auto.connect' and change.after == 1 for change in changes)
+
+
+def test_cli_labels():
+    """快照按标签保存，diff 可以用标签或ID前缀引用"""
+    with tempfile.TemporaryDirectory() as directory:
+        before, after = os.path.join(directory, 'before.tar'), os.path.join(directory, 'after.tar')
+        with open(before, 'wb') as f:
+            f.write(make_tar(auto_connect=False))
+        with open(after, 'wb') as f:
+            f.write(make_tar(auto_connect=True))
+        cache = os.path.join(directory, 'cache')
+        assert prefs_main(['--cache', cache, 'snapshot', '--tar', before, '--label', 'before']) == 0
+        assert prefs_main(['--cache', cache, 'snapshot', '--tar', after, '--label', 'after']) == 0
+        output = os.path.join(directory, 'diff.json')
+        assert prefs_main(['--cache', cache, 'diff', 'before', 'after', '--json', output]) == 0
+        with open(output, 'r', encoding='utf-8') as f:
+            assert '"remote.control.auto.connect"' in f.read()
+        store = SnapshotStore(cache)
+        snapshot_id = store.resolve('after')
+        assert store.load(snapshot_id[:6]).get(DEFAULT_PREFS, 'remote.control.auto.connect') is True
+        assert prefs_main(['--cache', cache, 'diff', 'before', 'nothing']) == 1
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 SharedPreferences 快照测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
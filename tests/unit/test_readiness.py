@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+WebServer就绪检测测试：并发端口探测、退避轮询与启动日志匹配（使用本地监听套接字和adb server替身）
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.adb import AdbClient
+from common.fake_adb import FakeAdbServer
+from common.fake_webserver import FakeWebServer
+from common.logcat import LogcatStream
+from common.readiness import backoff, probe_ports, wait_for_webserver
+
+
+def free_port():
+    """取得一个当前未被监听的端口"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def listen_later(port, delay):
+    """delay秒后开始在port上监听，模拟应用启动后才绑定端口"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+
+    def bind():
+        time.sleep(delay)
+        sock.bind(('127.0.0.1', port))
+        sock.listen(5)
+
+    threading.Thread(target=bind, daemon=True).start()
+    return sock
+
+
+def log_handler(lines, delay):
+    """adb替身的logcat处理器：delay秒后输出lines并保持连接"""
+    def handler(command, conn):
+        if not command.startswith('logcat'):
+            return False
+        try:
+            time.sleep(delay)
+            for line in lines:
+                conn.sendall((line + '\n').encode('utf-8'))
+            time.sleep(5)
+        except OSError:
+            pass
+        return True
+    return handler
+
+
+def started_line(port):
+    return f'10-17 12:00:00.120  4321  4350 I OkHttpWebServer: OkHttpWebServer started successfully on port {port}'
+
+
+def test_backoff():
+    """退避间隔按倍数增长并封顶"""
+    delays = backoff(initial=0.1, factor=2, maximum=0.5)
+    assert [next(delays) for _ in range(5)] == [0.1, 0.2, 0.4, 0.5, 0.5]
+
+
+def test_probe_ports_concurrent():
+    """并发探测：返回开放端口（保持候选顺序），关闭的端口不拖慢整体"""
+    with FakeWebServer() as first, FakeWebServer() as second:
+        closed = free_port()
+        start = time.monotonic()
+        open_ports = probe_ports('127.0.0.1', [closed, second.port, first.port], timeout=1)
+        elapsed = time.monotonic() - start
+    assert open_ports == [second.port, first.port]
+    assert elapsed < 0.5, elapsed
+
+
+def test_wait_by_probing():
+    """没有日志时按退避间隔探测，端口开始监听后立即返回"""
+    port = free_port()
+    sock = listen_later(port, 0.4)
+    try:
+        readiness = wait_for_webserver('127.0.0.1', ports=(free_port(), port), timeout=5, stream=False)
+    finally:
+        sock.close()
+    assert readiness.ready and readiness.port == port and readiness.source == 'probe'
+    assert 0.4 <= readiness.elapsed < 1.5, readiness
+    assert readiness.to_dict()['elapsed_ms'] == readiness.elapsed_ms
+
+
+def test_wait_by_log():
+    """日志报告的端口不在候选列表中（回退端口）时也能找到，并确认可连接"""
+    with FakeWebServer() as server:
+        handler = log_handler([started_line(server.port)], delay=0.3)
+        with FakeAdbServer(shell_handler=handler) as adb:
+            stream = LogcatStream(['-s', 'OkHttpWebServer:*'], client=AdbClient(port=adb.port))
+            with stream:
+                readiness = wait_for_webserver('127.0.0.1', ports=(free_port(),), timeout=5, stream=stream)
+    assert readiness.ready and readiness.port == server.port and readiness.source == 'log'
+    assert 0.3 <= readiness.elapsed < 1.5, readiness
+
+
+def test_log_before_listen():
+    """日志先于端口可连接时继续等待该端口"""
+    port = free_port()
+    sock = listen_later(port, 0.5)
+    try:
+        with FakeAdbServer(shell_handler=log_handler([started_line(port)], delay=0)) as adb:
+            with LogcatStream(client=AdbClient(port=adb.port)) as stream:
+                readiness = wait_for_webserver('127.0.0.1', ports=(), timeout=5, stream=stream)
+    finally:
+        sock.close()
+    assert readiness.ready and readiness.port == port and readiness.source == 'log'
+    assert readiness.attempts > 1
+    assert readiness.elapsed >= 0.5, readiness
+
+
+def test_log_only():
+    """不探测端口时以启动日志为准"""
+    with FakeAdbServer(shell_handler=log_handler([started_line(10001)], delay=0.2)) as adb:
+        with LogcatStream(client=AdbClient(port=adb.port)) as stream:
+            readiness = wait_for_webserver(None, timeout=5, stream=stream)
+    assert readiness.ready and readiness.port == 10001 and readiness.source == 'log'
+
+
+def test_timeout():
+    """超时后返回未就绪，不会多等"""
+    start = time.monotonic()
+    readiness = wait_for_webserver('127.0.0.1', ports=(free_port(),), timeout=0.5, stream=False)
+    assert not readiness.ready and readiness.elapsed is None
+    assert time.monotonic() - start < 1.5
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 WebServer就绪检测测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+请求时间线测试：Kotlin日志格式、按线程关联请求阶段、慢请求归因、线程占用统计与本地替身日志
+"""
+
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.request_timeline import (CORPUS, ERRORS, KOTLIN_LOG_FORMATS, ROOT_PHASES, TimelineBuilder, capture_fake,
+                                     kotlin_log_messages)
+
+# 不是数字的插值的示例值
+SAMPLES = {'$firstLine': 'GET /api/status HTTP/1.1', '${socket.remoteSocketAddress}': '/192.168.43.2:51000',
+           '$method': 'GET', '$uri': '/api/status', '${request.method}': 'GET', '${request.uri}': '/api/status'}
+
+
+def corpus_report(**kwargs):
+    with open(CORPUS, 'r', encoding='utf-8') as f:
+        return TimelineBuilder(**kwargs).feed_lines(f.read().splitlines()).report()
+
+
+def line(time_, tid, message, tag='OkHttpWebServer'):
+    return f'10-17 09:00:{time_:06.3f}  4021 {tid:5d} D {tag}: {message}'
+
+
+def test_kotlin_logs():
+    """OkHttpWebServer.kt 仍输出解析依赖的每种日志，按模板填入示例值后能被对应的正则解析"""
+    messages = kotlin_log_messages()
+    for pattern, template in KOTLIN_LOG_FORMATS:
+        assert template in messages, template
+        sample = re.sub(r'\$\{[^}]*\}|\$\w+', lambda match: SAMPLES.get(match.group(), '1'), template)
+        assert pattern.match(sample), sample
+    for prefix in ERRORS:
+        assert any(message.startswith(prefix) for message in messages), prefix
+
+
+def test_corpus():
+    """语料中的请求按线程还原，各阶段与慢请求归因"""
+    report = corpus_report()
+    assert report['requests'] == 4 and report['connections'] == 5 and report['threads'] == 3
+    assert report['streams'] == 1 and report['errors'] == {'timeout': 1} and report['open_connections'] == 0
+    paths = report['paths']
+    assert paths['/api/status']['requests'] == 2 and paths['/api/status']['status_refreshes'] == 1
+    assert paths['/api/status']['attribution'] == {'status:cpu': 1}
+    assert paths['/favicon.ico']['attribution'] == {'network': 1}
+    assert paths['/api/wifi/start']['attribution'] == {'parse': 1}
+    slowest = report['slowest']
+    assert [span['path'] for span in slowest] == ['/api/status', '/api/wifi/start', '/favicon.ico', '/api/status']
+    assert slowest[0]['total_ms'] == 420.0 and slowest[0]['phases_ms']['status:cpuTemperature'] == 96
+    assert slowest[0]['phases_ms']['process'] == 4 and slowest[0]['phases_ms']['queue'] == 1.0
+    # keep-alive连接上的第二个请求不含排队和网络阶段
+    assert set(slowest[3]['phases_ms']) == {'parse', 'process', 'send'} and slowest[3]['total_ms'] == 3.0
+    assert report['status_refresh_us']['total']['count'] == 2
+    assert all(phase in report['phases_us'] for phase in ROOT_PHASES)
+
+
+def test_occupancy():
+    """两个工作线程的连接部分重叠：每个时间桶的平均与最大线程数"""
+    lines = [
+        line(0.0, 11, 'Accepted connection #1 from /10.0.0.2:1000'),
+        line(0.0, 21, 'Handling connection #1'),
+        line(0.5, 21, 'HTTP request first line: GET /api/status HTTP/1.1'),
+        line(0.5, 12, 'Accepted connection #2 from /10.0.0.3:1000', tag='OkHttpWebServer$start$1'),
+        line(0.5, 22, 'Handling connection #2'),
+        line(1.0, 21, 'Parsed HTTP request: GET /api/status (3 headers)'),
+        line(1.0, 22, 'HTTP request first line: GET / HTTP/1.1'),
+        line(1.0, 22, 'Parsed HTTP request: GET / (3 headers)'),
+        line(1.5, 22, 'Responded 200 to GET / (process 400 ms, send 100 ms)'),
+        line(1.5, 22, 'Connection #2 closed after 1 requests'),
+        line(1.5, 21, 'Responded 200 to GET /api/status (process 500 ms, send 0 ms)'),
+        line(2.0, 21, 'Connection #1 closed after 1 requests'),
+        line(2.0, 21, 'Responded 200 to GET /unrelated (process 0 ms, send 0 ms)', tag='OtherTag'),
+    ]
+    report = TimelineBuilder(bucket=1.0).feed_lines(lines).report()
+    timeline = report['occupancy']['timeline']
+    assert [bucket['t'] for bucket in timeline] == [0.0, 1.0, 2.0]
+    assert timeline[0]['busy_mean'] == 1.5 and timeline[0]['busy_max'] == 2
+    assert timeline[0]['active_mean'] == 0.5 and timeline[0]['active_max'] == 1
+    assert timeline[1]['busy_mean'] == 1.5 and timeline[1]['active_mean'] == 1.0 and timeline[1]['active_max'] == 2
+    assert report['occupancy']['busy']['max'] == 2 and report['requests'] == 2
+    assert report['paths']['/']['latency_us']['max'] == 1000000
+
+
+def test_bounded():
+    """长时间读取时只保留最慢的请求，已结束的连接不会累积"""
+    lines = []
+    for index in range(1, 501):
+        start = index * 0.05
+        lines.append(line(start, 11, f'Accepted connection #{index * 2} from /10.0.0.2:1000'))
+        lines.append(line(start, 11, f'Accepted connection #{index * 2 + 1} from /10.0.0.2:1000'))
+        lines.append(line(start, 20 + index % 4, f'Handling connection #{index * 2}'))
+        lines.append(line(start + 0.001, 20 + index % 4, 'HTTP request first line: GET /api/status HTTP/1.1'))
+        lines.append(line(start + 0.002, 20 + index % 4, f'Responded 200 to GET /api/status (process {index % 7} ms, '
+                                                         'send 0 ms)'))
+        lines.append(line(start + 0.002, 20 + index % 4, f'Connection #{index * 2} closed after 1 requests'))
+    builder = TimelineBuilder(keep_slowest=5).feed_lines(lines)
+    report = builder.report()
+    assert report['requests'] == 500 and report['threads'] == 4 and report['errors'] == {}
+    assert len(report['slowest']) == 5 and not builder.connections and len(builder.accepts) == 500
+
+
+def test_fake_capture():
+    """本地替身输出相同格式的日志，状态刷新的耗时归因到 su -c cat"""
+    builder = capture_fake(duration=1.0, concurrency=2, profile='device', slow_ms=100.0)
+    report = builder.report()
+    assert report['requests'] > 20 and report['errors'] == {} and report['open_connections'] == 0
+    assert report['connections'] == report['requests']
+    status = report['paths']['/{apiKey}/api/status']
+    assert status['status_refreshes'] >= 1 and set(status['attribution']) <= set(ROOT_PHASES)
+    assert report['occupancy']['busy']['max'] >= 1
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 请求时间线测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
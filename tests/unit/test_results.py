@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+结果存储测试：追加与流式读取、运行选择、显著性比较与Markdown报告（使用临时目录中的结果文件）
+"""
+
+import os
+import random
+import sys
+import tempfile
+import textwrap
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common import results
+from common.histogram import LatencyHistogram
+from common.orchestrator import discover, run_checks
+from common.results import (ResultStore, compare, mann_whitney, record_check, record_metric, render_markdown,
+                            script_check, write_report)
+
+
+def store_with_runs(directory, runs):
+    """runs: [(运行ID, {指标: 样本列表}), ...]，每次运行同时记录一项通过的检查"""
+    for run, metrics in runs:
+        store = run_store(directory, run)
+        record_check('unit/test_x.py::check', 'passed', 0.25, store=store)
+        for metric, samples in metrics.items():
+            record_metric(metric, samples=samples, check='unit/test_x.py::check', store=store)
+    return ResultStore(store.path)
+
+
+def run_store(directory, run):
+    return ResultStore(os.path.join(directory, 'results.jsonl'), {'run': run, 'build': 'abc1234', 'device': 'R58M'})
+
+
+def latencies(seed, median, count=40):
+    generator = random.Random(seed)
+    return [round(generator.gauss(median, median * 0.05), 2) for _ in range(count)]
+
+
+def test_append_and_stream():
+    """记录逐行追加；读取时可按运行与类型过滤，损坏的行被跳过"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = store_with_runs(directory, [('r1', {'latency': [1, 2, 3]}), ('r2', {'latency': [4]})])
+        with open(store.path, 'a', encoding='utf-8') as f:
+            f.write('{"run": "r3", "kind": "met')
+        metrics = list(store.records({'r1'}, kind='metric'))
+        assert len(metrics) == 1 and metrics[0]['samples'] == [1, 2, 3]
+        assert metrics[0]['script'] == 'unit/test_x.py' and metrics[0]['device'] == 'R58M'
+        runs = store.runs()
+        assert [run['run'] for run in runs] == ['r1', 'r2']
+        assert runs[0]['checks'] == 1 and runs[0]['failed'] == 0 and runs[0]['metrics'] == 1
+    assert list(ResultStore(None).records()) == [] and ResultStore('').append({'a': 1}) == {'a': 1}
+
+
+def test_script_report():
+    """单独运行的脚本逐项记录检查，报告只包含本次运行中该脚本的记录；不写文件时使用进程内的记录"""
+    def start_app():
+        record_metric('webserver_ready', value=120)
+        return True
+
+    def broken():
+        raise ValueError('bad')
+
+    script = 'device/test_x.py'
+    with tempfile.TemporaryDirectory() as directory:
+        for store in (run_store(directory, 'head'), ResultStore(None, {'run': 'head', 'build': 'abc1234'})):
+            record_check('device/other.py::check', 'passed', 0.1, store=store)
+            record_check('device/test_x.py::old', 'passed', 0.1, store=run_store(directory, 'base'))
+            previous = results.default_store()
+            results.set_default_store(store)
+            try:
+                assert script_check('应用启动测试', start_app, script=script)
+                assert script_check('状态', lambda: (False, None), passed=lambda status: status[0],
+                                    script=script) == (False, None)
+                try:
+                    script_check('崩溃', broken, script=script)
+                    assert False, '异常应当重新抛出'
+                except ValueError:
+                    pass
+                path = os.path.join(directory, 'REPORT.md')
+                write_report(path, '设备功能测试报告', script=script)
+            finally:
+                results.set_default_store(previous)
+            with open(path, encoding='utf-8') as f:
+                markdown = f.read()
+            assert markdown.startswith('# 设备功能测试报告') and '- 通过检查: 1/3' in markdown
+            assert '| device/test_x.py::应用启动测试 | ✅ |' in markdown and '| device/test_x.py::状态 | ❌ |' in markdown
+            assert "- device/test_x.py::崩溃: ValueError('bad')" in markdown
+            assert '| device/test_x.py | webserver_ready | 1 | 120 |' in markdown
+            assert 'other.py' not in markdown and '::old' not in markdown
+
+
+def test_select():
+    """latest / last:N / previous:N / 运行ID列表"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = store_with_runs(directory, [(f'r{i}', {}) for i in range(1, 6)])
+        assert store.select('latest') == ['r5']
+        assert store.select('last:2') == ['r4', 'r5']
+        assert store.select('previous:2', relative_to='r5') == ['r3', 'r4']
+        assert store.select('previous:9', relative_to='r2') == ['r1']
+        assert store.select('r1,r3') == ['r1', 'r3']
+
+
+def test_mann_whitney():
+    """完全分离的分布p值极小；相同分布p值不显著"""
+    before = {float(value): 1 for value in range(10)}
+    after = {float(value): 1 for value in range(10, 20)}
+    u, p_greater, p_less = mann_whitney(before, after)
+    assert u == 100 and p_greater < 0.001 and p_less > 0.99
+    _, p_greater, p_less = mann_whitney(before, dict(before))
+    assert p_greater > 0.4 and p_less > 0.4
+    # 全部相同（只有结）时不会除以零
+    assert mann_whitney({5.0: 6}, {5.0: 6})[1:] == (1.0, 1.0)
+
+
+def test_compare_verdicts():
+    """显著变慢判为回归、显著变快判为改善，噪声与样本不足不误报"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = store_with_runs(directory, [
+            ('base1', {'slower': latencies(1, 10), 'faster': latencies(2, 10), 'noise': latencies(3, 10),
+                       'sparse': [10, 11]}),
+            ('base2', {'slower': latencies(4, 10), 'faster': latencies(5, 10), 'noise': latencies(6, 10),
+                       'sparse': [10]}),
+            ('head', {'slower': latencies(7, 12), 'faster': latencies(8, 8), 'noise': latencies(9, 10),
+                      'sparse': [20, 21, 22, 23, 24, 25], 'fresh': [1, 2, 3, 4, 5]}),
+        ])
+        baseline = store.select('previous:5', relative_to='head')
+        verdicts = {(c.group, c.metric): c for c in compare(store.records(set(baseline)), store.records({'head'}))}
+    assert verdicts[('unit/test_x.py', 'slower')].verdict == 'regression'
+    assert 0.15 < verdicts[('unit/test_x.py', 'slower')].change < 0.25
+    assert verdicts[('unit/test_x.py', 'faster')].verdict == 'improvement'
+    assert verdicts[('unit/test_x.py', 'noise')].verdict == 'unchanged'
+    assert verdicts[('unit/test_x.py', 'sparse')].verdict == 'insufficient'
+    assert verdicts[('unit/test_x.py', 'fresh')].verdict == 'new'
+    # 检查耗时每次运行只有一个样本
+    assert verdicts[('unit/test_x.py::check', 'duration_ms')].verdict == 'insufficient'
+    assert verdicts[('unit/test_x.py', 'slower')].to_dict()['verdict'] == 'regression'
+
+
+def test_histogram_metric():
+    """直方图按 {数值: 次数} 存储，与原始样本得到相同的分位数"""
+    histogram = LatencyHistogram()
+    for value in range(1, 101):
+        histogram.record(value * 10)
+    with tempfile.TemporaryDirectory() as directory:
+        store = ResultStore(os.path.join(directory, 'results.jsonl'))
+        record_metric('latency /api/status', histogram=histogram.values(), unit='us', check='a.py::b', store=store)
+        markdown = render_markdown(store.records())
+    assert sum(histogram.values().values()) == 100
+    assert '| a.py | latency /api/status | 100 | 500 | 900 | 990 | 1000 | us |' in markdown
+
+
+def test_report_from_store():
+    """报告包含检查结果、失败详情与基线对比"""
+    with tempfile.TemporaryDirectory() as directory:
+        store = store_with_runs(directory, [('base', {'latency': latencies(1, 10)}),
+                                            ('head', {'latency': latencies(2, 15)})])
+        record_check('unit/test_x.py::broken', 'error', 0.01, 'ValueError: bad', store=run_store(directory, 'head'))
+        comparisons = compare(store.records({'base'}), store.records({'head'}))
+        markdown = render_markdown(store.records({'head'}), comparisons)
+    assert '- 运行: head' in markdown and '- 构建: abc1234' in markdown and '- 通过检查: 1/2' in markdown
+    assert '| unit/test_x.py::check | ✅ | 250 |' in markdown
+    assert '| unit/test_x.py::broken | 💥 | 10 |' in markdown
+    assert '- unit/test_x.py::broken: ValueError: bad' in markdown
+    assert '🔺 回归' in markdown
+
+
+def test_orchestrator_records_results():
+    """调度器运行检查时逐项写入结果，检查中记录的指标归属于该检查"""
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, 'unit'))
+        with open(os.path.join(root, 'unit', 'test_timed.py'), 'w', encoding='utf-8') as f:
+            f.write(textwrap.dedent('''
+                from common.results import record_metric
+
+                def check_fast():
+                    record_metric('latency', samples=[1, 2, 3])
+                    return True
+
+                def check_slow():
+                    return False
+
+                def main():
+                    check_fast()
+                    check_slow()
+            '''))
+        store = ResultStore(os.path.join(root, 'results.jsonl'))
+        previous = results.default_store()
+        results.set_default_store(store)
+        try:
+            run_checks(discover(['unit'], root), workers=2, tests_dir=root, store=store)
+        finally:
+            results.set_default_store(previous)
+        records = list(store.records())
+    checks = {record['check']: record['status'] for record in records if record['kind'] == 'check'}
+    assert checks == {'unit/test_timed.py::check_fast': 'passed', 'unit/test_timed.py::check_slow': 'failed'}
+    metric = [record for record in records if record['kind'] == 'metric'][0]
+    assert metric['check'] == 'unit/test_timed.py::check_fast' and metric['script'] == 'unit/test_timed.py'
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 结果存储测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
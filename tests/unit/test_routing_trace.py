@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Routing 事务命令回放测试：IptablesBatch 生成的命令、批量编译、替身root shell与逐条执行的回退
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.routing_trace import (CORPUS, IP6TABLES, FakeRootShell, IptablesBatch, Transaction, batch_trace, compare,
+                                  load_trace, replay, tethering, tokenize)
+
+
+def test_batch_commands():
+    """IptablesBatch 的移植生成与Kotlin相同的命令（期望与 IptablesBatchTest 相同）"""
+    transaction = Transaction('routing wlan0')
+    batch = IptablesBatch()
+    batch.new_chain('vpnhotspot_acl')
+    batch.insert('FORWARD -j vpnhotspot_acl')
+    batch.add('vpnhotspot_acl -i wlan0 -j ACCEPT')
+    batch.add('POSTROUTING -o rmnet0 -j MASQUERADE', 'nat')
+    batch.add('vpnhotspot_acl -i wlan0 -j ACCEPT', binary=IP6TABLES)
+    batch.apply_to(transaction)
+    [(command, revert)] = transaction.commands
+    assert command.split('\n') == [
+        'iptables -w -t filter -N vpnhotspot_acl 2>/dev/null',
+        "printf '%s\\n' '*filter' '-I FORWARD -j vpnhotspot_acl' '-A vpnhotspot_acl -i wlan0 -j ACCEPT' 'COMMIT' | "
+        'iptables-restore -w --noflush || { iptables -w -t filter -I FORWARD -j vpnhotspot_acl; '
+        'iptables -w -t filter -A vpnhotspot_acl -i wlan0 -j ACCEPT; }',
+        "printf '%s\\n' '*nat' '-A POSTROUTING -o rmnet0 -j MASQUERADE' 'COMMIT' | iptables-restore -w --noflush || "
+        '{ iptables -w -t nat -A POSTROUTING -o rmnet0 -j MASQUERADE; }',
+        "printf '%s\\n' '*filter' '-A vpnhotspot_acl -i wlan0 -j ACCEPT' 'COMMIT' | ip6tables-restore -w --noflush || "
+        '{ ip6tables -w -t filter -A vpnhotspot_acl -i wlan0 -j ACCEPT; }',
+    ]
+    assert revert.split('\n') == [
+        "printf '%s\\n' '*filter' '-D vpnhotspot_acl -i wlan0 -j ACCEPT' 'COMMIT' | ip6tables-restore -w --noflush || "
+        '{ ip6tables -w -t filter -D vpnhotspot_acl -i wlan0 -j ACCEPT; }',
+        "printf '%s\\n' '*nat' '-D POSTROUTING -o rmnet0 -j MASQUERADE' 'COMMIT' | iptables-restore -w --noflush || "
+        '{ iptables -w -t nat -D POSTROUTING -o rmnet0 -j MASQUERADE; }',
+        "printf '%s\\n' '*filter' '-D vpnhotspot_acl -i wlan0 -j ACCEPT' '-D FORWARD -j vpnhotspot_acl' 'COMMIT' | "
+        'iptables-restore -w --noflush || { iptables -w -t filter -D vpnhotspot_acl -i wlan0 -j ACCEPT; '
+        'iptables -w -t filter -D FORWARD -j vpnhotspot_acl; }',
+    ]
+
+
+def test_batch_trace():
+    """逐条命令的记录编译后与 IptablesBatch 直接生成的批量命令相同"""
+    legacy = tethering(batched=False, clients=2, upstreams=('rmnet_data0', 'tun0'))
+    batched = tethering(batched=True, clients=2, upstreams=('rmnet_data0', 'tun0'))
+    assert [t.commands for t in batch_trace(legacy)] == [t.commands for t in batched]
+    # 建链与三个表的负载在同一次调用中，撤销负载逆序登记为一条
+    command, revert = batched[0].commands[-1]
+    assert len(batched[0].commands) == 4 and command.count('tables-restore -w --noflush ||') == 3
+    assert revert.count('tables-restore -w --noflush ||') == 3
+    assert revert.startswith("printf '%s\\n' '*filter' '-D vpnhotspot_filter")
+
+
+def test_corpus():
+    """旧版本记录的事务：规则一致、关闭后复原，往返次数减少"""
+    transactions = load_trace(CORPUS)
+    assert [t.name for t in transactions][:2] == ['routing wlan1', 'subrouting rmnet_data0']
+    report = compare(transactions)
+    assert report['problems'] == [] and report['start_speedup'] > 2 and report['stop_speedup'] > 2
+    legacy, batched = report['modes']['legacy'], report['modes']['batched']
+    assert legacy['failures'] == [] and batched['failures'] == []
+    assert batched['start']['round_trips'] < legacy['start']['round_trips'] / 2
+    assert batched['start']['lock_acquisitions'] < legacy['start']['lock_acquisitions']
+
+
+def test_fallback():
+    """iptables-restore 不可用或不支持 -w 时逐条执行，结果不变"""
+    for kwargs in ({'restore': False}, {'restore_wait': False}):
+        report = compare(clients=2, **kwargs)
+        assert report['problems'] == [], kwargs
+        batched = report['modes']['batched']
+        assert batched['failures'] == []
+        assert batched['start']['processes'] > report['modes']['legacy']['start']['processes']
+
+
+def test_partial_failure():
+    """
+    负载中一条规则失败时整表不提交，只有这个表回退到逐条执行，已提交的其他表不会再执行一次；
+    撤销负载按请求的规则生成，对没有应用的规则整表失败后逐条删除，关闭后复原
+    """
+    broken = [Transaction('subrouting tun0'), Transaction('client 10.0.0.2')]
+    broken[0].exec('iptables -w -t filter -I FORWARD -o tun0 -j ACCEPT',
+                   'iptables -w -t filter -D FORWARD -o tun0 -j ACCEPT')
+    broken[0].exec('iptables -w -t nat -A vpnhotspot_missing -o tun0 -j MASQUERADE',
+                   'iptables -w -t nat -D vpnhotspot_missing -o tun0 -j MASQUERADE')
+    broken[0].exec('iptables -w -t nat -I POSTROUTING -o tun0 -j MASQUERADE',
+                   'iptables -w -t nat -D POSTROUTING -o tun0 -j MASQUERADE')
+    broken[1].exec('iptables -w -t filter -I FORWARD -s 10.0.0.2 -j ACCEPT',
+                   'iptables -w -t filter -D FORWARD -s 10.0.0.2 -j ACCEPT')
+    batched = batch_trace(broken)
+    assert len(batched[0].commands) == 1
+    shells = [FakeRootShell(system_rules=10) for _ in range(2)]
+    results = [replay(trace, shell) for trace, shell in zip((broken, batched), shells)]
+    assert results[0]['started'] == results[1]['started']
+    assert len(results[0]['failures']) == 1 and all(result['restored'] for result in results)
+    started = results[1]['started']['tables']
+    assert started['4/filter']['FORWARD'] == ['-s 10.0.0.2 -j ACCEPT', '-o tun0 -j ACCEPT']
+    assert started['4/nat']['POSTROUTING'] == ['-o tun0 -j MASQUERADE']
+    # 开启：filter 与 nat 各一次 iptables-restore，nat 回退的两条；关闭：nat 回退的两条删除（其中一条失败）
+    individual = [command for command in shells[1].executed if command.startswith('iptables ')]
+    assert individual == ['iptables -w -t nat -A vpnhotspot_missing -o tun0 -j MASQUERADE',
+                          'iptables -w -t nat -I POSTROUTING -o tun0 -j MASQUERADE',
+                          'iptables -w -t nat -D POSTROUTING -o tun0 -j MASQUERADE',
+                          'iptables -w -t nat -D vpnhotspot_missing -o tun0 -j MASQUERADE']
+
+
+def test_shell():
+    """替身shell：引号、管道与 :chain 声明会清空已有链（因此负载中不声明链）"""
+    tokens = tokenize("printf '%s\\n' 'it'\\''s' | cat")
+    assert tokens == [('word', 'printf'), ('word', '%s\\n'), ('word', "it's"), ('op', '|'), ('word', 'cat')]
+    shell = FakeRootShell()
+    shell.exec('iptables -w -t filter -N shared')
+    shell.exec('iptables -w -t filter -A shared -j ACCEPT')
+    exit_code, _, _ = shell.exec("printf '%s\\n' '*filter' ':shared - [0:0]' 'COMMIT' | iptables-restore -w --noflush")
+    assert exit_code == 0 and shell.table('iptables -w', 'filter').chains['shared'] == []
+    exit_code, _, _ = shell.exec("printf '%s\\n' '*filter' '-A nope -j ACCEPT' 'COMMIT' | "
+                                 "iptables-restore -w --noflush || { echo fallback; }")
+    assert exit_code == 0 and shell.round_trips == 4
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 Routing 事务命令回放测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+源码规则引擎测试：组合扫描与逐条匹配结果一致、位置正确、按内容哈希缓存
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.source_rules import Rule, SourceRuleEngine, literals, scan_bytes
+
+OKHTTP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'mobile', 'src', 'main',
+                           'java', 'be', 'mygod', 'vpnhotspot', 'OkHttpWebServer.kt')
+
+SAMPLE = '''class Sample {
+    fun copy() {
+        try {
+            clipboard.setPrimaryClip(clip)
+        } catch (e: SecurityException) {
+            Timber.w(e, "权限被拒绝")
+        } catch (e:SecurityException) {
+            Timber.e(e, "剪贴板服务不可用")
+        } finally {
+            aaaa()
+        }
+    }
+}
+'''
+
+
+def sample_rules():
+    return [
+        Rule('try', 'try'),
+        Rule('catch', 'catch'),
+        Rule('security', r'catch\s*\(\s*e:\s*SecurityException\s*\)', regex=True),
+        Rule('grouped', r'(Timber)\.(w|e)', regex=True),
+        Rule('aa', 'aa'),
+        Rule('span', r'try.*finally', regex=True, dotall=True),
+        Rule('missing', 'performEmergencyCleanup()'),
+    ] + literals('feedback', ['权限被拒绝', '剪贴板服务不可用', '剪贴板复制可能不完整'])
+
+
+def test_counts_match_individual_scans():
+    """计数与 str.count / re.findall 一致（包括重叠候选和自带分组的正则）"""
+    locations = scan_bytes(SAMPLE.encode('utf-8'), sample_rules())
+    for rule in sample_rules():
+        if rule.regex:
+            expected = len(re.findall(rule.pattern, SAMPLE, re.DOTALL if rule.dotall else 0))
+        else:
+            expected = SAMPLE.count(rule.pattern)
+        assert len(locations[rule.name]) == expected, (rule, locations[rule.name], expected)
+    assert len(locations['aa']) == 2
+
+
+def test_counts_match_on_kotlin_source():
+    """在真实的OkHttpWebServer.kt上与逐条匹配结果一致"""
+    with open(OKHTTP_FILE, 'r', encoding='utf-8') as f:
+        content = f.read()
+    rules = literals('literal', ['try', 'catch', 'Timber.', 'socket.close()', '} finally {']) + [
+        Rule('timeout', r'catch\s*\(\s*e:\s*java\.net\.SocketTimeoutException\s*\)', regex=True),
+        Rule('use', r'\.use\s*\{\s*(\w+)\s*->', regex=True),
+    ]
+    locations = scan_bytes(content.encode('utf-8'), rules)
+    for rule in rules:
+        expected = len(re.findall(rule.pattern, content)) if rule.regex else content.count(rule.pattern)
+        assert len(locations[rule.name]) == expected, (rule, expected)
+
+
+def test_locations():
+    """行列号从1开始，列号按字符而非字节计算"""
+    locations = scan_bytes(SAMPLE.encode('utf-8'), sample_rules())
+    assert locations['try'] == [(3, 9)]
+    assert locations['security'] == [(5, 11), (7, 11)]
+    assert locations['feedback_0'] == [(6, 26)]
+    assert locations['feedback_1'] == [(8, 26)]
+    assert locations['missing'] == []
+
+
+def test_cache_by_content_hash():
+    """文件未变化时复用缓存；只改修改时间时按哈希复用；内容变化时重新扫描"""
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'Sample.kt')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(SAMPLE)
+        cache = os.path.join(root, 'cache', 'rules.json')
+        engine = SourceRuleEngine(cache)
+        first = engine.scan(path, sample_rules())
+        assert not first.cached and engine.scans == 1
+        assert first.count('catch') == 2 and first.where('security') == 'Sample.kt:5'
+
+        # 新引擎实例从磁盘读取缓存
+        engine = SourceRuleEngine(cache)
+        second = engine.scan(path, sample_rules())
+        assert second.cached and engine.scans == 0
+        assert second.locations == first.locations
+
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        assert engine.scan(path, sample_rules()).cached and engine.scans == 0
+
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('// try again\n')
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2 * 10 ** 9))
+        third = engine.scan(path, sample_rules())
+        assert not third.cached and third.count('try') == 2
+
+        # 规则集变化时也会重新扫描
+        assert not engine.scan(path, [Rule('try', 'try')]).cached
+
+
+def test_missing_file():
+    """文件不存在时抛出 FileNotFoundError，与原脚本的 open() 行为一致"""
+    engine = SourceRuleEngine(None)
+    try:
+        engine.scan('/nonexistent/Sample.kt', sample_rules())
+    except FileNotFoundError:
+        pass
+    else:
+        raise AssertionError('expected FileNotFoundError')
+
+
+def test_cached_scan_is_fast():
+    """缓存命中时不读取文件内容"""
+    with tempfile.TemporaryDirectory() as root:
+        engine = SourceRuleEngine(os.path.join(root, 'rules.json'))
+        rules = literals('literal', ['try', 'catch', 'Timber.', 'socket.close()'])
+        engine.scan(OKHTTP_FILE, rules)
+        start = time.perf_counter()
+        for _ in range(100):
+            assert engine.scan(OKHTTP_FILE, rules).cached
+        assert time.perf_counter() - start < 0.5
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 源码规则引擎测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+状态流测试：SSE解析、只推送变化字段、间隔限制与认证，以及与轮询的请求数和流量对比（使用本地替身）
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.fake_webserver import FakeWebServer
+from common.fleet import Device
+from common.status_stream import STREAM_PATH, ClientStats, EventParser, _Connection, compare
+
+
+def open_stream(server, query='', api_key=True):
+    device = Device('127.0.0.1', server.port, api_key=server.api_key if api_key else None)
+    connection = _Connection(device, ClientStats('test', 'stream'), timeout=5.0)
+    connection.send_get(STREAM_PATH + query, 'text/event-stream')
+    return connection
+
+
+def read_events(connection, count):
+    parser = EventParser()
+    events = []
+    while len(events) < count:
+        event = parser.feed_line(connection.readline())
+        if event is not None:
+            events.append(event)
+    return parser, events
+
+
+def test_event_parser():
+    """注释、retry、多行data与id"""
+    parser = EventParser()
+    lines = ['retry: 1500\n', '\n', ': keep-alive\n', '\n', 'id: 3\n', 'event: delta\n', 'data: {"cpu": 1.0,\n',
+             'data: "battery": 5}\n', '\r\n']
+    events = [event for event in map(parser.feed_line, lines) if event is not None]
+    assert parser.retry == 1500 and parser.comments == 1
+    assert len(events) == 1 and events[0].name == 'delta' and events[0].id == '3'
+    assert events[0].json() == {'cpu': 1.0, 'battery': 5}
+
+
+def test_deltas():
+    """第一个事件包含全部字段，之后只推送变化的字段"""
+    values = iter([(10.0, 40.0), (10.0, 40.0), (20.0, 40.0), (20.0, 41.5)])
+    last = [(0.0, 0.0)]
+
+    def sampler(server):
+        last[0] = next(values, last[0])
+        return {'battery': 90, 'batteryTemperature': 30.0, 'cpuTemperature': last[0][1], 'cpu': last[0][0],
+                'wifiStatus': '已停止'}
+
+    start = time.monotonic()
+    # 时钟加速10倍：2秒的状态缓存相当于0.2秒，检查间隔为最小的0.5秒，每次检查都会刷新
+    with FakeWebServer(status_sampler=sampler, clock=lambda: start + (time.monotonic() - start) * 10) as server:
+        connection = open_stream(server, '?interval=500')
+        status, headers = connection.read_head()
+        assert status == 200 and headers['content-type'].startswith('text/event-stream')
+        parser, events = read_events(connection, 3)
+        connection.close()
+    assert parser.retry == 500
+    assert [event.name for event in events] == ['status', 'delta', 'delta']
+    assert set(events[0].json()) == {'battery', 'batteryTemperature', 'cpuTemperature', 'cpu', 'wifiStatus',
+                                     'timestamp'}
+    assert set(events[1].json()) == {'cpu', 'timestamp'} and events[1].json()['cpu'] == 20.0
+    assert set(events[2].json()) == {'cpuTemperature', 'timestamp'}
+    assert [event.id for event in events] == ['1', '2', '3']
+
+
+def test_interval_and_auth():
+    """间隔限制在500毫秒以上，没有API Key时返回普通的401响应，停止服务器时关闭状态流"""
+    with FakeWebServer() as server:
+        connection = open_stream(server, '?interval=10')
+        connection.read_head()
+        parser, _ = read_events(connection, 1)
+        assert parser.retry == 500
+        rejected = open_stream(server, api_key=False)
+        status, headers = rejected.read_head()
+        assert status == 401 and int(headers['content-length']) > 0
+        rejected.close()
+        closed = threading.Event()
+
+        def drain():
+            while connection.readline():
+                pass
+            closed.set()
+        threading.Thread(target=drain, daemon=True).start()
+    assert closed.wait(2.0)
+    connection.close()
+
+
+def test_compare():
+    """状态流每个客户端只有一个请求，流量少于轮询，更新次数相同量级"""
+    report = compare(clients=3, duration=2.5, interval=0.5, period=0.25)
+    poll, stream = report['modes']['poll'], report['modes']['stream']
+    assert poll['errors'] == 0 and stream['errors'] == 0
+    assert stream['requests'] == stream['server_requests'] == 3
+    assert poll['requests'] >= 3 * 4 and poll['unchanged'] > 0 and stream['unchanged'] == 0
+    assert stream['updates'] >= 3 and stream['lag_us']['count'] == stream['updates']
+    assert stream['bytes_per_client_min'] < poll['bytes_per_client_min']
+    assert report['request_reduction'] > 0.5 and report['bytes_reduction'] > 0
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 状态流测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
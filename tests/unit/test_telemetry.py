@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+/api/status 采样测试：环形缓冲区、降采样汇总、2秒缓存旧数据推断与对本地替身的固定节拍采样
+"""
+
+import math
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.fake_webserver import FakeWebServer
+from common.fleet import Device
+from common.telemetry import RingBuffer, Sampler, Series, StaleTracker, write_csv
+
+
+def status(n, cpu=None):
+    return {'battery': 100 - n // 100, 'batteryTemperature': 30.0, 'cpuTemperature': 40.0 + n % 10,
+            'cpu': float(n % 50) if cpu is None else cpu, 'wifiStatus': '运行中 (接口: wlan1)' if n >= 50 else '已停止'}
+
+
+def test_ring_buffer():
+    """写满后覆盖最旧的一行并返回它"""
+    ring = RingBuffer(3, ('a', 'b'))
+    assert [ring.append((i, i * 10)) for i in range(3)] == [None, None, None]
+    assert ring.append((3, 30)) == (0.0, 0.0)
+    assert list(ring.rows()) == [(1.0, 10.0), (2.0, 20.0), (3.0, 30.0)]
+    assert ring.column('b') == [10.0, 20.0, 30.0] and len(ring) == 3
+    assert ring.nbytes == 2 * 3 * 8
+
+
+def test_downsampling():
+    """被覆盖的样本按桶汇总，内存占用固定，汇总值与原始数据一致"""
+    series = Series(capacity=10, bucket_seconds=5, bucket_capacity=4)
+    size = series.nbytes
+    for n in range(100):
+        series.add(1000.0 + n, status(n))
+    assert series.nbytes == size and series.samples == 100
+    assert len(series.recent()) == 10 and series.recent()[0]['time'] == 1090.0
+    buckets = series.bucket_rows()
+    # 90个被覆盖的样本共18个桶，只保留最近4个已关闭的桶与正在汇总的桶
+    assert len(buckets) == 5
+    last = buckets[-1]
+    assert last['start'] == 1085.0 and last['count'] == 5
+    assert last['cpu_min'] == 35.0 and last['cpu_max'] == 39.0 and last['cpu_mean'] == 37.0
+    times, minimum, mean, maximum = series.series('cpuTemperature')
+    assert len(times) == 15 and times == sorted(times)
+    assert all(low <= middle <= high for low, middle, high in zip(minimum, mean, maximum))
+    assert [entry['wifiStatus'] for entry in series.recent()][-1] == '运行中 (接口: wlan1)'
+
+
+def test_unavailable_values():
+    """-1（无法获取）不计入汇总"""
+    series = Series(capacity=1, bucket_seconds=10)
+    for n in range(6):
+        series.add(float(n), status(n, cpu=-1 if n % 2 else 20.0))
+    bucket = series.bucket_rows()[0]
+    assert bucket['count'] == 5 and bucket['cpu_mean'] == 20.0
+    assert math.isnan(series.recent()[0]['cpu'])
+
+
+def test_stale_tracker():
+    """与上一样本相同且在2秒窗口内的样本视为缓存命中"""
+    tracker = StaleTracker()
+    values = [(0.0, 'a'), (0.5, 'a'), (1.9, 'a'), (2.1, 'a'), (2.5, 'b'), (3.0, 'b'), (3.2, 'c')]
+    ages = [tracker.observe(timestamp, value) for timestamp, value in values]
+    assert ages[:3] == [None, 0.5, 1.9] and ages[3] is None
+    assert ages[4] is None and ages[5] == 0.5 and ages[6] is None
+    summary = tracker.summary()
+    assert summary['stale'] == 3 and summary['samples'] == 7
+
+
+def test_sampler():
+    """对本地替身按固定节拍采样，缓存期内的重复数值被识别为旧数据"""
+    with FakeWebServer() as server:
+        devices = [Device('127.0.0.1', server.port, name='a'), Device('127.0.0.1', server.port, name='b')]
+        results = Sampler(devices, interval=0.05, capacity=8, bucket_seconds=0.2).run(1.0)
+    for telemetry in results.values():
+        summary = telemetry.to_dict()
+        assert summary['errors'] == 0 and 10 <= summary['samples'] <= 22, summary['samples']
+        assert summary['stale']['stale_ratio'] > 0.5
+        assert len(summary['recent']) == 8 and summary['buckets']
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'telemetry.csv')
+        write_csv(path, results)
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    assert lines[0] == 'device,time,field,min,mean,max' and len(lines) > 8
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 /api/status 采样测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
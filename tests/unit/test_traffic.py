@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+TrafficRecord离线分析测试：链解析、与queryStats对照、按时间桶汇总与数据库拉取（使用临时数据库和adb server替身）
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.adb import AdbClient
+from common.fake_adb import FakeAdbServer
+from common.traffic import (DEVICE_DB_PATH, PACKAGE, TrafficTable, format_mac, mac_to_long, pull_database,
+                            room_schema, synthesize, verify)
+
+MAC_A = mac_to_long('aa:bb:cc:00:00:01')
+MAC_B = mac_to_long('aa:bb:cc:00:00:02')
+
+
+def write_records(path, rows):
+    """rows: (id, timestamp, mac, downstream, sentPackets, sentBytes, receivedPackets, receivedBytes, previousId)"""
+    connection = sqlite3.connect(path)
+    for statement in room_schema():
+        connection.execute(statement)
+    connection.executemany(
+        'INSERT INTO TrafficRecord (id, timestamp, mac, ip, downstream, sentPackets, sentBytes, receivedPackets, '
+        'receivedBytes, previousId) VALUES (?, ?, ?, X\'c0a82b02\', ?, ?, ?, ?, ?, ?)', rows)
+    connection.commit()
+    connection.close()
+
+
+# 两个会话交错：A 的会话 1→3→5，B 的会话 2→4；A 的第二个会话 6 只有初始记录
+ROWS = [
+    (1, 1000, MAC_A, 'wlan1', 0, 0, 0, 0, None),
+    (2, 1500, MAC_B, 'rndis0', 0, 0, 0, 0, None),
+    (3, 2000, MAC_A, 'wlan1', 10, 1000, 20, 3000, 1),
+    (4, 2500, MAC_B, 'rndis0', 5, 400, 6, 700, 2),
+    (5, 3000, MAC_A, 'wlan1', 15, 1600, 30, 4000, 3),
+    (6, 3500, MAC_A, 'rndis0', 0, 0, 0, 0, None),
+]
+
+
+def test_mac_encoding():
+    """MAC与 MacAddressCompat.toLong 相同的小端序编码"""
+    assert mac_to_long('01:00:00:00:00:00') == 1
+    assert format_mac(mac_to_long('aa:bb:cc:dd:ee:ff')) == 'aa:bb:cc:dd:ee:ff'
+    assert mac_to_long('ff:ff:ff:ff:ff:ff') == 0xffffffffffff
+
+
+def test_chains():
+    """链尾、链首与增量"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'app.db')
+        write_records(path, ROWS)
+        table = TrafficTable.from_database(path, batch=4)
+    parent, root, is_tail = table.chains()
+    assert list(parent) == [0, 1, 0, 1, 2, 5]
+    assert list(root) == [0, 1, 0, 1, 0, 5]
+    assert list(table.id[is_tail]) == [4, 5, 6]
+    assert table.deltas()[4].tolist() == [5, 600, 10, 1000]
+    tails, started, ended, counters = table.sessions()
+    assert list(started) == [1500, 1000, 3500] and list(ended) == [2500, 3000, 3500]
+
+
+def test_totals_match_query_stats():
+    """按MAC汇总与 queryStats 口径一致，按下游接口汇总会话总量"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'app.db')
+        write_records(path, ROWS)
+        table = TrafficTable.from_database(path)
+        assert verify(path, table)[0] == []
+    by_mac = {entry['mac']: entry for entry in table.totals('mac')}
+    assert by_mac['aa:bb:cc:00:00:01'] == {'mac': 'aa:bb:cc:00:00:01', 'timestamp': 3000, 'count': 2,
+                                           'sentPackets': 15, 'sentBytes': 1600,
+                                           'receivedPackets': 30, 'receivedBytes': 4000}
+    by_downstream = {entry['downstream']: entry for entry in table.totals('downstream')}
+    assert by_downstream['rndis0']['count'] == 2 and by_downstream['rndis0']['sentBytes'] == 400
+    assert by_downstream['wlan1']['count'] == 1
+
+
+def test_buckets():
+    """时间桶中的增量之和等于会话总量"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'app.db')
+        write_records(path, ROWS)
+        table = TrafficTable.from_database(path)
+    buckets = table.buckets(2000)
+    assert [entry['start'] for entry in buckets] == [0, 2000]
+    assert buckets[0]['sentBytes'] == 0 and buckets[1]['sentBytes'] == 2000
+    by_mac = table.buckets(2000, by='mac')
+    assert {(entry['start'], entry['mac']): entry['receivedBytes'] for entry in by_mac} == {
+        (0, 'aa:bb:cc:00:00:01'): 0, (0, 'aa:bb:cc:00:00:02'): 0,
+        (2000, 'aa:bb:cc:00:00:01'): 4000, (2000, 'aa:bb:cc:00:00:02'): 700,
+    }
+
+
+def test_synthesized_database():
+    """按应用写入方式生成的较大数据库上与逐个MAC的SQL结果一致"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'app.db')
+        count = synthesize(path, clients=20, sessions=5, updates=30, seed=1)
+        table = TrafficTable.from_database(path, batch=1000)
+        mismatched, _ = verify(path, table)
+    assert len(table) == count and mismatched == []
+    assert table.chains()[2].sum() == 100
+    total = sum(entry['sentBytes'] for entry in table.totals('mac'))
+    assert sum(entry['sentBytes'] for entry in table.buckets(3_600_000)) == total
+
+
+def test_pull_database():
+    """通过 exec-out 原样拉取数据库，没有 -wal 时不留下旧文件"""
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'device.db')
+        write_records(source, ROWS)
+        with open(source, 'rb') as f:
+            data = f.read()
+
+        def handler(command, conn):
+            if command == f'run-as {PACKAGE} cat {DEVICE_DB_PATH}':
+                conn.sendall(data)
+            else:
+                conn.sendall(b'cat: No such file or directory\n')
+            return True
+
+        destination = os.path.join(directory, 'app.db')
+        with open(destination + '-wal', 'wb') as f:
+            f.write(b'stale')
+        with FakeAdbServer(shell_handler=handler) as adb:
+            assert pull_database(destination, client=AdbClient(port=adb.port)) == 'run-as'
+        assert not os.path.exists(destination + '-wal')
+        assert len(TrafficTable.from_database(destination)) == len(ROWS)
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 TrafficRecord离线分析测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+queryStats 基准测试：从Kotlin源码读取查询与迁移、迁移后链尾表的正确性、查询计划与加速（使用临时数据库）
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from common.traffic import TrafficTable, synthesize
+from common.traffic_bench import REPO_ROOT, bench, check_plan, kotlin_migration, kotlin_query_stats
+
+SCHEMA = os.path.join(REPO_ROOT, 'mobile', 'schemas', 'be.mygod.vpnhotspot.room.AppDatabase', '3.json')
+
+
+def test_kotlin_sources():
+    """新查询与 Migration3 的语句从Kotlin源码中完整读出"""
+    query = kotlin_query_stats()
+    assert 'FROM TrafficChainHead JOIN TrafficRecord' in query and 'TrafficChainHead.mac = ?' in query
+    statements = kotlin_migration()
+    assert len(statements) == 3
+    assert statements[0].startswith('CREATE TABLE IF NOT EXISTS `TrafficChainHead`')
+    assert statements[1] == 'CREATE INDEX IF NOT EXISTS `index_TrafficChainHead_mac` ON `TrafficChainHead` (`mac`)'
+    assert statements[2].startswith('INSERT INTO `TrafficChainHead`')
+
+
+def test_migration_finds_chain_tails():
+    """迁移后链尾表恰好是每条链的最后一条记录"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'app.db')
+        synthesize(path, clients=10, sessions=4, updates=20, version=2, seed=3)
+        connection = sqlite3.connect(path)
+        with connection:
+            for statement in kotlin_migration():
+                connection.execute(statement)
+        heads = {row[0] for row in connection.execute('SELECT id FROM TrafficChainHead')}
+        connection.close()
+        table = TrafficTable.from_database(path)
+    assert heads == set(table.id[table.chains()[2]].tolist())
+
+
+def test_exported_schema():
+    """Migration3 建出的表与索引与Room导出的版本3 schema一致"""
+    with open(SCHEMA, 'r', encoding='utf-8') as f:
+        database = json.load(f)['database']
+    assert database['version'] == 3
+    entity, = (entity for entity in database['entities'] if entity['tableName'] == 'TrafficChainHead')
+    expected = {statement.replace('IF NOT EXISTS ', '').replace('${TABLE_NAME}', 'TrafficChainHead')
+                for statement in [entity['createSql']] + [index['createSql'] for index in entity['indices']]}
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE TrafficRecord (id INTEGER PRIMARY KEY AUTOINCREMENT, mac INTEGER NOT NULL, '
+                       'previousId INTEGER)')
+    for statement in kotlin_migration():
+        connection.execute(statement)
+    actual = {row[0] for row in connection.execute("SELECT sql FROM sqlite_master WHERE tbl_name = 'TrafficChainHead' "
+                                                   "AND sql IS NOT NULL")}
+    connection.close()
+    assert actual == expected, actual
+
+
+def test_check_plan():
+    """计划退化为扫描时报告问题"""
+    good = ['SEARCH TrafficChainHead USING COVERING INDEX index_TrafficChainHead_mac (mac=?)',
+            'SEARCH TrafficRecord USING INTEGER PRIMARY KEY (rowid=?)']
+    assert check_plan(good) == []
+    problems = check_plan(['SCAN TrafficRecord', 'SEARCH TrafficChainHead USING INTEGER PRIMARY KEY (rowid=?)'])
+    assert len(problems) == 2
+
+
+def test_bench():
+    """新查询结果与自连接一致、使用mac索引并且更快；追加记录后链尾表恢复原状"""
+    result = bench(100, clients=10, sessions=4, repeat=2, appends=20)
+    assert result['mismatched'] == [] and result['plan_problems'] == []
+    assert result['records'] == 4000 and result['heads'] == 40
+    assert result['old']['plan'][0] == 'SCAN TrafficRecord'
+    assert result['speedup_p50'] > 3, result['speedup_p50']
+    assert result['append_us']['with_heads'] > 0
+
+
+def main():
+    """运行全部测试"""
+    print("🚀 queryStats 基准测试")
+    print("=" * 50)
+    tests = [value for name, value in sorted(globals().items()) if name.startswith('test_')]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            passed += 1
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            print(f"❌ {test.__name__}: {e!r}")
+    print("=" * 50)
+    print(f"测试总结: {passed}/{len(tests)} 通过")
+    return 0 if passed == len(tests) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())